@@ -1,11 +1,9 @@
 from terptracker.website import create_app
-from asgiref.wsgi import WsgiToAsgi
 import os
 
 FLASK_MODE = os.getenv("FLASK_MODE", "DEV").upper()
+# WSGI entry point (gunicorn app:app). The native asyncio app is served from asgi.py.
 app = create_app()
-# if FLASK_MODE == 'PROD':
-#     app = WsgiToAsgi(app)
 
 if __name__ == '__main__':
     app.run(debug=True)
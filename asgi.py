@@ -0,0 +1,4 @@
+from terptracker.asyncweb import create_async_app
+
+# Native asyncio serving mode, e.g. `hypercorn asgi:app -w 2 -b 0.0.0.0:5000`
+app = create_async_app()
@@ -0,0 +1,115 @@
+"""
+Micro-benchmark: per-row cost of preparing USER_EXPENSES items for the summary table.
+
+Compares the previous dict-copy normalization with `Expense` records, including what the template reads from each
+row (date, amount, category). Run from the repository root:
+
+    python -m benchmarks.expense_records --rows 50000
+"""
+import argparse
+import gc
+import random
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from decimal import Decimal
+from benchmarks.results import save_results
+from terptracker.dynamodb.expense_schema import Expense, expense_amount, expense_epoch_seconds, new_expense_item
+
+
+def legacy_normalize_summary_record(record: dict):
+    # The implementation Expense replaced, kept here as the baseline
+    norm_record = record.copy()
+    norm_record['expenseAmount'] = float(expense_amount(record))
+    norm_record['expenseTimestamp'] = expense_epoch_seconds(record['expenseTimestamp'])
+    norm_record['date_str'] = (datetime.fromtimestamp(norm_record['expenseTimestamp'], tz=timezone.utc).date()
+                               .isoformat())
+    return norm_record
+
+
+def render_legacy(record: dict):
+    return record['date_str'], '%.2f' % record['expenseAmount'], record.get('expenseCategory')
+
+
+def render_expense(expense: Expense):
+    return expense.date_str, expense.amount_str, expense.expense_category
+
+
+def make_items(rows: int, legacy_ratio: float, seed: int = 7):
+    """
+    Builds items the way boto3 deserializes them (Numbers as Decimal), all in one month.
+    """
+    rng = random.Random(seed)
+    month_start = int(datetime(2025, 2, 1, tzinfo=timezone.utc).timestamp())
+    items = []
+    for _ in range(rows):
+        epoch_micros = (month_start + rng.randrange(28 * 86400)) * 1_000_000 + rng.randrange(1_000_000)
+        cents = rng.randrange(1, 50_000)
+        category = rng.choice(['food', 'rent', 'travel', 'fun', 'gas'])
+        if rng.random() < legacy_ratio:
+            items.append({'userEmail': 'bench@terptracker.dev', 'expenseTimestamp': str(epoch_micros / 1_000_000),
+                          'expenseAmount': f'{cents / 100:.2f}', 'expenseType': 'card',
+                          'expenseCategory': category, 'userNote': 'lunch'})
+        else:
+            item = new_expense_item(user_email='bench@terptracker.dev', epoch_micros=epoch_micros,
+                                    amount_cents=cents, expense_type='card', expense_category=category,
+                                    user_note='lunch')
+            items.append({name: Decimal(value) if isinstance(value, int) else value
+                          for name, value in item.items()})
+    return items
+
+
+def time_per_row(convert, render, items, repeat: int):
+    best = float('inf')
+    for _ in range(repeat):
+        gc.collect()
+        started_at = time.perf_counter()
+        for item in items:
+            render(convert(item))
+        best = min(best, time.perf_counter() - started_at)
+    return best / len(items) * 1e9
+
+
+def retained_bytes_per_row(convert, items):
+    gc.collect()
+    tracemalloc.start()
+    records = [convert(item) for item in items]
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del records
+    return retained / len(items)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=50_000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--legacy-ratio', type=float, default=0.0,
+                        help='Share of v1 (pre-migration) items in the sample.')
+    parser.add_argument('--output',
+                        help='Result file; defaults to benchmarks/results/expense_records-<timestamp>.json.')
+    args = parser.parse_args()
+
+    items = make_items(rows=args.rows, legacy_ratio=args.legacy_ratio)
+    variants = {
+        'dict copy (before)': (legacy_normalize_summary_record, render_legacy),
+        'Expense (after)': (Expense.from_item, render_expense),
+    }
+    print(f'{args.rows} rows, {args.legacy_ratio:.0%} legacy items, best of {args.repeat}')
+    print(f"{'':>20} {'ns/row':>10} {'bytes/row retained':>20}")
+    results = {}
+    for name, (convert, render) in variants.items():
+        results[name] = (time_per_row(convert, render, items, repeat=args.repeat),
+                         retained_bytes_per_row(convert, items))
+        print(f'{name:>20} {results[name][0]:>10.0f} {results[name][1]:>20.0f}')
+
+    (before_ns, before_bytes), (after_ns, after_bytes) = results.values()
+    print(f'{"speedup":>20} {before_ns / after_ns:>9.1f}x {before_bytes / after_bytes:>19.1f}x')
+
+    save_results(benchmark='expense_records', config=vars(args), output=args.output,
+                 results={name: {'nsPerRow': round(ns, 1), 'retainedBytesPerRow': round(retained, 1)}
+                          for name, (ns, retained) in results.items()})
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,270 @@
+"""
+Load benchmark: drives the Flask app's login, add-expense, /summary and /pie_chart flows at set concurrency levels.
+
+Users and their expenses are seeded first, then each concurrency level runs that many threads, each with its own
+logged-in test client, through `--rounds` rounds of the selected flows. Latency (p50/p95/p99) is reported per flow
+and throughput per level, and the run is saved as JSON (see benchmarks/results.py). Requests are served in-process,
+so the numbers include the app's Python work and the DynamoDB calls but no network or WSGI server. Run from the
+repository root, against the in-process embedded backend:
+
+    python -m benchmarks.load --users 20 --months 6 --expenses-per-month 60 --concurrency 1,4,16
+
+or against the embedded SQLite backend (a new database file per run unless SQLITE_DB_PATH is set):
+
+    python -m benchmarks.load --db-mode SQLITE
+
+or against a fresh DynamoDB Local (every run adds expenses, so restart it between runs that should compare):
+
+    DYNAMODB_URL=http://localhost:8000 python -m benchmarks.load --db-mode DEV
+"""
+import argparse
+import calendar
+import contextlib
+import os
+import random
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from benchmarks.results import latency_summary, save_results
+
+FLOWS = ('login', 'add_expense', 'summary', 'pie_chart')
+BENCH_PASSWORD = 'benchmark-password'
+_CATEGORIES = ('food', 'rent', 'travel', 'fun', 'gas', 'groceries')
+_TYPES = ('card', 'cash')
+
+
+def configure_environment(db_mode: str):
+    """
+    Sets the configuration the app reads at import time; must run before anything from terptracker is imported.
+    """
+    os.environ['DB_MODE'] = db_mode
+    # Keep the response cache and metrics in-process, so a run neither reads nor leaves files in the working directory
+    os.environ.setdefault('RESPONSE_CACHE_BACKEND', 'LOCAL')
+    os.environ.setdefault('METRICS_BACKEND', 'LOCAL')
+    if db_mode == 'SQLITE':
+        os.environ.setdefault('SQLITE_DB_PATH', os.path.join(tempfile.mkdtemp(prefix='terptracker-bench-'),
+                                                             'dynamodb.sqlite'))
+
+
+def bench_email(index: int):
+    return f'bench{index}@terptracker.dev'
+
+
+def seeded_months(end_month: str, months: int):
+    """
+    Returns:
+        list[str]: The `months` months (YYYY-MM) ending with `end_month`, oldest first.
+    """
+    year, month = (int(part) for part in end_month.split('-'))
+    result = []
+    for _ in range(months):
+        result.append(f'{year:04d}-{month:02d}')
+        year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+    return result[::-1]
+
+
+def random_epoch_micros(rng: random.Random, year_month: str):
+    year, month = (int(part) for part in year_month.split('-'))
+    month_start = int(datetime(year, month, 1, tzinfo=timezone.utc).timestamp())
+    seconds = rng.randrange(calendar.monthrange(year, month)[1] * 86400)
+    return (month_start + seconds) * 1_000_000 + rng.randrange(1_000_000)
+
+
+def seed_data(users: int, months: list, expenses_per_month: int, seed: int):
+    """
+    Writes `users` accounts (all with `BENCH_PASSWORD`), their expenses and the matching monthly rollups directly to
+    the tables, the same items sign-up and add-expense would have written.
+
+    Returns:
+        dict: What was written and how long it took.
+    """
+    from werkzeug.security import generate_password_hash
+    from terptracker.constants.AppConstants import AppConstants
+    from terptracker.constants.DynamoDbConstants import DynamoDbConstants
+    from terptracker.dynamodb.dynamodb_helpers import get_dynamodb_resource, get_dynamodb_table
+    from terptracker.dynamodb.expense_schema import new_expense_item
+    from terptracker.dynamodb.login_accounts import email_lookup_item
+    from terptracker.dynamodb.rollup_helpers import build_rollup, rollup_to_item
+
+    started_at = time.perf_counter()
+    rng = random.Random(seed)
+    resource = get_dynamodb_resource(db_mode=DynamoDbConstants.DB_MODE)
+    login_table = get_dynamodb_table(resource, DynamoDbConstants.TERPTRACKER_LOGIN_TABLE_NAME)
+    expenses_table = get_dynamodb_table(resource, DynamoDbConstants.TERPTRACKER_USER_EXPENSES_TABLE_NAME)
+    rollup_table = get_dynamodb_table(resource, DynamoDbConstants.TERPTRACKER_USER_MONTHLY_ROLLUP_TABLE_NAME)
+    # One hash for every account: hashing is measured by the login flow, not paid per seeded user
+    password_hash = generate_password_hash(BENCH_PASSWORD, method=AppConstants.PASSWORD_HASH_METHOD)
+
+    expense_count = 0
+    with login_table.batch_writer() as login_writer, expenses_table.batch_writer() as expense_writer, \
+            rollup_table.batch_writer() as rollup_writer:
+        for index in range(users):
+            user_item = {'user_id': str(uuid.UUID(int=rng.getrandbits(128))), 'email': bench_email(index),
+                         'firstName': f'Bench{index}', 'password': password_hash}
+            login_writer.put_item(Item=user_item)
+            login_writer.put_item(Item=email_lookup_item(user_item))
+
+            for year_month in months:
+                items = [new_expense_item(user_email=user_item['email'],
+                                          epoch_micros=random_epoch_micros(rng, year_month),
+                                          amount_cents=rng.randrange(100, 20_000), expense_type=rng.choice(_TYPES),
+                                          expense_category=rng.choice(_CATEGORIES), user_note='seeded')
+                         for _ in range(expenses_per_month)]
+                for item in items:
+                    expense_writer.put_item(Item=item)
+                rollup_writer.put_item(Item=rollup_to_item(build_rollup(user_email=user_item['email'],
+                                                                        year_month=year_month, expense_items=items)))
+                expense_count += len(items)
+
+    return {'users': users, 'months': len(months), 'expenses': expense_count,
+            'seconds': round(time.perf_counter() - started_at, 3)}
+
+
+class VirtualUser:
+    """
+    One simulated browser: a test client with its own session cookie, logged in as a seeded account.
+    """
+
+    def __init__(self, app, email: str, months: list, seed: int):
+        self.client = app.test_client()
+        self.email = email
+        self.months = months
+        self.rng = random.Random(seed)
+        self.added = 0
+
+    @staticmethod
+    def _finish(response):
+        # Consume streamed bodies, so rendering is part of the measured time
+        response.get_data()
+        response.close()
+        return response.status_code
+
+    def login(self):
+        return self._finish(self.client.post('/login', data={'email': self.email, 'password': BENCH_PASSWORD}))
+
+    def add_expense(self):
+        self.added += 1
+        day = datetime.fromtimestamp(random_epoch_micros(self.rng, self.rng.choice(self.months)) / 1_000_000,
+                                     tz=timezone.utc).date().isoformat()
+        # A distinct note per submission, so the content-based idempotency key never collapses two of them
+        return self._finish(self.client.post('/', data={
+            'expense_date': day, 'expense_amount': f'{self.rng.randrange(100, 20_000) / 100:.2f}',
+            'expense_category': self.rng.choice(_CATEGORIES), 'expense_type': self.rng.choice(_TYPES),
+            'expense_note': f'load {self.added}'}))
+
+    def summary(self):
+        return self._finish(self.client.post('/summary', data={'month': self.rng.choice(self.months)}))
+
+    def pie_chart(self):
+        # The page, then the data its chart fetches
+        month = self.rng.choice(self.months)
+        status = self._finish(self.client.get('/pie_chart', query_string={'month': month}))
+        api_status = self._finish(self.client.get(f'/api/summary/{month}'))
+        return max(status, api_status)
+
+
+def run_level(app, concurrency: int, users: int, months: list, flows: list, rounds: int, seed: int):
+    """
+    Runs `concurrency` virtual users through `rounds` rounds of `flows` at once.
+
+    Returns:
+        dict: Per-flow latency summaries and status counts, plus the level's throughput.
+    """
+    virtual_users = [VirtualUser(app, email=bench_email(index % users), months=months, seed=seed + index)
+                     for index in range(concurrency)]
+    for virtual_user in virtual_users:
+        virtual_user.login()
+
+    samples = {flow: [] for flow in flows}
+    statuses = {flow: {} for flow in flows}
+    lock = threading.Lock()
+    start_gate = threading.Barrier(concurrency)
+
+    def drive(virtual_user: VirtualUser):
+        local_samples = {flow: [] for flow in flows}
+        local_statuses = {flow: [] for flow in flows}
+        start_gate.wait()
+        for _ in range(rounds):
+            for flow in flows:
+                started_at = time.perf_counter()
+                status = getattr(virtual_user, flow)()
+                local_samples[flow].append(time.perf_counter() - started_at)
+                local_statuses[flow].append(status)
+        with lock:
+            for flow in flows:
+                samples[flow].extend(local_samples[flow])
+                for status in local_statuses[flow]:
+                    statuses[flow][status] = statuses[flow].get(status, 0) + 1
+
+    started_at = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(drive, virtual_users))
+    elapsed = time.perf_counter() - started_at
+
+    request_count = sum(len(values) for values in samples.values())
+    return {
+        'concurrency': concurrency,
+        'seconds': round(elapsed, 3),
+        'operations': request_count,
+        'operationsPerSecond': round(request_count / elapsed, 2) if elapsed else 0.0,
+        'flows': {flow: dict(latency_summary(samples[flow]), statuses=statuses[flow]) for flow in flows},
+    }
+
+
+def print_level(level: dict):
+    print(f"concurrency {level['concurrency']}: {level['operations']} operations in {level['seconds']}s, "
+          f"{level['operationsPerSecond']} ops/s")
+    print(f"{'flow':>14} {'count':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}  statuses")
+    for flow, summary in level['flows'].items():
+        print(f"{flow:>14} {summary['count']:>7} {summary['p50Ms']:>9.2f} {summary['p95Ms']:>9.2f} "
+              f"{summary['p99Ms']:>9.2f} {summary['maxMs']:>9.2f}  {summary['statuses']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--db-mode', choices=('MEMORY', 'SQLITE', 'DEV'), default='MEMORY',
+                        help='MEMORY or SQLITE for the in-process embedded backend, DEV for DynamoDB Local at '
+                             'DYNAMODB_URL.')
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--months', type=int, default=6)
+    parser.add_argument('--end-month', default='2025-06', help='Last seeded month (YYYY-MM).')
+    parser.add_argument('--expenses-per-month', type=int, default=60)
+    parser.add_argument('--concurrency', default='1,4,16', help='Comma-separated thread counts, one run each.')
+    parser.add_argument('--rounds', type=int, default=10, help='Rounds of the flows per thread and level.')
+    parser.add_argument('--flows', default=','.join(FLOWS), help=f'Comma-separated subset of {", ".join(FLOWS)}.')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--output', help='Result file; defaults to benchmarks/results/load-<timestamp>.json.')
+    parser.add_argument('--verbose', action='store_true', help="Keep the app's own output during the runs.")
+    args = parser.parse_args()
+
+    flows = [flow.strip() for flow in args.flows.split(',') if flow.strip()]
+    unknown = set(flows) - set(FLOWS)
+    if unknown:
+        parser.error(f'Unknown flows: {", ".join(sorted(unknown))}')
+    levels = [int(level) for level in args.concurrency.split(',')]
+
+    configure_environment(db_mode=args.db_mode)
+    from terptracker.website import create_app
+
+    app = create_app()
+    months = seeded_months(end_month=args.end_month, months=args.months)
+    seeded = seed_data(users=args.users, months=months, expenses_per_month=args.expenses_per_month, seed=args.seed)
+    print(f"🚧Seeded {seeded['users']} users and {seeded['expenses']} expenses in {seeded['seconds']}s")
+
+    results = {'seeded': seeded, 'levels': []}
+    for concurrency in levels:
+        with open(os.devnull, 'w') as devnull, \
+                contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(devnull):
+            level = run_level(app, concurrency=concurrency, users=args.users, months=months, flows=flows,
+                              rounds=args.rounds, seed=args.seed)
+        results['levels'].append(level)
+        print_level(level)
+
+    save_results(benchmark='load', config=vars(args), results=results, output=args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""
+Micro-benchmarks of hot paths on the request side: summary record normalization, password hashing and template
+rendering.
+
+Each benchmark times `--repeat` batches and reports the per-operation latency of the batches (p50/p95/p99), and the
+run is saved as JSON (see benchmarks/results.py). Run from the repository root:
+
+    python -m benchmarks.micro --rows 5000 --repeat 20
+    python -m benchmarks.micro --only templates --template-rows 2000
+"""
+import argparse
+import gc
+import time
+from benchmarks.load import configure_environment
+from benchmarks.results import latency_summary, save_results
+
+BENCHMARKS = ('normalize', 'password', 'templates')
+
+
+def time_batches(operation, batch_size: int, repeat: int):
+    """
+    Runs `operation` `batch_size` times per batch, `repeat` batches.
+
+    Returns:
+        list[float]: Seconds per operation of each batch.
+    """
+    samples = []
+    for _ in range(repeat):
+        gc.collect()
+        started_at = time.perf_counter()
+        for _ in range(batch_size):
+            operation()
+        samples.append((time.perf_counter() - started_at) / batch_size)
+    return samples
+
+
+def bench_normalize(rows: int, legacy_ratio: float, repeat: int):
+    from benchmarks.expense_records import make_items
+    from terptracker.dynamodb.dynamodb_helpers import normalize_summary_records
+
+    items = make_items(rows=rows, legacy_ratio=legacy_ratio)
+    samples = time_batches(lambda: normalize_summary_records(items), batch_size=1, repeat=repeat)
+    summary = latency_summary(samples)
+    summary['nsPerRow'] = round(sorted(samples)[len(samples) // 2] / rows * 1e9, 1)
+    return {'normalize_summary_records': dict(summary, rows=rows, legacyRatio=legacy_ratio)}
+
+
+def bench_password(method: str, iterations: int, repeat: int):
+    from werkzeug.security import check_password_hash, generate_password_hash
+
+    password_hash = generate_password_hash('benchmark-password', method=method)
+    return {
+        'hash': dict(latency_summary(time_batches(lambda: generate_password_hash('benchmark-password', method=method),
+                                                  batch_size=iterations, repeat=repeat)), method=method),
+        'verify': dict(latency_summary(time_batches(lambda: check_password_hash(password_hash, 'benchmark-password'),
+                                                    batch_size=iterations, repeat=repeat)), method=method),
+    }
+
+
+def bench_templates(rows: int, repeat: int):
+    from flask import render_template
+    from benchmarks.expense_records import make_items
+    from terptracker.dynamodb.expense_schema import Expense
+    from terptracker.dynamodb.rollup_helpers import build_rollup, rollup_from_item, rollup_to_item
+    from terptracker.website import create_app
+
+    app = create_app()
+    items = make_items(rows=rows, legacy_ratio=0.0)
+    expenses = [Expense.from_item(item) for item in items]
+    rollup = rollup_from_item(rollup_to_item(build_rollup(user_email='bench@terptracker.dev', year_month='2025-02',
+                                                          expense_items=items)))
+    results = {}
+    with app.test_request_context('/summary', method='POST', data={'month': '2025-02'}):
+        # Compile once, so the batches measure rendering only
+        render_template('summary_table.html', selected_month='2025-02', rollup=rollup, expenses=expenses, offset=0,
+                        next_cursor=None)
+        results['summary_table.html'] = dict(latency_summary(time_batches(
+            lambda: render_template('summary_table.html', selected_month='2025-02', rollup=rollup,
+                                    expenses=expenses, offset=0, next_cursor=None), batch_size=1, repeat=repeat)),
+                                             rows=rows)
+        render_template('home.html', idempotency_key='0' * 32)
+        results['home.html'] = latency_summary(time_batches(
+            lambda: render_template('home.html', idempotency_key='0' * 32), batch_size=10, repeat=repeat))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--only', default=','.join(BENCHMARKS),
+                        help=f'Comma-separated subset of {", ".join(BENCHMARKS)}.')
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--rows', type=int, default=5000, help='Items per normalize_summary_records call.')
+    parser.add_argument('--legacy-ratio', type=float, default=0.0, help='Share of v1 (pre-migration) items.')
+    parser.add_argument('--hash-method', help='werkzeug hash method; defaults to PASSWORD_HASH_METHOD.')
+    parser.add_argument('--hash-iterations', type=int, default=3, help='Hashes (and verifies) per batch.')
+    parser.add_argument('--template-rows', type=int,
+                        help='Expense rows in the rendered summary table; defaults to one page (SUMMARY_PAGE_SIZE).')
+    parser.add_argument('--output', help='Result file; defaults to benchmarks/results/micro-<timestamp>.json.')
+    args = parser.parse_args()
+
+    selected = [name.strip() for name in args.only.split(',') if name.strip()]
+    unknown = set(selected) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f'Unknown benchmarks: {", ".join(sorted(unknown))}')
+
+    configure_environment(db_mode='MEMORY')
+    from terptracker.constants.AppConstants import AppConstants
+
+    results = {}
+    if 'normalize' in selected:
+        results.update(bench_normalize(rows=args.rows, legacy_ratio=args.legacy_ratio, repeat=args.repeat))
+    if 'password' in selected:
+        results.update(bench_password(method=args.hash_method or AppConstants.PASSWORD_HASH_METHOD,
+                                      iterations=args.hash_iterations, repeat=args.repeat))
+    if 'templates' in selected:
+        results.update(bench_templates(rows=args.template_rows or AppConstants.SUMMARY_PAGE_SIZE, repeat=args.repeat))
+
+    print(f"{'benchmark':>26} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10}")
+    for name, summary in results.items():
+        print(f"{name:>26} {summary['p50Ms']:>10.3f} {summary['p95Ms']:>10.3f} {summary['p99Ms']:>10.3f}")
+
+    save_results(benchmark='micro', config=vars(args), results=results, output=args.output)
+
+
+if __name__ == '__main__':
+    main()
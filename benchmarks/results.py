@@ -0,0 +1,106 @@
+"""
+Shared helpers for the benchmark scripts: latency percentiles and JSON result files.
+
+Each run is written to `benchmarks/results/<benchmark>-<UTC timestamp>.json` (or `--output`) together with the
+commit, interpreter and configuration it ran with, so runs from different revisions can be compared side by side.
+"""
+import json
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime, timezone
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+# Settings that change what a benchmark measures; recorded with every run
+_RECORDED_ENV = ('DB_MODE', 'DYNAMODB_URL', 'SQLITE_DB_PATH', 'PASSWORD_HASH_METHOD', 'PASSWORD_HASH_WORKERS',
+                 'RESPONSE_CACHE_BACKEND', 'WRITE_BEHIND_ENABLED', 'EXPENSE_CATEGORY_INDEX_READY',
+                 'USER_SESSION_SNAPSHOT', 'METRICS_ENABLED')
+
+
+def percentile(sorted_values: list, q: float):
+    """
+    Returns:
+        float: The `q`-th percentile (0-100) of already sorted values, linearly interpolated; 0.0 when empty.
+    """
+    if not sorted_values:
+        return 0.0
+    rank = (len(sorted_values) - 1) * q / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (rank - lower)
+
+
+def latency_summary(seconds: list):
+    """
+    Summarizes latency samples in milliseconds.
+
+    Args:
+        seconds (list[float]): One duration per operation, in seconds.
+
+    Returns:
+        dict: count, mean, p50, p95, p99 and max.
+    """
+    values = sorted(seconds)
+    count = len(values)
+    return {
+        'count': count,
+        'meanMs': round(sum(values) / count * 1000, 3) if count else 0.0,
+        'p50Ms': round(percentile(values, 50) * 1000, 3),
+        'p95Ms': round(percentile(values, 95) * 1000, 3),
+        'p99Ms': round(percentile(values, 99) * 1000, 3),
+        'maxMs': round(values[-1] * 1000, 3) if count else 0.0,
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(RESULTS_DIR)).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_environment():
+    """
+    Returns:
+        dict: What a result depends on besides the code: commit, interpreter, machine and recorded settings.
+    """
+    return {
+        'commit': _git_commit(),
+        'python': sys.version.split()[0],
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'cpuCount': os.cpu_count(),
+        'env': {name: os.environ[name] for name in _RECORDED_ENV if name in os.environ},
+    }
+
+
+def save_results(benchmark: str, config: dict, results, output: str = None):
+    """
+    Writes one benchmark run as JSON.
+
+    Args:
+        benchmark (str): The benchmark's name, used in the default file name.
+        config (dict): The run's parameters (usually the parsed command line).
+        results: The measurements.
+        output (str, optional): Where to write; defaults to a timestamped file in `RESULTS_DIR`.
+
+    Returns:
+        str: The path written.
+    """
+    started_at = datetime.now(timezone.utc)
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f'{benchmark}-{started_at.strftime("%Y%m%dT%H%M%SZ")}.json')
+    document = {
+        'benchmark': benchmark,
+        'recordedAt': started_at.isoformat(),
+        'environment': run_environment(),
+        'config': config,
+        'results': results,
+    }
+    with open(output, 'w') as f:
+        json.dump(document, f, indent=2, default=str)
+    print(f'✅Results written to {output}')
+    return output
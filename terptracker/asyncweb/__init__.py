@@ -0,0 +1,88 @@
+import os
+from quart import Quart, abort
+from terptracker.constants.AppConstants import AppConstants
+from terptracker.dynamodb.TerpTrackerDb import TerpTrackerDb
+from terptracker.dynamodb.dynamodb_helpers import DynamoDbConstants
+from terptracker.dynamodb.async_dynamodb_helpers import (get_async_dynamodb_client, async_list_table_names,
+                                                         close_async_dynamodb_resources)
+from terptracker.dynamodb.schema_manifest import verify_schema_manifest
+from terptracker.website.startup import StartupTimer
+
+# The asyncio serving mode: the same pages and endpoints as terptracker.website, written as coroutines on the async
+# DynamoDB layer and served by an ASGI server (see asgi.py). Templates are shared with the Flask app.
+TEMPLATE_FOLDER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'website', 'templates')
+
+
+class AsyncLazySchemaCheck:
+    """
+    Async counterpart of `LazySchemaCheck`: verifies the tables exist on the first request, answering 503 until
+    they do.
+    """
+
+    def __init__(self, db_mode: str):
+        self.db_mode = db_mode
+        self.verified = False
+
+    async def __call__(self):
+        if self.verified:
+            return
+        client = await get_async_dynamodb_client(db_mode=self.db_mode)
+        missing_tables = sorted(set(DynamoDbConstants.TERPTRACKER_TABLE_NAMES) - await async_list_table_names(client))
+        if missing_tables:
+            print(f'🚨Missing DynamoDB tables {missing_tables}; run `terptracker init-db`')
+            abort(503, description='The database schema has not been provisioned yet.')
+        self.verified = True
+
+
+def create_async_app():
+    timer = StartupTimer()
+    app = Quart(__name__, template_folder=TEMPLATE_FOLDER)
+    app.config['SECRET_KEY'] = 'terptracker_msml'
+
+    from .views import views
+    from .auth import auth
+    from .summary import summary
+    from .export import export
+
+    app.register_blueprint(views, url_prefix='/')
+    app.register_blueprint(auth, url_prefix='/')
+    app.register_blueprint(summary, url_prefix='/')
+    app.register_blueprint(export, url_prefix='/')
+    timer.mark('blueprints')
+
+    DB_MODE = DynamoDbConstants.DB_MODE
+    schema_mode = AppConstants.STARTUP_SCHEMA_MODE
+    print(f'Initializing TerpTracker Database (async) w/ {DB_MODE=} {schema_mode=}')
+
+    if schema_mode == 'MANIFEST':
+        verify_schema_manifest(path=AppConstants.SCHEMA_MANIFEST_PATH, db_mode=DB_MODE)
+    elif schema_mode == 'LAZY':
+        app.before_request(AsyncLazySchemaCheck(db_mode=DB_MODE))
+    else:
+        TerpTrackerDb(db_mode=DB_MODE).create_all_tables()
+    timer.mark('schema')
+
+    from .login import get_current_user
+
+    @app.context_processor
+    async def inject_user():
+        return dict(user=await get_current_user())
+
+    from terptracker.dynamodb.throttling import TableThrottled, retry_after_headers
+
+    @app.errorhandler(TableThrottled)
+    async def table_throttled(e):
+        print(f'⚠️{e}')
+        return 'TerpTracker is busy right now, please try again in a moment.', 503, retry_after_headers(e)
+
+    @app.after_serving
+    async def close_dynamodb():
+        await close_async_dynamodb_resources()
+
+    if AppConstants.METRICS_ENABLED:
+        from .instrumentation import instrument_async_app
+        instrument_async_app(app)
+
+    app.config['STARTUP_TIMINGS'] = timer.report()
+    timer.print_report(title='TerpTracker async app created')
+    return app
@@ -0,0 +1,154 @@
+import uuid
+from quart import Blueprint, render_template, request, flash, redirect, url_for
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+from terptracker.website.models import User, user_cache
+from terptracker.website.password_hashing import password_hasher, HashingPoolFull
+from terptracker.website.auth import SIGN_IN_BUSY_MESSAGE, sign_up_error
+from terptracker.constants.DynamoDbConstants import DynamoDbConstants
+from terptracker.dynamodb.throttling import TableThrottled, retry_after_headers
+from terptracker.dynamodb.login_accounts import (email_key, email_taken_from_error, new_account_transaction,
+                                                 password_update_transaction, user_item_from_email_lookup)
+from .login import (login_table, login_user, logout_user, login_required, get_current_user, remember_user_snapshot,
+                    forget_user)
+
+auth = Blueprint('auth', __name__)
+
+
+async def rehash_password(user_data: dict, password: str):
+    """
+    Async counterpart of `terptracker.website.auth.rehash_password`.
+
+    Returns:
+        str: The hash now stored for the user.
+    """
+    try:
+        new_hash = await password_hasher.async_hash_password(password)
+        await login_table.transact_write_items(TransactItems=password_update_transaction(user_item=user_data,
+                                                                                         new_hash=new_hash))
+        return new_hash
+    except (HashingPoolFull, ClientError, TableThrottled) as e:
+        print(f"⚠️ Skipped password rehash for user_id={user_data['user_id']}: {e}")
+        return user_data['password']
+
+
+async def find_login_item(email: str):
+    """
+    Async counterpart of `terptracker.website.auth.find_login_item`.
+
+    Returns:
+        dict | None: The account's user item fields (user_id, email, firstName, password), or None.
+    """
+    if not email:
+        return None
+    item = (await login_table.get_item(Key={'user_id': email_key(email)}, ConsistentRead=True)).get('Item')
+    if item:
+        return user_item_from_email_lookup(item)
+    if DynamoDbConstants.LOGIN_EMAIL_INDEX_FALLBACK:
+        response = await login_table.query(IndexName='username-index', KeyConditionExpression=Key('email').eq(email))
+        items = response.get('Items', [])
+        return items[0] if items else None
+    return None
+
+
+async def sign_in_busy(template: str, error: TableThrottled):
+    """
+    Async counterpart of `terptracker.website.auth.sign_in_busy`.
+    """
+    print(f'⚠️{error}')
+    await flash(SIGN_IN_BUSY_MESSAGE, category='error')
+    return await render_template(template), 503, retry_after_headers(error)
+
+
+@auth.route('/login', methods=['GET', 'POST'])
+async def login():
+    if request.method == 'POST':
+        form = await request.form
+        email = form.get('email')
+        password = form.get('password')
+
+        try:
+            user_data = await find_login_item(email)
+        except TableThrottled as e:
+            return await sign_in_busy(template='login.html', error=e)
+
+        if user_data:
+            try:
+                password_valid = await password_hasher.async_verify_password(user_data['password'], password)
+            except HashingPoolFull:
+                await flash(SIGN_IN_BUSY_MESSAGE, category='error')
+                return await render_template('login.html'), 429
+
+            if password_valid:
+                if password_hasher.needs_rehash(user_data['password']):
+                    user_data = dict(user_data, password=await rehash_password(user_data=user_data,
+                                                                               password=password))
+                user = User.from_item(user_data)
+                login_user(user)
+                user_cache.set(user.id, user)
+                remember_user_snapshot(user)
+                return redirect(url_for('views.home'))
+            else:
+                await flash('Incorrect password, try again.', category='error')
+        else:
+            await flash('Email does not exist', category='error')
+    return await render_template('login.html')
+
+
+@auth.route('/logout')
+@login_required
+async def logout():
+    forget_user((await get_current_user()).id)
+    logout_user()
+    await flash("You’ve been logged out.", "success")
+    return redirect(url_for('auth.login'))
+
+
+@auth.route('/sign-up', methods=['GET', 'POST'])
+async def sign_up():
+    if request.method == 'POST':
+        form = await request.form
+        email = form.get('email')
+        first_name = form.get('firstName')
+        password1 = form.get('password1')
+        password2 = form.get('password2')
+
+        try:
+            existing = await find_login_item(email)
+        except TableThrottled as e:
+            return await sign_in_busy(template='sign_up.html', error=e)
+        error = sign_up_error(email=email, first_name=first_name, password1=password1, password2=password2,
+                              email_taken=existing is not None)
+        if error:
+            await flash(error, category='error')
+        else:
+            user_id = str(uuid.uuid4())
+            try:
+                password_hash = await password_hasher.async_hash_password(password1)
+            except HashingPoolFull:
+                await flash(SIGN_IN_BUSY_MESSAGE, category='error')
+                return await render_template('sign_up.html'), 429
+
+            new_user = User(user_id=user_id, email=email, first_name=first_name, password_hash=password_hash)
+            try:
+                await login_table.transact_write_items(TransactItems=new_account_transaction(user_item={
+                    'user_id': user_id,
+                    'email': email,
+                    'firstName': first_name,
+                    'password': password_hash
+                }))
+            except TableThrottled as e:
+                return await sign_in_busy(template='sign_up.html', error=e)
+            except ClientError as e:
+                if not email_taken_from_error(e):
+                    raise
+                await flash(sign_up_error(email=email, first_name=first_name, password1=password1,
+                                          password2=password2, email_taken=True), category='error')
+                return await render_template('sign_up.html')
+            forget_user(user_id)
+            login_user(new_user)
+            remember_user_snapshot(new_user)
+            await flash('Account created!', category='success')
+            return redirect(url_for('views.home'))
+
+    return await render_template('sign_up.html')
@@ -0,0 +1,44 @@
+from quart import Blueprint, Response, request
+from terptracker.dynamodb.async_dynamodb_helpers import async_paginate_query_pages
+from terptracker.website.export import (ExportEncoder, parse_export_args, export_headers,
+                                        user_expenses_query_kwargs)
+from terptracker.dynamodb.write_behind import async_with_pending_pages
+from terptracker.website.expense_store import pending_expenses
+from .login import login_required, get_current_user
+from .views import user_expenses_table
+
+export = Blueprint('export', __name__)
+
+
+async def async_encode_export(pages, export_format: str, compress: bool):
+    """
+    Async counterpart of `terptracker.website.export.encode_export`.
+    """
+    encoder = ExportEncoder(export_format=export_format, compress=compress)
+    chunk = encoder.start()
+    if chunk:
+        yield chunk
+    async for page in pages:
+        chunk = encoder.encode_page(page.get('Items', []))
+        if chunk:
+            yield chunk
+    chunk = encoder.finish()
+    if chunk:
+        yield chunk
+
+
+@export.route('/export', methods=['GET'])
+@login_required
+async def export_expenses():
+    """
+    Streams the current user's whole expense history; see `terptracker.website.export.export_expenses`.
+    """
+    export_format, compress = parse_export_args(request.args)
+    current_user = await get_current_user()
+    pending = pending_expenses(user_email=current_user.email)
+    pages = async_with_pending_pages(
+        async_paginate_query_pages(user_expenses_table, **user_expenses_query_kwargs(user_email=current_user.email)),
+        pending)
+    mimetype, headers = export_headers(export_format=export_format, compress=compress)
+    return Response(async_encode_export(pages, export_format=export_format, compress=compress), mimetype=mimetype,
+                    headers=headers)
@@ -0,0 +1,42 @@
+from quart import request
+from quart.signals import before_render_template, request_finished, request_started, template_rendered
+from terptracker.metrics import current_request_timing, record_request, start_request_timing
+from terptracker.website.instrumentation import route_label
+
+# Async counterparts of the Flask receivers in terptracker.website.instrumentation. Quart runs synchronous receivers
+# on a thread with a copy of the context, so these are coroutines: the request timing they set must be visible to the
+# rest of the request's task. Quart sends request_finished before the body is sent, so streamed templates are timed up
+# to the first chunk.
+
+
+async def _on_request_started(sender, **extra):
+    start_request_timing()
+
+
+async def _on_before_render_template(sender, **extra):
+    timing = current_request_timing()
+    if timing is not None:
+        timing.render_started()
+
+
+async def _on_template_rendered(sender, **extra):
+    timing = current_request_timing()
+    if timing is not None:
+        timing.render_finished()
+
+
+async def _on_request_finished(sender, response, **extra):
+    timing = current_request_timing()
+    if timing is not None:
+        timing.render_finished()
+        record_request(timing, request.method, route_label(request), response.status_code)
+
+
+def instrument_async_app(app):
+    """
+    Connects Quart's request and template signals to the request metrics.
+    """
+    request_started.connect(_on_request_started, app)
+    before_render_template.connect(_on_before_render_template, app)
+    template_rendered.connect(_on_template_rendered, app)
+    request_finished.connect(_on_request_finished, app)
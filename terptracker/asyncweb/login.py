@@ -0,0 +1,103 @@
+from functools import wraps
+from quart import g, session, request, redirect, url_for, flash
+from flask_login import AnonymousUserMixin
+from terptracker.constants.AppConstants import AppConstants
+from terptracker.constants.DynamoDbConstants import DynamoDbConstants
+from terptracker.dynamodb.throttling import create_async_throttled_table
+from terptracker.website.models import User, user_cache, USER_SNAPSHOT_SESSION_KEY
+
+# Flask-Login is synchronous, so the asyncio app keeps the logged-in user itself. It uses the same session keys as
+# Flask-Login (and the same signed cookie format), so a session started in either app is valid in the other.
+SESSION_USER_ID_KEY = '_user_id'
+SESSION_FRESH_KEY = '_fresh'
+LOGIN_MESSAGE = 'Please log in to access this page.'
+
+login_table = create_async_throttled_table(db_mode=DynamoDbConstants.DB_MODE,
+                                           table_name=DynamoDbConstants.TERPTRACKER_LOGIN_TABLE_NAME)
+
+
+def remember_user_snapshot(user: User):
+    """
+    Stores a snapshot of the user in the session when session snapshots are enabled. The session is only written
+    when the snapshot changed, so an unchanged session cookie is not re-signed and re-sent.
+    """
+    if not AppConstants.USER_SESSION_SNAPSHOT:
+        return
+    snapshot = user.to_session_snapshot()
+    if session.get(USER_SNAPSHOT_SESSION_KEY) != snapshot:
+        session[USER_SNAPSHOT_SESSION_KEY] = snapshot
+
+
+def forget_user(user_id):
+    """
+    Drops every cached copy of a user: the in-process cache entry and the session snapshot.
+    """
+    user_cache.invalidate(user_id)
+    session.pop(USER_SNAPSHOT_SESSION_KEY, None)
+
+
+async def load_user(user_id: str):
+    """
+    Resolves a user id the same way the Flask app's user_loader does: session snapshot, then the in-process cache,
+    then a LOGIN table GetItem.
+
+    Returns:
+        User | None: The user, or None if the account no longer exists.
+    """
+    if AppConstants.USER_SESSION_SNAPSHOT:
+        user = User.from_session_snapshot(session.get(USER_SNAPSHOT_SESSION_KEY), user_id)
+        if user:
+            return user
+
+    user = user_cache.get(user_id)
+    if user is None:
+        response = await login_table.get_item(Key={'user_id': user_id})
+        item = response.get('Item')
+        if not item:
+            return None
+        user = User.from_item(item)
+        user_cache.set(user_id, user)
+
+    remember_user_snapshot(user)
+    return user
+
+
+async def get_current_user():
+    """
+    Returns the user of the current request, loading it on first access.
+
+    Returns:
+        User | AnonymousUserMixin: The logged-in user, or an anonymous user.
+    """
+    if 'user' not in g:
+        user_id = session.get(SESSION_USER_ID_KEY)
+        user = await load_user(user_id) if user_id else None
+        g.user = user or AnonymousUserMixin()
+    return g.user
+
+
+def login_user(user: User):
+    session[SESSION_USER_ID_KEY] = user.get_id()
+    session[SESSION_FRESH_KEY] = True
+    g.user = user
+
+
+def logout_user():
+    session.pop(SESSION_USER_ID_KEY, None)
+    session.pop(SESSION_FRESH_KEY, None)
+    g.user = AnonymousUserMixin()
+
+
+def login_required(view):
+    """
+    Redirects anonymous users to the login page, like Flask-Login's decorator.
+    """
+    @wraps(view)
+    async def decorated_view(*args, **kwargs):
+        user = await get_current_user()
+        if not user.is_authenticated:
+            await flash(LOGIN_MESSAGE, category='message')
+            return redirect(url_for('auth.login', next=request.path))
+        return await view(*args, **kwargs)
+
+    return decorated_view
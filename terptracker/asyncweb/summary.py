@@ -0,0 +1,219 @@
+import asyncio
+from quart import Blueprint, render_template, request, jsonify, abort, current_app
+from terptracker.constants.AppConstants import AppConstants
+from terptracker.dynamodb.async_dynamodb_helpers import async_run_query_plan_page, async_run_range_query
+from terptracker.dynamodb.rollup_helpers import accumulate_monthly_rollups, async_get_or_build_monthly_rollup
+from terptracker.dynamodb.expense_analytics import (LOOKBACK_MONTHS, async_load_expense_columns, expense_trends,
+                                                    shift_month)
+from terptracker.website.summary import (MONTH_YEAR_PATTERN, month_expenses_page, month_expenses_plan,
+                                         month_summary_payload, page_pending_items, parse_page_cursor,
+                                         parse_page_size, parse_range_dates, parse_trend_args, parse_trend_filters,
+                                         quarter_dates, range_expense_query, range_pending_items,
+                                         range_summary_payload, summary_page_view, trim_look_ahead,
+                                         year_dates)
+from terptracker.dynamodb.write_behind import async_merge_pending, merge_pending
+from terptracker.website.models import response_cache
+from terptracker.website.expense_store import pending_expenses
+from .login import login_required, get_current_user
+from .views import user_expenses_table, user_monthly_rollup_table
+
+summary = Blueprint('summary', __name__)
+
+
+async def load_month_expenses_page(user_email: str, month_year: str, page_size: int, start_key: dict, offset: int,
+                                   pending_items: list):
+    """
+    Async counterpart of `terptracker.website.summary.load_month_expenses_page`.
+    """
+    items, _ = await async_run_query_plan_page(
+        user_expenses_table, month_expenses_plan(user_email=user_email, month_year=month_year),
+        page_size=page_size + 1, exclusive_start_key=start_key)
+    items, last_evaluated_key = trim_look_ahead(items, page_size)
+    rows = list(merge_pending(items, page_pending_items(pending_items, start_key, last_evaluated_key)))
+    return month_expenses_page(secret_key=current_app.secret_key, user_email=user_email, month_year=month_year,
+                               rows=rows, last_evaluated_key=last_evaluated_key, offset=offset)
+
+
+@summary.route('/summary', methods=['GET', 'POST'])
+@login_required
+async def home():
+    values = await request.values
+    month_year = values.get('month')
+    if request.method == 'POST' or month_year:
+        if not MONTH_YEAR_PATTERN.match(month_year or ''):
+            abort(400, description='Month must be formatted as YYYY-MM')
+        current_user = await get_current_user()
+        cursor = values.get('cursor')
+        start_key, offset = parse_page_cursor(secret_key=current_app.secret_key, cursor=cursor,
+                                              user_email=current_user.email, month_year=month_year)
+
+        view = summary_page_view(cursor)
+        page, version = response_cache.lookup(user_email=current_user.email, year_month=month_year, view=view)
+        if page is None:
+            pending = pending_expenses(user_email=current_user.email, year_month=month_year)
+            rollup = await async_get_or_build_monthly_rollup(
+                rollup_table=user_monthly_rollup_table,
+                user_expenses_table=user_expenses_table,
+                user_email=current_user.email,
+                year_month=month_year,
+                expense_query_plan=month_expenses_plan(user_email=current_user.email, month_year=month_year),
+                pending_items=pending
+            )
+            page = await load_month_expenses_page(user_email=current_user.email, month_year=month_year,
+                                                  page_size=AppConstants.SUMMARY_PAGE_SIZE, start_key=start_key,
+                                                  offset=offset, pending_items=pending)
+            page['rollup'] = rollup
+            response_cache.set(user_email=current_user.email, year_month=month_year, view=view, value=page,
+                               version=version)
+        return await render_template("summary_table.html",
+                                     selected_month=month_year,
+                                     rollup=page['rollup'],
+                                     expenses=page['expenses'],
+                                     offset=page['offset'],
+                                     next_cursor=page['nextCursor'])
+    else:
+        return await render_template('summary.html')
+
+
+@summary.route('/pie_chart', methods=['GET', 'POST'])
+@login_required
+async def get_pie_chart():
+    month_year = (await request.values).get('month')
+    if not MONTH_YEAR_PATTERN.match(month_year or ''):
+        abort(400, description='Month must be formatted as YYYY-MM')
+    return await render_template("pie_chart.html", selected_month=month_year)
+
+
+@summary.route('/api/summary/<month_year>', methods=['GET'])
+@login_required
+async def get_month_summary(month_year):
+    """
+    Async counterpart of `terptracker.website.summary.get_month_summary`.
+    """
+    if not MONTH_YEAR_PATTERN.match(month_year):
+        abort(400, description='Month must be formatted as YYYY-MM')
+
+    current_user = await get_current_user()
+    payload, version = response_cache.lookup(user_email=current_user.email, year_month=month_year,
+                                             view='api_summary')
+    if payload is None:
+        rollup = await async_get_or_build_monthly_rollup(
+            rollup_table=user_monthly_rollup_table,
+            user_expenses_table=user_expenses_table,
+            user_email=current_user.email,
+            year_month=month_year,
+            expense_query_plan=month_expenses_plan(user_email=current_user.email, month_year=month_year),
+            pending_items=pending_expenses(user_email=current_user.email, year_month=month_year)
+        )
+        payload = month_summary_payload(month_year=month_year, rollup=rollup)
+        response_cache.set(user_email=current_user.email, year_month=month_year, view='api_summary', value=payload,
+                           version=version)
+
+    response = jsonify(payload)
+    await response.add_etag()
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return await response.make_conditional(request)
+
+
+@summary.route('/api/summary/<month_year>/expenses', methods=['GET'])
+@login_required
+async def get_month_expenses(month_year):
+    """
+    Async counterpart of `terptracker.website.summary.get_month_expenses`.
+    """
+    if not MONTH_YEAR_PATTERN.match(month_year):
+        abort(400, description='Month must be formatted as YYYY-MM')
+    current_user = await get_current_user()
+    start_key, offset = parse_page_cursor(secret_key=current_app.secret_key, cursor=request.args.get('cursor'),
+                                          user_email=current_user.email, month_year=month_year)
+    page = await load_month_expenses_page(user_email=current_user.email, month_year=month_year,
+                                          page_size=parse_page_size(request.args), start_key=start_key,
+                                          offset=offset,
+                                          pending_items=pending_expenses(user_email=current_user.email,
+                                                                         year_month=month_year))
+
+    response = jsonify({'month': month_year, 'offset': page['offset'], 'nextCursor': page['nextCursor'],
+                        'expenses': [expense.to_dict() for expense in page['expenses']]})
+    await response.add_etag()
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return await response.make_conditional(request)
+
+
+@summary.route('/summary/trends', methods=['GET'])
+@login_required
+async def get_trends():
+    start_month, end_month, window = parse_trend_args(request.args)
+    return await render_template('trends.html', start_month=start_month, end_month=end_month, window=window)
+
+
+@summary.route('/api/summary/trends', methods=['GET'])
+@login_required
+async def get_expense_trends():
+    """
+    Async counterpart of `terptracker.website.summary.get_expense_trends`; the NumPy passes run on a worker thread.
+    """
+    start_month, end_month, window = parse_trend_args(request.args)
+    category, expense_type = parse_trend_filters(request.args)
+    current_user = await get_current_user()
+    columns = await async_load_expense_columns(user_expenses_table=user_expenses_table,
+                                               user_email=current_user.email,
+                                               start_month=shift_month(start_month, -LOOKBACK_MONTHS),
+                                               end_month=end_month, category=category, expense_type=expense_type,
+                                               pending_items=pending_expenses(user_email=current_user.email))
+    trends = await asyncio.to_thread(expense_trends, columns, start_month=start_month, end_month=end_month,
+                                     window=window)
+
+    response = jsonify(trends)
+    await response.add_etag()
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return await response.make_conditional(request)
+
+
+async def range_summary_response(start_date, end_date, period: str = None):
+    """
+    Async counterpart of `terptracker.website.summary.range_summary_response`.
+    """
+    category, expense_type = parse_trend_filters(request.args)
+    current_user = await get_current_user()
+    query = range_expense_query(user_email=current_user.email, start_date=start_date, end_date=end_date,
+                                category=category, expense_type=expense_type)
+    rollups = {}
+    async for item in async_merge_pending(async_run_range_query(user_expenses_table, query),
+                                          range_pending_items(query)):
+        accumulate_monthly_rollups(rollups, user_email=current_user.email, expense_item=item)
+
+    response = jsonify(range_summary_payload(start_date=start_date, end_date=end_date, rollups=rollups,
+                                             period=period))
+    await response.add_etag()
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return await response.make_conditional(request)
+
+
+@summary.route('/api/summary/range', methods=['GET'])
+@login_required
+async def get_range_summary():
+    """
+    Async counterpart of `terptracker.website.summary.get_range_summary`.
+    """
+    start_date, end_date = parse_range_dates(request.args)
+    return await range_summary_response(start_date=start_date, end_date=end_date)
+
+
+@summary.route('/api/summary/quarter/<int:year>/<int:quarter>', methods=['GET'])
+@login_required
+async def get_quarter_summary(year, quarter):
+    """
+    Async counterpart of `terptracker.website.summary.get_quarter_summary`.
+    """
+    start_date, end_date = quarter_dates(year=year, quarter=quarter)
+    return await range_summary_response(start_date=start_date, end_date=end_date, period=f'{year:04d}-Q{quarter}')
+
+
+@summary.route('/api/summary/year/<int:year>', methods=['GET'])
+@login_required
+async def get_year_summary(year):
+    """
+    Async counterpart of `terptracker.website.summary.get_year_summary`.
+    """
+    start_date, end_date = year_dates(year=year)
+    return await range_summary_response(start_date=start_date, end_date=end_date, period=f'{year:04d}')
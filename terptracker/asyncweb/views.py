@@ -0,0 +1,126 @@
+import asyncio
+import csv
+import io
+from quart import Blueprint, Response, render_template, request, flash, jsonify, abort
+from terptracker.constants.AppConstants import AppConstants
+from terptracker.constants.DynamoDbConstants import DynamoDbConstants
+from terptracker.dynamodb.async_dynamodb_helpers import AsyncLazyDynamoDbTable, get_async_dynamodb_client
+from terptracker.dynamodb.dynamodb_helpers import LazyDynamoDbTable, get_dynamodb_client
+from terptracker.dynamodb.expense_import import import_expenses_csv, RowRejected
+from terptracker.dynamodb.rollup_helpers import expense_year_month
+from terptracker.dynamodb.throttling import throttle_stats
+from terptracker.dynamodb.idempotency import async_put_expense_idempotently, expense_idempotency_key, new_form_token
+from terptracker.metrics import metrics, render_prometheus
+from terptracker.website.instrumentation import PROMETHEUS_CONTENT_TYPE, metrics_scrape_allowed
+from terptracker.website.models import user_cache, response_cache
+from terptracker.website.expense_store import expense_write_queue
+from terptracker.website.views import build_user_expense_item, import_upload_refusal, record_expense
+from .login import login_required, get_current_user
+
+views = Blueprint('views', __name__)
+
+user_expenses_table = AsyncLazyDynamoDbTable(db_mode=DynamoDbConstants.DB_MODE,
+                                             table_name=DynamoDbConstants.TERPTRACKER_USER_EXPENSES_TABLE_NAME)
+user_monthly_rollup_table = AsyncLazyDynamoDbTable(
+    db_mode=DynamoDbConstants.DB_MODE, table_name=DynamoDbConstants.TERPTRACKER_USER_MONTHLY_ROLLUP_TABLE_NAME)
+idempotency_table = AsyncLazyDynamoDbTable(
+    db_mode=DynamoDbConstants.DB_MODE, table_name=DynamoDbConstants.TERPTRACKER_EXPENSE_IDEMPOTENCY_TABLE_NAME)
+
+
+async def async_record_expense(user_expense_item: dict, form_token: str = None):
+    """
+    Async counterpart of `terptracker.website.views.record_expense`.
+    """
+    if expense_write_queue is not None:
+        # Claiming the key, journaling and waiting for room in a full queue block, so they run off the event loop
+        return await asyncio.to_thread(record_expense, user_expense_item, form_token)
+    return await async_put_expense_idempotently(
+        client=await get_async_dynamodb_client(db_mode=DynamoDbConstants.DB_MODE), expense_item=user_expense_item,
+        idempotency_key=expense_idempotency_key(expense_item=user_expense_item, form_token=form_token),
+        idempotency_table=idempotency_table)
+
+
+@views.route('/', methods=['GET', 'POST'])
+@login_required
+async def home():
+    if request.method == 'POST':
+        current_user = await get_current_user()
+        try:
+            form = await request.form
+            user_expense_item = build_user_expense_item(user_email=current_user.email, form=form)
+
+            original = await async_record_expense(user_expense_item=user_expense_item,
+                                                  form_token=form.get('idempotency_key'))
+            if original is None:
+                response_cache.invalidate_month(user_email=current_user.email,
+                                                year_month=expense_year_month(user_expense_item['expenseTimestamp']))
+                await flash(f"Successfully added your {user_expense_item['expenseCategory']} expense")
+            else:
+                await flash(f"Successfully added your {original.get('expenseCategory')} expense")
+
+        except Exception as e:
+            print(e)
+            await flash('There was an error parsing your information', category='error')
+
+    return await render_template("home.html", idempotency_key=new_form_token())
+
+
+@views.route('/import', methods=['GET', 'POST'])
+@login_required
+async def import_expenses():
+    report = None
+    if request.method == 'POST':
+        refusal = import_upload_refusal(request.content_length)
+        if refusal is None and request.content_length is None:
+            # A body of unknown size is read first (bounded by MAX_CONTENT_LENGTH) and then measured
+            refusal = import_upload_refusal(len(await request.get_data()))
+        if refusal:
+            await flash(refusal, category='error')
+            return await render_template('import_expenses.html', report=None), 413
+        upload = (await request.files).get('expense_file')
+        if not upload or not upload.filename:
+            await flash('Choose a CSV file to import', category='error')
+        else:
+            # The importer is built on writer threads and the synchronous client, so it runs off the event loop
+            current_user = await get_current_user()
+            text_stream = io.TextIOWrapper(upload.stream, encoding='utf-8-sig', newline='')
+            try:
+                report = await asyncio.to_thread(
+                    import_expenses_csv, text_stream=text_stream, user_email=current_user.email,
+                    client=get_dynamodb_client(db_mode=DynamoDbConstants.DB_MODE),
+                    rollup_table=LazyDynamoDbTable(
+                        db_mode=DynamoDbConstants.DB_MODE,
+                        table_name=DynamoDbConstants.TERPTRACKER_USER_MONTHLY_ROLLUP_TABLE_NAME))
+                for year_month in report.months:
+                    response_cache.invalidate_month(user_email=current_user.email, year_month=year_month)
+                await flash(f'Imported {report.rows_imported} of {report.rows_read} expenses')
+            except (RowRejected, UnicodeDecodeError, csv.Error) as e:
+                await flash(f'Could not import {upload.filename}: {e}', category='error')
+
+    return await render_template('import_expenses.html', report=report.to_dict() if report else None)
+
+
+@views.route('/health', methods=['GET'])
+async def health():
+    return "Healthy!", 200
+
+
+@views.route('/metrics', methods=['GET'])
+async def prometheus_metrics():
+    """
+    Async counterpart of `terptracker.website.views.prometheus_metrics`; the shared store is read on a worker thread.
+    """
+    if not AppConstants.METRICS_ENABLED:
+        abort(404)
+    if not metrics_scrape_allowed(remote_addr=request.remote_addr, authorization=request.headers.get('Authorization')):
+        abort(403)
+    body = await asyncio.to_thread(lambda: render_prometheus(metrics.collect()))
+    return Response(body, content_type=PROMETHEUS_CONTENT_TYPE)
+
+
+@views.route('/api/cache/stats', methods=['GET'])
+@login_required
+async def cache_stats():
+    return jsonify({'responseCache': response_cache.stats(), 'userCache': user_cache.stats(),
+                    'writeBehind': expense_write_queue.stats() if expense_write_queue else None,
+                    'throttling': throttle_stats()})
@@ -0,0 +1,170 @@
+import click
+import json
+import statistics
+import subprocess
+import sys
+from terptracker.constants.AppConstants import AppConstants
+from terptracker.constants.DynamoDbConstants import DynamoDbConstants
+from terptracker.dynamodb.TerpTrackerDb import TerpTrackerDb
+from terptracker.dynamodb.admin_analytics import AdminAnalytics, EXECUTORS, write_snapshot
+from terptracker.dynamodb.dynamodb_helpers import get_dynamodb_client, get_dynamodb_resource, get_dynamodb_table
+from terptracker.dynamodb.expense_import import import_expenses_csv, RowRejected
+from terptracker.dynamodb.expense_migration import ExpenseSchemaMigration
+from terptracker.dynamodb.login_accounts import LoginEmailMigration
+from terptracker.dynamodb.schema_manifest import write_schema_manifest
+
+# Run in a fresh interpreter so module imports are measured cold
+_STARTUP_PROBE = """
+import json, time
+started_at = time.perf_counter()
+from terptracker.website import create_app
+app = create_app()
+timings = dict(app.config['STARTUP_TIMINGS'], wallMs=round((time.perf_counter() - started_at) * 1000, 2))
+print('STARTUP_TIMINGS=' + json.dumps(timings))
+"""
+
+
+@click.group()
+def cli():
+    """TerpTracker maintenance commands."""
+
+
+@cli.command('init-db')
+@click.option('--db-mode', default=DynamoDbConstants.DB_MODE, show_default=True,
+              help='PROD for AWS, DEV for DynamoDB Local, SQLITE for the embedded SQLite file.')
+@click.option('--manifest', default=AppConstants.SCHEMA_MANIFEST_PATH, show_default=True,
+              help='Where to write the schema manifest checked by workers in MANIFEST mode.')
+@click.option('--drop-legacy-indexes', is_flag=True,
+              help='Also drop indexes no query uses any more (USER_EXPENSES UserTimestampIndex).')
+def init_db(db_mode, manifest, drop_legacy_indexes):
+    """Create any missing tables and indexes and record the schema manifest."""
+    terptracker_db = TerpTrackerDb(db_mode=db_mode)
+    created_tables = terptracker_db.create_all_tables()
+    if DynamoDbConstants.TERPTRACKER_USER_EXPENSES_TABLE_NAME not in created_tables:
+        terptracker_db.update_user_expenses_indexes(drop_legacy_index=drop_legacy_indexes)
+    write_schema_manifest(path=manifest, db_mode=db_mode)
+    print(f'✅Schema v{DynamoDbConstants.SCHEMA_VERSION} ready (created: {created_tables or "none"}); '
+          f'manifest written to {manifest}')
+
+
+@cli.command('startup-report')
+@click.option('--runs', default=5, show_default=True, help='Number of cold starts to measure.')
+def startup_report(runs):
+    """Measure cold import and create_app() time in fresh interpreters."""
+    reports = []
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, '-c', _STARTUP_PROBE], capture_output=True, text=True, check=True)
+        line = next(l for l in result.stdout.splitlines() if l.startswith('STARTUP_TIMINGS='))
+        reports.append(json.loads(line.split('=', 1)[1]))
+
+    for metric in ('importMs', 'totalMs', 'wallMs'):
+        values = [report[metric] for report in reports]
+        print(f'{metric:>14}: median={statistics.median(values):.1f}ms min={min(values):.1f}ms '
+              f'max={max(values):.1f}ms')
+    for step in reports[0]['steps']:
+        values = [report['steps'][step] for report in reports]
+        print(f'{step:>14}: median={statistics.median(values):.1f}ms')
+
+
+@cli.command('backfill-rollups')
+@click.option('--db-mode', default=DynamoDbConstants.DB_MODE, show_default=True,
+              help='PROD for AWS, DEV for DynamoDB Local, SQLITE for the embedded SQLite file.')
+def backfill_rollups(db_mode):
+    """Rebuild USER_MONTHLY_ROLLUP from the raw USER_EXPENSES items."""
+    terptracker_db = TerpTrackerDb(db_mode=db_mode)
+    terptracker_db.create_user_monthly_rollup_table()
+    terptracker_db.backfill_monthly_rollups()
+
+
+@cli.command('import-expenses')
+@click.argument('csv_file', type=click.File('r', encoding='utf-8-sig'))
+@click.option('--user-email', required=True, help='The account the expenses belong to.')
+@click.option('--db-mode', default=DynamoDbConstants.DB_MODE, show_default=True,
+              help='PROD for AWS, DEV for DynamoDB Local, SQLITE for the embedded SQLite file.')
+@click.option('--threads', default=DynamoDbConstants.IMPORT_WRITER_THREADS, show_default=True,
+              help='Parallel transactional writers.')
+@click.option('--json-report', is_flag=True, help='Print the full report as JSON.')
+def import_expenses(csv_file, user_email, db_mode, threads, json_report):
+    """Bulk import expenses from a CSV file (or bank export)."""
+    rollup_table = get_dynamodb_table(dynamodb_resource=get_dynamodb_resource(db_mode=db_mode),
+                                      table_name=DynamoDbConstants.TERPTRACKER_USER_MONTHLY_ROLLUP_TABLE_NAME)
+    try:
+        report = import_expenses_csv(text_stream=csv_file, user_email=user_email,
+                                     client=get_dynamodb_client(db_mode=db_mode), rollup_table=rollup_table,
+                                     writer_threads=threads)
+    except RowRejected as e:
+        raise click.ClickException(str(e))
+
+    if json_report:
+        print(json.dumps(report.to_dict(), indent=2))
+    else:
+        for rejection in report.rejected:
+            print(f"⚠️ Row {rejection['row']}: {rejection['reason']}")
+
+
+@cli.command('migrate-expenses')
+@click.option('--db-mode', default=DynamoDbConstants.DB_MODE, show_default=True,
+              help='PROD for AWS, DEV for DynamoDB Local, SQLITE for the embedded SQLite file.')
+@click.option('--segments', default=DynamoDbConstants.MIGRATION_SEGMENTS, show_default=True,
+              help='Parallel Scan segments (one thread each).')
+@click.option('--write-rate', default=DynamoDbConstants.MIGRATION_WRITE_RATE, show_default=True,
+              help='Items migrated per second across all segments; 0 for unlimited.')
+@click.option('--state-file', default=DynamoDbConstants.MIGRATION_STATE_PATH, show_default=True,
+              help='Progress file used to resume an interrupted migration.')
+def migrate_expenses(db_mode, segments, write_rate, state_file):
+    """Rewrite older USER_EXPENSES items in the current expense schema."""
+    try:
+        ExpenseSchemaMigration(db_mode=db_mode, segments=segments, write_rate=write_rate,
+                               state_path=state_file).run()
+    except RuntimeError as e:
+        raise click.ClickException(str(e))
+
+
+@cli.command('migrate-login-emails')
+@click.option('--db-mode', default=DynamoDbConstants.DB_MODE, show_default=True,
+              help='PROD for AWS, DEV for DynamoDB Local, SQLITE for the embedded SQLite file.')
+@click.option('--write-rate', default=DynamoDbConstants.LOGIN_MIGRATION_WRITE_RATE, show_default=True,
+              help='Email items written per second; 0 for unlimited.')
+def migrate_login_emails(db_mode, write_rate):
+    """Write the LOGIN email item of every account created before email items existed."""
+    totals = LoginEmailMigration(db_mode=db_mode, write_rate=write_rate).run()
+    if totals['conflicts']:
+        raise click.ClickException(f"{totals['conflicts']} emails belong to more than one account")
+
+
+@cli.command('admin-analytics')
+@click.option('--db-mode', default=DynamoDbConstants.DB_MODE, show_default=True,
+              help='PROD for AWS, DEV for DynamoDB Local, SQLITE for the embedded SQLite file.')
+@click.option('--month', 'month_year', default=None, help='Only count expenses in this month (YYYY-MM).')
+@click.option('--segments', default=DynamoDbConstants.ANALYTICS_SEGMENTS, show_default=True,
+              help='Parallel Scan segments.')
+@click.option('--workers', default=DynamoDbConstants.ANALYTICS_WORKERS, show_default=True,
+              help='Threads or processes scanning segments at once.')
+@click.option('--executor', type=click.Choice(EXECUTORS), default=DynamoDbConstants.ANALYTICS_EXECUTOR,
+              show_default=True, help='Scan segments on a thread pool or a process pool.')
+@click.option('--read-capacity', default=DynamoDbConstants.ANALYTICS_READ_CAPACITY, show_default=True,
+              help='Read capacity units per second the scan may consume; 0 for unlimited.')
+@click.option('--output', default=None, help='Write a snapshot here (.parquet needs pyarrow, otherwise CSV).')
+@click.option('--json-report', is_flag=True, help='Print the full report as JSON.')
+def admin_analytics(db_mode, month_year, segments, workers, executor, read_capacity, output, json_report):
+    """Aggregate spend, item counts and active users across every user."""
+    try:
+        analytics = AdminAnalytics(terptracker_db=TerpTrackerDb(db_mode=db_mode), segments=segments,
+                                   workers=workers, executor=executor, read_capacity=read_capacity)
+        report = analytics.run(month_year=month_year)
+        if output:
+            write_snapshot(report, path=output)
+            print(f'✅Snapshot written to {output}')
+    except (ValueError, RuntimeError) as e:
+        raise click.ClickException(str(e))
+
+    if json_report:
+        print(json.dumps(report, indent=2))
+    else:
+        for category, totals in report['categories'].items():
+            print(f"{category:>20}: ${totals['totalAmount']} over {totals['itemCount']} expenses "
+                  f"({totals['activeUsers']} users)")
+
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,57 @@
+import os
+
+
+class AppConstants:
+    # Flask-Login user cache
+    USER_CACHE_MAX_SIZE = int(os.getenv('USER_CACHE_MAX_SIZE', '1024'))
+    USER_CACHE_TTL_SECONDS = float(os.getenv('USER_CACHE_TTL_SECONDS', '300'))
+    # Rebuild current_user from a signed session snapshot instead of reading the LOGIN table
+    USER_SESSION_SNAPSHOT = os.getenv('USER_SESSION_SNAPSHOT', 'false').lower() == 'true'
+
+    # How workers make sure the DynamoDB schema exists at startup:
+    #   PROVISION - check for (and create) missing tables in create_app
+    #   MANIFEST  - trust the manifest written by `terptracker init-db`, no DynamoDB calls
+    #   LAZY      - check the tables once, on the first request
+    STARTUP_SCHEMA_MODE = os.getenv('STARTUP_SCHEMA_MODE', 'PROVISION').upper()
+    SCHEMA_MANIFEST_PATH = os.getenv('SCHEMA_MANIFEST_PATH', '.terptracker_schema.json')
+
+    # Password hashing runs in a dedicated process pool; 0 workers hashes inline on the request thread
+    PASSWORD_HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000')
+    PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', '2'))
+    PASSWORD_HASH_QUEUE_DEPTH = int(os.getenv('PASSWORD_HASH_QUEUE_DEPTH', '16'))
+    PASSWORD_HASH_TIMEOUT_SECONDS = float(os.getenv('PASSWORD_HASH_TIMEOUT_SECONDS', '10'))
+
+    # Multi-month trend analytics (/api/summary/trends): the longest range served and the default rolling window
+    TRENDS_MAX_MONTHS = int(os.getenv('TRENDS_MAX_MONTHS', '60'))
+    TRENDS_DEFAULT_WINDOW = int(os.getenv('TRENDS_DEFAULT_WINDOW', '3'))
+    # Keyset-paginated summary table and /api/summary/<month>/expenses: rows per page, and the largest `limit` the API
+    # accepts
+    SUMMARY_PAGE_SIZE = int(os.getenv('SUMMARY_PAGE_SIZE', '50'))
+    SUMMARY_PAGE_MAX_SIZE = int(os.getenv('SUMMARY_PAGE_MAX_SIZE', '500'))
+    # Date-range summaries (/api/summary/range): the longest range served, in days
+    RANGE_SUMMARY_MAX_DAYS = int(os.getenv('RANGE_SUMMARY_MAX_DAYS', '366'))
+    # CSV import through the web form (/import): the largest upload imported within the request. Bigger files go
+    # through the `terptracker import-expenses` command, which is not bound by a request timeout
+    IMPORT_MAX_UPLOAD_BYTES = int(os.getenv('IMPORT_MAX_UPLOAD_BYTES', str(5 * 1024 * 1024)))
+
+    # Per-(user, month) response cache for the summary views. LOCAL (the default) keeps entries in each process only;
+    # SQLITE adds a shared tier in a local file so writes invalidate every worker's copy
+    RESPONSE_CACHE_BACKEND = os.getenv('RESPONSE_CACHE_BACKEND', 'LOCAL').upper()
+    RESPONSE_CACHE_PATH = os.getenv('RESPONSE_CACHE_PATH', '.terptracker_cache.sqlite')
+    RESPONSE_CACHE_MAX_SIZE = int(os.getenv('RESPONSE_CACHE_MAX_SIZE', '2048'))
+    RESPONSE_CACHE_MAX_ROWS = int(os.getenv('RESPONSE_CACHE_MAX_ROWS', '2000'))
+    RESPONSE_CACHE_OPEN_MONTH_TTL_SECONDS = float(os.getenv('RESPONSE_CACHE_OPEN_MONTH_TTL_SECONDS', '60'))
+    # Months that have ended only change through back-dated writes, which invalidate them explicitly
+    RESPONSE_CACHE_CLOSED_MONTH_TTL_SECONDS = float(os.getenv('RESPONSE_CACHE_CLOSED_MONTH_TTL_SECONDS', '86400'))
+
+    # Prometheus metrics (/metrics): request, template and DynamoDB timings, off unless METRICS_ENABLED. LOCAL (the
+    # default) reports the scraped worker only; SQLITE shares every worker's counters through a local file so one
+    # scrape covers all gunicorn workers
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'false').lower() == 'true'
+    METRICS_BACKEND = os.getenv('METRICS_BACKEND', 'LOCAL').upper()
+    METRICS_PATH = os.getenv('METRICS_PATH', '.terptracker_metrics.sqlite')
+    METRICS_PUBLISH_INTERVAL_SECONDS = float(os.getenv('METRICS_PUBLISH_INTERVAL_SECONDS', '5'))
+    # Who may scrape /metrics: with METRICS_TOKEN set, requests sending 'Authorization: Bearer <token>'; otherwise
+    # only clients in METRICS_ALLOWED_NETWORKS (comma-separated CIDRs, loopback by default)
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+    METRICS_ALLOWED_NETWORKS = os.getenv('METRICS_ALLOWED_NETWORKS', '127.0.0.1/32,::1/128')
@@ -4,10 +4,100 @@ import os
 class DynamoDbConstants:
     TERPTRACKER_LOGIN_TABLE_NAME = 'LOGIN'
     TERPTRACKER_USER_EXPENSES_TABLE_NAME = 'USER_EXPENSES'
+    TERPTRACKER_USER_MONTHLY_ROLLUP_TABLE_NAME = 'USER_MONTHLY_ROLLUP'
+    TERPTRACKER_EXPENSE_IDEMPOTENCY_TABLE_NAME = 'EXPENSE_IDEMPOTENCY'
+    TERPTRACKER_TABLE_NAMES = (TERPTRACKER_LOGIN_TABLE_NAME, TERPTRACKER_USER_EXPENSES_TABLE_NAME,
+                               TERPTRACKER_USER_MONTHLY_ROLLUP_TABLE_NAME, TERPTRACKER_EXPENSE_IDEMPOTENCY_TABLE_NAME)
+    # Bump whenever a table, key schema or index definition changes so stale schema manifests are rejected
+    SCHEMA_VERSION = 3
+    # Layout of USER_EXPENSES items (see dynamodb/expense_schema.py); new writes always use the latest version
+    EXPENSE_ITEM_SCHEMA_VERSION = 3
+    # Sparse USER_EXPENSES index on (userCategory, expenseTimestamp); see dynamodb/expense_schema.py
+    USER_EXPENSES_CATEGORY_INDEX_NAME = 'UserCategoryTimestampIndex'
+    # The index USER_EXPENSES was created with before schema v3; same keys as the table, so it is no longer queried
+    USER_EXPENSES_LEGACY_TIMESTAMP_INDEX_NAME = 'UserTimestampIndex'
     DYNAMODB_REGION = 'us-east-1'
     AWS_ACCESS_KEY_ID = os.getenv('AWS_ACCESS_KEY_ID')
     AWS_SECRET_ACCESS_KEY_ID = os.getenv('AWS_SECRET_ACCESS_KEY')
     DYNAMODB_URL = os.getenv('DYNAMODB_URL', 'http://localhost:8000')
     DYNAMODB_DEV_URL = 'http://localhost:8000'
     DB_MODE = os.getenv('DB_MODE', 'PROD')
+    # Database file of the embedded SQLite backend (DB_MODE=SQLITE), shared by every worker process on the host
+    SQLITE_DB_PATH = os.getenv('SQLITE_DB_PATH', '.terptracker_dynamodb.sqlite')
     FERNET_KEY = 'FERNET_KEY'
+
+    # Connection pool / retry tuning shared by every boto3 client in a worker process
+    DYNAMODB_MAX_POOL_CONNECTIONS = int(os.getenv('DYNAMODB_MAX_POOL_CONNECTIONS', '50'))
+    DYNAMODB_TCP_KEEPALIVE = os.getenv('DYNAMODB_TCP_KEEPALIVE', 'true').lower() == 'true'
+    DYNAMODB_CONNECT_TIMEOUT = float(os.getenv('DYNAMODB_CONNECT_TIMEOUT', '2'))
+    DYNAMODB_READ_TIMEOUT = float(os.getenv('DYNAMODB_READ_TIMEOUT', '5'))
+    DYNAMODB_RETRY_MODE = os.getenv('DYNAMODB_RETRY_MODE', 'standard')
+    DYNAMODB_MAX_ATTEMPTS = int(os.getenv('DYNAMODB_MAX_ATTEMPTS', '3'))
+
+    # Bulk expense import (CSV): parallel BatchWriteItem writers and UnprocessedItems retry policy
+    IMPORT_WRITER_THREADS = int(os.getenv('IMPORT_WRITER_THREADS', '4'))
+    IMPORT_MAX_ATTEMPTS = int(os.getenv('IMPORT_MAX_ATTEMPTS', '8'))
+    IMPORT_BACKOFF_BASE_SECONDS = float(os.getenv('IMPORT_BACKOFF_BASE_SECONDS', '0.05'))
+    IMPORT_BACKOFF_MAX_SECONDS = float(os.getenv('IMPORT_BACKOFF_MAX_SECONDS', '5'))
+
+    # Expense schema migration: parallel Scan segments and the write rate (items/s) across all segments
+    MIGRATION_SEGMENTS = int(os.getenv('MIGRATION_SEGMENTS', '4'))
+    MIGRATION_WRITE_RATE = float(os.getenv('MIGRATION_WRITE_RATE', '50'))
+    MIGRATION_STATE_PATH = os.getenv('MIGRATION_STATE_PATH', '.terptracker_migration.json')
+
+    # Admin analytics: parallel Scan segments and workers, and the read capacity (RCU/s) the scan may consume
+    ANALYTICS_SEGMENTS = int(os.getenv('ANALYTICS_SEGMENTS', '8'))
+    ANALYTICS_WORKERS = int(os.getenv('ANALYTICS_WORKERS', '4'))
+    ANALYTICS_EXECUTOR = os.getenv('ANALYTICS_EXECUTOR', 'thread')
+    ANALYTICS_READ_CAPACITY = float(os.getenv('ANALYTICS_READ_CAPACITY', '100'))
+    ANALYTICS_PROGRESS_INTERVAL_SECONDS = float(os.getenv('ANALYTICS_PROGRESS_INTERVAL_SECONDS', '5'))
+
+    # Write-behind expense submissions: a bounded per-worker queue, journaled to local disk and flushed with
+    # BatchWriteItem. Off by default; submits wait WRITE_BEHIND_ENQUEUE_TIMEOUT_SECONDS for room before writing
+    # synchronously.
+    WRITE_BEHIND_ENABLED = os.getenv('WRITE_BEHIND_ENABLED', 'false').lower() == 'true'
+    WRITE_BEHIND_MAX_PENDING = int(os.getenv('WRITE_BEHIND_MAX_PENDING', '500'))
+    WRITE_BEHIND_LINGER_SECONDS = float(os.getenv('WRITE_BEHIND_LINGER_SECONDS', '0.05'))
+    WRITE_BEHIND_ENQUEUE_TIMEOUT_SECONDS = float(os.getenv('WRITE_BEHIND_ENQUEUE_TIMEOUT_SECONDS', '0.5'))
+    WRITE_BEHIND_JOURNAL_DIR = os.getenv('WRITE_BEHIND_JOURNAL_DIR', '.terptracker_journal')
+    WRITE_BEHIND_JOURNAL_FSYNC = os.getenv('WRITE_BEHIND_JOURNAL_FSYNC', 'true').lower() == 'true'
+
+    # Idempotent expense submission: how long an admitted submission is remembered, and the time bucket identical
+    # submissions without a form token are collapsed within
+    IDEMPOTENCY_TTL_SECONDS = int(os.getenv('IDEMPOTENCY_TTL_SECONDS', '86400'))
+    IDEMPOTENCY_CONTENT_WINDOW_SECONDS = int(os.getenv('IDEMPOTENCY_CONTENT_WINDOW_SECONDS', '30'))
+
+    # Client-side throttling of provisioned tables (LOGIN). Token buckets per table and index are sized from the
+    # provisioned capacity (times this worker's THROTTLE_CAPACITY_SHARE of it) and adapt to throttling; throttled
+    # calls back off with jitter (on top of botocore's own retries), and after THROTTLE_CIRCUIT_FAILURE_THRESHOLD
+    # calls in a row run out of attempts, requests to the table are shed for THROTTLE_CIRCUIT_RESET_SECONDS.
+    THROTTLE_ENABLED = os.getenv('THROTTLE_ENABLED', 'true').lower() == 'true'
+    THROTTLE_CAPACITY_SHARE = float(os.getenv('THROTTLE_CAPACITY_SHARE', '1'))
+    THROTTLE_BURST_SECONDS = float(os.getenv('THROTTLE_BURST_SECONDS', '5'))
+    THROTTLE_MAX_WAIT_SECONDS = float(os.getenv('THROTTLE_MAX_WAIT_SECONDS', '1'))
+    THROTTLE_MAX_ATTEMPTS = int(os.getenv('THROTTLE_MAX_ATTEMPTS', '3'))
+    THROTTLE_BACKOFF_BASE_SECONDS = float(os.getenv('THROTTLE_BACKOFF_BASE_SECONDS', '0.05'))
+    THROTTLE_BACKOFF_MAX_SECONDS = float(os.getenv('THROTTLE_BACKOFF_MAX_SECONDS', '1'))
+    THROTTLE_CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('THROTTLE_CIRCUIT_FAILURE_THRESHOLD', '5'))
+    THROTTLE_CIRCUIT_RESET_SECONDS = float(os.getenv('THROTTLE_CIRCUIT_RESET_SECONDS', '10'))
+    THROTTLE_CAPACITY_REFRESH_SECONDS = float(os.getenv('THROTTLE_CAPACITY_REFRESH_SECONDS', '300'))
+
+    # Login by email: accounts are found through their LOGIN email item. Until `terptracker migrate-login-emails` has
+    # written one for every existing account, emails without one are also looked up on username-index.
+    LOGIN_EMAIL_INDEX_FALLBACK = os.getenv('LOGIN_EMAIL_INDEX_FALLBACK', 'true').lower() == 'true'
+    LOGIN_MIGRATION_WRITE_RATE = float(os.getenv('LOGIN_MIGRATION_WRITE_RATE', '1'))
+
+    # Expense query planning (see dynamodb_helpers.plan_expense_query). Category reads only use the sparse category
+    # index once every item carries `userCategory`, i.e. after `terptracker migrate-expenses` has upgraded the table to
+    # expense schema v3; until then they filter the base table. QUERY_EXPLAIN logs every planned query with the read
+    # capacity it consumed.
+    EXPENSE_CATEGORY_INDEX_READY = os.getenv('EXPENSE_CATEGORY_INDEX_READY', 'false').lower() == 'true'
+    QUERY_EXPLAIN = os.getenv('QUERY_EXPLAIN', 'false').lower() == 'true'
+
+    # Multi-month expense reads (quarter, year and date-range summaries) are split into one query per month and run
+    # concurrently on a thread pool of RANGE_QUERY_MAX_WORKERS per worker process (0 runs them one after another on
+    # the request thread). A user runs at most RANGE_QUERY_USER_CONCURRENCY of those queries at once across their
+    # requests and reads at most RANGE_QUERY_USER_READ_CAPACITY read capacity units per second (0 is unlimited).
+    RANGE_QUERY_MAX_WORKERS = int(os.getenv('RANGE_QUERY_MAX_WORKERS', '16'))
+    RANGE_QUERY_USER_CONCURRENCY = int(os.getenv('RANGE_QUERY_USER_CONCURRENCY', '4'))
+    RANGE_QUERY_USER_READ_CAPACITY = float(os.getenv('RANGE_QUERY_USER_READ_CAPACITY', '50'))
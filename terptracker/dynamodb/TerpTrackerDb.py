@@ -1,7 +1,10 @@
 from boto3.dynamodb.conditions import Attr
 from terptracker.dynamodb.dynamodb_helpers import *
+from terptracker.dynamodb.rollup_helpers import new_rollup, accumulate_rollup, rollup_to_item, expense_year_month
 from terptracker.dynamodb.tables.ExpenseTable import ExpenseTable
 from terptracker.dynamodb.tables.AppLoginTable import LoginTable
+from terptracker.dynamodb.tables.MonthlyRollupTable import MonthlyRollupTable
+from terptracker.dynamodb.tables.IdempotencyTable import IdempotencyTable
 from terptracker.constants.DynamoDbConstants import DynamoDbConstants
 from botocore.exceptions import ClientError
 
@@ -17,11 +20,47 @@ class TerpTrackerDb:
 
     def __init__(self, db_mode: str):
         """
-        Initializes a TerpTrackerDb instance by making the DynamoDB resource and client objects readily available
+        Initializes a TerpTrackerDb instance. The shared DynamoDB resource and client are resolved on first use, so
+        constructing one at import time costs nothing.
         """
         self.db_mode = db_mode
-        self.dynamodb_resource = get_dynamodb_resource(db_mode=db_mode)
-        self.client = get_dynamodb_client(db_mode=db_mode)
+
+    @property
+    def dynamodb_resource(self):
+        return get_dynamodb_resource(db_mode=self.db_mode)
+
+    @property
+    def client(self):
+        return get_dynamodb_client(db_mode=self.db_mode)
+
+    def get_missing_tables(self):
+        """
+        Returns the TerpTracker tables that do not exist yet, using a single (paginated) ListTables call.
+
+        Returns:
+            list[str]: The missing table names.
+        """
+        existing_tables = list_table_names(client=self.client)
+        return [table_name for table_name in DynamoDbConstants.TERPTRACKER_TABLE_NAMES
+                if table_name not in existing_tables]
+
+    def create_all_tables(self):
+        """
+        Creates every TerpTracker table that does not exist yet.
+
+        Returns:
+            list[str]: The tables that had to be created.
+        """
+        table_creators = {
+            DynamoDbConstants.TERPTRACKER_LOGIN_TABLE_NAME: self.create_login_table,
+            DynamoDbConstants.TERPTRACKER_USER_EXPENSES_TABLE_NAME: self.create_user_expenses_table,
+            DynamoDbConstants.TERPTRACKER_USER_MONTHLY_ROLLUP_TABLE_NAME: self.create_user_monthly_rollup_table,
+            DynamoDbConstants.TERPTRACKER_EXPENSE_IDEMPOTENCY_TABLE_NAME: self.create_expense_idempotency_table,
+        }
+        missing_tables = self.get_missing_tables()
+        for table_name in missing_tables:
+            table_creators[table_name]()
+        return missing_tables
 
     def create_login_table(self):
         login_table = LoginTable(db_mode=self.db_mode)
@@ -34,6 +73,59 @@ class TerpTrackerDb:
         user_expenses_table = ExpenseTable(db_mode=self.db_mode)
         user_expenses_table.create_table()
 
+    def update_user_expenses_indexes(self, drop_legacy_index: bool = False):
+        """
+        Adds the USER_EXPENSES indexes a table created by an older version is missing (see
+        `ExpenseTable.update_indexes`).
+        """
+        user_expenses_table = ExpenseTable(db_mode=self.db_mode)
+        user_expenses_table.update_indexes(drop_legacy_index=drop_legacy_index)
+
+    def create_user_monthly_rollup_table(self):
+        """
+        Creates the USER_MONTHLY_ROLLUP table in DynamoDB using the configured DynamoDB resource.
+        """
+        rollup_table = MonthlyRollupTable(db_mode=self.db_mode)
+        rollup_table.create_table()
+
+    def create_expense_idempotency_table(self):
+        """
+        Creates the EXPENSE_IDEMPOTENCY table in DynamoDB using the configured DynamoDB resource.
+        """
+        idempotency_table = IdempotencyTable(db_mode=self.db_mode)
+        idempotency_table.create_table()
+
+    def backfill_monthly_rollups(self):
+        """
+        Rebuilds every USER_MONTHLY_ROLLUP item from the raw USER_EXPENSES data.
+
+        The expenses table is scanned page by page and aggregated per (user, month) in memory; each rollup is then
+        overwritten as a whole. Expenses written while the backfill is running may be counted twice or not at all,
+        so run it during a quiet period.
+
+        Returns:
+            int: The number of rollup items written.
+        """
+        expenses_table = get_dynamodb_table(dynamodb_resource=self.dynamodb_resource,
+                                            table_name=DynamoDbConstants.TERPTRACKER_USER_EXPENSES_TABLE_NAME)
+        rollup_table = get_dynamodb_table(dynamodb_resource=self.dynamodb_resource,
+                                          table_name=DynamoDbConstants.TERPTRACKER_USER_MONTHLY_ROLLUP_TABLE_NAME)
+
+        rollups = {}
+        scanned = 0
+        for item in paginate_scan(expenses_table):
+            key = (item['userEmail'], expense_year_month(item['expenseTimestamp']))
+            if key not in rollups:
+                rollups[key] = new_rollup(user_email=key[0], year_month=key[1])
+            accumulate_rollup(rollups[key], item)
+            scanned = scanned + 1
+
+        with rollup_table.batch_writer(overwrite_by_pkeys=['userEmail', 'yearMonth']) as batch:
+            for rollup in rollups.values():
+                batch.put_item(Item=rollup_to_item(rollup))
+        print(f'✅Rebuilt {len(rollups)} monthly rollups from {scanned} expenses')
+        return len(rollups)
+
     def __create_db_item(self, bsky_username: str, item: dict):
         """
         Formats a Bluesky post into a TerpTracker DynamoDB-compatible item by attaching the required keys (bskyUsername
@@ -0,0 +1,323 @@
+import csv
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from datetime import datetime, timezone
+from decimal import Decimal
+from boto3.dynamodb.conditions import Attr
+from terptracker.constants.DynamoDbConstants import DynamoDbConstants
+from terptracker.dynamodb.TerpTrackerDb import TerpTrackerDb
+from terptracker.dynamodb.dynamodb_helpers import get_dynamodb_table, get_month_timestamp_range, TokenBucket
+from terptracker.dynamodb.expense_schema import expense_amount_cents
+
+EXECUTORS = ('thread', 'process')
+SNAPSHOT_COLUMNS = ('snapshotAt', 'month', 'category', 'totalAmount', 'itemCount', 'activeUsers')
+ALL_CATEGORIES = '*'
+
+# Only the attributes the aggregates need are read (both amount layouts, so v1 and v2 items aggregate alike). Scan
+# still consumes read capacity for the whole item, but less data crosses the wire and is deserialized.
+_PROJECTION_NAMES = {'#email': 'userEmail', '#category': 'expenseCategory', '#cents': 'expenseAmountCents',
+                     '#amount': 'expenseAmount'}
+_PROJECTION_EXPRESSION = ', '.join(_PROJECTION_NAMES)
+
+
+class ScanAggregate:
+    """
+    The partial result of scanning part of USER_EXPENSES. Each segment builds its own, and the partials are merged
+    once the segments finish, so workers never share mutable state. Amounts are kept in integer cents.
+    """
+
+    def __init__(self):
+        self.item_count = 0
+        self.total_cents = 0
+        self.users = set()
+        self.category_cents = {}
+        self.category_counts = {}
+        self.category_users = {}
+
+    def add(self, item: dict):
+        cents = expense_amount_cents(item)
+        category = item.get('expenseCategory') or 'other'
+        self.item_count += 1
+        self.total_cents += cents
+        self.users.add(item['userEmail'])
+        self.category_cents[category] = self.category_cents.get(category, 0) + cents
+        self.category_counts[category] = self.category_counts.get(category, 0) + 1
+        self.category_users.setdefault(category, set()).add(item['userEmail'])
+
+    def merge(self, other: 'ScanAggregate'):
+        """
+        Folds another partial aggregate into this one.
+
+        Returns:
+            ScanAggregate: self, for chaining.
+        """
+        self.item_count += other.item_count
+        self.total_cents += other.total_cents
+        self.users |= other.users
+        for category, cents in other.category_cents.items():
+            self.category_cents[category] = self.category_cents.get(category, 0) + cents
+            self.category_counts[category] = self.category_counts.get(category, 0) + other.category_counts[category]
+            self.category_users.setdefault(category, set()).update(other.category_users[category])
+        return self
+
+    def to_dict(self):
+        return {
+            'itemCount': self.item_count,
+            'totalAmount': str(Decimal(self.total_cents) / 100),
+            'activeUsers': len(self.users),
+            'categories': {category: {'totalAmount': str(Decimal(cents) / 100),
+                                      'itemCount': self.category_counts[category],
+                                      'activeUsers': len(self.category_users[category])}
+                           for category, cents in sorted(self.category_cents.items(),
+                                                         key=lambda entry: entry[1], reverse=True)},
+        }
+
+
+def analytics_scan_kwargs(segment: int, total_segments: int, month_year: str = None, page_size: int = None):
+    """
+    Builds the Scan arguments for one segment.
+
+    Args:
+        segment (int): The segment to scan.
+        total_segments (int): How many segments the table is split into.
+        month_year (str, optional): Restrict the aggregates to one month ('YYYY-MM'); every item when omitted.
+        page_size (int, optional): Scan page Limit; DynamoDB's 1 MB page when omitted.
+
+    Returns:
+        dict: Keyword arguments for `table.scan`.
+    """
+    scan_kwargs = {
+        'Segment': segment,
+        'TotalSegments': total_segments,
+        'ProjectionExpression': _PROJECTION_EXPRESSION,
+        'ExpressionAttributeNames': dict(_PROJECTION_NAMES),
+        'ReturnConsumedCapacity': 'TOTAL',
+    }
+    if month_year:
+        scan_kwargs['FilterExpression'] = Attr('expenseTimestamp').between(*get_month_timestamp_range(month_year))
+    if page_size:
+        scan_kwargs['Limit'] = page_size
+    return scan_kwargs
+
+
+def scan_segment(db_mode: str, segment: int, total_segments: int, month_year: str = None, page_size: int = None,
+                 bucket: TokenBucket = None, read_capacity: float = 0, on_page=None):
+    """
+    Scans one segment of USER_EXPENSES and aggregates it. Module level so process pool workers can run it.
+
+    Args:
+        db_mode (str): The deployment mode.
+        segment (int): The segment to scan.
+        total_segments (int): How many segments the table is split into.
+        month_year (str, optional): Restrict the aggregates to one month ('YYYY-MM').
+        page_size (int, optional): Scan page Limit.
+        bucket (TokenBucket, optional): A read capacity budget shared with other threads.
+        read_capacity (float): The RCU/s budget of this call when no shared bucket is given (process workers);
+            0 disables the limit.
+        on_page (callable, optional): Called with (scanned, matched, capacity) after every page.
+
+    Returns:
+        tuple[ScanAggregate, dict]: The aggregate and the segment's scanned/matched/pages/consumedCapacity counters.
+    """
+    if bucket is None:
+        bucket = TokenBucket(rate=read_capacity)
+    table = get_dynamodb_table(dynamodb_resource=TerpTrackerDb(db_mode=db_mode).dynamodb_resource,
+                               table_name=DynamoDbConstants.TERPTRACKER_USER_EXPENSES_TABLE_NAME)
+    scan_kwargs = analytics_scan_kwargs(segment=segment, total_segments=total_segments, month_year=month_year,
+                                        page_size=page_size)
+    aggregate = ScanAggregate()
+    stats = {'segment': segment, 'scanned': 0, 'matched': 0, 'pages': 0, 'consumedCapacity': 0.0}
+    while True:
+        response = table.scan(**scan_kwargs)
+        items = response.get('Items', [])
+        for item in items:
+            aggregate.add(item)
+
+        capacity = float(response.get('ConsumedCapacity', {}).get('CapacityUnits', 0))
+        stats['scanned'] += response.get('ScannedCount', 0)
+        stats['matched'] += len(items)
+        stats['pages'] += 1
+        stats['consumedCapacity'] += capacity
+        if on_page:
+            on_page(response.get('ScannedCount', 0), len(items), capacity)
+        # The page's cost is only known once it is read, so the budget is charged afterwards; a page that
+        # overdraws it delays this segment's next page until the bucket refills
+        bucket.consume(capacity)
+
+        last_evaluated_key = response.get('LastEvaluatedKey')
+        if not last_evaluated_key:
+            return aggregate, stats
+        scan_kwargs['ExclusiveStartKey'] = last_evaluated_key
+
+
+class AdminAnalytics:
+    """
+    Answers cross-user questions (spend by category, active users, item counts) with one parallel segmented Scan of
+    USER_EXPENSES.
+
+    Segments are spread over a thread pool (I/O bound, one shared read capacity budget) or a process pool (spreads
+    item deserialization and aggregation over several cores; the budget is split evenly between the processes).
+    Each segment returns a partial ScanAggregate and the partials are merged at the end.
+    """
+
+    def __init__(self, terptracker_db: TerpTrackerDb, segments: int = DynamoDbConstants.ANALYTICS_SEGMENTS,
+                 workers: int = DynamoDbConstants.ANALYTICS_WORKERS,
+                 executor: str = DynamoDbConstants.ANALYTICS_EXECUTOR,
+                 read_capacity: float = DynamoDbConstants.ANALYTICS_READ_CAPACITY, page_size: int = None,
+                 progress_interval: float = DynamoDbConstants.ANALYTICS_PROGRESS_INTERVAL_SECONDS):
+        """
+        Args:
+            terptracker_db (TerpTrackerDb): The database to scan.
+            segments (int): Scan segments (TotalSegments).
+            workers (int): Threads or processes scanning segments at once.
+            executor (str): 'thread' or 'process'.
+            read_capacity (float): Read capacity units per second the whole scan may consume; 0 disables the limit.
+            page_size (int, optional): Scan page Limit; DynamoDB's 1 MB page when omitted.
+            progress_interval (float): Seconds between progress lines.
+
+        Raises:
+            ValueError: For an unknown executor, or a process pool over the in-memory database (forked workers
+                would each see an empty copy).
+        """
+        if executor not in EXECUTORS:
+            raise ValueError(f'Unsupported executor: {executor} (expected one of {", ".join(EXECUTORS)})')
+        if executor == 'process' and terptracker_db.db_mode.upper() == 'MEMORY':
+            raise ValueError('The process executor cannot scan the in-memory database; use --executor thread')
+        self.terptracker_db = terptracker_db
+        self.segments = max(1, segments)
+        self.workers = max(1, min(workers, self.segments))
+        self.executor = executor
+        self.read_capacity = read_capacity
+        self.page_size = page_size
+        self.progress_interval = progress_interval
+        self._lock = threading.Lock()
+        self._progress = None
+
+    def _report_progress(self, scanned: int, matched: int, capacity: float, force: bool = False):
+        with self._lock:
+            progress = self._progress
+            progress['scanned'] += scanned
+            progress['matched'] += matched
+            progress['consumedCapacity'] += capacity
+            now = time.perf_counter()
+            if not force and now - progress['reportedAt'] < self.progress_interval:
+                return
+            progress['reportedAt'] = now
+            elapsed_seconds = max(now - progress['startedAt'], 1e-9)
+            print(f"⏱️Scanned {progress['scanned']} items ({progress['scanned'] / elapsed_seconds:.0f}/s), "
+                  f"{progress['segmentsDone']}/{self.segments} segments done, "
+                  f"{progress['consumedCapacity'] / elapsed_seconds:.1f} RCU/s")
+
+    def _submit_segments(self, pool, month_year: str):
+        if self.executor == 'thread':
+            bucket = TokenBucket(rate=self.read_capacity)
+            return [pool.submit(scan_segment, self.terptracker_db.db_mode, segment, self.segments, month_year,
+                                self.page_size, bucket, 0, self._report_progress)
+                    for segment in range(self.segments)]
+        read_capacity = self.read_capacity / self.workers if self.read_capacity > 0 else 0
+        return [pool.submit(scan_segment, self.terptracker_db.db_mode, segment, self.segments, month_year,
+                            self.page_size, None, read_capacity)
+                for segment in range(self.segments)]
+
+    def _create_pool(self):
+        if self.executor == 'thread':
+            return ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='admin-analytics')
+        start_method = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn'
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context(start_method))
+
+    def run(self, month_year: str = None):
+        """
+        Scans USER_EXPENSES and aggregates it across every user.
+
+        Args:
+            month_year (str, optional): Only count expenses in this month ('YYYY-MM').
+
+        Returns:
+            dict: The merged aggregates (see `ScanAggregate.to_dict`) plus the scan's counters and throughput.
+        """
+        started_at = time.perf_counter()
+        self._progress = {'scanned': 0, 'matched': 0, 'consumedCapacity': 0.0, 'segmentsDone': 0,
+                          'startedAt': started_at, 'reportedAt': started_at}
+        print(f'🚧Scanning {DynamoDbConstants.TERPTRACKER_USER_EXPENSES_TABLE_NAME} '
+              f'({month_year or "all months"}): {self.segments} segments over {self.workers} {self.executor} '
+              f'workers, read budget {self.read_capacity or "unlimited"} RCU/s')
+
+        aggregate = ScanAggregate()
+        totals = {'scanned': 0, 'matched': 0, 'pages': 0, 'consumedCapacity': 0.0}
+        with self._create_pool() as pool:
+            for future in as_completed(self._submit_segments(pool, month_year)):
+                partial, stats = future.result()
+                aggregate.merge(partial)
+                for name in totals:
+                    totals[name] += stats[name]
+                with self._lock:
+                    self._progress['segmentsDone'] += 1
+                if self.executor == 'process':
+                    self._report_progress(stats['scanned'], stats['matched'], stats['consumedCapacity'])
+
+        elapsed_seconds = time.perf_counter() - started_at
+        report = aggregate.to_dict()
+        report.update({
+            'month': month_year,
+            'segments': self.segments,
+            'scannedCount': totals['scanned'],
+            'pages': totals['pages'],
+            'consumedCapacity': round(totals['consumedCapacity'], 1),
+            'elapsedSeconds': round(elapsed_seconds, 2),
+            'itemsPerSecond': round(totals['scanned'] / elapsed_seconds, 1) if elapsed_seconds else 0.0,
+            'capacityPerSecond': round(totals['consumedCapacity'] / elapsed_seconds, 1) if elapsed_seconds else 0.0,
+            'snapshotAt': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        })
+        print(f"✅Admin analytics complete: {report['itemCount']} expenses from {report['activeUsers']} users, "
+              f"scanned {report['scannedCount']} items in {report['elapsedSeconds']}s "
+              f"({report['itemsPerSecond']}/s, {report['consumedCapacity']} RCU)")
+        return report
+
+
+def snapshot_rows(report: dict):
+    """
+    Flattens an analytics report into one row per category plus an all-categories ('*') row.
+
+    Returns:
+        list[dict]: Rows keyed by SNAPSHOT_COLUMNS.
+    """
+    common = {'snapshotAt': report['snapshotAt'], 'month': report['month'] or ''}
+    rows = [dict(common, category=ALL_CATEGORIES, totalAmount=report['totalAmount'],
+                 itemCount=report['itemCount'], activeUsers=report['activeUsers'])]
+    for category, totals in report['categories'].items():
+        rows.append(dict(common, category=category, **totals))
+    return rows
+
+
+def write_snapshot(report: dict, path: str):
+    """
+    Writes an analytics report to a local snapshot: Parquet when the path ends in '.parquet' (needs the optional
+    pyarrow dependency, `pip install msml_terptracker[analytics]`), CSV otherwise.
+
+    Raises:
+        RuntimeError: If a Parquet snapshot is requested without pyarrow installed.
+    """
+    rows = snapshot_rows(report)
+    if path.endswith('.parquet'):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise RuntimeError('Parquet snapshots need pyarrow: pip install "msml_terptracker[analytics]"')
+        table = pyarrow.table({
+            'snapshotAt': [row['snapshotAt'] for row in rows],
+            'month': [row['month'] for row in rows],
+            'category': [row['category'] for row in rows],
+            'totalAmount': pyarrow.array([Decimal(row['totalAmount']) for row in rows], type=pyarrow.decimal128(18, 2)),
+            'itemCount': pyarrow.array([row['itemCount'] for row in rows], type=pyarrow.int64()),
+            'activeUsers': pyarrow.array([row['activeUsers'] for row in rows], type=pyarrow.int64()),
+        })
+        pyarrow.parquet.write_table(table, path)
+        return
+
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=SNAPSHOT_COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
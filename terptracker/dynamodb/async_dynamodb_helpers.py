@@ -0,0 +1,413 @@
+import asyncio
+import contextvars
+import functools
+import os
+import time
+import weakref
+from contextlib import AsyncExitStack
+from terptracker.constants.DynamoDbConstants import DynamoDbConstants
+from terptracker.dynamodb.dynamodb_helpers import (EMBEDDED_DB_MODES, RANGE_QUERY_POLL_SECONDS, ExpenseQuery,
+                                                   QueryPlan, get_dynamodb_resource, instrument_session,
+                                                   log_query_plan, new_query_plan_stats, plan_expense_query,
+                                                   range_query_executor, record_query_page, split_expense_query)
+from terptracker.metrics import current_request_timing
+from terptracker.dynamodb.expense_schema import Expense
+
+
+# asyncio counterpart of dynamodb_helpers. PROD and DEV (DynamoDB Local) go through aioboto3, which is an optional
+# dependency (`pip install msml_terptracker[async]`) imported on first use. MEMORY and SQLITE reuse the process's
+# embedded stand-in behind awaitable adapters, so the async app can run without any DynamoDB endpoint; its calls are
+# short in-process operations and run inline on the event loop.
+#
+# aiobotocore clients are bound to the event loop that created them, so resources and clients are registered per
+# (loop, db_mode) and closed with `close_async_dynamodb_resources` when the loop's server shuts down.
+_async_dynamodb_registry = weakref.WeakKeyDictionary()
+
+
+class _AwaitableAdapter:
+    """
+    Exposes a synchronous boto3-style object (embedded table or client) through coroutine methods, matching the
+    aioboto3 calling convention (`await table.get_item(...)`).
+    """
+
+    def __init__(self, target):
+        self._target = target
+
+    def __getattr__(self, name):
+        attribute = getattr(self._target, name)
+        if not callable(attribute):
+            return attribute
+
+        @functools.wraps(attribute)
+        async def call(*args, **kwargs):
+            return attribute(*args, **kwargs)
+
+        return call
+
+
+class AsyncEmbeddedDynamoDbResource:
+    """
+    The aioboto3-shaped view of the embedded DynamoDB resource: `await resource.Table(name)` and
+    `resource.meta.client` return adapters whose methods are coroutines.
+    """
+
+    def __init__(self, resource):
+        self._resource = resource
+        self.meta = type('Meta', (), {'client': _AwaitableAdapter(resource.meta.client)})()
+
+    async def Table(self, name: str):
+        return _AwaitableAdapter(self._resource.Table(name))
+
+    async def close(self):
+        pass
+
+
+def get_aiobotocore_config():
+    """
+    Builds the aiobotocore client configuration, mirroring `get_botocore_config` (keep-alive is managed by aiohttp's
+    connector rather than a socket option).
+
+    Returns:
+        aiobotocore.config.AioConfig: Pool size, timeouts and retry settings.
+    """
+    from aiobotocore.config import AioConfig
+    return AioConfig(
+        max_pool_connections=DynamoDbConstants.DYNAMODB_MAX_POOL_CONNECTIONS,
+        connect_timeout=DynamoDbConstants.DYNAMODB_CONNECT_TIMEOUT,
+        read_timeout=DynamoDbConstants.DYNAMODB_READ_TIMEOUT,
+        retries={
+            'mode': DynamoDbConstants.DYNAMODB_RETRY_MODE,
+            'total_max_attempts': DynamoDbConstants.DYNAMODB_MAX_ATTEMPTS
+        }
+    )
+
+
+def _create_aioboto3_session(db_mode: str):
+    import aioboto3
+    if db_mode == 'PROD':
+        return instrument_session(aioboto3.Session(
+            region_name=DynamoDbConstants.DYNAMODB_REGION,
+            aws_access_key_id=DynamoDbConstants.AWS_ACCESS_KEY_ID,
+            aws_secret_access_key=DynamoDbConstants.AWS_SECRET_ACCESS_KEY_ID
+        ))
+    elif db_mode == 'DEV':
+        return instrument_session(aioboto3.Session(
+            region_name=DynamoDbConstants.DYNAMODB_REGION,
+            aws_access_key_id='dummy',
+            aws_secret_access_key='dummy'
+        ))
+    raise ValueError(f'Unsupported DB_MODE: {db_mode}')
+
+
+def _aioboto3_kwargs(db_mode: str):
+    kwargs = {'config': get_aiobotocore_config()}
+    if db_mode == 'DEV':
+        kwargs['endpoint_url'] = DynamoDbConstants.DYNAMODB_URL
+    return kwargs
+
+
+async def _create_async_dynamodb_resource(db_mode: str, exit_stack: AsyncExitStack):
+    if db_mode in EMBEDDED_DB_MODES:
+        return AsyncEmbeddedDynamoDbResource(get_dynamodb_resource(db_mode=db_mode))
+    session = _create_aioboto3_session(db_mode=db_mode)
+    return await exit_stack.enter_async_context(session.resource('dynamodb', **_aioboto3_kwargs(db_mode=db_mode)))
+
+
+async def _create_async_dynamodb_client(db_mode: str, exit_stack: AsyncExitStack):
+    if db_mode in EMBEDDED_DB_MODES:
+        # The embedded client already speaks typed AttributeValues
+        return AsyncEmbeddedDynamoDbResource(get_dynamodb_resource(db_mode=db_mode)).meta.client
+    session = _create_aioboto3_session(db_mode=db_mode)
+    return await exit_stack.enter_async_context(session.client('dynamodb', **_aioboto3_kwargs(db_mode=db_mode)))
+
+
+async def _get_registered(db_mode: str, kind: str, create):
+    loop = asyncio.get_running_loop()
+    registry = _async_dynamodb_registry.get(loop)
+    if registry is None or registry['pid'] != os.getpid():
+        registry = {'pid': os.getpid(), 'lock': asyncio.Lock(), 'resources': {}, 'exit_stack': AsyncExitStack()}
+        _async_dynamodb_registry[loop] = registry
+
+    registry_key = (kind, db_mode)
+    registered = registry['resources'].get(registry_key)
+    if registered is None:
+        async with registry['lock']:
+            registered = registry['resources'].get(registry_key)
+            if registered is None:
+                registered = await create(db_mode=db_mode, exit_stack=registry['exit_stack'])
+                registry['resources'][registry_key] = registered
+    return registered
+
+
+async def get_async_dynamodb_resource(db_mode: str):
+    """
+    Returns the async DynamoDB resource shared by every coroutine on the running event loop, creating it on first
+    use.
+
+    Args:
+        db_mode (str): Deployment mode. Use 'PROD' for production, 'DEV' for DynamoDB Local, or 'MEMORY' or 'SQLITE'
+            for the in-process embedded stand-in.
+
+    Returns:
+        aioboto3 DynamoDB ServiceResource (or its embedded equivalent).
+    """
+    return await _get_registered(db_mode=db_mode.upper(), kind='resource', create=_create_async_dynamodb_resource)
+
+
+async def get_async_dynamodb_client(db_mode: str):
+    """
+    Returns the low-level async DynamoDB client shared by every coroutine on the running event loop. Like
+    `get_dynamodb_client`, it is a separate client from the resource's, which would re-serialize typed
+    AttributeValues.
+    """
+    return await _get_registered(db_mode=db_mode.upper(), kind='client', create=_create_async_dynamodb_client)
+
+
+async def close_async_dynamodb_resources():
+    """
+    Closes the async resources (and their HTTP sessions) created on the running event loop. Call it when the
+    server stops serving.
+    """
+    registry = _async_dynamodb_registry.pop(asyncio.get_running_loop(), None)
+    if registry:
+        await registry['exit_stack'].aclose()
+
+
+class AsyncLazyDynamoDbTable:
+    """
+    The async counterpart of `LazyDynamoDbTable`: a module-level table reference whose table methods are
+    coroutines, resolving the event loop's shared resource on first use.
+
+        await user_expenses_table.put_item(Item=item)
+    """
+
+    def __init__(self, db_mode: str, table_name: str):
+        self.db_mode = db_mode
+        self.table_name = table_name
+
+    async def resolve(self):
+        """
+        Returns:
+            The async table object bound to the running event loop's shared resource.
+        """
+        resource = await get_async_dynamodb_resource(db_mode=self.db_mode)
+        return await resource.Table(self.table_name)
+
+    async def transact_write_items(self, **kwargs):
+        """
+        Runs TransactWriteItems on the event loop's shared low-level client (typed AttributeValues).
+        """
+        client = await get_async_dynamodb_client(db_mode=self.db_mode)
+        return await client.transact_write_items(**kwargs)
+
+    def __getattr__(self, name):
+        async def call(*args, **kwargs):
+            table = await self.resolve()
+            return await getattr(table, name)(*args, **kwargs)
+
+        call.__name__ = name
+        return call
+
+
+async def async_list_table_names(client):
+    """
+    Lists every DynamoDB table name, following `LastEvaluatedTableName` across pages.
+
+    Returns:
+        set[str]: The names of all tables visible to the client.
+    """
+    table_names = set()
+    list_kwargs = {}
+    while True:
+        response = await client.list_tables(**list_kwargs)
+        table_names.update(response.get('TableNames', []))
+
+        last_table_name = response.get('LastEvaluatedTableName')
+        if not last_table_name:
+            return table_names
+        list_kwargs['ExclusiveStartTableName'] = last_table_name
+
+
+async def async_paginate_query_pages(table, **query_kwargs):
+    """
+    Runs a DynamoDB query and yields each response page, following `LastEvaluatedKey` until the result set is
+    exhausted.
+
+    Args:
+        table: An async table, e.g. an `AsyncLazyDynamoDbTable`.
+        **query_kwargs: Keyword arguments passed straight through to `table.query`.
+
+    Yields:
+        dict: One raw query response per page.
+    """
+    query_kwargs = dict(query_kwargs)
+    while True:
+        response = await table.query(**query_kwargs)
+        yield response
+
+        last_evaluated_key = response.get('LastEvaluatedKey')
+        if not last_evaluated_key:
+            return
+        query_kwargs['ExclusiveStartKey'] = last_evaluated_key
+
+
+async def async_paginate_query(table, **query_kwargs):
+    """
+    Runs a DynamoDB query and lazily yields every matching item across all result pages, holding one page in
+    memory at a time.
+
+    Yields:
+        dict: Each item returned by the query, in sort key order.
+    """
+    async for page in async_paginate_query_pages(table, **query_kwargs):
+        for item in page.get('Items', []):
+            yield item
+
+
+
+async def async_run_query_plan_pages(table, plan: QueryPlan):
+    """
+    Async counterpart of `dynamodb_helpers.run_query_plan_pages`.
+    """
+    stats = new_query_plan_stats()
+    started_at = time.perf_counter()
+    try:
+        async for response in async_paginate_query_pages(table, **plan.query_kwargs):
+            record_query_page(stats, response)
+            yield response
+    finally:
+        stats['elapsedMs'] = (time.perf_counter() - started_at) * 1000
+        log_query_plan(plan, stats)
+
+
+async def async_run_query_plan(table, plan: QueryPlan):
+    """
+    Async counterpart of `dynamodb_helpers.run_query_plan`.
+    """
+    async for response in async_run_query_plan_pages(table, plan):
+        for item in response.get('Items', []):
+            yield item
+
+async def async_run_query_plan_page(table, plan: QueryPlan, page_size: int, exclusive_start_key: dict = None):
+    """
+    Async counterpart of `dynamodb_helpers.run_query_plan_page`.
+    """
+    query_kwargs = dict(plan.query_kwargs)
+    if exclusive_start_key:
+        query_kwargs['ExclusiveStartKey'] = exclusive_start_key
+    items = []
+    stats = new_query_plan_stats()
+    started_at = time.perf_counter()
+    try:
+        while True:
+            query_kwargs['Limit'] = page_size - len(items)
+            response = await table.query(**query_kwargs)
+            record_query_page(stats, response)
+            items.extend(response.get('Items', []))
+            last_evaluated_key = response.get('LastEvaluatedKey')
+            if not last_evaluated_key or len(items) >= page_size:
+                return items, last_evaluated_key
+            query_kwargs['ExclusiveStartKey'] = last_evaluated_key
+    finally:
+        stats['elapsedMs'] = (time.perf_counter() - started_at) * 1000
+        log_query_plan(plan, stats)
+
+
+async def async_run_range_query_pages(table, query: ExpenseQuery):
+    """
+    Async counterpart of `dynamodb_helpers.run_range_query_pages`. The month sub-queries run as tasks on the event
+    loop, started in time order, and share the user's budget with the threaded executor: a free slot per running
+    sub-query and the per-second read capacity.
+    """
+    plans = [plan_expense_query(sub_query) for sub_query in split_expense_query(query)]
+    if range_query_executor.max_workers <= 0:
+        for plan in plans:
+            async for response in async_run_query_plan_pages(table, plan):
+                yield response
+        return
+
+    budget = range_query_executor.acquire_budget(query.user_email)
+    results = [asyncio.Queue() for _ in plans]
+
+    async def run_plan(plan: QueryPlan, plan_results: asyncio.Queue):
+        try:
+            async for response in async_run_query_plan_pages(table, plan):
+                plan_results.put_nowait(('page', response))
+                budget.capacity.adjust(float((response.get('ConsumedCapacity') or {}).get('CapacityUnits', 0)))
+                await asyncio.sleep(budget.capacity.wait_seconds(0))
+            plan_results.put_nowait(('done', None))
+        except Exception as e:
+            plan_results.put_nowait(('error', e))
+
+    async def start_plans():
+        for plan, plan_results in zip(plans, results):
+            while not budget.slots.acquire(blocking=False):
+                await asyncio.sleep(RANGE_QUERY_POLL_SECONDS)
+            # Sub-queries run in an empty context so their DynamoDB calls, which overlap, are not added up into
+            # the request's timing; the time spent waiting for them is added below instead
+            task = contextvars.Context().run(asyncio.ensure_future, run_plan(plan, plan_results))
+            # Released once the task is done, even when it is cancelled before it starts
+            task.add_done_callback(lambda _: budget.slots.release())
+            tasks.append(task)
+
+    tasks = []
+    starter = asyncio.ensure_future(start_plans())
+    timing = current_request_timing()
+    try:
+        for plan_results in results:
+            while True:
+                if plan_results.empty():
+                    started_at = time.perf_counter()
+                    kind, value = await plan_results.get()
+                    if timing is not None:
+                        timing.dynamodb_seconds += time.perf_counter() - started_at
+                else:
+                    kind, value = plan_results.get_nowait()
+                if kind == 'done':
+                    break
+                if kind == 'error':
+                    raise value
+                yield value
+    finally:
+        for task in [starter, *tasks]:
+            task.cancel()
+        range_query_executor.release_budget(budget)
+
+
+async def async_run_range_query(table, query: ExpenseQuery):
+    """
+    Async counterpart of `dynamodb_helpers.run_range_query`.
+    """
+    async for response in async_run_range_query_pages(table, query):
+        for item in response.get('Items', []):
+            yield item
+
+
+async def async_paginate_scan(table, **scan_kwargs):
+    """
+    Runs a DynamoDB scan and lazily yields every item across all result pages.
+
+    Yields:
+        dict: Each item returned by the scan.
+    """
+    scan_kwargs = dict(scan_kwargs)
+    while True:
+        response = await table.scan(**scan_kwargs)
+        for item in response.get('Items', []):
+            yield item
+
+        last_evaluated_key = response.get('LastEvaluatedKey')
+        if not last_evaluated_key:
+            return
+        scan_kwargs['ExclusiveStartKey'] = last_evaluated_key
+
+
+async def async_iter_summary_records(items):
+    """
+    Lazily converts an async stream of expense items into `Expense` records for display.
+
+    Yields:
+        Expense: The record.
+    """
+    async for r in items:
+        yield Expense.from_item(r)
@@ -1,62 +1,174 @@
 import boto3
+import calendar
+import functools
+import queue
+import threading
+import time
 import uuid
 import os
+from boto3.dynamodb.conditions import Attr, Key
+from botocore.config import Config
+from concurrent.futures import ThreadPoolExecutor
+from terptracker.constants.AppConstants import AppConstants
 from terptracker.constants.DynamoDbConstants import DynamoDbConstants
+from terptracker.dynamodb.expense_schema import (CATEGORY_INDEX_ATTRIBUTES, Expense, expense_category_key,
+                                                 expense_epoch_seconds, sort_key_range)
+from terptracker.metrics import current_request_timing
 from datetime import datetime, date, timezone
 
 
-def get_dynamodb_resource(db_mode: str):
+# Process-wide registry of boto3 resources and low-level clients, one each per db_mode. Every module shares the same
+# resource and client (and their urllib3 connection pools), so gunicorn threads reuse warm TLS connections. Sessions
+# and pools must not cross a fork, so the registry is cleared in forked children and re-checked against the current
+# pid.
+_dynamodb_registry = {}
+_dynamodb_registry_lock = threading.Lock()
+_dynamodb_registry_pid = os.getpid()
+
+# Modes served in-process by the embedded stand-in (dynamodb/embedded) instead of a DynamoDB endpoint
+EMBEDDED_DB_MODES = ('MEMORY', 'SQLITE')
+
+# Every attribute a query on the category index can return: its projected attributes plus the table and index keys
+_CATEGORY_INDEX_PROJECTION = frozenset(CATEGORY_INDEX_ATTRIBUTES) | {'userEmail', 'expenseTimestamp', 'userCategory'}
+
+# How often a range read waiting for a page retries starting sub-queries that were waiting for one of the user's
+# slots, and how many user budgets a range query executor keeps before dropping idle ones
+RANGE_QUERY_POLL_SECONDS = 0.05
+_RANGE_QUERY_MAX_BUDGETS = 1024
+
+
+def _reset_dynamodb_registry():
+    global _dynamodb_registry_lock, _dynamodb_registry_pid
+    _dynamodb_registry.clear()
+    _dynamodb_registry_lock = threading.Lock()
+    _dynamodb_registry_pid = os.getpid()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_dynamodb_registry)
+
+
+def get_botocore_config():
     """
-    Returns a boto3 DynamoDB resource configured for the given environment.
+    Builds the botocore client configuration shared by every DynamoDB client, tuned through DynamoDbConstants.
 
-    Args:
-        db_mode (str): Deployment mode. Use 'PROD' for production; otherwise, development settings are used.
+    Returns:
+        botocore.config.Config: Pool size, keep-alive, timeouts and retry settings.
+    """
+    return Config(
+        max_pool_connections=DynamoDbConstants.DYNAMODB_MAX_POOL_CONNECTIONS,
+        tcp_keepalive=DynamoDbConstants.DYNAMODB_TCP_KEEPALIVE,
+        connect_timeout=DynamoDbConstants.DYNAMODB_CONNECT_TIMEOUT,
+        read_timeout=DynamoDbConstants.DYNAMODB_READ_TIMEOUT,
+        retries={
+            'mode': DynamoDbConstants.DYNAMODB_RETRY_MODE,
+            'total_max_attempts': DynamoDbConstants.DYNAMODB_MAX_ATTEMPTS
+        }
+    )
+
+
+def instrument_session(session):
+    """
+    Registers the DynamoDB metric hooks (see dynamodb_metrics) on a boto3 or aioboto3 session when metrics are on.
 
     Returns:
-        boto3.resources.factory.dynamodb.ServiceResource: A DynamoDB resource object.
+        The same session.
     """
-    if db_mode.upper() == 'PROD':
-        return boto3.resource(
-            'dynamodb',
+    if AppConstants.METRICS_ENABLED:
+        from terptracker.dynamodb.dynamodb_metrics import instrument_dynamodb_events
+        instrument_dynamodb_events(session.events)
+    return session
+
+
+def _create_dynamodb_session(db_mode: str):
+    if db_mode == 'PROD':
+        return instrument_session(boto3.session.Session(
             region_name=DynamoDbConstants.DYNAMODB_REGION,
             aws_access_key_id=DynamoDbConstants.AWS_ACCESS_KEY_ID,
             aws_secret_access_key=DynamoDbConstants.AWS_SECRET_ACCESS_KEY_ID
-        )
-    elif db_mode.upper() == 'DEV':
-        return boto3.resource(
-            'dynamodb',
-            region_name=DynamoDbConstants.DYNAMODB_REGION,
-            aws_access_key_id='dummy',
-            aws_secret_access_key='dummy',
-            endpoint_url=DynamoDbConstants.DYNAMODB_URL
-        )
+        ))
+    return instrument_session(boto3.session.Session(
+        region_name=DynamoDbConstants.DYNAMODB_REGION,
+        aws_access_key_id='dummy',
+        aws_secret_access_key='dummy'
+    ))
+
+
+def _dynamodb_endpoint_kwargs(db_mode: str):
+    return {'endpoint_url': DynamoDbConstants.DYNAMODB_URL} if db_mode == 'DEV' else {}
+
+
+def _create_dynamodb_resource(db_mode: str):
+    if db_mode in ('PROD', 'DEV'):
+        return _create_dynamodb_session(db_mode=db_mode).resource('dynamodb', config=get_botocore_config(),
+                                                                  **_dynamodb_endpoint_kwargs(db_mode=db_mode))
+    elif db_mode == 'MEMORY':
+        from terptracker.dynamodb.embedded import EmbeddedDynamoDbResource, InMemoryBackend
+        return EmbeddedDynamoDbResource(backend=InMemoryBackend())
+    elif db_mode == 'SQLITE':
+        from terptracker.dynamodb.embedded import EmbeddedDynamoDbResource, SqliteBackend
+        return EmbeddedDynamoDbResource(backend=SqliteBackend(path=DynamoDbConstants.SQLITE_DB_PATH))
+    raise ValueError(f'Unsupported DB_MODE: {db_mode}')
+
+
+def _create_dynamodb_client(db_mode: str):
+    if db_mode in ('PROD', 'DEV'):
+        return _create_dynamodb_session(db_mode=db_mode).client('dynamodb', config=get_botocore_config(),
+                                                                **_dynamodb_endpoint_kwargs(db_mode=db_mode))
+    # The embedded client already speaks typed AttributeValues
+    return get_dynamodb_resource(db_mode=db_mode).meta.client
+
+
+def get_dynamodb_resource(db_mode: str):
+    """
+    Returns the process-wide boto3 DynamoDB resource for the given environment, creating it on first use.
+
+    Args:
+        db_mode (str): Deployment mode. Use 'PROD' for production, 'DEV' for DynamoDB Local, or 'MEMORY' or 'SQLITE'
+            for the in-process embedded stand-in, kept in memory or in the SQLITE_DB_PATH file.
+
+    Returns:
+        boto3.resources.factory.dynamodb.ServiceResource: A DynamoDB resource object.
+    """
+    db_mode = db_mode.upper()
+    if _dynamodb_registry_pid != os.getpid():
+        _reset_dynamodb_registry()
+
+    resource = _dynamodb_registry.get(db_mode)
+    if resource is None:
+        with _dynamodb_registry_lock:
+            resource = _dynamodb_registry.get(db_mode)
+            if resource is None:
+                resource = _create_dynamodb_resource(db_mode=db_mode)
+                _dynamodb_registry[db_mode] = resource
+    return resource
 
 
 def get_dynamodb_client(db_mode: str):
     """
-    Returns a low-level boto3 DynamoDB client configured for the given environment.
+    Returns the process-wide low-level boto3 DynamoDB client for the given environment, creating it on first use.
+
+    This is not the resource's `meta.client`: boto3 hooks that one to (de)serialize plain Python values for the
+    resource, so it would re-serialize the typed AttributeValues ({'S': ...}) low-level callers pass in.
 
     Args:
-        db_mode (str): Deployment mode. Use 'PROD' for production; otherwise, development settings are used.
+        db_mode (str): Deployment mode. Use 'PROD' for production or 'DEV' for DynamoDB Local.
 
     Returns:
         botocore.client.DynamoDB: A DynamoDB client object.
     """
-    if db_mode.upper() == 'PROD':
-        return boto3.client(
-            'dynamodb',
-            region_name=DynamoDbConstants.DYNAMODB_REGION,
-            aws_access_key_id=DynamoDbConstants.AWS_ACCESS_KEY_ID,
-            aws_secret_access_key=DynamoDbConstants.AWS_SECRET_ACCESS_KEY_ID
-        )
-    elif db_mode.upper() == 'DEV':
-        return boto3.client(
-            'dynamodb',
-            region_name=DynamoDbConstants.DYNAMODB_REGION,
-            aws_access_key_id='dummy',
-            aws_secret_access_key='dummy',
-            endpoint_url=DynamoDbConstants.DYNAMODB_URL
-        )
+    db_mode = db_mode.upper()
+    if _dynamodb_registry_pid != os.getpid():
+        _reset_dynamodb_registry()
+
+    registry_key = f'{db_mode}#client'
+    client = _dynamodb_registry.get(registry_key)
+    if client is None:
+        # Created outside the lock: the embedded client comes from get_dynamodb_resource, which takes it too
+        client = _create_dynamodb_client(db_mode=db_mode)
+        with _dynamodb_registry_lock:
+            client = _dynamodb_registry.setdefault(registry_key, client)
+    return client
 
 
 def get_dynamodb_table(dynamodb_resource: boto3.resource, table_name: str):
@@ -74,6 +186,64 @@ def get_dynamodb_table(dynamodb_resource: boto3.resource, table_name: str):
     return table
 
 
+class LazyDynamoDbTable:
+    """
+    A reference to a DynamoDB table that resolves the shared DynamoDB resource on first use instead of at import time.
+
+    Blueprint modules hold these at module level so importing them stays free of boto3 session setup. All attribute
+    access (query, put_item, ...) is delegated to the real `Table`, which is re-resolved in forked worker processes.
+    """
+
+    def __init__(self, db_mode: str, table_name: str):
+        self.db_mode = db_mode
+        self.table_name = table_name
+        self._table = None
+        self._pid = None
+
+    def resolve(self):
+        """
+        Returns:
+            boto3.dynamodb.Table: The table object bound to this process's shared resource.
+        """
+        if self._table is None or self._pid != os.getpid():
+            self._table = get_dynamodb_table(dynamodb_resource=get_dynamodb_resource(db_mode=self.db_mode),
+                                             table_name=self.table_name)
+            self._pid = os.getpid()
+        return self._table
+
+    def transact_write_items(self, **kwargs):
+        """
+        Runs TransactWriteItems on the shared low-level client, so callers holding a table reference can write
+        atomically across items. Items, keys and values must be typed AttributeValues.
+        """
+        return get_dynamodb_client(db_mode=self.db_mode).transact_write_items(**kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.resolve(), name)
+
+
+def list_table_names(client: boto3.client):
+    """
+    Lists every DynamoDB table name, following `LastEvaluatedTableName` across pages.
+
+    Args:
+        client (boto3.client): The DynamoDB client object.
+
+    Returns:
+        set[str]: The names of all tables visible to the client.
+    """
+    table_names = set()
+    list_kwargs = {}
+    while True:
+        response = client.list_tables(**list_kwargs)
+        table_names.update(response.get('TableNames', []))
+
+        last_table_name = response.get('LastEvaluatedTableName')
+        if not last_table_name:
+            return table_names
+        list_kwargs['ExclusiveStartTableName'] = last_table_name
+
+
 def table_exists(client: boto3.client, table_name: str):
     """
     Checks whether a DynamoDB table exists.
@@ -85,13 +255,664 @@ def table_exists(client: boto3.client, table_name: str):
     Returns:
         bool: True if the table exists, False otherwise.
     """
-    exists = False
-    tables = client.list_tables()
+    return table_name in list_table_names(client=client)
+
+
+def paginate_query_pages(table, **query_kwargs):
+    """
+    Runs a DynamoDB query and yields each response page, following `LastEvaluatedKey` until the result set is
+    exhausted.
+
+    Args:
+        table (boto3.dynamodb.Table): The table (or index owner) to query.
+        **query_kwargs: Keyword arguments passed straight through to `table.query` (KeyConditionExpression,
+            IndexName, ...).
+
+    Yields:
+        dict: One raw query response per page.
+    """
+    query_kwargs = dict(query_kwargs)
+    while True:
+        response = table.query(**query_kwargs)
+        yield response
+
+        last_evaluated_key = response.get('LastEvaluatedKey')
+        if not last_evaluated_key:
+            return
+        query_kwargs['ExclusiveStartKey'] = last_evaluated_key
+
+
+def paginate_query(table, **query_kwargs):
+    """
+    Runs a DynamoDB query and lazily yields every matching item across all result pages.
+
+    Only a single page (at most 1 MB) is held in memory at a time, so callers can stream arbitrarily large
+    result sets.
+
+    Args:
+        table (boto3.dynamodb.Table): The table to query.
+        **query_kwargs: Keyword arguments passed straight through to `table.query`.
+
+    Yields:
+        dict: Each item returned by the query, in sort key order.
+    """
+    for page in paginate_query_pages(table, **query_kwargs):
+        yield from page.get('Items', [])
+
+
+def paginate_scan(table, **scan_kwargs):
+    """
+    Runs a DynamoDB scan and lazily yields every item across all result pages.
+
+    Args:
+        table (boto3.dynamodb.Table): The table to scan.
+        **scan_kwargs: Keyword arguments passed straight through to `table.scan`.
+
+    Yields:
+        dict: Each item returned by the scan.
+    """
+    scan_kwargs = dict(scan_kwargs)
+    while True:
+        response = table.scan(**scan_kwargs)
+        yield from response.get('Items', [])
+
+        last_evaluated_key = response.get('LastEvaluatedKey')
+        if not last_evaluated_key:
+            return
+        scan_kwargs['ExclusiveStartKey'] = last_evaluated_key
+
+
+class ExpenseQuery:
+    """
+    A logical read of one user's expenses: a time range, optional category and type, whether the read must be
+    strongly consistent and which attributes the caller uses. `plan_expense_query` turns it into a DynamoDB query.
+    """
+
+    def __init__(self, user_email: str, start: str, end: str, category: str = None, expense_type: str = None,
+                 consistent: bool = False, attributes: tuple = None, label: str = 'expenses'):
+        """
+        Args:
+            user_email (str): The user whose expenses are read.
+            start (str): The inclusive lower sort key bound (see `get_month_timestamp_range`).
+            end (str): The inclusive upper sort key bound.
+            category (str, optional): Only read expenses in this category.
+            expense_type (str, optional): Only return expenses of this type.
+            consistent (bool): Whether the read must see every write acknowledged before it.
+            attributes (tuple[str], optional): The item attributes the caller uses; every attribute when omitted.
+            label (str): Names the read in the explain log.
+        """
+        self.user_email = user_email
+        self.start = start
+        self.end = end
+        self.category = category
+        self.expense_type = expense_type
+        self.consistent = consistent
+        self.attributes = tuple(attributes) if attributes else None
+        self.label = label
+
+    @classmethod
+    def for_months(cls, user_email: str, start_month: str, end_month: str, **kwargs):
+        """
+        Builds a query for the user's expenses from the first day of `start_month` through the last day of
+        `end_month` (both YYYY-MM).
+        """
+        start, _ = get_month_timestamp_range(start_month)
+        _, end = get_month_timestamp_range(end_month)
+        return cls(user_email=user_email, start=start, end=end, **kwargs)
+
+    @classmethod
+    def for_dates(cls, user_email: str, start_date: date, end_date: date, **kwargs):
+        """
+        Builds a query for the user's expenses from the start of `start_date` through the end of `end_date` (UTC).
+        """
+        start, _ = sort_key_range(start_seconds=float(get_first_timestamp_of_day(start_date)), end_seconds=0)
+        _, end = sort_key_range(start_seconds=0, end_seconds=float(get_last_timestamp_of_day(end_date)))
+        return cls(user_email=user_email, start=start, end=end, **kwargs)
+
+    def with_range(self, start: str, end: str):
+        """
+        Returns:
+            ExpenseQuery: The same read restricted to the sort key range [start, end].
+        """
+        return ExpenseQuery(user_email=self.user_email, start=start, end=end, category=self.category,
+                            expense_type=self.expense_type, consistent=self.consistent, attributes=self.attributes,
+                            label=self.label)
+
+    def in_range(self, item: dict):
+        """
+        Returns:
+            bool: True if `item`'s sort key is within the time range.
+        """
+        return self.start <= item['expenseTimestamp'] <= self.end
+
+    def matches(self, item: dict):
+        """
+        Returns:
+            bool: True if `item` passes the category and type conditions (the time range is not checked), e.g. for
+                write-behind items merged into the results.
+        """
+        return ((not self.category or item.get('expenseCategory') == self.category) and
+                (not self.expense_type or item.get('expenseType') == self.expense_type))
+
+
+class QueryPlan:
+    """
+    The access path `plan_expense_query` chose for an `ExpenseQuery` and the query arguments implementing it.
+    """
+
+    __slots__ = ('query', 'access_path', 'reason', 'query_kwargs')
+
+    def __init__(self, query: ExpenseQuery, access_path: str, reason: str, query_kwargs: dict):
+        self.query = query
+        self.access_path = access_path
+        self.reason = reason
+        self.query_kwargs = query_kwargs
+
+    def explain(self, stats: dict = None):
+        """
+        Returns:
+            str: One line describing the plan and, when given, what executing it cost (see `run_query_plan_pages`).
+        """
+        read = 'consistent' if self.query_kwargs.get('ConsistentRead') else 'eventual'
+        filters = [name for name, value in (('category', self.query.category), ('type', self.query.expense_type))
+                   if value and not (name == 'category' and self.access_path == 'category-index')]
+        line = (f'[{self.query.label}] path={self.access_path} read={read} '
+                f'filter={",".join(filters) or "none"} '
+                f'projection={len(self.query.attributes) if self.query.attributes else "all"} '
+                f'reason="{self.reason}"')
+        if stats:
+            line += (f" pages={stats['pages']} items={stats['items']} scanned={stats['scanned']} "
+                     f"rcu={stats['capacityUnits']:g} ms={stats['elapsedMs']:.1f}")
+        return line
+
+
+def plan_expense_query(query: ExpenseQuery,
+                       category_index_ready: bool = DynamoDbConstants.EXPENSE_CATEGORY_INDEX_READY):
+    """
+    Picks the cheapest access path for a logical expense read.
+
+    The base table is keyed on (userEmail, expenseTimestamp), so every time range is a single key range on it, and
+    it is the only path offering strongly consistent reads. A category read prefers the sparse category index
+    (keyed on userCategory, expenseTimestamp), which only reads that category's items, when the read may be
+    eventually consistent, the index has been backfilled and it projects every attribute the caller uses;
+    otherwise the base table is read and the category filtered. Expense types are not keyed, so they are always a
+    filter: filtered-out items are still read and paid for.
+
+    Args:
+        query (ExpenseQuery): The logical read.
+        category_index_ready (bool): Whether every item carries `userCategory` (expense schema v3).
+
+    Returns:
+        QueryPlan: The plan; its `query_kwargs` go straight to `table.query` (see `run_query_plan_pages`).
+    """
+    access_path, reason = 'table', 'time range on the table key'
+    if query.category:
+        if query.consistent:
+            reason = 'consistent read; the category index is eventually consistent'
+        elif not category_index_ready:
+            reason = 'category index not backfilled yet'
+        elif query.attributes is None or not set(query.attributes) <= _CATEGORY_INDEX_PROJECTION:
+            reason = 'attributes not projected into the category index'
+        else:
+            access_path, reason = 'category-index', 'category and time range on the index key'
+
+    if access_path == 'category-index':
+        query_kwargs = {
+            'IndexName': DynamoDbConstants.USER_EXPENSES_CATEGORY_INDEX_NAME,
+            'KeyConditionExpression': (Key('userCategory').eq(expense_category_key(query.user_email, query.category))
+                                       & Key('expenseTimestamp').between(query.start, query.end)),
+        }
+        filters = []
+    else:
+        query_kwargs = {
+            'KeyConditionExpression': (Key('userEmail').eq(query.user_email)
+                                       & Key('expenseTimestamp').between(query.start, query.end)),
+            'ConsistentRead': query.consistent,
+        }
+        filters = [Attr('expenseCategory').eq(query.category)] if query.category else []
+    if query.expense_type:
+        filters.append(Attr('expenseType').eq(query.expense_type))
+    if filters:
+        query_kwargs['FilterExpression'] = functools.reduce(lambda left, right: left & right, filters)
+    if query.attributes:
+        names = {f'#p{position}': name for position, name in enumerate(query.attributes)}
+        query_kwargs['ProjectionExpression'] = ', '.join(names)
+        query_kwargs['ExpressionAttributeNames'] = names
+    query_kwargs['ReturnConsumedCapacity'] = 'TOTAL'
+    return QueryPlan(query=query, access_path=access_path, reason=reason, query_kwargs=query_kwargs)
+
+
+def split_expense_query(query: ExpenseQuery):
+    """
+    Splits a read into one read per calendar month (UTC) it touches. The month bounds are the ones single-month
+    reads use, and the first and last sub-read keep the original bounds, so together they cover exactly the original
+    sort key range without overlapping.
+
+    Returns:
+        list[ExpenseQuery]: The sub-reads, in time order.
+    """
+    first = datetime.fromtimestamp(expense_epoch_seconds(query.start), tz=timezone.utc)
+    last = datetime.fromtimestamp(expense_epoch_seconds(query.end.rstrip('~')), tz=timezone.utc)
+    year, month = first.year, first.month
+    sub_queries = []
+    while (year, month) <= (last.year, last.month):
+        start, end = get_month_timestamp_range(f'{year:04d}-{month:02d}')
+        sub_queries.append((start, end))
+        year, month = (year, month + 1) if month < 12 else (year + 1, 1)
+    if not sub_queries:
+        return [query]
+    sub_queries[0] = (query.start, sub_queries[0][1])
+    sub_queries[-1] = (sub_queries[-1][0], query.end)
+    return [query.with_range(start=start, end=end) for start, end in sub_queries]
+
+
+def new_query_plan_stats():
+    return {'pages': 0, 'items': 0, 'scanned': 0, 'capacityUnits': 0.0, 'elapsedMs': 0.0}
+
+
+def record_query_page(stats: dict, response: dict):
+    """
+    Adds one query response page to the running totals of a plan's execution.
+    """
+    stats['pages'] += 1
+    stats['items'] += response.get('Count', len(response.get('Items', [])))
+    stats['scanned'] += response.get('ScannedCount', 0)
+    stats['capacityUnits'] += float((response.get('ConsumedCapacity') or {}).get('CapacityUnits', 0))
+
+
+def log_query_plan(plan: QueryPlan, stats: dict):
+    if DynamoDbConstants.QUERY_EXPLAIN:
+        print(f'⏱️Query plan {plan.explain(stats)}')
+
+
+def run_query_plan_pages(table, plan: QueryPlan):
+    """
+    Executes a plan and yields each response page. With QUERY_EXPLAIN on, the plan is logged with the pages, items
+    and read capacity units it consumed once the pages are exhausted (or the caller stops early).
+
+    Args:
+        table (boto3.dynamodb.Table): The USER_EXPENSES table.
+        plan (QueryPlan): The plan, from `plan_expense_query`.
+
+    Yields:
+        dict: One raw query response per page.
+    """
+    stats = new_query_plan_stats()
+    started_at = time.perf_counter()
+    try:
+        for response in paginate_query_pages(table, **plan.query_kwargs):
+            record_query_page(stats, response)
+            yield response
+    finally:
+        stats['elapsedMs'] = (time.perf_counter() - started_at) * 1000
+        log_query_plan(plan, stats)
+
+
+def run_query_plan(table, plan: QueryPlan):
+    """
+    Executes a plan and lazily yields every matching item (see `run_query_plan_pages`).
+    """
+    for response in run_query_plan_pages(table, plan):
+        yield from response.get('Items', [])
+
+
+def run_query_plan_page(table, plan: QueryPlan, page_size: int, exclusive_start_key: dict = None):
+    """
+    Reads one page of a plan's results for keyset pagination: at most `page_size` items, resuming after
+    `exclusive_start_key`. `Limit` caps the items DynamoDB evaluates, so a filtered plan may take several calls to
+    fill the page; each asks for the rest of it only, which keeps the returned `LastEvaluatedKey` exact.
+
+    Args:
+        table (boto3.dynamodb.Table): The USER_EXPENSES table.
+        plan (QueryPlan): The plan, from `plan_expense_query`.
+        page_size (int): The most items to return.
+        exclusive_start_key (dict, optional): The `LastEvaluatedKey` of the previous page.
+
+    Returns:
+        tuple[list[dict], dict | None]: The items and the key to resume after, None once the results are exhausted
+            (as with DynamoDB, a full last page may still return a key, followed by an empty page).
+    """
+    query_kwargs = dict(plan.query_kwargs)
+    if exclusive_start_key:
+        query_kwargs['ExclusiveStartKey'] = exclusive_start_key
+    items = []
+    stats = new_query_plan_stats()
+    started_at = time.perf_counter()
+    try:
+        while True:
+            query_kwargs['Limit'] = page_size - len(items)
+            response = table.query(**query_kwargs)
+            record_query_page(stats, response)
+            items.extend(response.get('Items', []))
+            last_evaluated_key = response.get('LastEvaluatedKey')
+            if not last_evaluated_key or len(items) >= page_size:
+                return items, last_evaluated_key
+            query_kwargs['ExclusiveStartKey'] = last_evaluated_key
+    finally:
+        stats['elapsedMs'] = (time.perf_counter() - started_at) * 1000
+        log_query_plan(plan, stats)
+
+
+class TokenBucket:
+    """
+    A thread-safe token bucket used to cap the rate of DynamoDB calls (e.g. writes per second) shared by several
+    worker threads.
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        """
+        Args:
+            rate (float): Tokens added per second; 0 or less disables limiting.
+            capacity (float, optional): The burst size. Defaults to one second's worth of tokens.
+        """
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def try_acquire(self, tokens: float = 1):
+        """
+        Returns:
+            bool: True if the tokens were taken, False if the bucket does not hold enough right now.
+        """
+        if self.rate <= 0:
+            return True
+        with self._lock:
+            self._refill()
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+    def acquire(self, tokens: float = 1, timeout: float = None):
+        """
+        Blocks until `tokens` are available and takes them.
+
+        Args:
+            tokens (float): The tokens to take.
+            timeout (float, optional): Give up instead of waiting longer than this many seconds.
+
+        Returns:
+            bool: True once the tokens were taken, False if they would not be available within `timeout`.
+        """
+        if self.rate <= 0:
+            return True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return True
+                wait_seconds = (tokens - self._tokens) / self.rate
+            if deadline is not None and time.monotonic() + wait_seconds > deadline:
+                return False
+            time.sleep(wait_seconds)
+
+    def wait_seconds(self, tokens: float = 1):
+        """
+        Returns:
+            float: How long until `tokens` are available (0 if they are now), for callers that wait themselves.
+        """
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            self._refill()
+            return max(0.0, (tokens - self._tokens) / self.rate)
+
+    def consume(self, tokens: float):
+        """
+        Charges `tokens` that were already spent, blocking until the bucket is out of debt. Use it when the cost is
+        only known after the call, e.g. the ConsumedCapacity of a Scan page, which may exceed the burst size.
+        """
+        if self.rate <= 0 or tokens <= 0:
+            return
+        with self._lock:
+            self._refill()
+            self._tokens -= tokens
+            wait_seconds = -self._tokens / self.rate
+        if wait_seconds > 0:
+            time.sleep(wait_seconds)
+
+    def adjust(self, tokens: float):
+        """
+        Takes `tokens` without waiting (the bucket may go into debt), or gives them back when negative, e.g. to
+        settle the difference between a call's estimated and reported cost.
+        """
+        if self.rate <= 0 or tokens == 0:
+            return
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.capacity, self._tokens - tokens)
+
+    def set_rate(self, rate: float, capacity: float = None):
+        """
+        Changes the refill rate (and burst size) in place, keeping the tokens currently held up to the new burst
+        size. A bucket that was unlimited starts full.
+        """
+        with self._lock:
+            self._refill()
+            was_unlimited = self.rate <= 0
+            self.rate = rate
+            self.capacity = capacity if capacity is not None else max(1.0, rate)
+            self._tokens = self.capacity if was_unlimited else min(self._tokens, self.capacity)
+
+
+class _UserRangeBudget:
+    """
+    One user's share of a `RangeQueryExecutor`: how many of their sub-queries may run at once and the read
+    capacity units per second they may consume.
+    """
+
+    __slots__ = ('slots', 'capacity', 'active_runs')
+
+    def __init__(self, concurrency: int, read_capacity: float):
+        self.slots = threading.BoundedSemaphore(max(1, concurrency))
+        self.capacity = TokenBucket(rate=read_capacity)
+        self.active_runs = 0
+
+    def is_idle(self):
+        return self.active_runs == 0 and self.capacity.wait_seconds(self.capacity.capacity) == 0
+
+
+class _RangeQueryRun:
+    """
+    The sub-queries of one range read. They are started in time order whenever the user has a free slot, and each
+    one's pages are handed to the reading thread through its own queue, so the pages come out in sort key order
+    however the sub-queries interleave.
+    """
+
+    def __init__(self, executor, table, plans: list, budget: _UserRangeBudget):
+        self.executor = executor
+        self.table = table
+        self.plans = plans
+        self.budget = budget
+        self.results = [queue.SimpleQueue() for _ in plans]
+        self.cancelled = threading.Event()
+        self._next_plan = 0
+        self._lock = threading.Lock()
+
+    def submit_ready(self):
+        """
+        Starts the next sub-queries while the user has free slots. Called by the reading thread while it waits and
+        by every sub-query as it finishes, since slots are shared with the user's other requests.
+        """
+        with self._lock:
+            while self._next_plan < len(self.plans) and not self.cancelled.is_set():
+                if not self.budget.slots.acquire(blocking=False):
+                    return
+                try:
+                    self.executor.submit(self._run_plan, self._next_plan)
+                except BaseException:
+                    self.budget.slots.release()
+                    raise
+                self._next_plan += 1
+
+    def _run_plan(self, position: int):
+        results = self.results[position]
+        pages = run_query_plan_pages(self.table, self.plans[position])
+        try:
+            for response in pages:
+                results.put(('page', response))
+                # The cost of a page is only known once it has been read: charge it and hold the slot while the
+                # user is over their read capacity
+                self.budget.capacity.consume(float((response.get('ConsumedCapacity') or {}).get('CapacityUnits', 0)))
+                if self.cancelled.is_set():
+                    break
+            results.put(('done', None))
+        except Exception as e:
+            results.put(('error', e))
+        finally:
+            pages.close()
+            self.budget.slots.release()
+            if not self.cancelled.is_set():
+                self.submit_ready()
+
+    def _next_result(self, results: queue.SimpleQueue):
+        try:
+            return results.get_nowait()
+        except queue.Empty:
+            pass
+        # Pool threads do not carry the request's context, so the time the request spends waiting on them is what
+        # counts as its DynamoDB time
+        timing = current_request_timing()
+        started_at = time.perf_counter()
+        try:
+            while True:
+                try:
+                    return results.get(timeout=RANGE_QUERY_POLL_SECONDS)
+                except queue.Empty:
+                    self.submit_ready()
+        finally:
+            if timing is not None:
+                timing.dynamodb_seconds += time.perf_counter() - started_at
+
+    def pages(self):
+        """
+        Yields:
+            dict: Every sub-query's response pages, in sort key order.
+        """
+        try:
+            self.submit_ready()
+            for results in self.results:
+                while True:
+                    kind, value = self._next_result(results)
+                    if kind == 'done':
+                        break
+                    if kind == 'error':
+                        raise value
+                    yield value
+        finally:
+            # Sub-queries still running stop after their current page; those not started yet never are
+            self.cancelled.set()
+
+
+class RangeQueryExecutor:
+    """
+    Runs expense reads spanning several months (quarters, years, date ranges) as one query per month, concurrently on
+    a bounded thread pool sharing this process's DynamoDB clients, and streams the pages back in sort key order.
+
+    Every user gets a budget shared by all of their range reads in this worker process: at most `user_concurrency`
+    of their sub-queries run at once, and once they have read more than `user_read_capacity` read capacity units in
+    the last second their sub-queries wait before reading the next page. One user's year view therefore cannot take
+    over the pool or the table's read capacity.
+    """
+
+    def __init__(self, max_workers: int, user_concurrency: int, user_read_capacity: float):
+        """
+        Args:
+            max_workers (int): Threads in the pool; 0 runs the sub-queries one after another on the calling thread.
+            user_concurrency (int): Sub-queries one user may run at once.
+            user_read_capacity (float): Read capacity units per second one user may consume; 0 is unlimited.
+        """
+        self.max_workers = max_workers
+        self.user_concurrency = user_concurrency
+        self.user_read_capacity = user_read_capacity
+        self._executor = None
+        self._executor_pid = None
+        self._budgets = {}
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        # The pool and the budgets (whose slots may be held by the parent's threads) belong to the process that
+        # created them; a forked gunicorn worker builds its own
+        with self._lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='range-query')
+                self._executor_pid = os.getpid()
+                self._budgets = {}
+            return self._executor
+
+    def acquire_budget(self, user_email: str):
+        """
+        Returns:
+            _UserRangeBudget: The user's budget, held until `release_budget`; the async executor shares it.
+        """
+        with self._lock:
+            budget = self._budgets.get(user_email)
+            if budget is None:
+                if len(self._budgets) >= _RANGE_QUERY_MAX_BUDGETS:
+                    self._budgets = {email: kept for email, kept in self._budgets.items() if not kept.is_idle()}
+                budget = self._budgets[user_email] = _UserRangeBudget(concurrency=self.user_concurrency,
+                                                                      read_capacity=self.user_read_capacity)
+            budget.active_runs += 1
+            return budget
+
+    def release_budget(self, budget: _UserRangeBudget):
+        with self._lock:
+            budget.active_runs -= 1
+
+    def run_pages(self, table, query: ExpenseQuery):
+        """
+        Reads every page of a range read, splitting it per month (see `split_expense_query`).
+
+        Args:
+            table (boto3.dynamodb.Table): The USER_EXPENSES table.
+            query (ExpenseQuery): The logical read.
+
+        Yields:
+            dict: One raw query response per page, in sort key order.
+        """
+        plans = [plan_expense_query(sub_query) for sub_query in split_expense_query(query)]
+        if self.max_workers <= 0:
+            for plan in plans:
+                yield from run_query_plan_pages(table, plan)
+            return
+
+        executor = self._get_executor()
+        budget = self.acquire_budget(query.user_email)
+        try:
+            yield from _RangeQueryRun(executor=executor, table=table, plans=plans, budget=budget).pages()
+        finally:
+            self.release_budget(budget)
+
+
+range_query_executor = RangeQueryExecutor(max_workers=DynamoDbConstants.RANGE_QUERY_MAX_WORKERS,
+                                          user_concurrency=DynamoDbConstants.RANGE_QUERY_USER_CONCURRENCY,
+                                          user_read_capacity=DynamoDbConstants.RANGE_QUERY_USER_READ_CAPACITY)
+
+
+def run_range_query_pages(table, query: ExpenseQuery):
+    """
+    Executes a read spanning any number of months on `range_query_executor` and yields each response page, in sort
+    key order.
+    """
+    return range_query_executor.run_pages(table, query)
 
-    if table_name in tables['TableNames']:
-        exists = True
 
-    return exists
+def run_range_query(table, query: ExpenseQuery):
+    """
+    Executes a read spanning any number of months and lazily yields every matching item, in sort key order (see
+    `run_range_query_pages`).
+    """
+    for response in run_range_query_pages(table, query):
+        yield from response.get('Items', [])
 
 
 def stable_hash(input: str):
@@ -119,16 +940,22 @@ def timestamp_with_current_time(year: int, month: int, day: int):
     return dt, dt.timestamp()
 
 
-def normalize_summary_records(response: list):
-    norm_records = []
-    for r in response:
-        norm_record = r.copy()
-        norm_record['expenseAmount'] = float(norm_record['expenseAmount'])
-        norm_record['expenseTimestamp'] = float(norm_record['expenseTimestamp'])
-        norm_record['date_str'] = (datetime.fromtimestamp(norm_record['expenseTimestamp'], tz=timezone.utc).date()
-                                   .isoformat())
-        norm_records.append(norm_record)
-    return norm_records
+def iter_summary_records(items):
+    """
+    Lazily converts expense items into `Expense` records for display.
+
+    Args:
+        items (Iterable[dict]): Raw USER_EXPENSES items, e.g. the output of `paginate_query`.
+
+    Yields:
+        Expense: The record.
+    """
+    for r in items:
+        yield Expense.from_item(r)
+
+
+def normalize_summary_records(response):
+    return list(iter_summary_records(response))
 
 def isLeapYear(year):
     # Check if n is divisible by 4
@@ -147,8 +974,35 @@ def get_first_timestamp_of_month(year: int, month: int):
     return str(start.timestamp())
 
 
+def get_first_timestamp_of_day(day: date):
+    start = datetime(year=day.year, month=day.month, day=day.day, tzinfo=timezone.utc)
+    return str(start.timestamp())
+
+
+def get_last_timestamp_of_day(day: date):
+    return get_last_timestamp_of_month(year=day.year, month=day.month, day=day.day)
+
+
 def get_last_timestamp_of_month(year: int, month: int, day: int):
     end = datetime(year=year, month=month, day=day,
                    hour=23, minute=59, second=59, microsecond=999_999,
                    tzinfo=timezone.utc)
     return str(end.timestamp())
+
+
+def get_month_timestamp_range(month_year: str):
+    """
+    Converts a `YYYY-MM` string (as submitted by an <input type="month">) into the sort key bounds of that month,
+    matching both v1 and v2 expense keys (see expense_schema.sort_key_range).
+
+    Args:
+        month_year (str): The month to resolve, e.g. '2025-02'.
+
+    Returns:
+        tuple[str, str]: The (start, end) sort key bounds for a `between` key condition.
+    """
+    year, month = (int(part) for part in month_year.split('-')[:2])
+    last_day = calendar.monthrange(year, month)[1]
+    start = get_first_timestamp_of_month(year=year, month=month)
+    end = get_last_timestamp_of_month(year=year, month=month, day=last_day)
+    return sort_key_range(start_seconds=float(start), end_seconds=float(end))
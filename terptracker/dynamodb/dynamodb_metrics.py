@@ -0,0 +1,98 @@
+import time
+from terptracker.dynamodb.throttling import THROTTLING_ERROR_CODES
+from terptracker.metrics import (current_request_timing, dynamodb_consumed_capacity, dynamodb_errors,
+                                 dynamodb_operation_duration, dynamodb_retries, dynamodb_throttles)
+
+# botocore event handlers recording per-operation, per-table DynamoDB metrics (see terptracker/metrics.py). They are
+# registered on the session, so every client and resource created from it (boto3 and aioboto3 alike) reports. The
+# request context dict botocore passes from provide-client-params through after-call carries the table and start time.
+_CAPACITY_OPERATIONS = frozenset({'GetItem', 'PutItem', 'UpdateItem', 'DeleteItem', 'Query', 'Scan', 'BatchGetItem',
+                                  'BatchWriteItem', 'TransactGetItems', 'TransactWriteItems'})
+_TABLE_KEY = 'terptracker_table'
+_STARTED_AT_KEY = 'terptracker_started_at'
+
+
+def table_label(params: dict):
+    """
+    Returns:
+        str: The table an API call targets; 'multiple' for batches and transactions spanning several tables.
+    """
+    if params.get('TableName'):
+        return params['TableName']
+    tables = set(params.get('RequestItems') or ())
+    for transact_item in params.get('TransactItems') or ():
+        tables.update(action['TableName'] for action in transact_item.values() if 'TableName' in action)
+    if len(tables) == 1:
+        return tables.pop()
+    return 'multiple' if tables else ''
+
+
+def _on_provide_client_params(params, model, context=None, **kwargs):
+    if context is not None:
+        context[_TABLE_KEY] = table_label(params)
+    if model.name in _CAPACITY_OPERATIONS:
+        # Explicit settings (e.g. 'INDEXES' from the client-side throttle) are kept
+        params.setdefault('ReturnConsumedCapacity', 'TOTAL')
+
+
+def _on_before_call(model, context=None, **kwargs):
+    if context is not None:
+        context[_STARTED_AT_KEY] = time.perf_counter()
+
+
+def _record_call(operation: str, context: dict):
+    table = (context or {}).get(_TABLE_KEY, '')
+    started_at = (context or {}).get(_STARTED_AT_KEY)
+    if started_at is not None:
+        elapsed = time.perf_counter() - started_at
+        dynamodb_operation_duration.observe(elapsed, operation=operation, table=table)
+        timing = current_request_timing()
+        if timing is not None:
+            timing.dynamodb_seconds += elapsed
+    return table
+
+
+def _on_after_call(parsed, model, context=None, **kwargs):
+    table = _record_call(model.name, context)
+    retries = (parsed.get('ResponseMetadata') or {}).get('RetryAttempts', 0)
+    if retries:
+        dynamodb_retries.inc(retries, operation=model.name, table=table)
+    error_code = (parsed.get('Error') or {}).get('Code')
+    if error_code:
+        dynamodb_errors.inc(operation=model.name, table=table, code=error_code)
+
+    consumed = parsed.get('ConsumedCapacity') or []
+    for capacity in consumed if isinstance(consumed, list) else [consumed]:
+        if capacity.get('CapacityUnits'):
+            dynamodb_consumed_capacity.inc(float(capacity['CapacityUnits']), operation=model.name,
+                                           table=capacity.get('TableName', table))
+
+
+def _on_after_call_error(exception, model, context=None, **kwargs):
+    table = _record_call(model.name, context)
+    dynamodb_errors.inc(operation=model.name, table=table, code=type(exception).__name__)
+
+
+def _on_needs_retry(response=None, operation=None, request_dict=None, **kwargs):
+    if not response or operation is None:
+        return None
+    error_code = (response[1].get('Error') or {}).get('Code')
+    if error_code in THROTTLING_ERROR_CODES:
+        context = (request_dict or {}).get('context') or {}
+        dynamodb_throttles.inc(operation=operation.name, table=context.get(_TABLE_KEY, ''))
+    # Never decide the retry; botocore's own handler does
+    return None
+
+
+def instrument_dynamodb_events(events):
+    """
+    Registers the metric handlers on a boto3 (or aioboto3) session's event system.
+
+    Args:
+        events (botocore.hooks.HierarchicalEmitter): `session.events`.
+    """
+    events.register('provide-client-params.dynamodb', _on_provide_client_params, unique_id='terptracker-metrics-params')
+    events.register('before-call.dynamodb', _on_before_call, unique_id='terptracker-metrics-before')
+    events.register('after-call.dynamodb', _on_after_call, unique_id='terptracker-metrics-after')
+    events.register('after-call-error.dynamodb', _on_after_call_error, unique_id='terptracker-metrics-error')
+    events.register('needs-retry.dynamodb', _on_needs_retry, unique_id='terptracker-metrics-retry')
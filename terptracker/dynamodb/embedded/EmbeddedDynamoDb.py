@@ -0,0 +1,817 @@
+import copy
+import math
+import threading
+import zlib
+from decimal import Decimal
+from types import SimpleNamespace
+from boto3.dynamodb.types import TypeSerializer, TypeDeserializer
+from botocore.exceptions import ClientError
+from terptracker.dynamodb.embedded.expressions import (ExpressionContext, parse_condition, parse_update,
+                                                       evaluate_condition, apply_update, project,
+                                                       split_key_condition, validation_error,
+                                                       conditional_check_failed)
+
+# DynamoDB stops a Query/Scan page after 1 MB of evaluated data
+MAX_PAGE_BYTES = 1024 * 1024
+BATCH_WRITER_FLUSH_AMOUNT = 25
+
+_serializer = TypeSerializer()
+_deserializer = TypeDeserializer()
+
+
+def _client_error(code: str, message: str, operation_name: str, **extra):
+    error = {'Error': {'Code': code, 'Message': message}}
+    error.update(extra)
+    return ClientError(error, operation_name)
+
+
+def normalize_value(value):
+    """
+    Converts a Python value into the form DynamoDB would hand back (ints become Decimal), rejecting floats the same
+    way boto3's serializer does.
+    """
+    if isinstance(value, bool) or value is None or isinstance(value, (str, Decimal, bytes)):
+        return value
+    if isinstance(value, int):
+        return Decimal(value)
+    if isinstance(value, float):
+        raise TypeError('Float types are not supported. Use Decimal types instead.')
+    if isinstance(value, dict):
+        return {k: normalize_value(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [normalize_value(v) for v in value]
+    if isinstance(value, (set, frozenset)):
+        return {normalize_value(v) for v in value}
+    if isinstance(value, bytearray):
+        return bytes(value)
+    raise TypeError(f'Unsupported type "{type(value)}" for value "{value}"')
+
+
+def item_size(item: dict):
+    """
+    Approximates the DynamoDB item size in bytes (attribute names plus values), used for page limits and consumed
+    capacity.
+    """
+    def value_size(value):
+        if isinstance(value, str):
+            return len(value.encode('utf-8'))
+        if isinstance(value, bytes):
+            return len(value)
+        if isinstance(value, Decimal):
+            return len(value.as_tuple().digits) // 2 + 2
+        if isinstance(value, bool) or value is None:
+            return 1
+        if isinstance(value, dict):
+            return 3 + sum(len(k) + value_size(v) for k, v in value.items())
+        if isinstance(value, (list, set)):
+            return 3 + sum(value_size(v) + 1 for v in value)
+        return 8
+
+    return sum(len(name) + value_size(value) for name, value in item.items())
+
+
+def _copy_item(item: dict):
+    return copy.deepcopy(item)
+
+
+class TableDefinition:
+    """
+    The schema of an embedded table: key attributes, secondary indexes and provisioned capacity, mirroring the
+    DescribeTable output.
+    """
+
+    def __init__(self, description: dict):
+        self.description = description
+        self.name = description['TableName']
+        self.hash_key, self.range_key = self.parse_key_schema(description['KeySchema'])
+        self.indexes = {
+            index['IndexName']: SimpleNamespace(name=index['IndexName'],
+                                                hash_key=self.parse_key_schema(index['KeySchema'])[0],
+                                                range_key=self.parse_key_schema(index['KeySchema'])[1],
+                                                projection=index.get('Projection', {'ProjectionType': 'ALL'}))
+            for index in description.get('GlobalSecondaryIndexes', [])
+        }
+
+    @staticmethod
+    def parse_key_schema(key_schema: list):
+        hash_key = next(k['AttributeName'] for k in key_schema if k['KeyType'] == 'HASH')
+        range_key = next((k['AttributeName'] for k in key_schema if k['KeyType'] == 'RANGE'), None)
+        return hash_key, range_key
+
+    def key_of(self, item: dict, operation_name: str):
+        """
+        Returns:
+            tuple: The (partition key, sort key) of `item`; the sort key is '' for tables without one.
+        """
+        if self.hash_key not in item or (self.range_key and self.range_key not in item):
+            raise validation_error('One of the required keys was not given a value', operation_name)
+        return item[self.hash_key], item[self.range_key] if self.range_key else ''
+
+    def key_dict(self, item: dict):
+        key = {self.hash_key: item[self.hash_key]}
+        if self.range_key:
+            key[self.range_key] = item[self.range_key]
+        return key
+
+    def index_key_of(self, index, item: dict):
+        """
+        Returns:
+            tuple | None: The (index partition key, index sort key) of `item`, or None if the item is not in the
+                (sparse) index.
+        """
+        if index.hash_key not in item or (index.range_key and index.range_key not in item):
+            return None
+        return item[index.hash_key], item[index.range_key] if index.range_key else ''
+
+    def project_for_index(self, index, item: dict):
+        projection = index.projection
+        if projection.get('ProjectionType', 'ALL') == 'ALL':
+            return item
+        keep = {self.hash_key, self.range_key, index.hash_key, index.range_key}
+        keep.update(projection.get('NonKeyAttributes', []))
+        return {name: value for name, value in item.items() if name in keep}
+
+
+class InMemoryStorage:
+    """
+    Stores one embedded table in memory: a dict of partitions, each holding its items and a sorted list of sort
+    keys, plus the same layout for every global secondary index. Items are returned by reference, so readers copy
+    them.
+    """
+
+    copies_items = False
+
+    def __init__(self, definition: TableDefinition):
+        self.definition = definition
+        self.partitions = {}
+        self.index_partitions = {name: {} for name in definition.indexes}
+        self.count = 0
+
+    @staticmethod
+    def _insert_sorted(keys: list, key):
+        low, high = 0, len(keys)
+        while low < high:
+            middle = (low + high) // 2
+            if keys[middle] < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low == len(keys) or keys[low] != key:
+            keys.insert(low, key)
+
+    @staticmethod
+    def _remove_sorted(keys: list, key):
+        low, high = 0, len(keys)
+        while low < high:
+            middle = (low + high) // 2
+            if keys[middle] < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < len(keys) and keys[low] == key:
+            keys.pop(low)
+
+    def get(self, key: tuple):
+        partition = self.partitions.get(key[0])
+        return partition['items'].get(key[1]) if partition else None
+
+    def put(self, key: tuple, item: dict, old_item: dict = None):
+        partition = self.partitions.setdefault(key[0], {'items': {}, 'keys': []})
+        if key[1] not in partition['items']:
+            self._insert_sorted(partition['keys'], key[1])
+            self.count += 1
+        partition['items'][key[1]] = item
+        self._update_indexes(key, old_item, item)
+
+    def delete(self, key: tuple, old_item: dict):
+        partition = self.partitions.get(key[0])
+        if not partition or key[1] not in partition['items']:
+            return
+        del partition['items'][key[1]]
+        self._remove_sorted(partition['keys'], key[1])
+        if not partition['items']:
+            del self.partitions[key[0]]
+        self.count -= 1
+        self._update_indexes(key, old_item, None)
+
+    def _update_indexes(self, key: tuple, old_item: dict, new_item: dict):
+        for name, index in self.definition.indexes.items():
+            partitions = self.index_partitions[name]
+            old_index_key = self.definition.index_key_of(index, old_item) if old_item else None
+            new_index_key = self.definition.index_key_of(index, new_item) if new_item else None
+            if old_index_key:
+                entries = partitions.get(old_index_key[0])
+                if entries is not None:
+                    self._remove_sorted(entries, (old_index_key[1], key))
+                    if not entries:
+                        del partitions[old_index_key[0]]
+            if new_index_key:
+                self._insert_sorted(partitions.setdefault(new_index_key[0], []), (new_index_key[1], key))
+
+    def rebuild_index(self, index_name: str):
+        index = self.definition.indexes[index_name]
+        self.index_partitions[index_name] = {}
+        for partition_key, partition in self.partitions.items():
+            for sort_key, item in partition['items'].items():
+                index_key = self.definition.index_key_of(index, item)
+                if index_key:
+                    self._insert_sorted(self.index_partitions[index_name].setdefault(index_key[0], []),
+                                        (index_key[1], (partition_key, sort_key)))
+
+    def iter_partition(self, partition_key, sort_range, forward: bool, start_after):
+        partition = self.partitions.get(partition_key)
+        if not partition:
+            return
+        keys = partition['keys'] if forward else list(reversed(partition['keys']))
+        for sort_key in keys:
+            if start_after is not None and ((forward and sort_key <= start_after)
+                                            or (not forward and sort_key >= start_after)):
+                continue
+            if sort_range.contains(sort_key):
+                yield partition['items'][sort_key]
+
+    def iter_index(self, index_name: str, partition_key, sort_range, forward: bool, start_after):
+        entries = self.index_partitions[index_name].get(partition_key, [])
+        if not forward:
+            entries = list(reversed(entries))
+        for entry in entries:
+            if start_after is not None and ((forward and entry <= start_after)
+                                            or (not forward and entry >= start_after)):
+                continue
+            if sort_range.contains(entry[0]):
+                yield self.get(entry[1])
+
+    def iter_all(self, start_after):
+        for partition_key in sorted(self.partitions, key=lambda k: (type(k).__name__, k)):
+            partition = self.partitions[partition_key]
+            for sort_key in partition['keys']:
+                if start_after is not None and \
+                        ((type(partition_key).__name__, partition_key, sort_key) <=
+                         (type(start_after[0]).__name__, start_after[0], start_after[1])):
+                    continue
+                yield partition['items'][sort_key]
+
+
+class InMemoryBackend:
+    """
+    Keeps every embedded table of a process in memory. One re-entrant lock serializes all operations, which also
+    makes TransactWriteItems atomic.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.tables = {}
+
+    def write_transaction(self):
+        return self.lock
+
+    def read_transaction(self):
+        return self.lock
+
+    def table_names(self):
+        return sorted(self.tables)
+
+    def get_table(self, table_name: str):
+        return self.tables.get(table_name)
+
+    def create_table(self, definition: TableDefinition):
+        self.tables[definition.name] = InMemoryStorage(definition)
+
+    def update_definition(self, definition: TableDefinition, created_indexes=()):
+        storage = self.tables[definition.name]
+        storage.definition = definition
+        for name in list(storage.index_partitions):
+            if name not in definition.indexes:
+                del storage.index_partitions[name]
+        for name in created_indexes:
+            storage.rebuild_index(name)
+
+    def delete_table(self, table_name: str):
+        self.tables.pop(table_name, None)
+
+
+class EmbeddedBatchWriter:
+    """
+    Mirrors boto3's `Table.batch_writer()`: buffers puts and deletes and flushes them 25 at a time, optionally
+    de-duplicating by primary key.
+    """
+
+    def __init__(self, table, overwrite_by_pkeys=None):
+        self.table = table
+        self.overwrite_by_pkeys = overwrite_by_pkeys
+        self.buffer = []
+
+    def _add(self, request: dict, key_source: dict):
+        if self.overwrite_by_pkeys:
+            key = tuple(key_source.get(k) for k in self.overwrite_by_pkeys)
+            self.buffer = [r for r in self.buffer
+                           if tuple(r[1].get(k) for k in self.overwrite_by_pkeys) != key]
+        self.buffer.append((request, key_source))
+        if len(self.buffer) >= BATCH_WRITER_FLUSH_AMOUNT:
+            self.flush()
+
+    def put_item(self, Item):
+        self._add({'PutRequest': {'Item': Item}}, Item)
+
+    def delete_item(self, Key):
+        self._add({'DeleteRequest': {'Key': Key}}, Key)
+
+    def flush(self):
+        if self.buffer:
+            self.table.resource.batch_write_item(
+                RequestItems={self.table.name: [request for request, _ in self.buffer]})
+            self.buffer = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.flush()
+
+
+class EmbeddedTable:
+    """
+    Implements the subset of boto3's `dynamodb.Table` used by TerpTracker (get/put/update/delete item, query, scan,
+    batch writer) on top of an embedded backend, with DynamoDB's expression, pagination, sparse index and consumed
+    capacity semantics.
+    """
+
+    def __init__(self, resource, name: str):
+        self.resource = resource
+        self.name = name
+        self.meta = SimpleNamespace(client=resource.meta.client)
+
+    @property
+    def table_name(self):
+        return self.name
+
+    def _storage(self, operation_name: str):
+        storage = self.resource.backend.get_table(self.name)
+        if storage is None:
+            raise _client_error('ResourceNotFoundException', 'Requested resource not found', operation_name)
+        return storage
+
+    @property
+    def _description(self):
+        return self.resource.meta.client.describe_table(TableName=self.name)['Table']
+
+    @property
+    def key_schema(self):
+        return self._description['KeySchema']
+
+    @property
+    def attribute_definitions(self):
+        return self._description['AttributeDefinitions']
+
+    @property
+    def global_secondary_indexes(self):
+        return self._description.get('GlobalSecondaryIndexes')
+
+    @property
+    def provisioned_throughput(self):
+        return self._description.get('ProvisionedThroughput')
+
+    @property
+    def billing_mode_summary(self):
+        return self._description.get('BillingModeSummary')
+
+    @property
+    def item_count(self):
+        return self._description['ItemCount']
+
+    @property
+    def table_status(self):
+        return self._description['TableStatus']
+
+    def load(self):
+        self._storage('DescribeTable')
+
+    def reload(self):
+        self.load()
+
+    def wait_until_exists(self):
+        self.load()
+
+    def wait_until_not_exists(self):
+        pass
+
+    def batch_writer(self, overwrite_by_pkeys=None):
+        return EmbeddedBatchWriter(table=self, overwrite_by_pkeys=overwrite_by_pkeys)
+
+    @staticmethod
+    def _consumed(table_name: str, size: int, per_unit: int, factor: float, return_consumed_capacity):
+        if not return_consumed_capacity or return_consumed_capacity == 'NONE':
+            return None
+        return {'TableName': table_name, 'CapacityUnits': max(1, math.ceil(size / per_unit)) * factor}
+
+    def _with_consumed(self, response: dict, size: int, write: bool, consistent: bool, return_consumed_capacity):
+        consumed = self._consumed(self.name, size, 1024 if write else 4096,
+                                  1.0 if write or consistent else 0.5, return_consumed_capacity)
+        if consumed:
+            response['ConsumedCapacity'] = consumed
+        return response
+
+    def get_item(self, Key, ConsistentRead=False, ProjectionExpression=None, ExpressionAttributeNames=None,
+                 ReturnConsumedCapacity=None, **_):
+        with self.resource.backend.read_transaction():
+            storage = self._storage('GetItem')
+            key = storage.definition.key_of(normalize_value(Key), 'GetItem')
+            item = storage.get(key)
+            if item is not None and not storage.copies_items:
+                item = _copy_item(item)
+
+        response = {}
+        if item is not None:
+            context = ExpressionContext(names=ExpressionAttributeNames)
+            response['Item'] = project(item, ProjectionExpression, context)
+        return self._with_consumed(response, item_size(item) if item else 0, False, ConsistentRead,
+                                   ReturnConsumedCapacity)
+
+    def _check_condition(self, condition, existing: dict, context: ExpressionContext, operation_name: str):
+        expression = context.render(condition)
+        if expression and not evaluate_condition(parse_condition(expression), existing or {}, context):
+            raise conditional_check_failed(operation_name)
+
+    def _return_values(self, return_values: str, old_item: dict, new_item: dict):
+        if return_values == 'ALL_OLD' and old_item is not None:
+            return {'Attributes': _copy_item(old_item)}
+        if return_values in ('ALL_NEW', 'UPDATED_NEW') and new_item is not None:
+            return {'Attributes': _copy_item(new_item)}
+        return {}
+
+    def put_item(self, Item, ConditionExpression=None, ExpressionAttributeNames=None,
+                 ExpressionAttributeValues=None, ReturnValues='NONE', ReturnConsumedCapacity=None, **_):
+        item = normalize_value(Item)
+        context = ExpressionContext(names=ExpressionAttributeNames,
+                                    values=normalize_value(ExpressionAttributeValues or {}))
+        with self.resource.backend.write_transaction():
+            storage = self._storage('PutItem')
+            key = storage.definition.key_of(item, 'PutItem')
+            existing = storage.get(key)
+            self._check_condition(ConditionExpression, existing, context, 'PutItem')
+            storage.put(key, _copy_item(item), existing)
+            response = self._return_values(ReturnValues, existing, None)
+        return self._with_consumed(response, item_size(item), True, True, ReturnConsumedCapacity)
+
+    def update_item(self, Key, UpdateExpression=None, ConditionExpression=None, ExpressionAttributeNames=None,
+                    ExpressionAttributeValues=None, ReturnValues='NONE', ReturnConsumedCapacity=None, **_):
+        key_attributes = normalize_value(Key)
+        context = ExpressionContext(names=ExpressionAttributeNames,
+                                    values=normalize_value(ExpressionAttributeValues or {}))
+        with self.resource.backend.write_transaction():
+            storage = self._storage('UpdateItem')
+            key = storage.definition.key_of(key_attributes, 'UpdateItem')
+            existing = storage.get(key)
+            self._check_condition(ConditionExpression, existing, context, 'UpdateItem')
+
+            updated = _copy_item(existing) if existing is not None else dict(key_attributes)
+            if UpdateExpression:
+                apply_update(parse_update(UpdateExpression), updated, context)
+            if storage.definition.key_of(updated, 'UpdateItem') != key:
+                raise validation_error('Cannot update attribute; this attribute is part of the key', 'UpdateItem')
+            storage.put(key, updated, existing)
+            response = self._return_values(ReturnValues, existing, updated)
+        return self._with_consumed(response, item_size(updated), True, True, ReturnConsumedCapacity)
+
+    def delete_item(self, Key, ConditionExpression=None, ExpressionAttributeNames=None,
+                    ExpressionAttributeValues=None, ReturnValues='NONE', ReturnConsumedCapacity=None, **_):
+        context = ExpressionContext(names=ExpressionAttributeNames,
+                                    values=normalize_value(ExpressionAttributeValues or {}))
+        with self.resource.backend.write_transaction():
+            storage = self._storage('DeleteItem')
+            key = storage.definition.key_of(normalize_value(Key), 'DeleteItem')
+            existing = storage.get(key)
+            self._check_condition(ConditionExpression, existing, context, 'DeleteItem')
+            storage.delete(key, existing)
+            response = self._return_values(ReturnValues, existing, None)
+        return self._with_consumed(response, item_size(existing) if existing else 0, True, True,
+                                   ReturnConsumedCapacity)
+
+    def _page(self, items, storage, index, context: ExpressionContext, filter_expression, projection_expression,
+              limit, select, consistent, return_consumed_capacity):
+        definition = storage.definition
+        copy_item = (lambda item: item) if storage.copies_items else _copy_item
+        filter_node = parse_condition(filter_expression) if filter_expression else None
+        results = []
+        scanned = 0
+        size = 0
+        last_item = None
+        for item in items:
+            scanned += 1
+            size += item_size(item)
+            last_item = item
+            visible = definition.project_for_index(index, item) if index else item
+            if filter_node is None or evaluate_condition(filter_node, visible, context):
+                if select != 'COUNT':
+                    results.append(project(copy_item(visible), projection_expression, context))
+                else:
+                    results.append(None)
+            if (limit and scanned >= limit) or size >= MAX_PAGE_BYTES:
+                break
+        else:
+            last_item = None
+        # Release the storage's cursor now rather than when the iterator is collected
+        items.close()
+
+        response = {'Count': len(results), 'ScannedCount': scanned}
+        if select != 'COUNT':
+            response['Items'] = results
+        if last_item is not None:
+            last_key = definition.key_dict(last_item)
+            if index:
+                last_key[index.hash_key] = last_item[index.hash_key]
+                if index.range_key:
+                    last_key[index.range_key] = last_item[index.range_key]
+            response['LastEvaluatedKey'] = _copy_item(last_key)
+        return self._with_consumed(response, size, False, consistent, return_consumed_capacity)
+
+    def query(self, KeyConditionExpression, IndexName=None, FilterExpression=None, ProjectionExpression=None,
+              ExpressionAttributeNames=None, ExpressionAttributeValues=None, ExclusiveStartKey=None, Limit=None,
+              ScanIndexForward=True, ConsistentRead=False, Select=None, ReturnConsumedCapacity=None, **_):
+        context = ExpressionContext(names=ExpressionAttributeNames,
+                                    values=normalize_value(ExpressionAttributeValues or {}))
+        key_expression = context.render(KeyConditionExpression, is_key_condition=True)
+        filter_expression = context.render(FilterExpression)
+        start_key = normalize_value(ExclusiveStartKey) if ExclusiveStartKey else None
+
+        with self.resource.backend.read_transaction():
+            storage = self._storage('Query')
+            definition = storage.definition
+            if IndexName:
+                index = definition.indexes.get(IndexName)
+                if index is None:
+                    raise validation_error(f'The table does not have the specified index: {IndexName}', 'Query')
+                if ConsistentRead:
+                    raise validation_error('Consistent reads are not supported on global secondary indexes',
+                                           'Query')
+                partition_key, sort_range = split_key_condition(parse_condition(key_expression), index.hash_key,
+                                                                index.range_key, context)
+                start_after = None
+                if start_key:
+                    start_after = (start_key[index.range_key] if index.range_key else '',
+                                   definition.key_of(start_key, 'Query'))
+                items = storage.iter_index(IndexName, partition_key, sort_range, ScanIndexForward, start_after)
+            else:
+                index = None
+                partition_key, sort_range = split_key_condition(parse_condition(key_expression),
+                                                                definition.hash_key, definition.range_key, context)
+                start_after = definition.key_of(start_key, 'Query')[1] if start_key else None
+                items = storage.iter_partition(partition_key, sort_range, ScanIndexForward, start_after)
+
+            return self._page(items, storage, index, context, filter_expression, ProjectionExpression, Limit,
+                              Select, ConsistentRead, ReturnConsumedCapacity)
+
+    def scan(self, FilterExpression=None, ProjectionExpression=None, ExpressionAttributeNames=None,
+             ExpressionAttributeValues=None, ExclusiveStartKey=None, Limit=None, Segment=None, TotalSegments=None,
+             ConsistentRead=False, Select=None, ReturnConsumedCapacity=None, IndexName=None, **_):
+        if IndexName:
+            raise validation_error('Index scans are not supported by the embedded backend', 'Scan')
+        context = ExpressionContext(names=ExpressionAttributeNames,
+                                    values=normalize_value(ExpressionAttributeValues or {}))
+        filter_expression = context.render(FilterExpression)
+        start_key = normalize_value(ExclusiveStartKey) if ExclusiveStartKey else None
+
+        with self.resource.backend.read_transaction():
+            storage = self._storage('Scan')
+            definition = storage.definition
+            start_after = definition.key_of(start_key, 'Scan') if start_key else None
+            items = storage.iter_all(start_after)
+            if TotalSegments:
+                items = (item for item in items
+                         if zlib.crc32(repr(item[definition.hash_key]).encode('utf-8')) % TotalSegments == Segment)
+            return self._page(items, storage, None, context, filter_expression, ProjectionExpression, Limit,
+                              Select, ConsistentRead, ReturnConsumedCapacity)
+
+
+class EmbeddedDynamoDbClient:
+    """
+    The low-level (typed AttributeValue) client of an embedded resource, covering table management,
+    TransactWriteItems and BatchWriteItem.
+    """
+
+    def __init__(self, resource):
+        self.resource = resource
+        self.meta = SimpleNamespace(region_name='embedded', config=None)
+        self._time_to_live = {}
+
+    @property
+    def backend(self):
+        return self.resource.backend
+
+    def list_tables(self, ExclusiveStartTableName=None, Limit=100, **_):
+        with self.backend.read_transaction():
+            names = [name for name in self.backend.table_names()
+                     if ExclusiveStartTableName is None or name > ExclusiveStartTableName]
+        response = {'TableNames': names[:Limit]}
+        if len(names) > Limit:
+            response['LastEvaluatedTableName'] = names[Limit - 1]
+        return response
+
+    def describe_table(self, TableName, **_):
+        with self.backend.read_transaction():
+            storage = self.backend.get_table(TableName)
+            if storage is None:
+                raise _client_error('ResourceNotFoundException', f'Requested resource not found: Table: '
+                                                                 f'{TableName} not found', 'DescribeTable')
+            description = copy.deepcopy(storage.definition.description)
+            description['ItemCount'] = storage.count
+        return {'Table': description}
+
+    def create_table(self, TableName, KeySchema, AttributeDefinitions, BillingMode='PROVISIONED',
+                     ProvisionedThroughput=None, GlobalSecondaryIndexes=None, **_):
+        description = {
+            'TableName': TableName,
+            'KeySchema': KeySchema,
+            'AttributeDefinitions': AttributeDefinitions,
+            'TableStatus': 'ACTIVE',
+            'BillingModeSummary': {'BillingMode': BillingMode},
+        }
+        if ProvisionedThroughput:
+            description['ProvisionedThroughput'] = ProvisionedThroughput
+        if GlobalSecondaryIndexes:
+            description['GlobalSecondaryIndexes'] = [dict(index, IndexStatus='ACTIVE')
+                                                     for index in GlobalSecondaryIndexes]
+
+        with self.backend.write_transaction():
+            if self.backend.get_table(TableName) is not None:
+                raise _client_error('ResourceInUseException', f'Table already exists: {TableName}', 'CreateTable')
+            self.backend.create_table(TableDefinition(description))
+        return {'TableDescription': copy.deepcopy(description)}
+
+    def delete_table(self, TableName, **_):
+        description = self.describe_table(TableName=TableName)['Table']
+        with self.backend.write_transaction():
+            self.backend.delete_table(TableName)
+        return {'TableDescription': description}
+
+    def update_table(self, TableName, AttributeDefinitions=None, GlobalSecondaryIndexUpdates=None,
+                     ProvisionedThroughput=None, BillingMode=None, **_):
+        with self.backend.write_transaction():
+            description = self.describe_table(TableName=TableName)['Table']
+            description.pop('ItemCount', None)
+            if AttributeDefinitions:
+                known = {d['AttributeName'] for d in description['AttributeDefinitions']}
+                description['AttributeDefinitions'] += [d for d in AttributeDefinitions
+                                                        if d['AttributeName'] not in known]
+            if ProvisionedThroughput:
+                description['ProvisionedThroughput'] = ProvisionedThroughput
+            if BillingMode:
+                description['BillingModeSummary'] = {'BillingMode': BillingMode}
+
+            created_indexes = []
+            indexes = description.get('GlobalSecondaryIndexes', [])
+            for update in GlobalSecondaryIndexUpdates or []:
+                if 'Create' in update:
+                    indexes.append(dict(update['Create'], IndexStatus='ACTIVE'))
+                    created_indexes.append(update['Create']['IndexName'])
+                elif 'Delete' in update:
+                    indexes = [i for i in indexes if i['IndexName'] != update['Delete']['IndexName']]
+                elif 'Update' in update:
+                    for index in indexes:
+                        if index['IndexName'] == update['Update']['IndexName']:
+                            index.update(update['Update'])
+            if indexes:
+                description['GlobalSecondaryIndexes'] = indexes
+            else:
+                description.pop('GlobalSecondaryIndexes', None)
+            self.backend.update_definition(TableDefinition(description), created_indexes=created_indexes)
+        return {'TableDescription': description}
+
+    def update_time_to_live(self, TableName, TimeToLiveSpecification, **_):
+        self.describe_table(TableName=TableName)
+        self._time_to_live[TableName] = TimeToLiveSpecification
+        return {'TimeToLiveSpecification': TimeToLiveSpecification}
+
+    def describe_time_to_live(self, TableName, **_):
+        specification = self._time_to_live.get(TableName)
+        if not specification or not specification.get('Enabled'):
+            return {'TimeToLiveDescription': {'TimeToLiveStatus': 'DISABLED'}}
+        return {'TimeToLiveDescription': {'TimeToLiveStatus': 'ENABLED',
+                                          'AttributeName': specification['AttributeName']}}
+
+    @staticmethod
+    def _deserialize(typed: dict):
+        return {name: _deserializer.deserialize(value) for name, value in (typed or {}).items()}
+
+    def transact_write_items(self, TransactItems, ReturnConsumedCapacity=None, **_):
+        """
+        Applies Put/Update/Delete/ConditionCheck actions atomically: every condition is checked first, and nothing
+        is written unless all of them pass.
+        """
+        if len(TransactItems) > 100:
+            raise validation_error('Member must have length less than or equal to 100', 'TransactWriteItems')
+
+        with self.backend.write_transaction():
+            plans = []
+            reasons = []
+            for action in TransactItems:
+                kind, request = next(iter(action.items()))
+                table = self.resource.Table(request['TableName'])
+                storage = table._storage('TransactWriteItems')
+                context = ExpressionContext(names=request.get('ExpressionAttributeNames'),
+                                            values=self._deserialize(request.get('ExpressionAttributeValues')))
+                key_source = self._deserialize(request['Item'] if kind == 'Put' else request['Key'])
+                key = storage.definition.key_of(key_source, 'TransactWriteItems')
+                existing = storage.get(key)
+                condition = request.get('ConditionExpression')
+                if condition and not evaluate_condition(parse_condition(condition), existing or {}, context):
+                    reason = {'Code': 'ConditionalCheckFailed', 'Message': 'The conditional request failed'}
+                    if request.get('ReturnValuesOnConditionCheckFailure') == 'ALL_OLD' and existing is not None:
+                        reason['Item'] = {name: _serializer.serialize(value) for name, value in existing.items()}
+                    reasons.append(reason)
+                else:
+                    reasons.append({'Code': 'None'})
+                plans.append((kind, request, storage, key, key_source, existing, context))
+
+            if any(reason['Code'] != 'None' for reason in reasons):
+                codes = ', '.join(reason['Code'] for reason in reasons)
+                raise _client_error('TransactionCanceledException',
+                                    f'Transaction cancelled, please refer cancellation reasons for specific '
+                                    f'reasons [{codes}]', 'TransactWriteItems', CancellationReasons=reasons)
+
+            for kind, request, storage, key, key_source, existing, context in plans:
+                if kind == 'Put':
+                    storage.put(key, key_source, existing)
+                elif kind == 'Delete':
+                    storage.delete(key, existing)
+                elif kind == 'Update':
+                    updated = _copy_item(existing) if existing is not None else dict(key_source)
+                    apply_update(parse_update(request['UpdateExpression']), updated, context)
+                    storage.put(key, updated, existing)
+        return {}
+
+    def batch_write_item(self, RequestItems, **_):
+        """
+        Typed BatchWriteItem; every request is processed, so UnprocessedItems is always empty.
+        """
+        untyped = {}
+        for table_name, requests in RequestItems.items():
+            untyped[table_name] = []
+            for request in requests:
+                if 'PutRequest' in request:
+                    untyped[table_name].append({'PutRequest': {'Item': self._deserialize(
+                        request['PutRequest']['Item'])}})
+                else:
+                    untyped[table_name].append({'DeleteRequest': {'Key': self._deserialize(
+                        request['DeleteRequest']['Key'])}})
+        self.resource.batch_write_item(RequestItems=untyped)
+        return {'UnprocessedItems': {}}
+
+
+class EmbeddedDynamoDbResource:
+    """
+    A stand-in for boto3's DynamoDB ServiceResource backed by an embedded store: `InMemoryBackend` for DB_MODE=MEMORY,
+    `SqliteBackend` for DB_MODE=SQLITE.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.meta = SimpleNamespace(client=None)
+        self.meta.client = EmbeddedDynamoDbClient(self)
+
+    def Table(self, name: str):
+        return EmbeddedTable(resource=self, name=name)
+
+    def create_table(self, **kwargs):
+        self.meta.client.create_table(**kwargs)
+        return self.Table(kwargs['TableName'])
+
+    def batch_write_item(self, RequestItems, ReturnConsumedCapacity=None, **_):
+        """
+        Untyped BatchWriteItem (the resource-level action); at most 25 requests, none left unprocessed.
+        """
+        if sum(len(requests) for requests in RequestItems.values()) > BATCH_WRITER_FLUSH_AMOUNT:
+            raise validation_error('Too many items requested for the BatchWriteItem call', 'BatchWriteItem')
+
+        consumed = []
+        with self.backend.write_transaction():
+            for table_name, requests in RequestItems.items():
+                table = self.Table(table_name)
+                size = 0
+                for request in requests:
+                    if 'PutRequest' in request:
+                        table.put_item(Item=request['PutRequest']['Item'])
+                        size += item_size(request['PutRequest']['Item'])
+                    else:
+                        table.delete_item(Key=request['DeleteRequest']['Key'])
+                consumed.append({'TableName': table_name, 'CapacityUnits': max(1, math.ceil(size / 1024))})
+
+        response = {'UnprocessedItems': {}}
+        if ReturnConsumedCapacity and ReturnConsumedCapacity != 'NONE':
+            response['ConsumedCapacity'] = consumed
+        return response
+
+    def batch_get_item(self, RequestItems, **_):
+        responses = {}
+        for table_name, request in RequestItems.items():
+            table = self.Table(table_name)
+            responses[table_name] = [item for item in
+                                     (table.get_item(Key=key).get('Item') for key in request['Keys']) if item]
+        return {'Responses': responses, 'UnprocessedKeys': {}}
+
+
+def serialize_item(item: dict):
+    """
+    Converts a Python item into DynamoDB's typed AttributeValue form, for low-level client calls.
+    """
+    return {name: _serializer.serialize(value) for name, value in item.items()}
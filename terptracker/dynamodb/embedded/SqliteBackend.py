@@ -0,0 +1,281 @@
+import json
+import os
+import pickle
+import sqlite3
+import threading
+from contextlib import contextmanager
+from decimal import Decimal
+from terptracker.dynamodb.embedded.EmbeddedDynamoDb import TableDefinition
+
+# Layout of the database file (DB_MODE=SQLITE):
+#   embedded_tables(name, description)       - the DescribeTable output of every table, as JSON
+#   "t:<table>"(pk, sk, item)                 - one per table, WITHOUT ROWID with PRIMARY KEY (pk, sk). The clustered
+#                                               primary key is the covering index on (partition key, sort key), e.g.
+#                                               (userEmail, expenseTimestamp) for USER_EXPENSES, so a Query is one
+#                                               range scan of that b-tree and never a second lookup
+#   "i:<table>:<index>"(ipk, isk, pk, sk)     - one per global secondary index; only items carrying the index keys
+#                                               have an entry (sparse, like DynamoDB), joined back to "t:<table>"
+# Key attributes are stored as native SQLite values so the b-trees order them the way DynamoDB does (numbers
+# numerically, strings and binary bytewise); items are pickled whole, so the file must only be writable by the app.
+_SQLITE_MAX_INTEGER = 2 ** 63
+
+
+def _sql_key(value):
+    """
+    Converts a key attribute value into the SQLite value it is stored and compared as.
+    """
+    if isinstance(value, Decimal):
+        if value == value.to_integral_value() and abs(value) < _SQLITE_MAX_INTEGER:
+            return int(value)
+        return float(value)
+    return value
+
+
+def _quote(identifier: str):
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+def _range_clauses(column: str, sort_range):
+    """
+    Translates a SortKeyRange into SQL conditions on `column`, so the range is a seek rather than a filter.
+    """
+    clauses, params = [], []
+    if sort_range.low is not None:
+        clauses.append(f'{column} {">=" if sort_range.low_inclusive else ">"} ?')
+        params.append(_sql_key(sort_range.low))
+    if sort_range.high is not None:
+        clauses.append(f'{column} {"<=" if sort_range.high_inclusive else "<"} ?')
+        params.append(_sql_key(sort_range.high))
+    if sort_range.prefix is not None:
+        # The lower bound lets SQLite seek to the first match; substr keeps only the matches
+        clauses.append(f'{column} >= ? AND substr({column}, 1, ?) = ?')
+        params.extend([sort_range.prefix, len(sort_range.prefix), sort_range.prefix])
+    return clauses, params
+
+
+class SqliteStorage:
+    """
+    Stores one embedded table in a SQLite database shared by every thread and worker process on the host, with the
+    same interface as `InMemoryStorage`. Every read unpickles a fresh item, so callers need not copy them.
+    """
+
+    copies_items = True
+
+    def __init__(self, backend, definition: TableDefinition):
+        self.backend = backend
+        self.definition = definition
+        self.items_table = _quote(f't:{definition.name}')
+        # Statements are built once per table, so the connection's statement cache keeps them prepared
+        self._get_sql = f'SELECT item FROM {self.items_table} WHERE pk = ? AND sk = ?'
+        self._put_sql = f'INSERT OR REPLACE INTO {self.items_table} (pk, sk, item) VALUES (?, ?, ?)'
+        self._delete_sql = f'DELETE FROM {self.items_table} WHERE pk = ? AND sk = ?'
+
+    @staticmethod
+    def index_table(table_name: str, index_name: str):
+        return _quote(f'i:{table_name}:{index_name}')
+
+    def _connection(self):
+        return self.backend.connection()
+
+    def create(self):
+        connection = self._connection()
+        connection.execute(f'CREATE TABLE IF NOT EXISTS {self.items_table} '
+                           f'(pk NOT NULL, sk NOT NULL, item BLOB NOT NULL, PRIMARY KEY (pk, sk)) WITHOUT ROWID')
+        for index_name in self.definition.indexes:
+            self.create_index(index_name)
+
+    def create_index(self, index_name: str):
+        self._connection().execute(f'CREATE TABLE IF NOT EXISTS {self.index_table(self.definition.name, index_name)} '
+                                   f'(ipk NOT NULL, isk NOT NULL, pk NOT NULL, sk NOT NULL, '
+                                   f'PRIMARY KEY (ipk, isk, pk, sk)) WITHOUT ROWID')
+
+    def drop(self, index_names=None):
+        connection = self._connection()
+        for index_name in self.definition.indexes if index_names is None else index_names:
+            connection.execute(f'DROP TABLE IF EXISTS {self.index_table(self.definition.name, index_name)}')
+        if index_names is None:
+            connection.execute(f'DROP TABLE IF EXISTS {self.items_table}')
+
+    @property
+    def count(self):
+        return self._connection().execute(f'SELECT COUNT(*) FROM {self.items_table}').fetchone()[0]
+
+    def get(self, key: tuple):
+        row = self._connection().execute(self._get_sql, (_sql_key(key[0]), _sql_key(key[1]))).fetchone()
+        return pickle.loads(row[0]) if row else None
+
+    def put(self, key: tuple, item: dict, old_item: dict = None):
+        self._connection().execute(self._put_sql, (_sql_key(key[0]), _sql_key(key[1]),
+                                                   pickle.dumps(item, protocol=pickle.HIGHEST_PROTOCOL)))
+        self._update_indexes(key, old_item, item)
+
+    def delete(self, key: tuple, old_item: dict):
+        if self._connection().execute(self._delete_sql, (_sql_key(key[0]), _sql_key(key[1]))).rowcount:
+            self._update_indexes(key, old_item, None)
+
+    def _update_indexes(self, key: tuple, old_item: dict, new_item: dict):
+        connection = self._connection()
+        row_key = (_sql_key(key[0]), _sql_key(key[1]))
+        for name, index in self.definition.indexes.items():
+            old_index_key = self.definition.index_key_of(index, old_item) if old_item else None
+            new_index_key = self.definition.index_key_of(index, new_item) if new_item else None
+            if old_index_key == new_index_key:
+                continue
+            index_table = self.index_table(self.definition.name, name)
+            if old_index_key:
+                connection.execute(f'DELETE FROM {index_table} WHERE ipk = ? AND isk = ? AND pk = ? AND sk = ?',
+                                   (_sql_key(old_index_key[0]), _sql_key(old_index_key[1])) + row_key)
+            if new_index_key:
+                connection.execute(f'INSERT OR REPLACE INTO {index_table} (ipk, isk, pk, sk) VALUES (?, ?, ?, ?)',
+                                   (_sql_key(new_index_key[0]), _sql_key(new_index_key[1])) + row_key)
+
+    def rebuild_index(self, index_name: str):
+        index = self.definition.indexes[index_name]
+        index_table = self.index_table(self.definition.name, index_name)
+        self.create_index(index_name)
+        connection = self._connection()
+        connection.execute(f'DELETE FROM {index_table}')
+        entries = []
+        for pk, sk, blob in connection.execute(f'SELECT pk, sk, item FROM {self.items_table}').fetchall():
+            index_key = self.definition.index_key_of(index, pickle.loads(blob))
+            if index_key:
+                entries.append((_sql_key(index_key[0]), _sql_key(index_key[1]), pk, sk))
+        connection.executemany(f'INSERT INTO {index_table} (ipk, isk, pk, sk) VALUES (?, ?, ?, ?)', entries)
+
+    def _iter_rows(self, sql: str, params: list):
+        cursor = self._connection().execute(sql, params)
+        try:
+            for row in cursor:
+                yield pickle.loads(row[0])
+        finally:
+            cursor.close()
+
+    def iter_partition(self, partition_key, sort_range, forward: bool, start_after):
+        clauses, params = _range_clauses('sk', sort_range)
+        if start_after is not None:
+            clauses.append(f'sk {">" if forward else "<"} ?')
+            params.append(_sql_key(start_after))
+        where = ''.join(f' AND {clause}' for clause in clauses)
+        return self._iter_rows(f'SELECT item FROM {self.items_table} WHERE pk = ?{where} '
+                               f'ORDER BY sk {"ASC" if forward else "DESC"}', [_sql_key(partition_key)] + params)
+
+    def iter_index(self, index_name: str, partition_key, sort_range, forward: bool, start_after):
+        clauses, params = _range_clauses('i.isk', sort_range)
+        if start_after is not None:
+            clauses.append(f'(i.isk, i.pk, i.sk) {">" if forward else "<"} (?, ?, ?)')
+            params.extend([_sql_key(start_after[0]), _sql_key(start_after[1][0]), _sql_key(start_after[1][1])])
+        where = ''.join(f' AND {clause}' for clause in clauses)
+        direction = 'ASC' if forward else 'DESC'
+        return self._iter_rows(f'SELECT t.item FROM {self.index_table(self.definition.name, index_name)} i '
+                               f'JOIN {self.items_table} t ON t.pk = i.pk AND t.sk = i.sk WHERE i.ipk = ?{where} '
+                               f'ORDER BY i.isk {direction}, i.pk {direction}, i.sk {direction}',
+                               [_sql_key(partition_key)] + params)
+
+    def iter_all(self, start_after):
+        if start_after is None:
+            return self._iter_rows(f'SELECT item FROM {self.items_table} ORDER BY pk, sk', [])
+        return self._iter_rows(f'SELECT item FROM {self.items_table} WHERE (pk, sk) > (?, ?) ORDER BY pk, sk',
+                               [_sql_key(start_after[0]), _sql_key(start_after[1])])
+
+
+class SqliteBackend:
+    """
+    Keeps every embedded table in one SQLite file, so all threads and worker processes of a single-node deployment
+    share the data and it survives restarts. Each thread (and forked process) opens its own connection; the database
+    runs in WAL mode so reads never wait for the writer.
+
+    Writes run in `BEGIN IMMEDIATE` transactions, which serialize writers across processes and make
+    TransactWriteItems atomic. Reads run on their own statement's snapshot unless they are part of a write.
+    """
+
+    def __init__(self, path: str, busy_timeout_seconds: float = 5):
+        self.path = path
+        self.busy_timeout_seconds = busy_timeout_seconds
+        self._local = threading.local()
+        self._storages = {}
+
+    def connection(self):
+        """
+        Returns:
+            sqlite3.Connection: This thread's connection, opened (and the metadata table created) on first use.
+        """
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=self.busy_timeout_seconds, isolation_level=None,
+                                         check_same_thread=False, cached_statements=256)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute('CREATE TABLE IF NOT EXISTS embedded_tables (name TEXT PRIMARY KEY, description TEXT)')
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+            self._local.depth = 0
+        return connection
+
+    @contextmanager
+    def write_transaction(self):
+        connection = self.connection()
+        if self._local.depth:
+            # Nested in another write (e.g. a batch write's puts): part of the outer transaction
+            self._local.depth += 1
+            try:
+                yield
+            finally:
+                self._local.depth -= 1
+            return
+
+        connection.execute('BEGIN IMMEDIATE')
+        self._local.depth = 1
+        try:
+            yield
+        except BaseException:
+            self._local.depth = 0
+            connection.execute('ROLLBACK')
+            raise
+        self._local.depth = 0
+        connection.execute('COMMIT')
+
+    @contextmanager
+    def read_transaction(self):
+        # Each read is a single statement, which SQLite runs on a consistent snapshot by itself
+        yield
+
+    def table_names(self):
+        return [row[0] for row in self.connection().execute('SELECT name FROM embedded_tables ORDER BY name')]
+
+    def get_table(self, table_name: str):
+        row = self.connection().execute('SELECT description FROM embedded_tables WHERE name = ?',
+                                        (table_name,)).fetchone()
+        if row is None:
+            self._storages.pop(table_name, None)
+            return None
+        # Re-parse only when the stored description changed, e.g. another process added an index
+        cached = self._storages.get(table_name)
+        if cached is None or cached[0] != row[0]:
+            cached = (row[0], SqliteStorage(backend=self, definition=TableDefinition(json.loads(row[0]))))
+            self._storages[table_name] = cached
+        return cached[1]
+
+    def _save_definition(self, definition: TableDefinition):
+        self.connection().execute('INSERT OR REPLACE INTO embedded_tables (name, description) VALUES (?, ?)',
+                                  (definition.name, json.dumps(definition.description)))
+
+    def create_table(self, definition: TableDefinition):
+        with self.write_transaction():
+            SqliteStorage(backend=self, definition=definition).create()
+            self._save_definition(definition)
+
+    def update_definition(self, definition: TableDefinition, created_indexes=()):
+        with self.write_transaction():
+            storage = self.get_table(definition.name)
+            storage.drop(index_names=[name for name in storage.definition.indexes if name not in definition.indexes])
+            self._save_definition(definition)
+            storage = SqliteStorage(backend=self, definition=definition)
+            for name in created_indexes:
+                storage.rebuild_index(name)
+
+    def delete_table(self, table_name: str):
+        with self.write_transaction():
+            storage = self.get_table(table_name)
+            if storage is not None:
+                storage.drop()
+                self.connection().execute('DELETE FROM embedded_tables WHERE name = ?', (table_name,))
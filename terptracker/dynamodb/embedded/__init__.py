@@ -0,0 +1,3 @@
+from .EmbeddedDynamoDb import (EmbeddedDynamoDbResource, EmbeddedDynamoDbClient, EmbeddedTable, InMemoryBackend,
+                               normalize_value, serialize_item)
+from .SqliteBackend import SqliteBackend
@@ -0,0 +1,510 @@
+import re
+from decimal import Decimal
+from boto3.dynamodb.conditions import ConditionBase, ConditionExpressionBuilder
+from botocore.exceptions import ClientError
+
+# Parsing and evaluation of the DynamoDB expression language (condition, key condition, filter, update and projection
+# expressions) for the embedded backends. boto3 condition objects (Key(...), Attr(...)) are first rendered to
+# expression strings with boto3's own builder, so both forms behave the same way.
+
+_TOKEN_PATTERN = re.compile(r'''
+    (?P<ws>\s+)
+  | (?P<op><>|<=|>=|=|<|>|\(|\)|,|\+|-)
+  | (?P<value>:[A-Za-z0-9_]+)
+  | (?P<path>[#A-Za-z_][#A-Za-z0-9_]*(?:\[\d+\])*(?:\.[#A-Za-z_][#A-Za-z0-9_]*(?:\[\d+\])*)*)
+''', re.VERBOSE)
+
+_KEYWORDS = {'AND', 'OR', 'NOT', 'BETWEEN', 'IN', 'SET', 'ADD', 'REMOVE', 'DELETE'}
+_FUNCTIONS = {'attribute_exists', 'attribute_not_exists', 'attribute_type', 'begins_with', 'contains', 'size',
+              'if_not_exists', 'list_append'}
+_COMPARATORS = {'=', '<>', '<', '<=', '>', '>='}
+
+
+def validation_error(message: str, operation_name: str = 'Unknown'):
+    return ClientError({'Error': {'Code': 'ValidationException', 'Message': message}}, operation_name)
+
+
+def conditional_check_failed(operation_name: str):
+    return ClientError({'Error': {'Code': 'ConditionalCheckFailedException',
+                                  'Message': 'The conditional request failed'}}, operation_name)
+
+
+class ExpressionContext:
+    """
+    Holds the ExpressionAttributeNames and ExpressionAttributeValues of one request, and renders boto3 condition
+    objects into expression strings with a single builder so their placeholders never collide.
+    """
+
+    def __init__(self, names: dict = None, values: dict = None):
+        self.names = dict(names or {})
+        self.values = dict(values or {})
+        self._builder = ConditionExpressionBuilder()
+
+    def render(self, expression, is_key_condition: bool = False):
+        """
+        Returns:
+            str | None: The expression as a string (boto3 condition objects are rendered; strings pass through).
+        """
+        if expression is None or isinstance(expression, str):
+            return expression
+        if isinstance(expression, ConditionBase):
+            built = self._builder.build_expression(expression, is_key_condition=is_key_condition)
+            self.names.update(built.attribute_name_placeholders)
+            self.values.update(built.attribute_value_placeholders)
+            return built.condition_expression
+        raise validation_error(f'Unsupported expression type {type(expression).__name__}')
+
+    def resolve_path(self, path: str):
+        """
+        Splits a document path into its segments, substituting #name placeholders.
+
+        Returns:
+            list[str | int]: Attribute names and list indexes, e.g. ['a', 'b', 0] for 'a.b[0]'.
+        """
+        segments = []
+        for part in path.split('.'):
+            name, _, indexes = part.partition('[')
+            if name.startswith('#'):
+                if name not in self.names:
+                    raise validation_error(f'An expression attribute name used in the document path is not '
+                                           f'defined; attribute name: {name}')
+                name = self.names[name]
+            segments.append(name)
+            if indexes:
+                segments.extend(int(index) for index in re.findall(r'\d+', '[' + indexes))
+        return segments
+
+    def value(self, placeholder: str):
+        if placeholder not in self.values:
+            raise validation_error(f'An expression attribute value used in expression is not defined; '
+                                   f'attribute value: {placeholder}')
+        return self.values[placeholder]
+
+
+def _tokenize(expression: str):
+    tokens = []
+    position = 0
+    while position < len(expression):
+        match = _TOKEN_PATTERN.match(expression, position)
+        if not match:
+            raise validation_error(f'Invalid expression: unexpected token near "{expression[position:]}"')
+        position = match.end()
+        kind = match.lastgroup
+        if kind == 'ws':
+            continue
+        text = match.group(kind)
+        if kind == 'path' and text.upper() in _KEYWORDS:
+            tokens.append(('keyword', text.upper()))
+        elif kind == 'path' and text in _FUNCTIONS:
+            tokens.append(('function', text))
+        else:
+            tokens.append((kind, text))
+    return tokens
+
+
+class _Parser:
+
+    def __init__(self, expression: str):
+        self.tokens = _tokenize(expression)
+        self.position = 0
+
+    def peek(self, offset: int = 0):
+        index = self.position + offset
+        return self.tokens[index] if index < len(self.tokens) else (None, None)
+
+    def take(self, kind: str = None, text: str = None):
+        token = self.peek()
+        if (kind and token[0] != kind) or (text and token[1] != text):
+            raise validation_error(f'Invalid expression: expected {text or kind}, found {token[1]}')
+        self.position += 1
+        return token
+
+    def at_end(self):
+        return self.position >= len(self.tokens)
+
+    # Condition expressions
+    def condition(self):
+        node = self.conjunction()
+        while self.peek() == ('keyword', 'OR'):
+            self.take()
+            node = ('or', node, self.conjunction())
+        return node
+
+    def conjunction(self):
+        node = self.negation()
+        while self.peek() == ('keyword', 'AND'):
+            self.take()
+            node = ('and', node, self.negation())
+        return node
+
+    def negation(self):
+        if self.peek() == ('keyword', 'NOT'):
+            self.take()
+            return ('not', self.negation())
+        return self.predicate()
+
+    def predicate(self):
+        kind, text = self.peek()
+        if kind == 'op' and text == '(':
+            self.take()
+            node = self.condition()
+            self.take('op', ')')
+            return node
+        if kind == 'function' and text != 'size':
+            return self.function_call()
+
+        left = self.operand()
+        kind, text = self.peek()
+        if kind == 'op' and text in _COMPARATORS:
+            self.take()
+            return ('compare', text, left, self.operand())
+        if (kind, text) == ('keyword', 'BETWEEN'):
+            self.take()
+            low = self.operand()
+            self.take('keyword', 'AND')
+            return ('between', left, low, self.operand())
+        if (kind, text) == ('keyword', 'IN'):
+            self.take()
+            self.take('op', '(')
+            options = [self.operand()]
+            while self.peek() == ('op', ','):
+                self.take()
+                options.append(self.operand())
+            self.take('op', ')')
+            return ('in', left, options)
+        raise validation_error(f'Invalid expression: expected a comparison, found {text}')
+
+    def function_call(self):
+        _, name = self.take('function')
+        self.take('op', '(')
+        arguments = [self.operand()]
+        while self.peek() == ('op', ','):
+            self.take()
+            arguments.append(self.operand())
+        self.take('op', ')')
+        return ('function', name, arguments)
+
+    def operand(self):
+        kind, text = self.peek()
+        if kind == 'path':
+            self.take()
+            return ('path', text)
+        if kind == 'value':
+            self.take()
+            return ('value', text)
+        if kind == 'function':
+            return self.function_call()
+        raise validation_error(f'Invalid expression: expected an operand, found {text}')
+
+    # Update expressions
+    def update(self):
+        actions = []
+        while not self.at_end():
+            _, clause = self.take('keyword')
+            while True:
+                path = self.take('path')[1]
+                if clause == 'SET':
+                    self.take('op', '=')
+                    value = self.operand()
+                    if self.peek()[0] == 'op' and self.peek()[1] in ('+', '-'):
+                        _, operator = self.take()
+                        value = ('arithmetic', operator, value, self.operand())
+                    actions.append(('SET', path, value))
+                elif clause == 'REMOVE':
+                    actions.append(('REMOVE', path, None))
+                elif clause in ('ADD', 'DELETE'):
+                    actions.append((clause, path, self.operand()))
+                else:
+                    raise validation_error(f'Invalid UpdateExpression: unknown clause {clause}')
+                if self.peek() != ('op', ','):
+                    break
+                self.take()
+        return actions
+
+
+_PARSE_CACHE = {}
+
+
+def parse_condition(expression: str):
+    """
+    Parses a condition, key condition or filter expression into a small tuple-based AST (cached per string).
+    """
+    key = ('condition', expression)
+    if key not in _PARSE_CACHE:
+        parser = _Parser(expression)
+        node = parser.condition()
+        if not parser.at_end():
+            raise validation_error(f'Invalid expression: unexpected trailing token {parser.peek()[1]}')
+        _PARSE_CACHE[key] = node
+    return _PARSE_CACHE[key]
+
+
+def parse_update(expression: str):
+    """
+    Parses an update expression into a list of (clause, path, operand) actions (cached per string).
+    """
+    key = ('update', expression)
+    if key not in _PARSE_CACHE:
+        _PARSE_CACHE[key] = _Parser(expression).update()
+    return _PARSE_CACHE[key]
+
+
+_MISSING = object()
+
+
+def get_path(item: dict, segments: list):
+    current = item
+    for segment in segments:
+        if isinstance(segment, int):
+            if not isinstance(current, list) or segment >= len(current):
+                return _MISSING
+            current = current[segment]
+        else:
+            if not isinstance(current, dict) or segment not in current:
+                return _MISSING
+            current = current[segment]
+    return current
+
+
+def _set_path(item: dict, segments: list, value):
+    current = item
+    for segment in segments[:-1]:
+        current = current[segment]
+    if isinstance(segments[-1], int) and segments[-1] >= len(current):
+        current.append(value)
+    else:
+        current[segments[-1]] = value
+
+
+def _remove_path(item: dict, segments: list):
+    parent = get_path(item, segments[:-1]) if len(segments) > 1 else item
+    if parent is _MISSING:
+        return
+    try:
+        del parent[segments[-1]]
+    except (KeyError, IndexError):
+        pass
+
+
+def _type_code(value):
+    if isinstance(value, str):
+        return 'S'
+    if isinstance(value, bool):
+        return 'BOOL'
+    if isinstance(value, (int, Decimal)):
+        return 'N'
+    if isinstance(value, (bytes, bytearray)):
+        return 'B'
+    if value is None:
+        return 'NULL'
+    if isinstance(value, dict):
+        return 'M'
+    if isinstance(value, list):
+        return 'L'
+    if isinstance(value, set):
+        sample = next(iter(value), '')
+        return {'S': 'SS', 'N': 'NS', 'B': 'BS'}.get(_type_code(sample), 'SS')
+    return 'S'
+
+
+def _operand_value(node, item: dict, context: ExpressionContext):
+    kind = node[0]
+    if kind == 'path':
+        return get_path(item, context.resolve_path(node[1]))
+    if kind == 'value':
+        return context.value(node[1])
+    if kind == 'function' and node[1] == 'size':
+        value = _operand_value(node[2][0], item, context)
+        if value is _MISSING:
+            return _MISSING
+        return Decimal(len(value.encode('utf-8') if isinstance(value, str) else value))
+    if kind == 'function' and node[1] == 'if_not_exists':
+        existing = _operand_value(node[2][0], item, context)
+        return _operand_value(node[2][1], item, context) if existing is _MISSING else existing
+    if kind == 'function' and node[1] == 'list_append':
+        first = _operand_value(node[2][0], item, context)
+        second = _operand_value(node[2][1], item, context)
+        return list(first if first is not _MISSING else []) + list(second if second is not _MISSING else [])
+    if kind == 'arithmetic':
+        left = _operand_value(node[2], item, context)
+        right = _operand_value(node[3], item, context)
+        if left is _MISSING or right is _MISSING:
+            raise validation_error('The provided operand for an arithmetic operation does not exist in the item')
+        return left + right if node[1] == '+' else left - right
+    raise validation_error(f'Unsupported operand {node}')
+
+
+def _comparable(left, right):
+    return left is not _MISSING and right is not _MISSING and _type_code(left) == _type_code(right)
+
+
+def evaluate_condition(node, item: dict, context: ExpressionContext):
+    """
+    Evaluates a parsed condition against an item (an empty dict stands for a missing item).
+
+    Returns:
+        bool: Whether the condition holds.
+    """
+    kind = node[0]
+    if kind == 'and':
+        return evaluate_condition(node[1], item, context) and evaluate_condition(node[2], item, context)
+    if kind == 'or':
+        return evaluate_condition(node[1], item, context) or evaluate_condition(node[2], item, context)
+    if kind == 'not':
+        return not evaluate_condition(node[1], item, context)
+    if kind == 'compare':
+        operator = node[1]
+        left = _operand_value(node[2], item, context)
+        right = _operand_value(node[3], item, context)
+        if operator == '<>':
+            return left is _MISSING or right is _MISSING or left != right
+        if not _comparable(left, right):
+            return False
+        return {'=': left == right, '<': left < right, '<=': left <= right,
+                '>': left > right, '>=': left >= right}[operator]
+    if kind == 'between':
+        value = _operand_value(node[1], item, context)
+        low = _operand_value(node[2], item, context)
+        high = _operand_value(node[3], item, context)
+        return _comparable(value, low) and _comparable(value, high) and low <= value <= high
+    if kind == 'in':
+        value = _operand_value(node[1], item, context)
+        return value is not _MISSING and any(value == _operand_value(option, item, context) for option in node[2])
+    if kind == 'function':
+        name, arguments = node[1], node[2]
+        if name == 'attribute_exists':
+            return _operand_value(arguments[0], item, context) is not _MISSING
+        if name == 'attribute_not_exists':
+            return _operand_value(arguments[0], item, context) is _MISSING
+        if name == 'attribute_type':
+            value = _operand_value(arguments[0], item, context)
+            return value is not _MISSING and _type_code(value) == _operand_value(arguments[1], item, context)
+        if name == 'begins_with':
+            value = _operand_value(arguments[0], item, context)
+            prefix = _operand_value(arguments[1], item, context)
+            return _comparable(value, prefix) and value[:len(prefix)] == prefix
+        if name == 'contains':
+            value = _operand_value(arguments[0], item, context)
+            operand = _operand_value(arguments[1], item, context)
+            if value is _MISSING or operand is _MISSING:
+                return False
+            return operand in value if isinstance(value, (str, list, set)) else False
+    raise validation_error(f'Unsupported condition {node}')
+
+
+def apply_update(actions: list, item: dict, context: ExpressionContext):
+    """
+    Applies parsed update actions to `item` in place.
+    """
+    for clause, path, operand in actions:
+        segments = context.resolve_path(path)
+        if clause == 'SET':
+            _set_path(item, segments, _operand_value(operand, item, context))
+        elif clause == 'REMOVE':
+            _remove_path(item, segments)
+        elif clause == 'ADD':
+            increment = _operand_value(operand, item, context)
+            existing = get_path(item, segments)
+            if existing is _MISSING:
+                _set_path(item, segments, increment)
+            elif isinstance(existing, set):
+                _set_path(item, segments, existing | set(increment))
+            else:
+                _set_path(item, segments, existing + increment)
+        elif clause == 'DELETE':
+            existing = get_path(item, segments)
+            if isinstance(existing, set):
+                remaining = existing - set(_operand_value(operand, item, context))
+                if remaining:
+                    _set_path(item, segments, remaining)
+                else:
+                    _remove_path(item, segments)
+
+
+def project(item: dict, projection_expression: str, context: ExpressionContext):
+    """
+    Returns a copy of `item` with only the top-level attributes named in a ProjectionExpression.
+    """
+    if not projection_expression:
+        return item
+    projected = {}
+    for path in projection_expression.split(','):
+        name = context.resolve_path(path.strip())[0]
+        if name in item:
+            projected[name] = item[name]
+    return projected
+
+
+class SortKeyRange:
+    """
+    The sort key restriction of a key condition, expressed as optional bounds and/or a prefix so storage engines can
+    seek instead of filtering.
+    """
+
+    def __init__(self, low=None, low_inclusive=True, high=None, high_inclusive=True, prefix=None):
+        self.low = low
+        self.low_inclusive = low_inclusive
+        self.high = high
+        self.high_inclusive = high_inclusive
+        self.prefix = prefix
+
+    def contains(self, value):
+        if self.low is not None and (value < self.low or (value == self.low and not self.low_inclusive)):
+            return False
+        if self.high is not None and (value > self.high or (value == self.high and not self.high_inclusive)):
+            return False
+        if self.prefix is not None and value[:len(self.prefix)] != self.prefix:
+            return False
+        return True
+
+
+def split_key_condition(node, hash_key: str, range_key: str, context: ExpressionContext):
+    """
+    Splits a parsed KeyConditionExpression into the partition key value and the sort key range.
+
+    Returns:
+        tuple: (partition key value, SortKeyRange)
+    """
+    conditions = []
+
+    def flatten(current):
+        if current[0] == 'and':
+            flatten(current[1])
+            flatten(current[2])
+        else:
+            conditions.append(current)
+
+    flatten(node)
+    partition_value = _MISSING
+    sort_range = SortKeyRange()
+    for condition in conditions:
+        if condition[0] == 'compare' and condition[2][0] == 'path':
+            attribute = context.resolve_path(condition[2][1])[0]
+            value = _operand_value(condition[3], {}, context)
+            if attribute == hash_key and condition[1] == '=':
+                partition_value = value
+                continue
+            if attribute == range_key:
+                operator = condition[1]
+                if operator == '=':
+                    sort_range.low, sort_range.high = value, value
+                elif operator in ('>', '>='):
+                    sort_range.low, sort_range.low_inclusive = value, operator == '>='
+                elif operator in ('<', '<='):
+                    sort_range.high, sort_range.high_inclusive = value, operator == '<='
+                else:
+                    raise validation_error('Unsupported key condition operator <>', 'Query')
+                continue
+        elif condition[0] == 'between' and context.resolve_path(condition[1][1])[0] == range_key:
+            sort_range.low = _operand_value(condition[2], {}, context)
+            sort_range.high = _operand_value(condition[3], {}, context)
+            continue
+        elif condition[0] == 'function' and condition[1] == 'begins_with' \
+                and context.resolve_path(condition[2][0][1])[0] == range_key:
+            sort_range.prefix = _operand_value(condition[2][1], {}, context)
+            continue
+        raise validation_error('Query key condition not supported', 'Query')
+
+    if partition_value is _MISSING:
+        raise validation_error(f'Query condition missed key schema element: {hash_key}', 'Query')
+    return partition_value, sort_range
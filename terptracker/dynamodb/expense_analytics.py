@@ -0,0 +1,286 @@
+import calendar
+import numpy as np
+from datetime import datetime, timezone
+from terptracker.dynamodb.dynamodb_helpers import ExpenseQuery, plan_expense_query, run_query_plan_pages
+from terptracker.dynamodb.expense_schema import expense_amount_cents, expense_epoch_micros
+from terptracker.dynamodb.write_behind import with_pending_pages
+
+# Trend responses also load this many months before the requested range, so month-over-month, year-over-year and
+# rolling figures are defined from the first requested month on
+LOOKBACK_MONTHS = 12
+MAX_ROLLING_WINDOW = LOOKBACK_MONTHS
+# The linear spend projection is fitted to at most this many of the latest complete months
+PROJECTION_FIT_MONTHS = 12
+
+_ANALYTICS_ATTRIBUTES = ('expenseTimestamp', 'expenseEpochMicros', 'expenseAmountCents', 'expenseAmount',
+                         'expenseCategory')
+
+
+class ExpenseColumns:
+    """
+    A user's expenses as parallel NumPy columns: int64 epoch microseconds, int64 amounts in cents and an int32 code
+    into `categories`. Items are converted once, page by page, while loading; every aggregate after that is a
+    vectorized pass over the columns.
+    """
+
+    def __init__(self, epoch_micros: np.ndarray, amount_cents: np.ndarray, category_codes: np.ndarray,
+                 categories: list):
+        self.epoch_micros = epoch_micros
+        self.amount_cents = amount_cents
+        self.category_codes = category_codes
+        self.categories = categories
+
+    @classmethod
+    def from_pages(cls, pages):
+        """
+        Builds the columns from pages of USER_EXPENSES items (v1 or v2).
+
+        Args:
+            pages: An iterable of item lists, e.g. the 'Items' of each query page.
+
+        Returns:
+            ExpenseColumns: The columns, in the order the items were read.
+        """
+        micros_chunks, cents_chunks, category_chunks = [], [], []
+        for items in pages:
+            if not items:
+                continue
+            micros_chunks.append(np.fromiter((expense_epoch_micros(item) for item in items), dtype=np.int64,
+                                             count=len(items)))
+            cents_chunks.append(np.fromiter((expense_amount_cents(item) for item in items), dtype=np.int64,
+                                            count=len(items)))
+            category_chunks.append(np.array([item.get('expenseCategory') or 'other' for item in items],
+                                            dtype=object))
+        if not micros_chunks:
+            return cls(epoch_micros=np.empty(0, dtype=np.int64), amount_cents=np.empty(0, dtype=np.int64),
+                       category_codes=np.empty(0, dtype=np.int32), categories=[])
+
+        categories, category_codes = np.unique(np.concatenate(category_chunks), return_inverse=True)
+        return cls(epoch_micros=np.concatenate(micros_chunks), amount_cents=np.concatenate(cents_chunks),
+                   category_codes=category_codes.astype(np.int32).ravel(), categories=categories.tolist())
+
+    def __len__(self):
+        return len(self.epoch_micros)
+
+    def month_numbers(self):
+        """
+        Returns:
+            np.ndarray: Each expense's UTC calendar month as months since 1970-01 (int64).
+        """
+        return self.epoch_micros.astype('datetime64[us]').astype('datetime64[M]').astype(np.int64)
+
+
+def month_number(month_year: str):
+    """
+    Converts 'YYYY-MM' into months since 1970-01.
+    """
+    return int(np.datetime64(month_year, 'M').astype(np.int64))
+
+
+def month_label(number: int):
+    """
+    Converts months since 1970-01 back into 'YYYY-MM'.
+    """
+    return str(np.datetime64(int(number), 'M'))
+
+
+def shift_month(month_year: str, months: int):
+    """
+    Returns the month `months` after (or before, if negative) 'YYYY-MM'.
+    """
+    return month_label(month_number(month_year) + months)
+
+
+def expense_range_query(user_email: str, start_month: str, end_month: str, category: str = None,
+                        expense_type: str = None):
+    """
+    Builds the logical read of the user's expenses from the first day of `start_month` through the last day of
+    `end_month`, optionally in one category or of one type, reading only the attributes the analytics columns
+    need. Trends are not cached, so the read may be eventually consistent (half the read capacity).
+    """
+    return ExpenseQuery.for_months(user_email=user_email, start_month=start_month, end_month=end_month,
+                                   category=category, expense_type=expense_type, attributes=_ANALYTICS_ATTRIBUTES,
+                                   label='trends')
+
+
+def load_expense_columns(user_expenses_table, user_email: str, start_month: str, end_month: str,
+                         category: str = None, expense_type: str = None, pending_items: list = ()):
+    """
+    Queries a user's expenses for a range of months into columns, one page at a time.
+
+    Args:
+        category (str, optional): Only load expenses in this category.
+        expense_type (str, optional): Only load expenses of this type.
+        pending_items (list[dict]): The user's items still in the write-behind queue; those outside the range are
+            ignored by the month bucketing.
+
+    Returns:
+        ExpenseColumns: The user's expenses in the range.
+    """
+    query = expense_range_query(user_email=user_email, start_month=start_month, end_month=end_month,
+                                category=category, expense_type=expense_type)
+    pages = run_query_plan_pages(user_expenses_table, plan_expense_query(query))
+    pending_items = [item for item in pending_items if query.matches(item)]
+    return ExpenseColumns.from_pages(page.get('Items', []) for page in with_pending_pages(pages, pending_items))
+
+
+async def async_load_expense_columns(user_expenses_table, user_email: str, start_month: str, end_month: str,
+                                     category: str = None, expense_type: str = None, pending_items: list = ()):
+    """
+    Async counterpart of `load_expense_columns`.
+    """
+    from terptracker.dynamodb.async_dynamodb_helpers import async_run_query_plan_pages
+
+    query = expense_range_query(user_email=user_email, start_month=start_month, end_month=end_month,
+                                category=category, expense_type=expense_type)
+    pages = [response async for response in async_run_query_plan_pages(user_expenses_table,
+                                                                        plan_expense_query(query))]
+    pending_items = [item for item in pending_items if query.matches(item)]
+    return ExpenseColumns.from_pages(page.get('Items', []) for page in with_pending_pages(pages, pending_items))
+
+
+def monthly_category_totals(columns: ExpenseColumns, first_month: int, month_count: int):
+    """
+    Buckets expenses into a (month, category) grid with two bincount passes.
+
+    Args:
+        columns (ExpenseColumns): The expenses.
+        first_month (int): The first row's month, as months since 1970-01.
+        month_count (int): Number of rows; expenses outside the months are ignored.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Amounts in cents (float64) and item counts (int64), both shaped
+            (month_count, len(columns.categories)).
+    """
+    category_count = len(columns.categories)
+    month_offsets = columns.month_numbers() - first_month
+    in_range = (month_offsets >= 0) & (month_offsets < month_count)
+    cells = month_offsets[in_range] * category_count + columns.category_codes[in_range]
+    size = month_count * category_count
+    amounts = np.bincount(cells, weights=columns.amount_cents[in_range], minlength=size)
+    counts = np.bincount(cells, minlength=size)
+    return amounts.reshape(month_count, category_count), counts.reshape(month_count, category_count)
+
+
+def percent_change(current: np.ndarray, previous: np.ndarray):
+    """
+    Returns:
+        np.ndarray: 100 * (current - previous) / previous, NaN where previous is 0.
+    """
+    change = np.full(current.shape, np.nan)
+    np.divide(current - previous, previous, out=change, where=previous != 0)
+    return change * 100
+
+
+def rolling_mean(values: np.ndarray, window: int):
+    """
+    Returns:
+        np.ndarray: The trailing `window`-month mean, NaN until `window` values are available.
+    """
+    means = np.full(values.shape, np.nan)
+    if len(values) >= window:
+        sums = np.cumsum(np.concatenate(([0.0], values)))
+        means[window - 1:] = (sums[window:] - sums[:-window]) / window
+    return means
+
+
+def linear_projection(values: np.ndarray):
+    """
+    Projects the next value of a monthly series with a least-squares line through its latest values.
+
+    Returns:
+        float | None: The projection (never negative), or None with fewer than three values.
+    """
+    values = values[-PROJECTION_FIT_MONTHS:]
+    if len(values) < 3:
+        return None
+    slope, intercept = np.polyfit(np.arange(len(values)), values, 1)
+    return max(0.0, float(slope * len(values) + intercept))
+
+
+def _dollars(cents):
+    if np.ndim(cents) == 0:
+        return None if cents is None or np.isnan(cents) else round(float(cents) / 100, 2)
+    return np.where(np.isnan(cents), None, np.round(cents / 100, 2)).tolist()
+
+
+def _percent(values: np.ndarray):
+    return np.where(np.isnan(values), None, np.round(values, 1)).tolist()
+
+
+def expense_trends(columns: ExpenseColumns, start_month: str, end_month: str, window: int = 3, now: datetime = None):
+    """
+    Computes monthly trends for a range of months: totals and counts, month-over-month and year-over-year deltas, a
+    rolling average, per-category totals and shares, and spend projections.
+
+    Args:
+        columns (ExpenseColumns): The user's expenses from LOOKBACK_MONTHS before `start_month` through
+            `end_month` (see `load_expense_columns`).
+        start_month (str): The first month reported ('YYYY-MM').
+        end_month (str): The last month reported ('YYYY-MM').
+        window (int): Rolling average window, in months (1 to MAX_ROLLING_WINDOW).
+        now (datetime, optional): The current time, used for the month-to-date projection.
+
+    Returns:
+        dict: Month-aligned series (amounts in dollars, changes in percent) plus range totals and projections.
+    """
+    now = now or datetime.now(timezone.utc)
+    first_month = month_number(start_month) - LOOKBACK_MONTHS
+    month_count = month_number(end_month) - first_month + 1
+    amounts, counts = monthly_category_totals(columns, first_month=first_month, month_count=month_count)
+    totals = amounts.sum(axis=1)
+
+    previous_month = np.concatenate(([np.nan], totals[:-1]))
+    previous_year = np.concatenate((np.full(LOOKBACK_MONTHS, np.nan), totals[:-LOOKBACK_MONTHS]))
+    rolling = rolling_mean(totals, window)
+
+    # Drop the lookback months
+    reported = slice(LOOKBACK_MONTHS, None)
+    amounts, counts, totals = amounts[reported], counts[reported], totals[reported]
+    previous_month, previous_year, rolling = previous_month[reported], previous_year[reported], rolling[reported]
+
+    category_totals = amounts.sum(axis=0)
+    range_total = category_totals.sum()
+    order = np.argsort(-category_totals, kind='stable')
+    order = order[category_totals[order] > 0]
+    shares = category_totals[order] / range_total * 100 if range_total else np.zeros(len(order))
+    categories = [columns.categories[code] for code in order]
+
+    months = [month_label(number) for number in range(month_number(start_month), month_number(end_month) + 1)]
+    current_month = now.strftime('%Y-%m')
+    complete_totals = totals[:months.index(current_month)] if current_month in months else totals
+    projection = {
+        'nextMonth': shift_month(end_month, 1),
+        'linearTrend': _dollars(linear_projection(complete_totals)),
+        'currentMonth': None,
+        'monthToDate': None,
+        'runRate': None,
+    }
+    if current_month in months:
+        # Straight-line run rate: spend so far scaled up to the whole month
+        days_in_month = calendar.monthrange(now.year, now.month)[1]
+        month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        elapsed_fraction = max((now - month_start).total_seconds() / (days_in_month * 86400), 1 / days_in_month)
+        month_to_date = totals[months.index(current_month)]
+        projection.update({'currentMonth': current_month, 'monthToDate': _dollars(month_to_date),
+                           'runRate': _dollars(month_to_date / elapsed_fraction)})
+
+    return {
+        'start': start_month,
+        'end': end_month,
+        'window': window,
+        'months': months,
+        'totals': _dollars(totals),
+        'counts': counts.sum(axis=1).tolist(),
+        'momChange': _dollars(totals - previous_month),
+        'momPercent': _percent(percent_change(totals, previous_month)),
+        'yoyChange': _dollars(totals - previous_year),
+        'yoyPercent': _percent(percent_change(totals, previous_year)),
+        'rollingAverage': _dollars(rolling),
+        'totalAmount': _dollars(range_total),
+        'itemCount': int(counts.sum()),
+        'categories': categories,
+        'categoryTotals': dict(zip(categories, _dollars(amounts[:, order].T))),
+        'categoryShares': dict(zip(categories, np.round(shares, 1).tolist())),
+        'projection': projection,
+    }
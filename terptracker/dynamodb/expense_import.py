@@ -0,0 +1,396 @@
+import csv
+import queue
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from decimal import Decimal, InvalidOperation
+from boto3.dynamodb.types import TypeSerializer
+from botocore.exceptions import ClientError
+from terptracker.constants.DynamoDbConstants import DynamoDbConstants
+from terptracker.dynamodb.dynamodb_helpers import stable_hash
+from terptracker.dynamodb.idempotency import rollup_update_action
+from terptracker.dynamodb.rollup_helpers import (accumulate_monthly_rollups, expense_year_month,
+                                                 rollup_delta_update_kwargs)
+from terptracker.dynamodb.expense_schema import SORT_KEY_SUFFIX_LENGTH, new_expense_item, dollars_to_cents
+
+# BatchWriteItem accepts at most 25 put requests per call
+BATCH_SIZE = 25
+# Only the first rejected rows are kept in the report; the rest are just counted
+MAX_REPORTED_REJECTIONS = 100
+
+# Header names accepted for each expense field, compared case-insensitively. Covers the add-expense form names and
+# the usual bank/card export columns.
+COLUMN_ALIASES = {
+    'date': ('date', 'expense_date', 'transaction date', 'trans. date', 'posted date', 'posting date'),
+    'amount': ('amount', 'expense_amount', 'debit', 'transaction amount'),
+    'category': ('category', 'expense_category'),
+    'type': ('type', 'expense_type', 'payment type'),
+    'note': ('note', 'expense_note', 'description', 'memo', 'payee'),
+}
+DATE_FORMATS = ('%Y-%m-%d', '%m/%d/%Y', '%m/%d/%y', '%Y/%m/%d')
+# Errors worth retrying a write after; anything else fails the batch
+_RETRYABLE_ERROR_CODES = ('ProvisionedThroughputExceededException', 'ThrottlingException', 'RequestLimitExceeded',
+                          'InternalServerError', 'TransactionInProgressException')
+
+_serializer = TypeSerializer()
+
+
+class RowRejected(ValueError):
+    """
+    Raised for a CSV row that cannot be converted into an expense; the import skips it and reports why.
+    """
+
+
+class ImportReport:
+    """
+    The outcome of one import: row counts, throughput, retry statistics and the first rejected rows. Rows that were
+    already imported (by an earlier import of the same file) are counted as skipped.
+    """
+
+    def __init__(self):
+        self.rows_read = 0
+        self.rows_imported = 0
+        self.rows_skipped = 0
+        self.rows_rejected = 0
+        self.rows_failed = 0
+        self.batches_written = 0
+        self.write_retries = 0
+        self.months_updated = 0
+        self.months = []
+        self.elapsed_seconds = 0.0
+        self.rejected = []
+
+    def reject(self, row_number: int, reason: str):
+        self.rows_rejected += 1
+        if len(self.rejected) < MAX_REPORTED_REJECTIONS:
+            self.rejected.append({'row': row_number, 'reason': reason})
+
+    @property
+    def rows_per_second(self):
+        return self.rows_imported / self.elapsed_seconds if self.elapsed_seconds else 0.0
+
+    def to_dict(self):
+        return {
+            'rowsRead': self.rows_read,
+            'rowsImported': self.rows_imported,
+            'rowsSkipped': self.rows_skipped,
+            'rowsRejected': self.rows_rejected,
+            'rowsFailed': self.rows_failed,
+            'batchesWritten': self.batches_written,
+            'writeRetries': self.write_retries,
+            'monthsUpdated': self.months_updated,
+            'elapsedSeconds': round(self.elapsed_seconds, 3),
+            'rowsPerSecond': round(self.rows_per_second, 1),
+            'rejected': list(self.rejected),
+        }
+
+    def summary_line(self):
+        return (f'{self.rows_imported}/{self.rows_read} rows imported in {self.elapsed_seconds:.2f}s '
+                f'({self.rows_per_second:.0f} rows/s), {self.rows_skipped} already imported, '
+                f'{self.rows_rejected} rejected, {self.rows_failed} failed, {self.write_retries} write retries')
+
+
+def resolve_columns(fieldnames):
+    """
+    Maps each expense field to the CSV header that provides it.
+
+    Args:
+        fieldnames (list[str]): The CSV header row.
+
+    Returns:
+        dict: Field name -> header, for the fields present.
+
+    Raises:
+        RowRejected: If the file has no date or amount column.
+    """
+    headers = {(name or '').strip().lower(): name for name in fieldnames or []}
+    columns = {}
+    for field, aliases in COLUMN_ALIASES.items():
+        header = next((headers[alias] for alias in aliases if alias in headers), None)
+        if header is not None:
+            columns[field] = header
+    missing = [field for field in ('date', 'amount') if field not in columns]
+    if missing:
+        raise RowRejected(f'CSV header is missing required column(s): {", ".join(missing)}')
+    return columns
+
+
+def parse_expense_date(value: str):
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(value.strip(), date_format).date()
+        except ValueError:
+            continue
+    raise RowRejected(f'unrecognized date "{value}"')
+
+
+def parse_expense_amount(value: str):
+    """
+    Parses an amount such as '12.50', '$1,204.00', '-12.50' or '(12.50)'. Bank exports list debits as negative
+    numbers, so the sign is dropped.
+
+    Returns:
+        Decimal: The amount, rounded to cents.
+    """
+    cleaned = (value or '').strip().replace('$', '').replace(',', '')
+    if cleaned.startswith('(') and cleaned.endswith(')'):
+        cleaned = cleaned[1:-1]
+    try:
+        amount = abs(Decimal(cleaned))
+    except InvalidOperation:
+        raise RowRejected(f'invalid amount "{value}"')
+    if not amount.is_finite():
+        raise RowRejected(f'invalid amount "{value}"')
+    amount = amount.quantize(Decimal('0.01'))
+    if amount == 0:
+        raise RowRejected(f'invalid amount "{value}"')
+    return amount
+
+
+def row_to_expense_item(row: dict, columns: dict, user_email: str, row_number: int):
+    """
+    Converts one CSV row into a (v2) USER_EXPENSES item.
+
+    The key is derived from the row alone, so importing the same file again produces the same keys and
+    `ExpenseImporter` skips the rows already stored: the expense time is the row's date plus its row number in
+    microseconds (rows of the same day keep their file order), and the sort key suffix hashes the row number and
+    the values read from the row.
+
+    Raises:
+        RowRejected: If the row's date or amount is invalid.
+    """
+    expense_date = parse_expense_date(row.get(columns['date']) or '')
+    amount_cents = dollars_to_cents(parse_expense_amount(row.get(columns['amount'])))
+    midnight = datetime(expense_date.year, expense_date.month, expense_date.day, tzinfo=timezone.utc)
+    epoch_micros = round(midnight.timestamp()) * 1_000_000 + row_number
+
+    def column(field, default):
+        value = (row.get(columns[field]) or '').strip() if field in columns else ''
+        return value or default
+
+    expense_type = column('type', 'other').lower()
+    expense_category = column('category', 'other').lower()
+    user_note = column('note', '')
+    content = '|'.join(str(part) for part in (user_email, row_number, expense_date.isoformat(), amount_cents,
+                                              expense_type, expense_category, user_note))
+    return new_expense_item(user_email=user_email, epoch_micros=epoch_micros, amount_cents=amount_cents,
+                            expense_type=expense_type, expense_category=expense_category, user_note=user_note,
+                            suffix=stable_hash(content).replace('-', '')[:SORT_KEY_SUFFIX_LENGTH])
+
+
+class ExpenseImporter:
+    """
+    Streams CSV rows into USER_EXPENSES through parallel transactional writers.
+
+    The calling thread parses and validates rows and hands 25-item batches to `writer_threads` writer threads over
+    bounded queues, so memory stays flat for files of any size. Each batch is written with one TransactWriteItems
+    call that puts its rows (only if absent) and adds them to their monthly rollups, so a rollup never counts a row
+    that was not written, and rows already stored by an earlier import of the same file are skipped rather than
+    duplicated or counted again. Batches are routed to writers by month, so concurrent transactions do not contend
+    for the same rollup item; throttled or conflicting transactions are retried with capped exponential backoff
+    and jitter.
+    """
+
+    def __init__(self, client, table_name: str = DynamoDbConstants.TERPTRACKER_USER_EXPENSES_TABLE_NAME,
+                 rollup_table=None, writer_threads: int = DynamoDbConstants.IMPORT_WRITER_THREADS,
+                 max_attempts: int = DynamoDbConstants.IMPORT_MAX_ATTEMPTS,
+                 backoff_base_seconds: float = DynamoDbConstants.IMPORT_BACKOFF_BASE_SECONDS,
+                 backoff_max_seconds: float = DynamoDbConstants.IMPORT_BACKOFF_MAX_SECONDS):
+        """
+        Args:
+            client (botocore.client.DynamoDB): The shared low-level client; clients are thread-safe, resources are
+                not.
+            table_name (str): The expenses table.
+            rollup_table (boto3.dynamodb.Table, optional): USER_MONTHLY_ROLLUP; rollups are skipped when None.
+            writer_threads (int): Parallel writers.
+            max_attempts (int): Calls per batch before its remaining unwritten rows count as failed.
+            backoff_base_seconds (float): First retry delay; doubles on every retry.
+            backoff_max_seconds (float): Upper bound of a retry delay.
+        """
+        self.client = client
+        self.table_name = table_name
+        self.rollup_table = rollup_table
+        self.writer_threads = max(1, writer_threads)
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_base_seconds = backoff_base_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+
+    def _backoff(self, attempt: int):
+        delay = min(self.backoff_max_seconds, self.backoff_base_seconds * (2 ** attempt))
+        time.sleep(random.uniform(0, delay))
+
+    def write_batch(self, items: list):
+        """
+        Writes up to 25 items with BatchWriteItem, retrying whatever comes back unprocessed. Used by callers that
+        keep rollups in step themselves (see write_behind).
+
+        Returns:
+            tuple: (the items that were written, the number of retries needed)
+        """
+        pending = [{'PutRequest': {'Item': {name: _serializer.serialize(value) for name, value in item.items()}}}
+                   for item in items]
+        written_keys = {item['expenseTimestamp'] for item in items}
+        retries = 0
+        for attempt in range(self.max_attempts):
+            try:
+                response = self.client.batch_write_item(RequestItems={self.table_name: pending})
+                pending = response.get('UnprocessedItems', {}).get(self.table_name, [])
+            except ClientError as e:
+                if e.response['Error']['Code'] not in _RETRYABLE_ERROR_CODES:
+                    raise
+            if not pending:
+                break
+            retries += 1
+            self._backoff(attempt)
+
+        for request in pending:
+            written_keys.discard(request['PutRequest']['Item']['expenseTimestamp']['S'])
+        return [item for item in items if item['expenseTimestamp'] in written_keys], retries
+
+    def import_batch_transaction(self, items: list):
+        """
+        Builds the TransactItems that put `items` unless they already exist and, with a rollup table, add them to
+        their monthly rollups. The puts come first, so a cancellation reason's index is the index of its item.
+        """
+        actions = [{'Put': {'TableName': self.table_name,
+                            'Item': {name: _serializer.serialize(value) for name, value in item.items()},
+                            'ConditionExpression': 'attribute_not_exists(expenseTimestamp)'}} for item in items]
+        if self.rollup_table is not None:
+            rollups = {}
+            for item in items:
+                accumulate_monthly_rollups(rollups, item['userEmail'], item)
+            actions += [rollup_update_action(rollup_delta_update_kwargs(rollup)) for rollup in rollups.values()]
+        return actions
+
+    def write_import_batch(self, items: list):
+        """
+        Writes up to 25 items, and their rollup deltas, in one transaction. Items that already exist cancel the
+        transaction; they are dropped as already imported and the rest is retried straight away.
+
+        Returns:
+            tuple: (the items that were written, the items that already existed, the number of backed-off retries)
+        """
+        pending, skipped = list(items), []
+        retries = 0
+        for attempt in range(self.max_attempts):
+            if not pending:
+                break
+            try:
+                self.client.transact_write_items(TransactItems=self.import_batch_transaction(pending))
+                return pending, skipped, retries
+            except ClientError as e:
+                code = e.response['Error']['Code']
+                if code != 'TransactionCanceledException' and code not in _RETRYABLE_ERROR_CODES:
+                    raise
+                reasons = e.response.get('CancellationReasons') or []
+                existing = {index for index, reason in enumerate(reasons[:len(pending)])
+                            if reason.get('Code') == 'ConditionalCheckFailed'}
+            if existing:
+                skipped += [item for index, item in enumerate(pending) if index in existing]
+                pending = [item for index, item in enumerate(pending) if index not in existing]
+            else:
+                # Throttled, or in conflict with another write to the same items
+                retries += 1
+                self._backoff(attempt)
+        return [], skipped, retries
+
+    def _writer(self, batches: queue.Queue, report: ImportReport, months: set, lock: threading.Lock):
+        while True:
+            items = batches.get()
+            if items is None:
+                return
+            try:
+                written, skipped, retries = self.write_import_batch(items)
+            except Exception as e:
+                # A writer must keep draining its queue, or the parsing thread would block on a full queue
+                print(f'🚨Import batch of {len(items)} rows failed: {e}')
+                written, skipped, retries = [], [], 0
+
+            with lock:
+                report.batches_written += 1
+                report.write_retries += retries
+                report.rows_imported += len(written)
+                report.rows_skipped += len(skipped)
+                report.rows_failed += len(items) - len(written) - len(skipped)
+                months.update(expense_year_month(item['expenseTimestamp']) for item in written)
+
+    def run(self, rows, user_email: str):
+        """
+        Imports expense rows for one user. Importing the same file again skips the rows that were already imported.
+
+        Args:
+            rows (csv.DictReader): The parsed CSV (any iterable of dicts with a `fieldnames` attribute).
+            user_email (str): The owner of the imported expenses.
+
+        Returns:
+            ImportReport: The import's counts, throughput and rejected rows.
+
+        Raises:
+            RowRejected: If the header lacks a date or amount column (nothing is written).
+        """
+        report = ImportReport()
+        started_at = time.perf_counter()
+        columns = resolve_columns(rows.fieldnames)
+
+        queues = [queue.Queue(maxsize=2) for _ in range(self.writer_threads)]
+        months = set()
+        lock = threading.Lock()
+        writers = [threading.Thread(target=self._writer, args=(batches, report, months, lock),
+                                    name=f'expense-import-{i}', daemon=True) for i, batches in enumerate(queues)]
+        for writer in writers:
+            writer.start()
+
+        def submit(batch):
+            # All batches of a month go to the same writer
+            month = expense_year_month(batch[0]['expenseTimestamp'])
+            queues[int(month.replace('-', '')) % len(queues)].put(batch)
+
+        try:
+            batch = []
+            for row_number, row in enumerate(rows, start=2):  # Row 1 is the header
+                with lock:
+                    report.rows_read += 1
+                try:
+                    batch.append(row_to_expense_item(row=row, columns=columns, user_email=user_email,
+                                                     row_number=row_number))
+                except RowRejected as e:
+                    with lock:
+                        report.reject(row_number=row_number, reason=str(e))
+                    continue
+                if len(batch) == BATCH_SIZE:
+                    submit(batch)
+                    batch = []
+            if batch:
+                submit(batch)
+        finally:
+            for batches in queues:
+                batches.put(None)
+            for writer in writers:
+                writer.join()
+
+        report.months = sorted(months)
+        if self.rollup_table is not None:
+            report.months_updated = len(months)
+        report.elapsed_seconds = time.perf_counter() - started_at
+        return report
+
+
+def import_expenses_csv(text_stream, user_email: str, client, rollup_table=None, **importer_kwargs):
+    """
+    Imports a CSV file of expenses for one user.
+
+    Args:
+        text_stream (TextIO): The CSV as text, read incrementally.
+        user_email (str): The owner of the imported expenses.
+        client (botocore.client.DynamoDB): The DynamoDB client.
+        rollup_table (boto3.dynamodb.Table, optional): USER_MONTHLY_ROLLUP, kept in step with the import.
+        **importer_kwargs: Passed to `ExpenseImporter` (writer_threads, max_attempts, ...).
+
+    Returns:
+        ImportReport: The outcome of the import.
+    """
+    importer = ExpenseImporter(client=client, rollup_table=rollup_table, **importer_kwargs)
+    report = importer.run(rows=csv.DictReader(text_stream), user_email=user_email)
+    print(f'✅Imported expenses for {user_email}: {report.summary_line()}')
+    return report
@@ -0,0 +1,202 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from boto3.dynamodb.conditions import Attr
+from boto3.dynamodb.types import TypeSerializer
+from botocore.exceptions import ClientError
+from terptracker.constants.DynamoDbConstants import DynamoDbConstants
+from terptracker.dynamodb.dynamodb_helpers import (get_dynamodb_resource, get_dynamodb_client, get_dynamodb_table,
+                                                   stable_hash, TokenBucket)
+from terptracker.dynamodb.expense_schema import (EXPENSE_SCHEMA_VERSION, SORT_KEY_SUFFIX_LENGTH,
+                                                 expense_category_key, upgrade_expense_item)
+
+_serializer = TypeSerializer()
+
+
+def _typed(item: dict):
+    return {name: _serializer.serialize(value) for name, value in item.items()}
+
+
+class ExpenseSchemaMigration:
+    """
+    Rewrites older USER_EXPENSES items in the current layout (see expense_schema).
+
+    The table is read with a parallel segmented Scan, one thread per segment. Each v1 item is replaced by a single
+    TransactWriteItems call that puts the upgraded item and deletes the old one, so readers never see an expense
+    twice or lose it; v2 items keep their key and are updated in place with their category index key. Writes across
+    all segments are capped by a token bucket. Progress (each segment's
+    LastEvaluatedKey and counters) is saved after every page, so an interrupted migration resumes where it stopped;
+    re-running a finished one is a no-op.
+    """
+
+    def __init__(self, db_mode: str, segments: int = DynamoDbConstants.MIGRATION_SEGMENTS,
+                 write_rate: float = DynamoDbConstants.MIGRATION_WRITE_RATE,
+                 state_path: str = DynamoDbConstants.MIGRATION_STATE_PATH, page_size: int = None):
+        """
+        Args:
+            db_mode (str): The deployment mode.
+            segments (int): Scan segments, each migrated by its own thread.
+            write_rate (float): Item migrations per second across all segments (each one is a transactional put
+                and delete); 0 disables the limit.
+            state_path (str): Where progress is saved.
+            page_size (int, optional): Scan page Limit; DynamoDB's 1 MB page when omitted.
+        """
+        self.db_mode = db_mode
+        self.segments = max(1, segments)
+        self.bucket = TokenBucket(rate=write_rate)
+        self.state_path = state_path
+        self.page_size = page_size
+        self.table_name = DynamoDbConstants.TERPTRACKER_USER_EXPENSES_TABLE_NAME
+        self._lock = threading.Lock()
+        self.state = None
+
+    def load_state(self):
+        """
+        Loads saved progress, or starts a new migration (also when the saved one upgraded to an older version).
+
+        Raises:
+            RuntimeError: If the saved progress used a different number of segments (segment boundaries would not
+                line up).
+        """
+        if os.path.exists(self.state_path):
+            with open(self.state_path) as f:
+                state = json.load(f)
+            if state.get('schemaVersion') != EXPENSE_SCHEMA_VERSION:
+                print(f"🚧{self.state_path} is from a migration to v{state.get('schemaVersion')}; starting over")
+                return self.new_state()
+            if state.get('totalSegments') != self.segments:
+                raise RuntimeError(f"{self.state_path} was started with {state.get('totalSegments')} segments; "
+                                   f"resume with --segments {state.get('totalSegments')} or delete it to restart")
+            return state
+        return self.new_state()
+
+    def new_state(self):
+        return {
+            'schemaVersion': EXPENSE_SCHEMA_VERSION,
+            'totalSegments': self.segments,
+            'segments': {str(segment): {'lastEvaluatedKey': None, 'done': False, 'scanned': 0, 'migrated': 0,
+                                        'conflicts': 0}
+                         for segment in range(self.segments)},
+        }
+
+    def save_state(self):
+        with self._lock:
+            tmp_path = f'{self.state_path}.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(self.state, f, indent=2, default=str)
+            os.replace(tmp_path, self.state_path)
+
+    def migrate_item(self, client, table, item: dict):
+        """
+        Brings one older item up to the current layout.
+
+        Returns:
+            bool: True if the item was migrated, False if it changed or was migrated concurrently.
+        """
+        if 'schemaVersion' in item:
+            return self.add_category_key(table, item)
+        return self.replace_legacy_item(client, item)
+
+    def add_category_key(self, table, item: dict):
+        """
+        Updates a v2 item in place to the current version, adding its category index key.
+        """
+        update_expression = 'SET schemaVersion = :version'
+        values = {':version': EXPENSE_SCHEMA_VERSION, ':old_version': item['schemaVersion']}
+        category_key = expense_category_key(user_email=item['userEmail'], expense_category=item.get('expenseCategory'))
+        if category_key:
+            update_expression += ', userCategory = :category_key'
+            values[':category_key'] = category_key
+        self.bucket.acquire()
+        try:
+            table.update_item(Key={'userEmail': item['userEmail'], 'expenseTimestamp': item['expenseTimestamp']},
+                              UpdateExpression=update_expression, ConditionExpression='schemaVersion = :old_version',
+                              ExpressionAttributeValues=values)
+            return True
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                return False
+            raise
+
+    def replace_legacy_item(self, client, item: dict):
+        """
+        Atomically replaces one v1 item with its upgraded version.
+        """
+        suffix = stable_hash(f"{item['userEmail']}|{item['expenseTimestamp']}")[:SORT_KEY_SUFFIX_LENGTH]
+        upgraded = upgrade_expense_item(item, suffix=suffix)
+        self.bucket.acquire()
+        try:
+            client.transact_write_items(TransactItems=[
+                {'Put': {'TableName': self.table_name, 'Item': _typed(upgraded),
+                         'ConditionExpression': 'attribute_not_exists(expenseTimestamp)'}},
+                {'Delete': {'TableName': self.table_name,
+                            'Key': _typed({'userEmail': item['userEmail'],
+                                           'expenseTimestamp': item['expenseTimestamp']}),
+                            'ConditionExpression': 'attribute_exists(expenseTimestamp) AND '
+                                                   'attribute_not_exists(schemaVersion)'}},
+            ])
+            return True
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'TransactionCanceledException':
+                return False
+            raise
+
+    def migrate_segment(self, segment: int):
+        table = get_dynamodb_table(dynamodb_resource=get_dynamodb_resource(db_mode=self.db_mode),
+                                   table_name=self.table_name)
+        client = get_dynamodb_client(db_mode=self.db_mode)
+        progress = self.state['segments'][str(segment)]
+
+        scan_kwargs = {'Segment': segment, 'TotalSegments': self.segments,
+                       'FilterExpression': (Attr('schemaVersion').not_exists() |
+                                            Attr('schemaVersion').lt(EXPENSE_SCHEMA_VERSION))}
+        if self.page_size:
+            scan_kwargs['Limit'] = self.page_size
+        while not progress['done']:
+            if progress['lastEvaluatedKey']:
+                scan_kwargs['ExclusiveStartKey'] = progress['lastEvaluatedKey']
+            response = table.scan(**scan_kwargs)
+
+            migrated = conflicts = 0
+            for item in response.get('Items', []):
+                if self.migrate_item(client, table, item):
+                    migrated += 1
+                else:
+                    conflicts += 1
+
+            with self._lock:
+                progress['scanned'] += response.get('ScannedCount', 0)
+                progress['migrated'] += migrated
+                progress['conflicts'] += conflicts
+                progress['lastEvaluatedKey'] = response.get('LastEvaluatedKey')
+                progress['done'] = not progress['lastEvaluatedKey']
+            self.save_state()
+        return progress
+
+    def run(self):
+        """
+        Migrates every remaining segment in parallel.
+
+        Returns:
+            dict: Totals across all segments: scanned, migrated, conflicts, elapsedSeconds and itemsPerSecond.
+        """
+        self.state = self.load_state()
+        started_at = time.perf_counter()
+        pending = [int(segment) for segment, progress in self.state['segments'].items() if not progress['done']]
+        print(f'🚧Migrating {self.table_name} to expense schema v{EXPENSE_SCHEMA_VERSION}: '
+              f'{len(pending)}/{self.segments} segments remaining, write rate {self.bucket.rate}/s')
+
+        with ThreadPoolExecutor(max_workers=max(1, len(pending)), thread_name_prefix='expense-migration') as pool:
+            for segment, progress in zip(pending, pool.map(self.migrate_segment, pending)):
+                print(f"✅Segment {segment}: scanned={progress['scanned']} migrated={progress['migrated']} "
+                      f"conflicts={progress['conflicts']}")
+
+        elapsed_seconds = time.perf_counter() - started_at
+        totals = {name: sum(progress[name] for progress in self.state['segments'].values())
+                  for name in ('scanned', 'migrated', 'conflicts')}
+        totals['elapsedSeconds'] = round(elapsed_seconds, 2)
+        totals['itemsPerSecond'] = round(totals['migrated'] / elapsed_seconds, 1) if elapsed_seconds else 0.0
+        print(f"✅Expense schema migration complete: {totals}")
+        return totals
@@ -0,0 +1,249 @@
+import functools
+import uuid
+from datetime import date
+from decimal import Decimal, ROUND_HALF_UP
+from terptracker.constants.DynamoDbConstants import DynamoDbConstants
+
+# USER_EXPENSES item layouts:
+#   v1 (legacy): expenseTimestamp = str(epoch float), e.g. '1739188800.123456'; expenseAmount = the raw form string
+#   v2: expenseTimestamp = 'SSSSSSSSSS.ffffff#xxxxxxxx' - zero-padded epoch seconds and microseconds plus a random
+#       suffix, so keys are fixed width (string order == time order) and two expenses recorded in the same
+#       microsecond no longer overwrite each other; expenseEpochMicros and expenseAmountCents are Numbers.
+#   v3: v2 plus userCategory = '<userEmail>#<expenseCategory>' (absent when there is no category), the partition key
+#       of the sparse category index, so one category's expenses are read without the rest of the user's partition.
+#
+# The v2 sort key keeps the legacy '<10-digit seconds>.<fraction>' prefix, so one `between` range selects both
+# layouts and readers can use the helpers below on either while `terptracker migrate-expenses` runs.
+EXPENSE_SCHEMA_VERSION = DynamoDbConstants.EXPENSE_ITEM_SCHEMA_VERSION
+SORT_KEY_SUFFIX_LENGTH = 8
+_CENTS = Decimal('0.01')
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+_MICROS_PER_DAY = 86_400_000_000
+# The attributes `Expense.from_item` reads, in any layout
+EXPENSE_RECORD_ATTRIBUTES = ('userEmail', 'expenseTimestamp', 'expenseEpochMicros', 'expenseAmountCents',
+                             'expenseAmount', 'expenseType', 'expenseCategory', 'userNote')
+# Non-key attributes projected into the category index; with the table and index keys that is every attribute above
+CATEGORY_INDEX_ATTRIBUTES = ('expenseEpochMicros', 'expenseAmountCents', 'expenseAmount', 'expenseType',
+                             'expenseCategory', 'userNote')
+
+
+def make_expense_sort_key(epoch_micros: int, suffix: str = None):
+    """
+    Builds a v2 USER_EXPENSES sort key.
+
+    Args:
+        epoch_micros (int): The expense time in microseconds since the epoch.
+        suffix (str, optional): The uniqueness suffix; random when omitted. Pass a deterministic one to make a write
+            idempotent (e.g. when migrating).
+
+    Returns:
+        str: e.g. '1739188800.123456#9f86d081'.
+    """
+    seconds, micros = divmod(int(epoch_micros), 1_000_000)
+    return f'{seconds:010d}.{micros:06d}#{suffix or uuid.uuid4().hex[:SORT_KEY_SUFFIX_LENGTH]}'
+
+
+def sort_key_range(start_seconds: float, end_seconds: float):
+    """
+    Returns the inclusive sort key bounds selecting every expense (v1 or v2) between two epoch seconds.
+
+    Returns:
+        tuple[str, str]: (low, high) for a `Key('expenseTimestamp').between(low, high)` condition.
+    """
+    low_micros = round(float(start_seconds) * 1_000_000)
+    high_micros = round(float(end_seconds) * 1_000_000)
+    low_seconds, low_fraction = divmod(low_micros, 1_000_000)
+    high_seconds, high_fraction = divmod(high_micros, 1_000_000)
+    # A legacy key of a whole second is '<seconds>.0', which sorts before '<seconds>.000000', so the low bound stops
+    # at the decimal point. '~' sorts after digits and '#', so the high bound includes every suffix.
+    low = f'{low_seconds:010d}.' if low_fraction == 0 else f'{low_seconds:010d}.{low_fraction:06d}'
+    return low, f'{high_seconds:010d}.{high_fraction:06d}~'
+
+
+def expense_epoch_seconds(expense_timestamp):
+    """
+    Returns the epoch seconds of a USER_EXPENSES sort key in either layout.
+    """
+    return float(str(expense_timestamp).split('#', 1)[0])
+
+
+def expense_epoch_micros(item: dict):
+    """
+    Returns:
+        int: The expense time in microseconds since the epoch, for an item in either layout.
+    """
+    if 'expenseEpochMicros' in item:
+        return int(item['expenseEpochMicros'])
+    return round(expense_epoch_seconds(item['expenseTimestamp']) * 1_000_000)
+
+
+def expense_amount_cents(item: dict):
+    """
+    Returns:
+        int: The expense amount in cents (v1 amounts are rounded half-up to the cent).
+    """
+    if 'expenseAmountCents' in item:
+        return int(item['expenseAmountCents'])
+    return int(dollars_to_cents(item['expenseAmount']))
+
+
+def expense_amount(item: dict):
+    """
+    Returns:
+        Decimal: The expense amount in dollars, exact to the cent.
+    """
+    return Decimal(expense_amount_cents(item)) / 100
+
+
+def dollars_to_cents(amount):
+    """
+    Converts a dollar amount ('12.5', Decimal('3.999'), 7) to integer cents, rounding half-up.
+    """
+    return int((Decimal(str(amount)).quantize(_CENTS, rounding=ROUND_HALF_UP) * 100).to_integral_value())
+
+
+def expense_category_key(user_email: str, expense_category: str):
+    """
+    Returns:
+        str | None: The category index partition key of a user's category, or None for no category.
+    """
+    if not expense_category:
+        return None
+    return f'{user_email}#{expense_category}'
+
+
+def new_expense_item(user_email: str, epoch_micros: int, amount_cents: int, expense_type: str,
+                     expense_category: str, user_note: str, suffix: str = None):
+    """
+    Builds a USER_EXPENSES item in the current layout.
+
+    Returns:
+        dict: The item to write.
+    """
+    item = {
+        'userEmail': user_email,
+        'expenseTimestamp': make_expense_sort_key(epoch_micros=epoch_micros, suffix=suffix),
+        'expenseEpochMicros': int(epoch_micros),
+        'expenseAmountCents': int(amount_cents),
+        'expenseType': expense_type,
+        'expenseCategory': expense_category,
+        'userNote': user_note,
+        'schemaVersion': EXPENSE_SCHEMA_VERSION,
+    }
+    category_key = expense_category_key(user_email=user_email, expense_category=expense_category)
+    if category_key:
+        item['userCategory'] = category_key
+    return item
+
+
+def is_current_expense_item(item: dict):
+    return int(item.get('schemaVersion', 1)) >= EXPENSE_SCHEMA_VERSION
+
+
+def upgrade_expense_item(item: dict, suffix: str):
+    """
+    Converts a v1 item into the current layout. The sort key changes, so the caller must write the new item and
+    delete the old one.
+
+    Args:
+        item (dict): The v1 item.
+        suffix (str): The sort key suffix; derive it from the old key so re-running a migration is idempotent.
+
+    Returns:
+        dict: The upgraded item, keeping any extra attributes of the original.
+    """
+    upgraded = {name: value for name, value in item.items() if name != 'expenseAmount'}
+    upgraded.update(new_expense_item(
+        user_email=item['userEmail'],
+        epoch_micros=round(expense_epoch_seconds(item['expenseTimestamp']) * 1_000_000),
+        amount_cents=expense_amount_cents(item),
+        expense_type=item.get('expenseType'),
+        expense_category=item.get('expenseCategory'),
+        user_note=item.get('userNote'),
+        suffix=suffix
+    ))
+    return upgraded
+
+
+@functools.lru_cache(maxsize=4096)
+def _iso_date(epoch_day: int):
+    return date.fromordinal(_EPOCH_ORDINAL + epoch_day).isoformat()
+
+
+class Expense:
+    """
+    A compact, read-only USER_EXPENSES record (v1 or v2) for rendering and export. Built straight from the
+    deserialized item without copying it; the timestamp and amount are stored once as integers (microseconds and
+    cents), and the display date is derived on access (cached per UTC day, so a month of rows formats at most 31
+    dates).
+    """
+
+    __slots__ = ('user_email', 'sort_key', 'epoch_micros', 'amount_cents', 'expense_type', 'expense_category',
+                 'user_note')
+
+    def __init__(self, user_email: str, sort_key: str, epoch_micros: int, amount_cents: int, expense_type: str,
+                 expense_category: str, user_note: str):
+        self.user_email = user_email
+        self.sort_key = sort_key
+        self.epoch_micros = epoch_micros
+        self.amount_cents = amount_cents
+        self.expense_type = expense_type
+        self.expense_category = expense_category
+        self.user_note = user_note
+
+    @classmethod
+    def from_item(cls, item: dict):
+        """
+        Builds an Expense from a USER_EXPENSES item in either layout.
+        """
+        # Positional arguments and inlined v2 lookups: this runs once per displayed row
+        epoch_micros = item.get('expenseEpochMicros')
+        amount_cents = item.get('expenseAmountCents')
+        return cls(item['userEmail'], item['expenseTimestamp'],
+                   int(epoch_micros) if epoch_micros is not None else expense_epoch_micros(item),
+                   int(amount_cents) if amount_cents is not None else expense_amount_cents(item),
+                   item.get('expenseType'), item.get('expenseCategory'), item.get('userNote'))
+
+    @property
+    def amount(self):
+        """
+        Decimal: The amount in dollars, exact to the cent.
+        """
+        return Decimal(self.amount_cents) / 100
+
+    @property
+    def amount_str(self):
+        """
+        str: The amount formatted for display, e.g. '12.50', without going through Decimal.
+        """
+        dollars, cents = divmod(abs(self.amount_cents), 100)
+        return f"{'-' if self.amount_cents < 0 else ''}{dollars}.{cents:02d}"
+
+    @property
+    def epoch_seconds(self):
+        return self.epoch_micros / 1_000_000
+
+    @property
+    def date_str(self):
+        """
+        str: The UTC date of the expense, YYYY-MM-DD.
+        """
+        return _iso_date(self.epoch_micros // _MICROS_PER_DAY)
+
+    def to_dict(self):
+        """
+        Returns:
+            dict: The record with plain JSON-safe values.
+        """
+        return {
+            'date': self.date_str,
+            'timestamp': self.sort_key,
+            'amount': str(self.amount),
+            'amountCents': self.amount_cents,
+            'type': self.expense_type,
+            'category': self.expense_category,
+            'note': self.user_note,
+        }
+
+    def __repr__(self):
+        return f'Expense({self.user_email!r}, {self.date_str}, {self.amount_cents}c, {self.expense_category!r})'
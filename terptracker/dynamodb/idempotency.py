@@ -0,0 +1,260 @@
+import re
+import time
+import uuid
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+from botocore.exceptions import ClientError
+from terptracker.constants.DynamoDbConstants import DynamoDbConstants
+from terptracker.dynamodb.dynamodb_helpers import stable_hash
+from terptracker.dynamodb.expense_schema import Expense
+from terptracker.dynamodb.rollup_helpers import rollup_delta_update_kwargs, rollup_update_kwargs
+
+# EXPENSE_IDEMPOTENCY items, keyed by (userEmail, idempotencyKey):
+#   'form:<token>'   - the hidden token the add-expense form is rendered with; a double-click or a browser resubmit
+#                      posts the same token again
+#   'content:<hash>' - fallback for posts without a token: a hash of the expense's user, date, amount, category, type
+#                      and note within an IDEMPOTENCY_CONTENT_WINDOW_SECONDS bucket
+#   'rollup:<id>'    - a rollup delta that was applied (see `apply_rollup_delta_once`), so a replayed write-behind
+#                      batch does not count its expenses twice
+# Submission items record the expense they admitted, so a repeated submission is answered with the original result.
+# Items expire through DynamoDB TTL on expiresAt.
+FORM_TOKEN_PATTERN = re.compile(r'^[A-Za-z0-9_-]{16,64}$')
+_CLAIM_CONDITION = 'attribute_not_exists(idempotencyKey) OR expiresAt < :now'
+
+_serializer = TypeSerializer()
+_deserializer = TypeDeserializer()
+
+
+def _typed(item: dict):
+    return {name: _serializer.serialize(value) for name, value in item.items()}
+
+
+def new_form_token():
+    """
+    Returns:
+        str: A fresh idempotency token for one rendering of the add-expense form.
+    """
+    return uuid.uuid4().hex
+
+
+def expense_idempotency_key(expense_item: dict, form_token: str = None,
+                            window_seconds: int = DynamoDbConstants.IDEMPOTENCY_CONTENT_WINDOW_SECONDS,
+                            now: float = None):
+    """
+    Picks the idempotency key of an add-expense submission.
+
+    Args:
+        expense_item (dict): The USER_EXPENSES item built from the form.
+        form_token (str, optional): The form's hidden token; ignored unless well-formed.
+        window_seconds (int): Width of the time bucket identical submissions are collapsed within.
+        now (float, optional): Epoch seconds; defaults to the current time.
+
+    Returns:
+        str: 'form:<token>' or 'content:<hash>'.
+    """
+    if form_token and FORM_TOKEN_PATTERN.match(form_token):
+        return f'form:{form_token}'
+    expense = Expense.from_item(expense_item)
+    window = int((time.time() if now is None else now) // max(1, window_seconds))
+    content = '|'.join(str(part) for part in (expense.user_email, expense.date_str, expense.amount_cents,
+                                              expense.expense_category, expense.expense_type, expense.user_note,
+                                              window))
+    return f'content:{stable_hash(content)}'
+
+
+def idempotency_record(expense_item: dict, idempotency_key: str,
+                       ttl_seconds: int = DynamoDbConstants.IDEMPOTENCY_TTL_SECONDS, now: float = None):
+    """
+    Builds the EXPENSE_IDEMPOTENCY item admitting `expense_item` under `idempotency_key`.
+    """
+    now = int(time.time() if now is None else now)
+    return {
+        'userEmail': expense_item['userEmail'],
+        'idempotencyKey': idempotency_key,
+        'expenseTimestamp': expense_item['expenseTimestamp'],
+        'expenseCategory': expense_item.get('expenseCategory'),
+        'createdAt': now,
+        'expiresAt': now + ttl_seconds,
+    }
+
+
+def rollup_update_action(rollup_update: dict):
+    """
+    Turns rollup UpdateItem arguments (see rollup_helpers) into a TransactWriteItems `Update` action.
+    """
+    return {'Update': {'TableName': DynamoDbConstants.TERPTRACKER_USER_MONTHLY_ROLLUP_TABLE_NAME,
+                       'Key': _typed(rollup_update['Key']),
+                       'UpdateExpression': rollup_update['UpdateExpression'],
+                       'ExpressionAttributeNames': rollup_update['ExpressionAttributeNames'],
+                       'ExpressionAttributeValues': _typed(rollup_update['ExpressionAttributeValues'])}}
+
+
+def expense_with_rollup_transaction(expense_item: dict):
+    """
+    Builds the TransactItems that put a new expense and add it to its month's rollup in one atomic step, so the
+    rollup never counts an expense that was not stored (or misses one that was).
+    """
+    return [
+        {'Put': {'TableName': DynamoDbConstants.TERPTRACKER_USER_EXPENSES_TABLE_NAME, 'Item': _typed(expense_item),
+                 'ConditionExpression': 'attribute_not_exists(expenseTimestamp)'}},
+        rollup_update_action(rollup_update_kwargs(expense_item)),
+    ]
+
+
+def idempotent_expense_transaction(expense_item: dict, record: dict):
+    """
+    Builds the TransactItems that claim the idempotency key, put the expense and add it to its month's rollup in one
+    atomic step. The claim comes first, so a duplicate is identified by the first cancellation reason.
+    """
+    return [
+        {'Put': {'TableName': DynamoDbConstants.TERPTRACKER_EXPENSE_IDEMPOTENCY_TABLE_NAME, 'Item': _typed(record),
+                 'ConditionExpression': _CLAIM_CONDITION,
+                 'ExpressionAttributeValues': _typed({':now': record['createdAt']}),
+                 'ReturnValuesOnConditionCheckFailure': 'ALL_OLD'}},
+        *expense_with_rollup_transaction(expense_item),
+    ]
+
+
+def put_expense_with_rollup(client, expense_item: dict):
+    """
+    Writes a new expense and its rollup delta in one transaction, for expenses whose idempotency key was already
+    claimed (see `claim_idempotency_key`).
+
+    Args:
+        client (botocore.client.DynamoDB): The DynamoDB client.
+        expense_item (dict): The USER_EXPENSES item to write.
+    """
+    client.transact_write_items(TransactItems=expense_with_rollup_transaction(expense_item))
+
+
+def rollup_delta_transaction(rollup: dict, delta_id: str,
+                             ttl_seconds: int = DynamoDbConstants.IDEMPOTENCY_TTL_SECONDS, now: float = None):
+    """
+    Builds the TransactItems that claim `delta_id` and add `rollup` to its stored month in one atomic step.
+    """
+    now = int(time.time() if now is None else now)
+    claim = {'userEmail': rollup['userEmail'], 'idempotencyKey': f'rollup:{delta_id}',
+             'yearMonth': rollup['yearMonth'], 'createdAt': now, 'expiresAt': now + ttl_seconds}
+    return [
+        {'Put': {'TableName': DynamoDbConstants.TERPTRACKER_EXPENSE_IDEMPOTENCY_TABLE_NAME, 'Item': _typed(claim),
+                 'ConditionExpression': 'attribute_not_exists(idempotencyKey)'}},
+        rollup_update_action(rollup_delta_update_kwargs(rollup)),
+    ]
+
+
+def duplicate_claim_from_error(error: ClientError):
+    """
+    Returns:
+        dict | None: The existing idempotency record if `error` is a transaction cancelled by the key claim (an empty
+            dict when DynamoDB did not return it), or None for any other error.
+    """
+    if error.response['Error']['Code'] != 'TransactionCanceledException':
+        return None
+    reasons = error.response.get('CancellationReasons') or []
+    if not reasons or reasons[0].get('Code') != 'ConditionalCheckFailed':
+        return None
+    return {name: _deserializer.deserialize(value) for name, value in (reasons[0].get('Item') or {}).items()}
+
+
+def _idempotency_key_attributes(record: dict):
+    return {'userEmail': record['userEmail'], 'idempotencyKey': record['idempotencyKey']}
+
+
+def put_expense_idempotently(client, expense_item: dict, idempotency_key: str, idempotency_table=None):
+    """
+    Writes a new expense and its rollup delta unless the same submission was already admitted.
+
+    Args:
+        client (botocore.client.DynamoDB): The DynamoDB client.
+        expense_item (dict): The USER_EXPENSES item to write.
+        idempotency_key (str): See `expense_idempotency_key`.
+        idempotency_table (boto3.dynamodb.Table, optional): EXPENSE_IDEMPOTENCY, read when a duplicate's original
+            record was not returned with the cancellation.
+
+    Returns:
+        dict | None: None if the expense was written, otherwise the idempotency record of the original submission.
+    """
+    record = idempotency_record(expense_item=expense_item, idempotency_key=idempotency_key)
+    try:
+        client.transact_write_items(TransactItems=idempotent_expense_transaction(expense_item=expense_item,
+                                                                                 record=record))
+        return None
+    except ClientError as e:
+        original = duplicate_claim_from_error(e)
+        if original is None:
+            raise
+    if not original and idempotency_table is not None:
+        original = idempotency_table.get_item(Key=_idempotency_key_attributes(record),
+                                              ConsistentRead=True).get('Item', {})
+    return original or record
+
+
+async def async_put_expense_idempotently(client, expense_item: dict, idempotency_key: str, idempotency_table=None):
+    """
+    Async counterpart of `put_expense_idempotently` for an async client and table.
+    """
+    record = idempotency_record(expense_item=expense_item, idempotency_key=idempotency_key)
+    try:
+        await client.transact_write_items(TransactItems=idempotent_expense_transaction(expense_item=expense_item,
+                                                                                       record=record))
+        return None
+    except ClientError as e:
+        original = duplicate_claim_from_error(e)
+        if original is None:
+            raise
+    if not original and idempotency_table is not None:
+        original = (await idempotency_table.get_item(Key=_idempotency_key_attributes(record),
+                                                     ConsistentRead=True)).get('Item', {})
+    return original or record
+
+
+def apply_rollup_delta_once(client, rollup: dict, delta_id: str):
+    """
+    Adds a rollup of new expenses to its stored month unless the delta with the same id was already applied, so a
+    delta can be retried or replayed after a crash without counting its expenses twice.
+
+    Args:
+        client (botocore.client.DynamoDB): The DynamoDB client.
+        rollup (dict): A rollup created by `new_rollup` holding only the new expenses of one user and month.
+        delta_id (str): Identifies the delta; the same expenses must always be applied under the same id.
+
+    Returns:
+        bool: True if the delta was applied now, False if it had been applied before.
+    """
+    try:
+        client.transact_write_items(TransactItems=rollup_delta_transaction(rollup=rollup, delta_id=delta_id))
+        return True
+    except ClientError as e:
+        if duplicate_claim_from_error(e) is None:
+            raise
+    return False
+
+
+def claim_idempotency_key(idempotency_table, expense_item: dict, idempotency_key: str):
+    """
+    Claims the idempotency key with a single conditional put, for writes that are stored later (write-behind).
+
+    Returns:
+        dict | None: None if the key was claimed, otherwise the idempotency record of the original submission.
+    """
+    record = idempotency_record(expense_item=expense_item, idempotency_key=idempotency_key)
+    try:
+        idempotency_table.put_item(Item=record, ConditionExpression=_CLAIM_CONDITION,
+                                   ExpressionAttributeValues={':now': record['createdAt']})
+        return None
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+    return idempotency_table.get_item(Key=_idempotency_key_attributes(record), ConsistentRead=True).get('Item', record)
+
+
+def release_idempotency_key(idempotency_table, expense_item: dict, idempotency_key: str):
+    """
+    Gives up a claim whose expense could not be written, so the user can retry the submission.
+    """
+    try:
+        idempotency_table.delete_item(
+            Key={'userEmail': expense_item['userEmail'], 'idempotencyKey': idempotency_key},
+            ConditionExpression='expenseTimestamp = :expense_timestamp',
+            ExpressionAttributeValues={':expense_timestamp': expense_item['expenseTimestamp']})
+    except ClientError as e:
+        print(f'⚠️Could not release idempotency key {idempotency_key}: {e}')
@@ -0,0 +1,172 @@
+import time
+from boto3.dynamodb.conditions import Attr
+from boto3.dynamodb.types import TypeSerializer
+from botocore.exceptions import ClientError
+from terptracker.constants.DynamoDbConstants import DynamoDbConstants
+from terptracker.dynamodb.dynamodb_helpers import TokenBucket
+from terptracker.dynamodb.throttling import TableThrottled, ThrottledTable
+
+# LOGIN holds two items per account, written together in one transaction:
+#   user item:   user_id = '<uuid>', email, firstName, password - what the user loader reads by id
+#   email item:  user_id = 'EMAIL#<email>', userId, loginEmail, firstName, password - what login reads by email with
+#                a strongly consistent GetItem; its existence is what makes an email unique
+# The email item has no `email` attribute, so it stays out of the (sparse) username-index. Both items carry the
+# password hash, and every password change updates them in the same transaction.
+EMAIL_KEY_PREFIX = 'EMAIL#'
+_NEW_ITEM_CONDITION = 'attribute_not_exists(user_id)'
+
+_serializer = TypeSerializer()
+
+
+def _typed(item: dict):
+    return {name: _serializer.serialize(value) for name, value in item.items()}
+
+
+def email_key(email: str):
+    """
+    Returns:
+        str: The LOGIN `user_id` of the email item for `email`.
+    """
+    return f'{EMAIL_KEY_PREFIX}{email or ""}'
+
+
+def email_lookup_item(user_item: dict):
+    """
+    Builds the email item of a LOGIN user item.
+    """
+    return {
+        'user_id': email_key(user_item['email']),
+        'userId': user_item['user_id'],
+        'loginEmail': user_item['email'],
+        'firstName': user_item['firstName'],
+        'password': user_item['password'],
+    }
+
+
+def user_item_from_email_lookup(item: dict):
+    """
+    Returns:
+        dict: The user item fields (user_id, email, firstName, password) stored on an email item.
+    """
+    return {'user_id': item['userId'], 'email': item['loginEmail'], 'firstName': item['firstName'],
+            'password': item['password']}
+
+
+def new_account_transaction(user_item: dict):
+    """
+    Builds the TransactItems creating an account: the email item and the user item, each only if it does not exist
+    yet. The email item comes first, so a taken email is identified by the first cancellation reason.
+    """
+    table_name = DynamoDbConstants.TERPTRACKER_LOGIN_TABLE_NAME
+    return [
+        {'Put': {'TableName': table_name, 'Item': _typed(email_lookup_item(user_item)),
+                 'ConditionExpression': _NEW_ITEM_CONDITION}},
+        {'Put': {'TableName': table_name, 'Item': _typed(user_item), 'ConditionExpression': _NEW_ITEM_CONDITION}},
+    ]
+
+
+def email_taken_from_error(error: ClientError):
+    """
+    Returns:
+        bool: True if `error` is a `new_account_transaction` cancelled because the email already has an account.
+    """
+    if error.response['Error']['Code'] != 'TransactionCanceledException':
+        return False
+    reasons = error.response.get('CancellationReasons') or []
+    return bool(reasons) and reasons[0].get('Code') == 'ConditionalCheckFailed'
+
+
+def password_update_transaction(user_item: dict, new_hash: str):
+    """
+    Builds the TransactItems replacing an account's password hash on both of its items, conditional on both still
+    holding the old hash.
+    """
+    update = {
+        'TableName': DynamoDbConstants.TERPTRACKER_LOGIN_TABLE_NAME,
+        'UpdateExpression': 'SET password = :new_hash',
+        'ConditionExpression': 'password = :old_hash',
+        'ExpressionAttributeValues': _typed({':new_hash': new_hash, ':old_hash': user_item['password']}),
+    }
+    return [
+        {'Update': dict(update, Key=_typed({'user_id': user_item['user_id']}))},
+        {'Update': dict(update, Key=_typed({'user_id': email_key(user_item['email'])}))},
+    ]
+
+
+class LoginEmailMigration:
+    """
+    Writes the email item of every LOGIN account created before email items existed.
+
+    The user items are read with a Scan and each email item is put only if the email has none yet, or already
+    belongs to the same account (refreshing its copy of the password hash), so re-running it is safe. An email that
+    already belongs to another account is a duplicate sign-up from before email uniqueness was enforced; it is
+    reported and left to whichever account claimed it first. Calls go through the LOGIN table's client-side
+    throttle, and writes are further capped at `write_rate` per second to leave capacity for live sign-ups.
+    """
+
+    def __init__(self, db_mode: str, write_rate: float = DynamoDbConstants.LOGIN_MIGRATION_WRITE_RATE,
+                 page_size: int = 25):
+        """
+        Args:
+            db_mode (str): The deployment mode.
+            write_rate (float): Email items written per second; 0 disables the limit.
+            page_size (int): Scan page Limit, kept small so a page fits in the table's read capacity.
+        """
+        self.db_mode = db_mode
+        self.bucket = TokenBucket(rate=write_rate)
+        self.page_size = page_size
+        self.table = ThrottledTable(db_mode=db_mode, table_name=DynamoDbConstants.TERPTRACKER_LOGIN_TABLE_NAME)
+
+    def _patiently(self, operation: str, **kwargs):
+        # A batch job waits out shed calls instead of failing
+        while True:
+            try:
+                return getattr(self.table, operation)(**kwargs)
+            except TableThrottled as e:
+                time.sleep(e.retry_after)
+
+    def migrate_account(self, user_item: dict):
+        """
+        Returns:
+            bool: True if the email item was written, False if the email belongs to another account.
+        """
+        self.bucket.acquire()
+        try:
+            self._patiently('put_item', Item=email_lookup_item(user_item),
+                            ConditionExpression=Attr('user_id').not_exists() | Attr('userId').eq(user_item['user_id']))
+            return True
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                return False
+            raise
+
+    def run(self):
+        """
+        Returns:
+            dict: Totals: scanned, migrated, conflicts and elapsedSeconds.
+        """
+        started_at = time.perf_counter()
+        totals = {'scanned': 0, 'migrated': 0, 'conflicts': 0}
+        print(f'🚧Writing email items for {DynamoDbConstants.TERPTRACKER_LOGIN_TABLE_NAME} accounts, write rate '
+              f'{self.bucket.rate}/s')
+        # User items are the ones with an `email` attribute; email items use `loginEmail`
+        scan_kwargs = {'FilterExpression': Attr('email').exists(), 'Limit': self.page_size}
+        while True:
+            response = self._patiently('scan', **scan_kwargs)
+            totals['scanned'] += response.get('ScannedCount', 0)
+            for user_item in response.get('Items', []):
+                if self.migrate_account(user_item):
+                    totals['migrated'] += 1
+                else:
+                    totals['conflicts'] += 1
+                    print(f"🚨{user_item['email']} already belongs to another account; "
+                          f"user_id={user_item['user_id']} cannot log in by email until the duplicate is resolved")
+
+            last_evaluated_key = response.get('LastEvaluatedKey')
+            if not last_evaluated_key:
+                break
+            scan_kwargs['ExclusiveStartKey'] = last_evaluated_key
+
+        totals['elapsedSeconds'] = round(time.perf_counter() - started_at, 2)
+        print(f'✅Login email migration complete: {totals}')
+        return totals
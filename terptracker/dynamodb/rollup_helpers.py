@@ -0,0 +1,443 @@
+from collections import defaultdict
+from decimal import Decimal
+from datetime import datetime, timezone
+from botocore.exceptions import ClientError
+from terptracker.dynamodb.dynamodb_helpers import QueryPlan, run_query_plan
+from terptracker.dynamodb.expense_schema import expense_amount, expense_epoch_seconds
+
+# Rollup items are flat so every counter can be incremented with a top-level ADD (nested map paths cannot be ADDed
+# to before the map exists). Per-category, per-type and per-day counters are stored as '<prefix><name>' attributes.
+CATEGORY_TOTAL_PREFIX = 'categoryTotal_'
+CATEGORY_COUNT_PREFIX = 'categoryCount_'
+TYPE_TOTAL_PREFIX = 'typeTotal_'
+TYPE_COUNT_PREFIX = 'typeCount_'
+DAY_TOTAL_PREFIX = 'dayTotal_'
+DAY_COUNT_PREFIX = 'dayCount_'
+
+_ROLLUP_GROUPS = {
+    CATEGORY_TOTAL_PREFIX: 'categoryTotals',
+    CATEGORY_COUNT_PREFIX: 'categoryCounts',
+    TYPE_TOTAL_PREFIX: 'typeTotals',
+    TYPE_COUNT_PREFIX: 'typeCounts',
+    DAY_TOTAL_PREFIX: 'dayTotals',
+    DAY_COUNT_PREFIX: 'dayCounts',
+}
+
+# Schema marker of rollups built from all of a month's expenses with per-day counters (backfills, rebuilds on read).
+# Only marked rollups are trusted. ADD updates never set it: one that creates a month's rollup only counts the
+# expenses added since, not those already stored, so unmarked rollups are rebuilt when read (see `is_rollup_complete`).
+ROLLUP_VERSION_ATTRIBUTE = 'rollupVersion'
+ROLLUP_SCHEMA_VERSION = 2
+
+
+def expense_year_month(expense_timestamp):
+    """
+    Returns the UTC calendar month (YYYY-MM) an expense timestamp falls in.
+
+    Args:
+        expense_timestamp (str | float | Decimal): The expense's sort key (v1 or v2) or epoch seconds.
+
+    Returns:
+        str: The month, e.g. '2025-02'.
+    """
+    return datetime.fromtimestamp(expense_epoch_seconds(expense_timestamp), tz=timezone.utc).strftime('%Y-%m')
+
+
+def expense_day_of_month(expense_timestamp):
+    """
+    Returns the zero-padded UTC day of month (DD) an expense timestamp falls on.
+    """
+    return datetime.fromtimestamp(expense_epoch_seconds(expense_timestamp), tz=timezone.utc).strftime('%d')
+
+
+def new_rollup(user_email: str, year_month: str):
+    """
+    Returns an empty rollup for the given user and month.
+    """
+    return {
+        'userEmail': user_email,
+        'yearMonth': year_month,
+        ROLLUP_VERSION_ATTRIBUTE: ROLLUP_SCHEMA_VERSION,
+        'totalAmount': Decimal('0'),
+        'itemCount': 0,
+        'categoryTotals': defaultdict(Decimal),
+        'categoryCounts': defaultdict(int),
+        'typeTotals': defaultdict(Decimal),
+        'typeCounts': defaultdict(int),
+        'dayTotals': defaultdict(Decimal),
+        'dayCounts': defaultdict(int),
+    }
+
+
+def accumulate_rollup(rollup: dict, expense_item: dict):
+    """
+    Adds a single USER_EXPENSES item to an in-memory rollup.
+
+    Args:
+        rollup (dict): A rollup created by `new_rollup`.
+        expense_item (dict): The raw expense item.
+
+    Returns:
+        dict: The same rollup, for chaining.
+    """
+    amount = expense_amount(expense_item)
+    category = expense_item.get('expenseCategory') or 'other'
+    expense_type = expense_item.get('expenseType') or 'other'
+    day = expense_day_of_month(expense_item['expenseTimestamp'])
+
+    rollup['totalAmount'] += amount
+    rollup['itemCount'] += 1
+    rollup['categoryTotals'][category] += amount
+    rollup['categoryCounts'][category] += 1
+    rollup['typeTotals'][expense_type] += amount
+    rollup['typeCounts'][expense_type] += 1
+    rollup['dayTotals'][day] += amount
+    rollup['dayCounts'][day] += 1
+    return rollup
+
+
+def accumulate_monthly_rollups(rollups: dict, user_email: str, expense_item: dict):
+    """
+    Adds a single USER_EXPENSES item to the in-memory rollup of the month it falls in, creating it on first use.
+
+    Args:
+        rollups (dict[str, dict]): Rollups by month (YYYY-MM).
+        user_email (str): The owner of the expenses.
+        expense_item (dict): The raw expense item.
+
+    Returns:
+        dict: The same rollups, for chaining.
+    """
+    year_month = expense_year_month(expense_item['expenseTimestamp'])
+    rollup = rollups.get(year_month)
+    if rollup is None:
+        rollup = rollups[year_month] = new_rollup(user_email=user_email, year_month=year_month)
+    accumulate_rollup(rollup, expense_item)
+    return rollups
+
+
+def build_rollup(user_email: str, year_month: str, expense_items):
+    """
+    Builds a rollup by streaming over a month's expense items. Used when no stored rollup exists yet.
+
+    Args:
+        user_email (str): The owner of the expenses.
+        year_month (str): The month the expenses belong to (YYYY-MM).
+        expense_items (Iterable[dict]): Raw USER_EXPENSES items, e.g. the output of `paginate_query`.
+
+    Returns:
+        dict: The rollup.
+    """
+    rollup = new_rollup(user_email=user_email, year_month=year_month)
+    for item in expense_items:
+        accumulate_rollup(rollup, item)
+    return rollup
+
+
+def rollup_to_item(rollup: dict):
+    """
+    Flattens an in-memory rollup into a USER_MONTHLY_ROLLUP item.
+    """
+    item = {
+        'userEmail': rollup['userEmail'],
+        'yearMonth': rollup['yearMonth'],
+        ROLLUP_VERSION_ATTRIBUTE: rollup[ROLLUP_VERSION_ATTRIBUTE],
+        'totalAmount': rollup['totalAmount'],
+        'itemCount': rollup['itemCount'],
+    }
+    for prefix, group in _ROLLUP_GROUPS.items():
+        for name, value in rollup[group].items():
+            item[f'{prefix}{name}'] = value
+    return item
+
+
+def rollup_from_item(item: dict):
+    """
+    Converts a USER_MONTHLY_ROLLUP item into a rollup with plain float totals and int counts, ready for templates
+    and JSON.
+
+    Args:
+        item (dict): The item returned by GetItem.
+
+    Returns:
+        dict: The rollup.
+    """
+    rollup = {
+        'userEmail': item['userEmail'],
+        'yearMonth': item['yearMonth'],
+        ROLLUP_VERSION_ATTRIBUTE: int(item.get(ROLLUP_VERSION_ATTRIBUTE, 0)),
+        'totalAmount': float(item.get('totalAmount', 0)),
+        'itemCount': int(item.get('itemCount', 0)),
+    }
+    for group in _ROLLUP_GROUPS.values():
+        rollup[group] = {}
+
+    for attribute, value in item.items():
+        for prefix, group in _ROLLUP_GROUPS.items():
+            if attribute.startswith(prefix):
+                name = attribute[len(prefix):]
+                rollup[group][name] = int(value) if group.endswith('Counts') else float(value)
+                break
+    return rollup
+
+
+def monthly_rollup_key(user_email: str, year_month: str):
+    """
+    Returns the USER_MONTHLY_ROLLUP primary key of one user's month.
+    """
+    return {'userEmail': user_email, 'yearMonth': year_month}
+
+
+def get_monthly_rollup(rollup_table, user_email: str, year_month: str):
+    """
+    Reads a user's rollup for one month.
+
+    Args:
+        rollup_table (boto3.dynamodb.Table): The USER_MONTHLY_ROLLUP table.
+        user_email (str): The user's email address.
+        year_month (str): The month to read (YYYY-MM).
+
+    Returns:
+        dict | None: The rollup (see `rollup_from_item`), or None if the user has no rollup for that month.
+    """
+    response = rollup_table.get_item(Key=monthly_rollup_key(user_email=user_email, year_month=year_month))
+    item = response.get('Item')
+    if item:
+        return rollup_from_item(item)
+    return None
+
+
+def rollup_update_kwargs(expense_item: dict):
+    """
+    Builds the UpdateItem arguments that add one expense to its month's rollup with a single `ADD` expression.
+
+    Args:
+        expense_item (dict): The USER_EXPENSES item that was just written.
+
+    Returns:
+        dict: Key, UpdateExpression, ExpressionAttributeNames and ExpressionAttributeValues.
+    """
+    amount = expense_amount(expense_item)
+    category = expense_item.get('expenseCategory') or 'other'
+    expense_type = expense_item.get('expenseType') or 'other'
+    day = expense_day_of_month(expense_item['expenseTimestamp'])
+
+    return dict(
+        Key=monthly_rollup_key(user_email=expense_item['userEmail'],
+                               year_month=expense_year_month(expense_item['expenseTimestamp'])),
+        UpdateExpression='ADD totalAmount :amount, itemCount :one, #ct :amount, #cc :one, #tt :amount, #tc :one, '
+                         '#dt :amount, #dc :one',
+        ExpressionAttributeNames={
+            '#ct': f'{CATEGORY_TOTAL_PREFIX}{category}',
+            '#cc': f'{CATEGORY_COUNT_PREFIX}{category}',
+            '#tt': f'{TYPE_TOTAL_PREFIX}{expense_type}',
+            '#tc': f'{TYPE_COUNT_PREFIX}{expense_type}',
+            '#dt': f'{DAY_TOTAL_PREFIX}{day}',
+            '#dc': f'{DAY_COUNT_PREFIX}{day}',
+        },
+        ExpressionAttributeValues={':amount': amount, ':one': 1}
+    )
+
+
+def rollup_delta_update_kwargs(rollup: dict):
+    """
+    Builds the UpdateItem arguments that add an in-memory rollup of new expenses (an import or write-behind batch)
+    to its stored month with a single `ADD` expression. The stored rollup's schema marker is left alone.
+
+    Args:
+        rollup (dict): A rollup created by `new_rollup` holding only the new expenses.
+
+    Returns:
+        dict: Key, UpdateExpression, ExpressionAttributeNames and ExpressionAttributeValues.
+    """
+    item = rollup_to_item(rollup)
+    counters = {name: value for name, value in item.items()
+                if name not in ('userEmail', 'yearMonth', ROLLUP_VERSION_ATTRIBUTE)}
+    return dict(
+        Key=monthly_rollup_key(user_email=rollup['userEmail'], year_month=rollup['yearMonth']),
+        UpdateExpression='ADD ' + ', '.join(f'#a{i} :v{i}' for i in range(len(counters))),
+        ExpressionAttributeNames={f'#a{i}': name for i, name in enumerate(counters)},
+        ExpressionAttributeValues={f':v{i}': value for i, value in enumerate(counters.values())}
+    )
+
+
+def record_expense_in_rollup(rollup_table, expense_item: dict):
+    """
+    Atomically adds a newly written expense to its month's rollup using a single `ADD` update expression.
+    The rollup item is created on first use.
+
+    Args:
+        rollup_table (boto3.dynamodb.Table): The USER_MONTHLY_ROLLUP table.
+        expense_item (dict): The USER_EXPENSES item that was just written.
+    """
+    rollup_table.update_item(**rollup_update_kwargs(expense_item))
+
+
+def is_rollup_complete(rollup: dict):
+    """
+    Returns:
+        bool: False if the rollup is missing or unmarked, i.e. it must be rebuilt from the month's expenses. An
+            unmarked rollup predates the per-day counters or was created by ADD updates for a month that was never
+            backfilled, so it may leave out expenses stored before it.
+    """
+    return rollup is not None and rollup[ROLLUP_VERSION_ATTRIBUTE] >= ROLLUP_SCHEMA_VERSION
+
+
+def rebuilt_rollup_put_kwargs(rollup: dict, built: dict):
+    """
+    Builds the PutItem arguments that store a rollup rebuilt from the month's expenses in place of a missing or
+    incomplete one, unless an expense was added to the month since the stored rollup was read.
+
+    Args:
+        rollup (dict | None): The stored rollup, as read; None if there was none.
+        built (dict): The rollup rebuilt from the month's expenses (see `build_rollup`).
+
+    Returns:
+        dict | None: Item, ConditionExpression and values, or None if nothing should be stored: the month has no
+            expenses, or the rebuild counts fewer expenses than the stored rollup (the read lagged behind it).
+    """
+    if built['itemCount'] == 0:
+        return None
+    if rollup is None:
+        return dict(Item=rollup_to_item(built), ConditionExpression='attribute_not_exists(userEmail)')
+    if built['itemCount'] < rollup['itemCount']:
+        return None
+    return dict(
+        Item=rollup_to_item(built),
+        ConditionExpression='attribute_not_exists(#version) AND itemCount = :count',
+        ExpressionAttributeNames={'#version': ROLLUP_VERSION_ATTRIBUTE},
+        ExpressionAttributeValues={':count': rollup['itemCount']}
+    )
+
+
+def _rebuilt_rollup_not_stored(error: ClientError, built: dict):
+    if error.response['Error']['Code'] != 'ConditionalCheckFailedException':
+        print(f"⚠️Could not store the rebuilt {built['yearMonth']} rollup of {built['userEmail']}: {error}")
+
+
+def store_rebuilt_rollup(rollup_table, rollup: dict, built: dict):
+    """
+    Stores a rebuilt rollup in place of a missing or incomplete one (see `rebuilt_rollup_put_kwargs`), so the month
+    is served by one GetItem from then on instead of being rebuilt on every read. Best effort: the caller already has
+    the rebuilt rollup.
+    """
+    put_kwargs = rebuilt_rollup_put_kwargs(rollup=rollup, built=built)
+    if put_kwargs is None:
+        return
+    try:
+        rollup_table.put_item(**put_kwargs)
+    except ClientError as e:
+        _rebuilt_rollup_not_stored(e, built)
+
+
+def get_or_build_monthly_rollup(rollup_table, user_expenses_table, user_email: str, year_month: str,
+                                expense_query_plan: QueryPlan, pending_items: list = ()):
+    """
+    Returns the stored rollup for a month, falling back to aggregating the month's expenses on the fly when the
+    rollup has not been written, is incomplete (e.g. for data recorded before rollups existed and not yet backfilled,
+    see `is_rollup_complete`) or does not include the user's pending write-behind items yet. A missing or incomplete
+    rollup is replaced with the rebuild.
+
+    Args:
+        rollup_table (boto3.dynamodb.Table): The USER_MONTHLY_ROLLUP table.
+        user_expenses_table (boto3.dynamodb.Table): The USER_EXPENSES table.
+        user_email (str): The user's email address.
+        year_month (str): The month to read (YYYY-MM).
+        expense_query_plan (QueryPlan): The planned read of the month's expenses.
+        pending_items (list[dict]): The month's items still in the write-behind queue (see write_behind.py).
+
+    Returns:
+        dict | None: The rollup, or None if the month has no expenses.
+    """
+    from terptracker.dynamodb.write_behind import merge_pending
+
+    rollup = None
+    if not pending_items:
+        rollup = get_monthly_rollup(rollup_table=rollup_table, user_email=user_email, year_month=year_month)
+        if is_rollup_complete(rollup):
+            return rollup
+
+    built = build_rollup(user_email=user_email, year_month=year_month,
+                         expense_items=merge_pending(run_query_plan(user_expenses_table, expense_query_plan),
+                                                     pending_items))
+    if not pending_items:
+        # A rebuild that includes unflushed items must not be stored: their rollup deltas are still to be applied
+        store_rebuilt_rollup(rollup_table=rollup_table, rollup=rollup, built=built)
+    if built['itemCount'] == 0:
+        return None
+    return rollup_from_item(rollup_to_item(built))
+
+
+def rollup_daily_series(rollup: dict):
+    """
+    Expands a rollup's per-day counters into a date-ordered series covering every day that has expenses.
+
+    Args:
+        rollup (dict): A rollup as returned by `get_monthly_rollup`.
+
+    Returns:
+        list[dict]: One {'date', 'total', 'count'} entry per day, e.g. {'date': '2025-02-03', ...}.
+    """
+    return [
+        {'date': f"{rollup['yearMonth']}-{day}",
+         'total': rollup['dayTotals'][day],
+         'count': rollup['dayCounts'].get(day, 0)}
+        for day in sorted(rollup['dayTotals'])
+    ]
+
+
+async def async_get_monthly_rollup(rollup_table, user_email: str, year_month: str):
+    """
+    Async counterpart of `get_monthly_rollup` for an async table (see async_dynamodb_helpers).
+    """
+    response = await rollup_table.get_item(Key=monthly_rollup_key(user_email=user_email, year_month=year_month))
+    item = response.get('Item')
+    if item:
+        return rollup_from_item(item)
+    return None
+
+
+async def async_record_expense_in_rollup(rollup_table, expense_item: dict):
+    """
+    Async counterpart of `record_expense_in_rollup`.
+    """
+    await rollup_table.update_item(**rollup_update_kwargs(expense_item))
+
+
+async def async_store_rebuilt_rollup(rollup_table, rollup: dict, built: dict):
+    """
+    Async counterpart of `store_rebuilt_rollup`.
+    """
+    put_kwargs = rebuilt_rollup_put_kwargs(rollup=rollup, built=built)
+    if put_kwargs is None:
+        return
+    try:
+        await rollup_table.put_item(**put_kwargs)
+    except ClientError as e:
+        _rebuilt_rollup_not_stored(e, built)
+
+
+async def async_get_or_build_monthly_rollup(rollup_table, user_expenses_table, user_email: str, year_month: str,
+                                            expense_query_plan: QueryPlan, pending_items: list = ()):
+    """
+    Async counterpart of `get_or_build_monthly_rollup`.
+    """
+    from terptracker.dynamodb.async_dynamodb_helpers import async_run_query_plan
+    from terptracker.dynamodb.write_behind import async_merge_pending
+
+    rollup = None
+    if not pending_items:
+        rollup = await async_get_monthly_rollup(rollup_table=rollup_table, user_email=user_email,
+                                                year_month=year_month)
+        if is_rollup_complete(rollup):
+            return rollup
+
+    built = new_rollup(user_email=user_email, year_month=year_month)
+    async for item in async_merge_pending(async_run_query_plan(user_expenses_table, expense_query_plan),
+                                          pending_items):
+        accumulate_rollup(built, item)
+    if not pending_items:
+        await async_store_rebuilt_rollup(rollup_table=rollup_table, rollup=rollup, built=built)
+    if built['itemCount'] == 0:
+        return None
+    return rollup_from_item(rollup_to_item(built))
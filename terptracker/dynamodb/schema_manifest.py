@@ -0,0 +1,68 @@
+import json
+import os
+from datetime import datetime, timezone
+from terptracker.constants.DynamoDbConstants import DynamoDbConstants
+
+
+def build_schema_manifest(db_mode: str):
+    """
+    Builds the manifest recorded by `terptracker init-db` once every table has been provisioned.
+
+    Args:
+        db_mode (str): The deployment mode the schema was provisioned for.
+
+    Returns:
+        dict: The manifest.
+    """
+    return {
+        'schemaVersion': DynamoDbConstants.SCHEMA_VERSION,
+        'dbMode': db_mode.upper(),
+        'tables': sorted(DynamoDbConstants.TERPTRACKER_TABLE_NAMES),
+        'provisionedAt': datetime.now(timezone.utc).isoformat(),
+    }
+
+
+def write_schema_manifest(path: str, db_mode: str):
+    """
+    Writes the schema manifest to `path` atomically (write to a temp file, then rename).
+
+    Returns:
+        dict: The manifest that was written.
+    """
+    manifest = build_schema_manifest(db_mode=db_mode)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+    return manifest
+
+
+def verify_schema_manifest(path: str, db_mode: str):
+    """
+    Checks that a manifest exists at `path` and matches the schema this code expects, without calling DynamoDB.
+
+    Args:
+        path (str): The manifest path.
+        db_mode (str): The deployment mode the worker is running in.
+
+    Raises:
+        RuntimeError: If the manifest is missing, unreadable or stale.
+    """
+    try:
+        with open(path) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        raise RuntimeError(f'Schema manifest {path} could not be read ({e}); run `terptracker init-db` first.')
+
+    if manifest.get('schemaVersion') != DynamoDbConstants.SCHEMA_VERSION:
+        raise RuntimeError(f"Schema manifest {path} is for schema version {manifest.get('schemaVersion')}, expected "
+                           f"{DynamoDbConstants.SCHEMA_VERSION}; rerun `terptracker init-db`.")
+    if manifest.get('dbMode') != db_mode.upper():
+        raise RuntimeError(f"Schema manifest {path} was written for DB_MODE={manifest.get('dbMode')}, "
+                           f"not {db_mode.upper()}; rerun `terptracker init-db`.")
+
+    missing_tables = set(DynamoDbConstants.TERPTRACKER_TABLE_NAMES) - set(manifest.get('tables', []))
+    if missing_tables:
+        raise RuntimeError(f'Schema manifest {path} does not list {sorted(missing_tables)}; '
+                           f'rerun `terptracker init-db`.')
+    return manifest
@@ -1,5 +1,6 @@
 import botocore.exceptions
 from terptracker.dynamodb.dynamodb_helpers import *
+from terptracker.dynamodb.expense_schema import CATEGORY_INDEX_ATTRIBUTES
 from terptracker.constants.DynamoDbConstants import DynamoDbConstants
 
 
@@ -16,12 +17,71 @@ class ExpenseTable:
         self.dynamodb_resource = get_dynamodb_resource(db_mode=db_mode)
         self.dynamodb_client = get_dynamodb_client(db_mode=db_mode)
 
+    @staticmethod
+    def category_index_definition():
+        """
+        Returns:
+            dict: The sparse category index on (userCategory, expenseTimestamp). Only items with a category carry
+                `userCategory`, and only the attributes expense records are built from are projected.
+        """
+        return {
+            'IndexName': DynamoDbConstants.USER_EXPENSES_CATEGORY_INDEX_NAME,
+            'KeySchema': [
+                {
+                    'AttributeName': 'userCategory',
+                    'KeyType': 'HASH'
+                },
+                {
+                    'AttributeName': 'expenseTimestamp',
+                    'KeyType': 'RANGE'
+                }
+            ],
+            'Projection': {
+                'ProjectionType': 'INCLUDE',
+                'NonKeyAttributes': list(CATEGORY_INDEX_ATTRIBUTES),
+            }
+        }
+
+    def update_indexes(self, drop_legacy_index: bool = False):
+        """
+        Brings the indexes of an existing USER_EXPENSES table up to date: adds the category index if it is missing
+        and, when asked, drops the legacy UserTimestampIndex (same keys as the table, so nothing queries it any
+        more; drop it once no worker running older code is left). DynamoDB runs one index change at a time, so an
+        index that is still being built makes the drop fail until it is ACTIVE; rerun it then.
+
+        Args:
+            drop_legacy_index (bool): Whether to delete UserTimestampIndex.
+        """
+        table_name = DynamoDbConstants.TERPTRACKER_USER_EXPENSES_TABLE_NAME
+        description = self.dynamodb_client.describe_table(TableName=table_name)['Table']
+        index_names = {index['IndexName'] for index in description.get('GlobalSecondaryIndexes', [])}
+        try:
+            if DynamoDbConstants.USER_EXPENSES_CATEGORY_INDEX_NAME not in index_names:
+                print(f'🚧Adding {DynamoDbConstants.USER_EXPENSES_CATEGORY_INDEX_NAME} to {table_name}...')
+                self.dynamodb_client.update_table(
+                    TableName=table_name,
+                    AttributeDefinitions=[{'AttributeName': 'userCategory', 'AttributeType': 'S'},
+                                          {'AttributeName': 'expenseTimestamp', 'AttributeType': 'S'}],
+                    GlobalSecondaryIndexUpdates=[{'Create': self.category_index_definition()}]
+                )
+            legacy_index_name = DynamoDbConstants.USER_EXPENSES_LEGACY_TIMESTAMP_INDEX_NAME
+            if drop_legacy_index and legacy_index_name in index_names:
+                print(f'🚧Dropping {legacy_index_name} from {table_name}...')
+                self.dynamodb_client.update_table(TableName=table_name,
+                                                  GlobalSecondaryIndexUpdates=[{'Delete': {
+                                                      'IndexName': legacy_index_name}}])
+        except botocore.exceptions.ClientError as e:
+            if e.response['Error']['Code'] in ('LimitExceededException', 'ResourceInUseException'):
+                print(f'⚠️ {table_name} has an index change in progress; rerun once it has finished: {e}')
+            else:
+                raise
+
     def create_table(self):
         """
         Creates a USER_EXPENSES DynamoDB table with the necessary schema and a global secondary index.
 
-        The table uses 'bskyUsername' as the partition key and 'bskyPostHash' as the sort key.
-        The schema also defines a global secondary index on 'timelineDate' to support queries by date.
+        The table uses 'userEmail' as the partition key and 'expenseTimestamp' as the sort key, which serves every
+        time range query. The sparse category index (see `category_index_definition`) serves category queries.
 
         Returns:
             None
@@ -55,26 +115,13 @@ class ExpenseTable:
                             'AttributeName': 'expenseTimestamp',
                             'AttributeType': 'S'
                         },
+                        {
+                            'AttributeName': 'userCategory',
+                            'AttributeType': 'S'
+                        },
                     ],
                     BillingMode='PAY_PER_REQUEST',
-                    GlobalSecondaryIndexes=[
-                        {
-                            'IndexName': 'UserTimestampIndex',
-                            'KeySchema': [
-                                {
-                                    'AttributeName': 'userEmail',
-                                    'KeyType': 'HASH'
-                                },
-                                {
-                                    'AttributeName': 'expenseTimestamp',
-                                    'KeyType': 'RANGE'
-                                }
-                            ],
-                            'Projection': {
-                                'ProjectionType': 'ALL',
-                            }
-                        }
-                    ]
+                    GlobalSecondaryIndexes=[self.category_index_definition()]
                 )
                 table.wait_until_exists()
                 print(f"✅{DynamoDbConstants.TERPTRACKER_USER_EXPENSES_TABLE_NAME} table created successfully.")
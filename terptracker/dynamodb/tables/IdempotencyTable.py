@@ -0,0 +1,74 @@
+import botocore.exceptions
+from terptracker.dynamodb.dynamodb_helpers import *
+from terptracker.constants.DynamoDbConstants import DynamoDbConstants
+
+
+class IdempotencyTable:
+    """
+    Handles the dynamodb table schema used to create the EXPENSE_IDEMPOTENCY DynamoDB table.
+
+    Each item records which expense an add-expense submission created, so a repeated submission (double-click,
+    browser resubmit) is answered with the original result instead of writing a duplicate (see
+    dynamodb/idempotency.py). Items expire through DynamoDB TTL.
+    """
+
+    def __init__(self, db_mode):
+        """
+        Initializes an EXPENSE_IDEMPOTENCY instance by making the DynamoDB resource and client objects readily
+        available
+        """
+        self.dynamodb_resource = get_dynamodb_resource(db_mode=db_mode)
+        self.dynamodb_client = get_dynamodb_client(db_mode=db_mode)
+
+    def create_table(self):
+        """
+        Creates an EXPENSE_IDEMPOTENCY DynamoDB table keyed by 'userEmail' (partition key) and 'idempotencyKey' (sort
+        key), with TTL enabled on 'expiresAt'.
+
+        Returns:
+            None
+        """
+        table_name = DynamoDbConstants.TERPTRACKER_EXPENSE_IDEMPOTENCY_TABLE_NAME
+        try:
+            idempotency_table_exists = table_exists(client=self.dynamodb_client, table_name=table_name)
+            if idempotency_table_exists is True:
+                print(f'✅{table_name} table already exists')
+                return
+            else:
+                print(f'🚧Creating {table_name}...')
+                table = self.dynamodb_resource.create_table(
+                    TableName=table_name,
+                    KeySchema=[
+                        {
+                            'AttributeName': 'userEmail',
+                            'KeyType': 'HASH'  # Partition key
+                        },
+                        {
+                            'AttributeName': 'idempotencyKey',
+                            'KeyType': 'RANGE'  # Sort key
+                        }
+                    ],
+                    AttributeDefinitions=[
+                        {
+                            'AttributeName': 'userEmail',
+                            'AttributeType': 'S'
+                        },
+                        {
+                            'AttributeName': 'idempotencyKey',
+                            'AttributeType': 'S'
+                        },
+                    ],
+                    BillingMode='PAY_PER_REQUEST'
+                )
+                table.wait_until_exists()
+                self.dynamodb_client.update_time_to_live(
+                    TableName=table_name,
+                    TimeToLiveSpecification={'Enabled': True, 'AttributeName': 'expiresAt'}
+                )
+                print(f"✅{table_name} table created successfully.")
+
+        except botocore.exceptions.ClientError as e:
+            if e.response['Error']['Code'] == 'ResourceInUseException':
+                print(f"⚠️ {table_name} is being created by another process. Skipping.")
+            else:
+                print(f'🚨DynamoDB error when trying to create {table_name} table: {e}')
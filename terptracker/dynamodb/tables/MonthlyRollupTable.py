@@ -0,0 +1,68 @@
+import botocore.exceptions
+from terptracker.dynamodb.dynamodb_helpers import *
+from terptracker.constants.DynamoDbConstants import DynamoDbConstants
+
+
+class MonthlyRollupTable:
+    """
+    Handles the dynamodb table schema used to create the USER_MONTHLY_ROLLUP DynamoDB table.
+
+    Each item holds the pre-aggregated totals and counts of one user's expenses for one calendar month, so the
+    summary pages can be served with a single GetItem.
+    """
+
+    def __init__(self, db_mode):
+        """
+        Initializes a USER_MONTHLY_ROLLUP instance by making the DynamoDB resource and client objects readily available
+        """
+        self.dynamodb_resource = get_dynamodb_resource(db_mode=db_mode)
+        self.dynamodb_client = get_dynamodb_client(db_mode=db_mode)
+
+    def create_table(self):
+        """
+        Creates a USER_MONTHLY_ROLLUP DynamoDB table keyed by 'userEmail' (partition key) and 'yearMonth' (sort key,
+        formatted as YYYY-MM).
+
+        Returns:
+            None
+        """
+        table_name = DynamoDbConstants.TERPTRACKER_USER_MONTHLY_ROLLUP_TABLE_NAME
+        try:
+            rollup_table_exists = table_exists(client=self.dynamodb_client, table_name=table_name)
+            if rollup_table_exists is True:
+                print(f'✅{table_name} table already exists')
+                return
+            else:
+                print(f'🚧Creating {table_name}...')
+                table = self.dynamodb_resource.create_table(
+                    TableName=table_name,
+                    KeySchema=[
+                        {
+                            'AttributeName': 'userEmail',
+                            'KeyType': 'HASH'  # Partition key
+                        },
+                        {
+                            'AttributeName': 'yearMonth',
+                            'KeyType': 'RANGE'  # Sort key
+                        }
+                    ],
+                    AttributeDefinitions=[
+                        {
+                            'AttributeName': 'userEmail',
+                            'AttributeType': 'S'
+                        },
+                        {
+                            'AttributeName': 'yearMonth',
+                            'AttributeType': 'S'
+                        },
+                    ],
+                    BillingMode='PAY_PER_REQUEST'
+                )
+                table.wait_until_exists()
+                print(f"✅{table_name} table created successfully.")
+
+        except botocore.exceptions.ClientError as e:
+            if e.response['Error']['Code'] == 'ResourceInUseException':
+                print(f"⚠️ {table_name} is being created by another process. Skipping.")
+            else:
+                print(f'🚨DynamoDB error when trying to create {table_name} table: {e}')
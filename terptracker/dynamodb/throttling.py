@@ -0,0 +1,545 @@
+import asyncio
+import math
+import os
+import random
+import threading
+import time
+from botocore.exceptions import BotoCoreError, ClientError
+from terptracker.constants.DynamoDbConstants import DynamoDbConstants
+from terptracker.dynamodb.dynamodb_helpers import LazyDynamoDbTable, TokenBucket, get_dynamodb_client
+from terptracker.dynamodb.async_dynamodb_helpers import AsyncLazyDynamoDbTable, get_async_dynamodb_client
+
+# Error codes DynamoDB answers with when a table or index is over its provisioned (or account) throughput
+THROTTLING_ERROR_CODES = frozenset({'ProvisionedThroughputExceededException', 'ThrottlingException',
+                                    'RequestLimitExceeded'})
+_READ_OPERATIONS = frozenset({'get_item', 'query', 'scan'})
+# Adaptive rate: halve a bucket's rate when DynamoDB throttles it, win back 5% of the provisioned rate per successful
+# call, and never drop below 10% of it
+_DECREASE_FACTOR = 0.5
+_INCREASE_SHARE = 0.05
+_MIN_RATE_SHARE = 0.1
+# Weight of the latest reported cost in a call's running cost estimate
+_ESTIMATE_WEIGHT = 0.2
+
+# One throttle per (db_mode, table name) and worker process, shared by the sync and async wrappers
+_throttle_registry = {}
+_throttle_registry_lock = threading.Lock()
+_throttle_registry_pid = os.getpid()
+# Running async capacity refreshes, referenced until done so they are not garbage collected mid-flight
+_capacity_refresh_tasks = set()
+
+
+class TableThrottled(Exception):
+    """
+    Raised instead of calling DynamoDB when a table cannot take more traffic right now: the client-side rate limit
+    would wait too long, throttled retries ran out, or the circuit breaker is open. Answer it with 503 and
+    `retry_after_headers`.
+    """
+
+    def __init__(self, table_name: str, reason: str, retry_after: float):
+        super().__init__(f'{table_name} is throttled ({reason}); retry in {retry_after:.1f}s')
+        self.table_name = table_name
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def retry_after_headers(error: TableThrottled):
+    """
+    Returns:
+        dict: The Retry-After header for a 503 answering `error`, in whole seconds.
+    """
+    return {'Retry-After': str(max(1, math.ceil(error.retry_after)))}
+
+
+def is_throttling_error(error: ClientError):
+    return error.response.get('Error', {}).get('Code') in THROTTLING_ERROR_CODES
+
+
+def consumed_capacity_units(response: dict, table_name: str, target: str):
+    """
+    Splits a response's ConsumedCapacity (requested with ReturnConsumedCapacity='INDEXES') by table and index.
+
+    Args:
+        response (dict): The DynamoDB response.
+        table_name (str): The table called.
+        target (str): The table or index the call addressed; charged the total when no breakdown is reported.
+
+    Returns:
+        dict[str, float]: Capacity units per table or index name; empty if the response reports none.
+    """
+    consumed = response.get('ConsumedCapacity') or {}
+    if isinstance(consumed, list):
+        # TransactWriteItems reports one entry per table it wrote
+        consumed = next((entry for entry in consumed if entry.get('TableName') == table_name), {})
+    units = {}
+    if 'Table' in consumed:
+        units[table_name] = float(consumed['Table'].get('CapacityUnits', 0))
+    for index_name, index_consumed in (consumed.get('GlobalSecondaryIndexes') or {}).items():
+        units[index_name] = float(index_consumed.get('CapacityUnits', 0))
+    if not units and 'CapacityUnits' in consumed:
+        units[target] = float(consumed['CapacityUnits'])
+    return units
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` failed calls in a row and sheds calls for `reset_seconds`. Then one probe call is
+    let through per period; its success closes the breaker again, its failure keeps it open. A probe that ends
+    neither way (e.g. a failed condition check) lets the next call probe instead.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name: str, failure_threshold: int, reset_seconds: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def retry_after(self):
+        """
+        Returns:
+            float | None: None if a call may go ahead, otherwise the seconds until the next probe.
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return None
+            now = time.monotonic()
+            remaining = self._opened_at + self.reset_seconds - now
+            if remaining > 0:
+                return remaining
+            # This call is the probe; later ones wait for another period unless it succeeds
+            self.state = self.HALF_OPEN
+            self._opened_at = now
+            return None
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            if self.state != self.CLOSED:
+                print(f'✅{self.name} circuit closed')
+                self.state = self.CLOSED
+
+    def record_neutral(self):
+        """
+        Records a call that reached DynamoDB but did not succeed for reasons unrelated to throughput (a failed
+        condition, a validation error); it neither resets the failure count nor closes the breaker.
+        """
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._opened_at = time.monotonic() - self.reset_seconds
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self.state == self.CLOSED:
+                    print(f'🚨{self.name} circuit opened after {self._failures} throttled calls; shedding requests '
+                          f'for {self.reset_seconds}s')
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+
+class TableThrottle:
+    """
+    Client-side throughput control for one table: a read and a write token bucket per table and global secondary
+    index, sized from the provisioned capacity in DescribeTable, jittered exponential backoff for throttled calls
+    and a circuit breaker.
+
+    Buckets are charged an estimate before each call and settled with the ConsumedCapacity DynamoDB reports, so the
+    estimates follow the real item sizes. A throttled bucket halves its rate and recovers a little with every
+    successful call, which also absorbs other workers sharing the same capacity. On-demand tables get unlimited
+    buckets but keep the backoff and the breaker.
+    """
+
+    def __init__(self, table_name: str, capacity_share: float = DynamoDbConstants.THROTTLE_CAPACITY_SHARE,
+                 burst_seconds: float = DynamoDbConstants.THROTTLE_BURST_SECONDS,
+                 max_wait_seconds: float = DynamoDbConstants.THROTTLE_MAX_WAIT_SECONDS,
+                 max_attempts: int = DynamoDbConstants.THROTTLE_MAX_ATTEMPTS,
+                 backoff_base_seconds: float = DynamoDbConstants.THROTTLE_BACKOFF_BASE_SECONDS,
+                 backoff_max_seconds: float = DynamoDbConstants.THROTTLE_BACKOFF_MAX_SECONDS,
+                 failure_threshold: int = DynamoDbConstants.THROTTLE_CIRCUIT_FAILURE_THRESHOLD,
+                 reset_seconds: float = DynamoDbConstants.THROTTLE_CIRCUIT_RESET_SECONDS,
+                 refresh_seconds: float = DynamoDbConstants.THROTTLE_CAPACITY_REFRESH_SECONDS):
+        """
+        Args:
+            table_name (str): The table.
+            capacity_share (float): The fraction of the provisioned capacity this worker may use.
+            burst_seconds (float): Bucket size, in seconds of the bucket's rate.
+            max_wait_seconds (float): The longest a call waits for tokens before it is shed.
+            max_attempts (int): Attempts per call when DynamoDB throttles it.
+            backoff_base_seconds (float): Upper bound of the first retry delay; doubles on every retry.
+            backoff_max_seconds (float): Upper bound of any retry delay.
+            failure_threshold (int): Calls in a row that run out of attempts before the breaker opens.
+            reset_seconds (float): How long the open breaker sheds calls before probing.
+            refresh_seconds (float): How often the provisioned capacity is re-read (it may be auto scaled).
+        """
+        self.table_name = table_name
+        self.capacity_share = capacity_share
+        self.burst_seconds = burst_seconds
+        self.max_wait_seconds = max_wait_seconds
+        self.max_attempts = max_attempts
+        self.backoff_base_seconds = backoff_base_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+        self.refresh_seconds = refresh_seconds
+        self.breaker = CircuitBreaker(name=table_name, failure_threshold=failure_threshold,
+                                      reset_seconds=reset_seconds)
+        self._buckets = {}
+        self._provisioned = {}
+        self._estimates = {}
+        self._described_at = None
+        self._lock = threading.Lock()
+        self.counters = {'calls': 0, 'throttled': 0, 'retries': 0, 'shed': 0, 'exhausted': 0,
+                         'consumedReadUnits': 0.0, 'consumedWriteUnits': 0.0}
+
+    def claim_refresh(self):
+        """
+        Returns:
+            bool: True if the provisioned capacity is due to be (re-)read and this caller should do it.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self._described_at is not None and now - self._described_at < self.refresh_seconds:
+                return False
+            self._described_at = now
+            return True
+
+    def apply_description(self, description: dict):
+        """
+        Sizes the buckets from a DescribeTable `Table` description.
+        """
+        on_demand = (description.get('BillingModeSummary') or {}).get('BillingMode') == 'PAY_PER_REQUEST'
+        throughputs = {self.table_name: description.get('ProvisionedThroughput') or {}}
+        for index in description.get('GlobalSecondaryIndexes') or []:
+            throughputs[index['IndexName']] = index.get('ProvisionedThroughput') or {}
+
+        with self._lock:
+            for target, throughput in throughputs.items():
+                for kind, units_name in (('read', 'ReadCapacityUnits'), ('write', 'WriteCapacityUnits')):
+                    rate = 0.0 if on_demand else float(throughput.get(units_name, 0)) * self.capacity_share
+                    key = (kind, target)
+                    if self._provisioned.get(key) == rate:
+                        continue
+                    self._provisioned[key] = rate
+                    self._bucket(key).set_rate(rate, capacity=max(1.0, rate * self.burst_seconds))
+
+    def _count(self, name: str, amount: float = 1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def _bucket(self, key: tuple):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(rate=0)
+        return bucket
+
+    def bucket(self, key: tuple):
+        """
+        Returns:
+            TokenBucket: The bucket for ('read' | 'write', table or index name); unlimited until sized.
+        """
+        with self._lock:
+            return self._bucket(key)
+
+    def begin(self, operation: str, kwargs: dict):
+        """
+        Checks the breaker and picks the bucket and estimated cost of a call.
+
+        Returns:
+            tuple[tuple, float]: The bucket key and the tokens to take before calling.
+
+        Raises:
+            TableThrottled: The breaker is open.
+        """
+        retry_after = self.breaker.retry_after()
+        if retry_after is not None:
+            self._count('shed')
+            raise TableThrottled(table_name=self.table_name, reason='circuit open', retry_after=retry_after)
+        kind = 'read' if operation in _READ_OPERATIONS else 'write'
+        target = kwargs.get('IndexName') or self.table_name
+        key = (kind, target)
+        with self._lock:
+            tokens = self._estimates.get((operation, target), 1.0)
+            bucket = self._bucket(key)
+            self.counters['calls'] += 1
+        # A call never waits for more than a full bucket, however large its estimate
+        return key, min(tokens, bucket.capacity)
+
+    def shed(self, key: tuple, tokens: float):
+        """
+        Returns:
+            TableThrottled: The error for a call whose tokens would not be available within max_wait_seconds.
+        """
+        self._count('shed')
+        return TableThrottled(table_name=self.table_name, reason=f'{key[0]} rate limit on {key[1]}',
+                              retry_after=self.bucket(key).wait_seconds(tokens))
+
+    def settle(self, operation: str, key: tuple, tokens: float, response: dict):
+        """
+        Charges the buckets what a successful call reported it consumed, updates the call's cost estimate and lets
+        the bucket's rate recover.
+        """
+        kind, target = key
+        units = consumed_capacity_units(response, table_name=self.table_name, target=target)
+        for name, consumed in units.items():
+            self.bucket((kind, name)).adjust(consumed - tokens if name == target else consumed)
+        self._count('consumedReadUnits' if kind == 'read' else 'consumedWriteUnits', sum(units.values()))
+
+        with self._lock:
+            if target in units:
+                estimate = self._estimates.get((operation, target), units[target])
+                self._estimates[(operation, target)] = ((1 - _ESTIMATE_WEIGHT) * estimate +
+                                                        _ESTIMATE_WEIGHT * units[target])
+            provisioned = self._provisioned.get(key, 0.0)
+            bucket = self._bucket(key)
+        if provisioned and bucket.rate < provisioned:
+            rate = min(provisioned, bucket.rate + provisioned * _INCREASE_SHARE)
+            bucket.set_rate(rate, capacity=max(1.0, rate * self.burst_seconds))
+        self.breaker.record_success()
+
+    def throttled(self, key: tuple, attempt: int, error: ClientError):
+        """
+        Handles a throttled attempt: slows the bucket down and picks the retry delay.
+
+        Args:
+            key (tuple): The call's bucket key.
+            attempt (int): Attempts made so far, including this one.
+            error (ClientError): The throttling error.
+
+        Returns:
+            float: Seconds to sleep before the next attempt.
+
+        Raises:
+            TableThrottled: The call is out of attempts.
+        """
+        self._count('throttled')
+        with self._lock:
+            provisioned = self._provisioned.get(key, 0.0)
+            bucket = self._bucket(key)
+        if provisioned:
+            rate = max(provisioned * _MIN_RATE_SHARE, bucket.rate * _DECREASE_FACTOR)
+            bucket.set_rate(rate, capacity=max(1.0, rate * self.burst_seconds))
+
+        if attempt >= self.max_attempts:
+            self._count('exhausted')
+            self.breaker.record_failure()
+            raise TableThrottled(table_name=self.table_name, reason=error.response['Error']['Code'],
+                                 retry_after=self.backoff_max_seconds) from error
+        self._count('retries')
+        # Full jitter: spreads the retries of every request throttled by the same spike
+        return random.uniform(0, min(self.backoff_max_seconds, self.backoff_base_seconds * (2 ** (attempt - 1))))
+
+    def stats(self):
+        """
+        Returns:
+            dict: Call counters, the breaker state and the current rate of every sized bucket.
+        """
+        with self._lock:
+            rates = {f'{kind}:{target}': {'rate': round(self._buckets[(kind, target)].rate, 3),
+                                          'provisioned': provisioned}
+                     for (kind, target), provisioned in self._provisioned.items()}
+            counters = dict(self.counters)
+        return dict(counters, table=self.table_name, circuit=self.breaker.state, buckets=rates)
+
+
+def get_table_throttle(db_mode: str, table_name: str):
+    """
+    Returns:
+        TableThrottle: This worker process's throttle for the table, created on first use.
+    """
+    global _throttle_registry_lock, _throttle_registry_pid
+    if _throttle_registry_pid != os.getpid():
+        _throttle_registry.clear()
+        _throttle_registry_lock = threading.Lock()
+        _throttle_registry_pid = os.getpid()
+    key = (db_mode.upper(), table_name)
+    throttle = _throttle_registry.get(key)
+    if throttle is None:
+        with _throttle_registry_lock:
+            throttle = _throttle_registry.setdefault(key, TableThrottle(table_name=table_name))
+    return throttle
+
+
+def throttle_stats():
+    """
+    Returns:
+        list[dict]: `TableThrottle.stats` of every throttled table in this worker process.
+    """
+    return [throttle.stats() for throttle in list(_throttle_registry.values())]
+
+
+class ThrottledTable:
+    """
+    A module-level table reference like `LazyDynamoDbTable` whose get_item, query, scan, put_item, update_item,
+    delete_item and transact_write_items calls go through the table's `TableThrottle` (a transaction is charged to
+    the table's write bucket). Every other attribute is delegated unchanged.
+    """
+
+    def __init__(self, db_mode: str, table_name: str):
+        self.db_mode = db_mode
+        self.table_name = table_name
+        self._table = LazyDynamoDbTable(db_mode=db_mode, table_name=table_name)
+
+    def _refresh_capacity(self, throttle: TableThrottle):
+        try:
+            description = get_dynamodb_client(db_mode=self.db_mode).describe_table(TableName=self.table_name)
+            throttle.apply_description(description['Table'])
+        except (BotoCoreError, ClientError) as e:
+            print(f'⚠️Could not read the provisioned capacity of {self.table_name}: {e}')
+
+    @property
+    def throttle(self):
+        throttle = get_table_throttle(db_mode=self.db_mode, table_name=self.table_name)
+        if throttle.claim_refresh():
+            # DescribeTable never runs on the request: the buckets keep their current sizing (unlimited before the
+            # first refresh) until the background read returns
+            threading.Thread(target=self._refresh_capacity, args=(throttle,), daemon=True,
+                             name=f'{self.table_name}-capacity-refresh').start()
+        return throttle
+
+    def _call(self, operation: str, kwargs: dict):
+        throttle = self.throttle
+        key, tokens = throttle.begin(operation, kwargs)
+        if not throttle.bucket(key).acquire(tokens, timeout=throttle.max_wait_seconds):
+            raise throttle.shed(key, tokens)
+        kwargs.setdefault('ReturnConsumedCapacity', 'INDEXES')
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                response = getattr(self._table, operation)(**kwargs)
+            except ClientError as e:
+                if not is_throttling_error(e):
+                    throttle.breaker.record_neutral()
+                    raise
+                time.sleep(throttle.throttled(key, attempt=attempt, error=e))
+                continue
+            throttle.settle(operation, key, tokens, response)
+            return response
+
+    def get_item(self, **kwargs):
+        return self._call('get_item', kwargs)
+
+    def query(self, **kwargs):
+        return self._call('query', kwargs)
+
+    def scan(self, **kwargs):
+        return self._call('scan', kwargs)
+
+    def put_item(self, **kwargs):
+        return self._call('put_item', kwargs)
+
+    def update_item(self, **kwargs):
+        return self._call('update_item', kwargs)
+
+    def delete_item(self, **kwargs):
+        return self._call('delete_item', kwargs)
+
+    def transact_write_items(self, **kwargs):
+        return self._call('transact_write_items', kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._table, name)
+
+
+class AsyncThrottledTable:
+    """
+    Async counterpart of `ThrottledTable`, wrapping an `AsyncLazyDynamoDbTable`. It shares the worker's
+    `TableThrottle` with the sync wrapper and waits for tokens and retries with asyncio.sleep.
+    """
+
+    def __init__(self, db_mode: str, table_name: str):
+        self.db_mode = db_mode
+        self.table_name = table_name
+        self._table = AsyncLazyDynamoDbTable(db_mode=db_mode, table_name=table_name)
+
+    async def _refresh_capacity(self, throttle: TableThrottle):
+        try:
+            client = await get_async_dynamodb_client(db_mode=self.db_mode)
+            description = await client.describe_table(TableName=self.table_name)
+            throttle.apply_description(description['Table'])
+        except (BotoCoreError, ClientError) as e:
+            print(f'⚠️Could not read the provisioned capacity of {self.table_name}: {e}')
+
+    async def get_throttle(self):
+        throttle = get_table_throttle(db_mode=self.db_mode, table_name=self.table_name)
+        if throttle.claim_refresh():
+            # Like `ThrottledTable.throttle`, the refresh runs as its own task instead of delaying this call
+            task = asyncio.get_running_loop().create_task(self._refresh_capacity(throttle))
+            _capacity_refresh_tasks.add(task)
+            task.add_done_callback(_capacity_refresh_tasks.discard)
+        return throttle
+
+    async def _call(self, operation: str, kwargs: dict):
+        throttle = await self.get_throttle()
+        key, tokens = throttle.begin(operation, kwargs)
+        bucket = throttle.bucket(key)
+        deadline = time.monotonic() + throttle.max_wait_seconds
+        while not bucket.try_acquire(tokens):
+            wait_seconds = bucket.wait_seconds(tokens)
+            if time.monotonic() + wait_seconds > deadline:
+                raise throttle.shed(key, tokens)
+            await asyncio.sleep(wait_seconds)
+        kwargs.setdefault('ReturnConsumedCapacity', 'INDEXES')
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                response = await getattr(self._table, operation)(**kwargs)
+            except ClientError as e:
+                if not is_throttling_error(e):
+                    throttle.breaker.record_neutral()
+                    raise
+                await asyncio.sleep(throttle.throttled(key, attempt=attempt, error=e))
+                continue
+            throttle.settle(operation, key, tokens, response)
+            return response
+
+    async def get_item(self, **kwargs):
+        return await self._call('get_item', kwargs)
+
+    async def query(self, **kwargs):
+        return await self._call('query', kwargs)
+
+    async def scan(self, **kwargs):
+        return await self._call('scan', kwargs)
+
+    async def put_item(self, **kwargs):
+        return await self._call('put_item', kwargs)
+
+    async def update_item(self, **kwargs):
+        return await self._call('update_item', kwargs)
+
+    async def delete_item(self, **kwargs):
+        return await self._call('delete_item', kwargs)
+
+    async def transact_write_items(self, **kwargs):
+        return await self._call('transact_write_items', kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._table, name)
+
+
+def create_throttled_table(db_mode: str, table_name: str):
+    """
+    Returns:
+        ThrottledTable | LazyDynamoDbTable: The throttled table, or the plain one when THROTTLE_ENABLED is off.
+    """
+    if not DynamoDbConstants.THROTTLE_ENABLED:
+        return LazyDynamoDbTable(db_mode=db_mode, table_name=table_name)
+    return ThrottledTable(db_mode=db_mode, table_name=table_name)
+
+
+def create_async_throttled_table(db_mode: str, table_name: str):
+    """
+    Returns:
+        AsyncThrottledTable | AsyncLazyDynamoDbTable: The async throttled table, or the plain one when
+            THROTTLE_ENABLED is off.
+    """
+    if not DynamoDbConstants.THROTTLE_ENABLED:
+        return AsyncLazyDynamoDbTable(db_mode=db_mode, table_name=table_name)
+    return AsyncThrottledTable(db_mode=db_mode, table_name=table_name)
@@ -0,0 +1,524 @@
+import atexit
+import fcntl
+import glob
+import heapq
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from botocore.exceptions import ClientError
+from terptracker.constants.DynamoDbConstants import DynamoDbConstants
+from terptracker.dynamodb.dynamodb_helpers import LazyDynamoDbTable, get_dynamodb_client
+from terptracker.dynamodb.expense_import import BATCH_SIZE, ExpenseImporter
+from terptracker.dynamodb.idempotency import apply_rollup_delta_once
+from terptracker.dynamodb.rollup_helpers import accumulate_monthly_rollups, expense_year_month
+
+# One journal per worker process, named write-behind-<pid>-<token>.jsonl. Each line is one of
+#   {"put": item}                               - written before the submit returns
+#   {"batch": id, "keys": [[userEmail, expenseTimestamp], ...]}
+#                                               - the items a BatchWriteItem stored; their rollup deltas are applied
+#                                                 under this id next, so a replay cannot count them twice
+#   {"done": keys}                              - the batch's rollup deltas are applied too
+#   {"dead": keys}                              - rejected by DynamoDB and moved to the dead-letter journal
+# Whatever was put but never done (or dead) is replayed after a crash.
+JOURNAL_PATTERN = 'write-behind-*.jsonl'
+# Items DynamoDB rejects as invalid, one {"item", "error", "failedAt"} line each, shared by all workers. They are
+# never retried automatically.
+DEAD_LETTER_FILENAME = 'dead-letter.jsonl'
+# Errors caused by the items themselves; retrying them can never succeed
+_POISON_ERROR_CODES = frozenset({'ValidationException', 'SerializationException',
+                                 'ItemCollectionSizeLimitExceededException'})
+
+
+class WriteBehindFull(Exception):
+    """
+    Raised when the write-behind queue stays full for the enqueue timeout; the caller should write synchronously.
+    """
+
+
+def _item_key(item: dict):
+    return item['userEmail'], item['expenseTimestamp']
+
+
+def is_poison_error(error: Exception):
+    """
+    Returns:
+        bool: True if DynamoDB rejected the request because of what was written, so retrying it cannot succeed.
+    """
+    return isinstance(error, ClientError) and error.response.get('Error', {}).get('Code') in _POISON_ERROR_CODES
+
+
+def read_journal(path: str):
+    """
+    Replays a write-behind journal.
+
+    Args:
+        path (str): The journal file.
+
+    Returns:
+        tuple[list[dict], dict[str, list[dict]]]: The items that were queued but never stored, in submission order,
+            and the stored items whose rollup deltas may not have been applied yet, by batch id.
+    """
+    pending = {}
+    batch_ids = {}
+    with open(path, encoding='utf-8') as journal:
+        for line in journal:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # A line torn by a crash; its submit never returned, so the user was not told it was saved
+            if 'put' in record:
+                pending[_item_key(record['put'])] = record['put']
+            elif 'batch' in record:
+                for user_email, expense_timestamp in record['keys']:
+                    batch_ids[(user_email, expense_timestamp)] = record['batch']
+            else:
+                for user_email, expense_timestamp in record.get('done', []) + record.get('dead', []):
+                    pending.pop((user_email, expense_timestamp), None)
+                    batch_ids.pop((user_email, expense_timestamp), None)
+
+    unwritten, written_batches = [], {}
+    for key, item in pending.items():
+        if key in batch_ids:
+            written_batches.setdefault(batch_ids[key], []).append(item)
+        else:
+            unwritten.append(item)
+    return unwritten, written_batches
+
+
+class WriteBehindQueue:
+    """
+    Takes new USER_EXPENSES items off the request path: `submit` journals the item to a local file and returns, and a
+    background flusher coalesces queued items into 25-item BatchWriteItem calls (retrying `UnprocessedItems` through
+    `ExpenseImporter.write_batch`) followed by one rollup `ADD` per (user, month). Each batch's deltas are applied
+    under the batch's id (see `apply_rollup_delta_once`) and retried until they succeed; items are only journaled
+    done after that. Items DynamoDB rejects as invalid go to the dead-letter journal instead of being retried.
+
+    The queue holds at most `max_pending` items. A submit waits up to `enqueue_timeout_seconds` for room and then
+    raises `WriteBehindFull`, so callers fall back to a synchronous write when DynamoDB cannot keep up. Items stay
+    visible through `pending_items` until they and their rollup deltas are stored, so a user's reads can include
+    their own unflushed writes.
+
+    Each worker process has its own journal, locked with flock. When a worker starts, it adopts the journals of
+    workers that died (their locks are released by the kernel) and requeues whatever they had not flushed.
+    """
+
+    def __init__(self, db_mode: str, journal_dir: str, max_pending: int, linger_seconds: float,
+                 enqueue_timeout_seconds: float, fsync: bool = True,
+                 table_name: str = DynamoDbConstants.TERPTRACKER_USER_EXPENSES_TABLE_NAME,
+                 rollup_table_name: str = DynamoDbConstants.TERPTRACKER_USER_MONTHLY_ROLLUP_TABLE_NAME,
+                 max_attempts: int = DynamoDbConstants.IMPORT_MAX_ATTEMPTS,
+                 backoff_base_seconds: float = DynamoDbConstants.IMPORT_BACKOFF_BASE_SECONDS,
+                 backoff_max_seconds: float = DynamoDbConstants.IMPORT_BACKOFF_MAX_SECONDS):
+        """
+        Args:
+            db_mode (str): Deployment mode the flusher writes to.
+            journal_dir (str): Directory holding the per-process journals; created on first use.
+            max_pending (int): Items that may be queued or in flight at once.
+            linger_seconds (float): How long the flusher waits for a partial batch to fill before writing it.
+            enqueue_timeout_seconds (float): How long `submit` waits for room in a full queue.
+            fsync (bool): Whether every journal append is fsynced before `submit` returns.
+            table_name (str): The expenses table.
+            rollup_table_name (str): The monthly rollup table.
+            max_attempts (int): BatchWriteItem calls per batch before its unprocessed items are requeued.
+            backoff_base_seconds (float): First retry delay; doubles on every retry.
+            backoff_max_seconds (float): Upper bound of a retry delay.
+        """
+        self.db_mode = db_mode
+        self.journal_dir = journal_dir
+        self.max_pending = max(1, max_pending)
+        self.linger_seconds = linger_seconds
+        self.enqueue_timeout_seconds = enqueue_timeout_seconds
+        self.fsync = fsync
+        self.table_name = table_name
+        self.rollup_table = LazyDynamoDbTable(db_mode=db_mode, table_name=rollup_table_name)
+        self.max_attempts = max_attempts
+        self.backoff_base_seconds = backoff_base_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+        self._reset()
+        atexit.register(self.stop)
+        if hasattr(os, 'register_at_fork'):
+            # The flusher thread does not survive a fork; a forked worker starts its own queue and journal
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self._condition = threading.Condition()
+        self._start_lock = threading.Lock()
+        self._queue = deque()
+        self._unapplied = deque()  # (batch id, items) stored by BatchWriteItem whose rollup deltas are not applied yet
+        self._pending = {}  # userEmail -> {expenseTimestamp: item}, for items queued or being written
+        self._pending_count = 0
+        self._journal = None
+        self._journal_path = None
+        self._importer = None
+        self._thread = None
+        self._stopping = False
+        self._stats = {'submitted': 0, 'rejected': 0, 'recovered': 0, 'flushed': 0, 'batches': 0,
+                       'unprocessedRetries': 0, 'failedBatches': 0, 'failedRollups': 0, 'deadLettered': 0}
+
+    def start(self):
+        """
+        Opens this process's journal, adopts orphaned journals and starts the flusher. Called on first use.
+        """
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            os.makedirs(self.journal_dir, exist_ok=True)
+            self._journal_path = os.path.join(self.journal_dir,
+                                              f'write-behind-{os.getpid()}-{uuid.uuid4().hex[:8]}.jsonl')
+            self._journal = open(self._journal_path, 'a', encoding='utf-8')
+            fcntl.flock(self._journal, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            self._importer = ExpenseImporter(client=get_dynamodb_client(db_mode=self.db_mode),
+                                             table_name=self.table_name, rollup_table=self.rollup_table,
+                                             max_attempts=self.max_attempts,
+                                             backoff_base_seconds=self.backoff_base_seconds,
+                                             backoff_max_seconds=self.backoff_max_seconds)
+            self._recover_orphaned_journals()
+            self._thread = threading.Thread(target=self._run, name='expense-write-behind', daemon=True)
+            self._thread.start()
+
+    def _recover_orphaned_journals(self):
+        for path in sorted(glob.glob(os.path.join(self.journal_dir, JOURNAL_PATTERN))):
+            if path == self._journal_path:
+                continue
+            try:
+                orphan = open(path, 'r', encoding='utf-8')
+            except FileNotFoundError:
+                continue  # Adopted by another worker in the meantime
+            with orphan:
+                try:
+                    fcntl.flock(orphan, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue  # A live worker's journal
+                try:
+                    if os.stat(path).st_ino != os.fstat(orphan.fileno()).st_ino:
+                        continue
+                except FileNotFoundError:
+                    continue  # Another worker replayed and removed it before we got the lock
+                unwritten, written_batches = read_journal(path)
+                with self._condition:
+                    for item in unwritten:
+                        self._enqueue(item)
+                    for batch_id, items in written_batches.items():
+                        self._enqueue_written(batch_id, items)
+                    recovered = len(unwritten) + sum(len(items) for items in written_batches.values())
+                    self._stats['recovered'] += recovered
+                    self._condition.notify_all()
+                os.remove(path)
+            if recovered:
+                print(f'🚧Recovered {recovered} unflushed expense writes from {path}')
+
+    def _journal_append(self, record: dict):
+        self._journal.write(json.dumps(record, separators=(',', ':')) + '\n')
+        self._journal.flush()
+        if self.fsync:
+            os.fsync(self._journal.fileno())
+
+    def _track(self, item: dict):
+        # Caller holds self._condition. Returns False for an item that is already pending.
+        user_pending = self._pending.setdefault(item['userEmail'], {})
+        if item['expenseTimestamp'] in user_pending:
+            return False
+        self._journal_append({'put': item})
+        user_pending[item['expenseTimestamp']] = item
+        self._pending_count += 1
+        return True
+
+    def _untrack(self, keys: set):
+        # Caller holds self._condition
+        for user_email, expense_timestamp in keys:
+            self._pending[user_email].pop(expense_timestamp, None)
+            if not self._pending[user_email]:
+                del self._pending[user_email]
+        self._pending_count -= len(keys)
+
+    def _enqueue(self, item: dict):
+        # Caller holds self._condition
+        if self._track(item):
+            self._queue.append(item)
+
+    def _enqueue_written(self, batch_id: str, items: list):
+        # Caller holds self._condition. The items are stored; only their rollup deltas are left, under the same id.
+        items = [item for item in items if self._track(item)]
+        if items:
+            self._journal_append({'batch': batch_id, 'keys': [list(_item_key(item)) for item in items]})
+            self._unapplied.append((batch_id, items))
+
+    def submit(self, item: dict, timeout: float = None):
+        """
+        Queues a new expense item. Once this returns, the item is journaled and will be written even if the worker
+        crashes before the flusher gets to it.
+
+        Args:
+            item (dict): The USER_EXPENSES item (see expense_schema.new_expense_item).
+            timeout (float, optional): Seconds to wait for room; defaults to `enqueue_timeout_seconds`.
+
+        Raises:
+            WriteBehindFull: If the queue is still full after the timeout.
+        """
+        self.start()
+        timeout = self.enqueue_timeout_seconds if timeout is None else timeout
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._pending_count < self.max_pending, timeout=timeout):
+                self._stats['rejected'] += 1
+                raise WriteBehindFull(f'{self._pending_count} expense writes are already pending')
+            self._enqueue(item)
+            self._stats['submitted'] += 1
+            self._condition.notify_all()
+
+    def pending_items(self, user_email: str, year_month: str = None):
+        """
+        Returns:
+            list[dict]: The user's items not yet stored (optionally only those of one YYYY-MM month), in sort key
+                order.
+        """
+        self.start()
+        with self._condition:
+            items = list(self._pending.get(user_email, {}).values())
+        if year_month is not None:
+            items = [item for item in items if expense_year_month(item['expenseTimestamp']) == year_month]
+        return sorted(items, key=lambda item: item['expenseTimestamp'])
+
+    def _dead_letter(self, items: list, error: Exception):
+        path = os.path.join(self.journal_dir, DEAD_LETTER_FILENAME)
+        with open(path, 'a', encoding='utf-8') as dead_letters:
+            for item in items:
+                dead_letters.write(json.dumps({'item': item, 'error': str(error), 'failedAt': time.time()},
+                                              separators=(',', ':')) + '\n')
+            dead_letters.flush()
+            os.fsync(dead_letters.fileno())
+        print(f'🚨Moved {len(items)} rejected expense writes to {path}: {error}')
+
+    def _write(self, batch: list):
+        """
+        Stores a batch, isolating the items DynamoDB rejects as invalid.
+
+        Returns:
+            tuple: (the items written, the items to retry, the items rejected, the number of retries needed)
+        """
+        try:
+            written, retries = self._importer.write_batch(batch)
+        except Exception as e:
+            if not is_poison_error(e):
+                print(f'🚨Write-behind batch of {len(batch)} expenses failed: {e}')
+                return [], batch, [], 0
+            if len(batch) == 1:
+                self._dead_letter(batch, e)
+                return [], [], batch, 0
+            # One bad item fails the whole BatchWriteItem; write the items one by one to find it
+            written, retry, rejected, retries = [], [], [], 0
+            for item in batch:
+                item_written, item_retry, item_rejected, item_retries = self._write([item])
+                written += item_written
+                retry += item_retry
+                rejected += item_rejected
+                retries += item_retries
+            return written, retry, rejected, retries
+
+        written_keys = {_item_key(item) for item in written}
+        return written, [item for item in batch if _item_key(item) not in written_keys], [], retries
+
+    def _apply_rollups(self, batch_id: str, items: list):
+        """
+        Applies a stored batch's rollup deltas, one per (user, month), each under an id derived from the batch.
+
+        Returns:
+            bool: True once every delta is applied (now or before).
+        """
+        rollups = {}
+        for item in items:
+            accumulate_monthly_rollups(rollups.setdefault(item['userEmail'], {}), item['userEmail'], item)
+        applied = True
+        for user_rollups in rollups.values():
+            for year_month, rollup in user_rollups.items():
+                try:
+                    apply_rollup_delta_once(client=self._importer.client, rollup=rollup,
+                                            delta_id=f'{batch_id}:{year_month}')
+                except Exception as e:
+                    if is_poison_error(e):
+                        # The expenses are stored; the month is rebuilt from them once backfilled
+                        print(f"🚨Write-behind rollup delta for {rollup['userEmail']} {year_month} was rejected, "
+                              f"skipping it: {e}")
+                        continue
+                    print(f"🚨Write-behind rollup delta for {rollup['userEmail']} {year_month} failed: {e}")
+                    applied = False
+        return applied
+
+    def _run(self):
+        consecutive_failures = 0
+        while True:
+            batch = []
+            with self._condition:
+                self._condition.wait_for(lambda: self._queue or self._unapplied or self._stopping)
+                if not self._queue and not self._unapplied:
+                    return
+                if self._queue:
+                    # Give a burst a moment to fill the batch before paying for a request
+                    self._condition.wait_for(lambda: len(self._queue) >= BATCH_SIZE or self._stopping,
+                                             timeout=self.linger_seconds)
+                    batch = [self._queue.popleft() for _ in range(min(BATCH_SIZE, len(self._queue)))]
+
+            written, unwritten, rejected, retries = self._write(batch) if batch else ([], [], [], 0)
+            with self._condition:
+                if batch:
+                    self._stats['batches'] += 1
+                    self._stats['unprocessedRetries'] += retries
+                if unwritten:
+                    self._stats['failedBatches'] += 1
+                    self._queue.extendleft(reversed(unwritten))
+                if rejected:
+                    self._stats['deadLettered'] += len(rejected)
+                    rejected_keys = {_item_key(item) for item in rejected}
+                    self._journal_append({'dead': [list(key) for key in rejected_keys]})
+                    self._untrack(rejected_keys)
+                if written:
+                    batch_id = uuid.uuid4().hex
+                    self._journal_append({'batch': batch_id, 'keys': [list(_item_key(item)) for item in written]})
+                    self._unapplied.append((batch_id, written))
+                unapplied = list(self._unapplied)
+
+            # Only this thread takes batches off _unapplied, so the ones read above are still at its front
+            failed_rollups = {batch_id for batch_id, items in unapplied if not self._apply_rollups(batch_id, items)}
+            with self._condition:
+                for batch_id, items in unapplied:
+                    self._unapplied.popleft()
+                    if batch_id in failed_rollups:
+                        self._unapplied.append((batch_id, items))
+                        continue
+                    done_keys = {_item_key(item) for item in items}
+                    self._journal_append({'done': [list(key) for key in done_keys]})
+                    self._untrack(done_keys)
+                    self._stats['flushed'] += len(done_keys)
+                self._stats['failedRollups'] += len(failed_rollups)
+                if not self._pending_count:
+                    # Everything journaled so far is stored, so the journal can start over
+                    self._journal.seek(0)
+                    self._journal.truncate()
+                self._condition.notify_all()
+
+            consecutive_failures = consecutive_failures + 1 if unwritten or failed_rollups else 0
+            if consecutive_failures:
+                time.sleep(min(self.backoff_max_seconds, self.backoff_base_seconds * (2 ** consecutive_failures)))
+
+    def flush(self, timeout: float = None):
+        """
+        Waits until every queued item is stored.
+
+        Returns:
+            bool: False if items were still pending after `timeout` seconds.
+        """
+        with self._condition:
+            return self._condition.wait_for(lambda: not self._pending_count, timeout=timeout)
+
+    def stop(self, timeout: float = 5.0):
+        """
+        Flushes what it can within `timeout` seconds and stops the flusher. Anything left stays in the journal and is
+        replayed by the next worker to start.
+        """
+        if self._thread is None:
+            return
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+        self._thread.join(timeout)
+        if not self._thread.is_alive():
+            self._journal.close()  # Releases the flock
+            self._thread = None
+
+    def stats(self):
+        """
+        Returns:
+            dict: Queue depth and pending count, plus submit, flush, retry and failure counters.
+        """
+        with self._condition:
+            return dict(self._stats, queued=len(self._queue), pending=self._pending_count,
+                        maxPending=self.max_pending, journal=self._journal_path)
+
+
+def merge_pending(items, pending_items: list):
+    """
+    Merges pending (unflushed) items into a stream of stored items, both in sort key order. Items that were stored
+    while the stream was being read are only yielded once.
+
+    Args:
+        items (Iterable[dict]): Stored USER_EXPENSES items, e.g. from `paginate_query`.
+        pending_items (list[dict]): The same user's pending items, read before the query started.
+
+    Yields:
+        dict: Every item, in sort key order.
+    """
+    if not pending_items:
+        yield from items
+        return
+    pending_keys = {item['expenseTimestamp'] for item in pending_items}
+    yield from heapq.merge((item for item in items if item['expenseTimestamp'] not in pending_keys),
+                           pending_items, key=lambda item: item['expenseTimestamp'])
+
+
+async def async_merge_pending(items, pending_items: list):
+    """
+    Async counterpart of `merge_pending` for an async iterable of stored items.
+    """
+    pending_keys = {item['expenseTimestamp'] for item in pending_items}
+    pending = deque(pending_items)
+    async for item in items:
+        if item['expenseTimestamp'] in pending_keys:
+            continue
+        while pending and pending[0]['expenseTimestamp'] < item['expenseTimestamp']:
+            yield pending.popleft()
+        yield item
+    while pending:
+        yield pending.popleft()
+
+
+def with_pending_pages(pages, pending_items: list):
+    """
+    Appends pending items to a sequence of query pages as one last page, dropping any of them the query already
+    returned. For consumers that do not depend on row order (exports, aggregates).
+
+    Yields:
+        dict: Query pages with an 'Items' list.
+    """
+    if not pending_items:
+        yield from pages
+        return
+    pending_keys = {item['expenseTimestamp'] for item in pending_items}
+    for page in pages:
+        yield dict(page, Items=[item for item in page.get('Items', [])
+                                if item['expenseTimestamp'] not in pending_keys])
+    yield {'Items': list(pending_items)}
+
+
+async def async_with_pending_pages(pages, pending_items: list):
+    """
+    Async counterpart of `with_pending_pages`.
+    """
+    pending_keys = {item['expenseTimestamp'] for item in pending_items}
+    async for page in pages:
+        if pending_keys:
+            page = dict(page, Items=[item for item in page.get('Items', [])
+                                     if item['expenseTimestamp'] not in pending_keys])
+        yield page
+    if pending_items:
+        yield {'Items': list(pending_items)}
+
+
+def create_write_behind_queue(db_mode: str):
+    """
+    Builds the worker's write-behind queue from DynamoDbConstants.
+
+    Returns:
+        WriteBehindQueue | None: The queue, or None when WRITE_BEHIND_ENABLED is off.
+    """
+    if not DynamoDbConstants.WRITE_BEHIND_ENABLED:
+        return None
+    return WriteBehindQueue(db_mode=db_mode,
+                            journal_dir=DynamoDbConstants.WRITE_BEHIND_JOURNAL_DIR,
+                            max_pending=DynamoDbConstants.WRITE_BEHIND_MAX_PENDING,
+                            linger_seconds=DynamoDbConstants.WRITE_BEHIND_LINGER_SECONDS,
+                            enqueue_timeout_seconds=DynamoDbConstants.WRITE_BEHIND_ENQUEUE_TIMEOUT_SECONDS,
+                            fsync=DynamoDbConstants.WRITE_BEHIND_JOURNAL_FSYNC)
@@ -0,0 +1,358 @@
+import bisect
+import contextvars
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from terptracker.constants.AppConstants import AppConstants
+
+# Latency buckets (seconds) shared by every histogram
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# The timing of the request being served in the current context (thread, or asyncio task), so DynamoDB calls and
+# template rendering can be attributed to it; None outside requests
+_current_request = contextvars.ContextVar('terptracker_current_request', default=None)
+
+
+class Counter:
+    """
+    A monotonically increasing value per label set.
+    """
+
+    kind = 'counter'
+
+    def __init__(self, name: str, help_text: str, label_names: tuple):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict):
+        return tuple(str(labels.get(name, '')) for name in self.label_names)
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def snapshot(self):
+        with self._lock:
+            return [[list(key), value] for key, value in self._series.items()]
+
+
+class Histogram(Counter):
+    """
+    Observations per label set, counted into fixed buckets (stored per bucket, rendered cumulatively) with their
+    sum and count.
+    """
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, help_text: str, label_names: tuple, buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name=name, help_text=help_text, label_names=label_names)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # One count per bucket, one for +Inf, then the sum
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[bisect.bisect_left(self.buckets, value)] += 1
+            series[-1] += value
+
+    def snapshot(self):
+        with self._lock:
+            return [[list(key), list(series)] for key, series in self._series.items()]
+
+
+class MetricsRegistry:
+    """
+    The metrics of one worker process. Every worker publishes a snapshot to the shared store (at most once per
+    `publish_interval`), and /metrics merges the snapshots of all workers on the host.
+    """
+
+    def __init__(self, store=None, publish_interval: float = 5):
+        """
+        Args:
+            store (SqliteMetricsStore, optional): Where worker snapshots are shared; each process reports only its
+                own metrics without one.
+            publish_interval (float): The most often a worker publishes a snapshot outside /metrics requests.
+        """
+        self.store = store
+        self.publish_interval = publish_interval
+        self.metrics = {}
+        self._lock = threading.Lock()
+        self._worker_id = None
+        self._worker_pid = None
+        self._published_at = 0.0
+
+    def _register(self, metric):
+        with self._lock:
+            return self.metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help_text: str, label_names: tuple = ()):
+        return self._register(Counter(name=name, help_text=help_text, label_names=label_names))
+
+    def histogram(self, name: str, help_text: str, label_names: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        return self._register(Histogram(name=name, help_text=help_text, label_names=label_names, buckets=buckets))
+
+    @property
+    def worker_id(self):
+        # A fresh id per process (also after a fork), so a restarted worker reusing a pid adds to the totals
+        # instead of overwriting the snapshot of the worker it replaced
+        if self._worker_pid != os.getpid():
+            self._worker_id = f'{os.getpid()}-{uuid.uuid4().hex[:8]}'
+            self._worker_pid = os.getpid()
+            self._published_at = 0.0
+        return self._worker_id
+
+    def snapshot(self):
+        """
+        Returns:
+            dict: Every metric's definition and series, JSON serializable.
+        """
+        with self._lock:
+            metrics = list(self.metrics.values())
+        return {metric.name: {'kind': metric.kind, 'help': metric.help_text, 'labels': list(metric.label_names),
+                              'buckets': list(getattr(metric, 'buckets', ())), 'series': metric.snapshot()}
+                for metric in metrics}
+
+    def publish(self, force: bool = False):
+        """
+        Writes this worker's snapshot to the shared store, unless it was written less than `publish_interval` ago.
+        """
+        if self.store is None:
+            return
+        worker_id = self.worker_id
+        now = time.monotonic()
+        with self._lock:
+            if not force and now - self._published_at < self.publish_interval:
+                return
+            self._published_at = now
+        self.store.publish(worker_id=worker_id, snapshot=self.snapshot())
+
+    def collect(self):
+        """
+        Returns:
+            dict: The merged snapshot of every worker sharing the store (just this one without a store).
+        """
+        if self.store is None:
+            return self.snapshot()
+        self.publish(force=True)
+        snapshots = self.store.collect()
+        return merge_snapshots(snapshots or [self.snapshot()])
+
+
+class SqliteMetricsStore:
+    """
+    Shares worker snapshots through a local SQLite file (the same approach as the response cache's shared tier), one
+    row per worker process. Rows of workers that exited are kept, so counters never go backwards when gunicorn
+    replaces a worker.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute('CREATE TABLE IF NOT EXISTS worker_metrics '
+                               '(worker TEXT PRIMARY KEY, updated_at REAL, snapshot TEXT)')
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def publish(self, worker_id: str, snapshot: dict):
+        try:
+            self._connection().execute('INSERT OR REPLACE INTO worker_metrics (worker, updated_at, snapshot) '
+                                       'VALUES (?, ?, ?)', (worker_id, time.time(), json.dumps(snapshot)))
+        except sqlite3.Error as e:
+            print(f'⚠️Could not publish metrics to {self.path}: {e}')
+
+    def collect(self):
+        """
+        Returns:
+            list[dict] | None: Every worker's latest snapshot, or None if the database is unavailable.
+        """
+        try:
+            rows = self._connection().execute('SELECT snapshot FROM worker_metrics').fetchall()
+        except sqlite3.Error as e:
+            print(f'⚠️Could not read metrics from {self.path}: {e}')
+            return None
+        return [json.loads(row[0]) for row in rows]
+
+
+def merge_snapshots(snapshots: list):
+    """
+    Sums the series of several worker snapshots (counters add up; histograms add up bucket by bucket).
+    """
+    merged = {}
+    for snapshot in snapshots:
+        for name, metric in snapshot.items():
+            target = merged.setdefault(name, dict(metric, series={}))
+            for label_values, value in metric['series']:
+                key = tuple(label_values)
+                if metric['kind'] == 'histogram':
+                    current = target['series'].get(key)
+                    target['series'][key] = value if current is None else [a + b for a, b in zip(current, value)]
+                else:
+                    target['series'][key] = target['series'].get(key, 0) + value
+    for metric in merged.values():
+        metric['series'] = [[list(key), value] for key, value in metric['series'].items()]
+    return merged
+
+
+def _escape(value: str):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _label_text(names, values, extra: str = ''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value: float):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_prometheus(snapshot: dict):
+    """
+    Renders a (merged) snapshot in the Prometheus text exposition format (version 0.0.4).
+
+    Returns:
+        str: The /metrics response body.
+    """
+    lines = []
+    for name in sorted(snapshot):
+        metric = snapshot[name]
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['kind']}")
+        for label_values, value in sorted(metric['series']):
+            if metric['kind'] != 'histogram':
+                lines.append(f"{name}{_label_text(metric['labels'], label_values)} {_number(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip(list(metric['buckets']) + ['+Inf'], value[:-1]):
+                cumulative += count
+                le = 'le="+Inf"' if bound == '+Inf' else f'le="{_number(float(bound))}"'
+                lines.append(f"{name}_bucket{_label_text(metric['labels'], label_values, le)} {cumulative}")
+            lines.append(f"{name}_sum{_label_text(metric['labels'], label_values)} {_number(float(value[-1]))}")
+            lines.append(f"{name}_count{_label_text(metric['labels'], label_values)} {cumulative}")
+    return '\n'.join(lines) + '\n'
+
+
+class RequestTiming:
+    """
+    Where the time of one request went: DynamoDB calls, template rendering (excluding DynamoDB calls made while
+    streaming a template) and everything else.
+    """
+
+    __slots__ = ('started_at', 'dynamodb_seconds', 'render_seconds', '_render_started', '_render_dynamodb')
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.dynamodb_seconds = 0.0
+        self.render_seconds = 0.0
+        self._render_started = None
+        self._render_dynamodb = 0.0
+
+    def render_started(self):
+        self._render_started = time.perf_counter()
+        self._render_dynamodb = self.dynamodb_seconds
+
+    def render_finished(self):
+        if self._render_started is None:
+            return
+        elapsed = time.perf_counter() - self._render_started
+        self.render_seconds += max(0.0, elapsed - (self.dynamodb_seconds - self._render_dynamodb))
+        self._render_started = None
+
+    def phases(self, total_seconds: float):
+        return {'dynamodb': self.dynamodb_seconds, 'render': self.render_seconds,
+                'app': max(0.0, total_seconds - self.dynamodb_seconds - self.render_seconds)}
+
+
+def start_request_timing():
+    """
+    Starts timing a request in the current context.
+
+    Returns:
+        RequestTiming: The timing.
+    """
+    timing = RequestTiming()
+    _current_request.set(timing)
+    return timing
+
+
+def current_request_timing():
+    """
+    Returns:
+        RequestTiming | None: The timing of the request served in the current context.
+    """
+    return _current_request.get()
+
+
+def create_metrics_registry():
+    """
+    Builds the registry configured by AppConstants.
+    """
+    store = None
+    if AppConstants.METRICS_BACKEND == 'SQLITE':
+        store = SqliteMetricsStore(path=AppConstants.METRICS_PATH)
+    elif AppConstants.METRICS_BACKEND != 'LOCAL':
+        raise ValueError(f'Unsupported METRICS_BACKEND: {AppConstants.METRICS_BACKEND}')
+    return MetricsRegistry(store=store, publish_interval=AppConstants.METRICS_PUBLISH_INTERVAL_SECONDS)
+
+
+metrics = create_metrics_registry()
+
+http_request_duration = metrics.histogram(
+    'terptracker_http_request_duration_seconds',
+    'Time from the start of a request until its response body was sent.',
+    ('method', 'route', 'status'))
+http_request_phase_duration = metrics.histogram(
+    'terptracker_http_request_phase_seconds',
+    'Request time spent in DynamoDB calls, template rendering and the rest of the app (normalization etc.).',
+    ('route', 'phase'))
+dynamodb_operation_duration = metrics.histogram(
+    'terptracker_dynamodb_operation_duration_seconds',
+    'DynamoDB API call latency including botocore retries.',
+    ('operation', 'table'))
+dynamodb_retries = metrics.counter(
+    'terptracker_dynamodb_retries_total',
+    'DynamoDB attempts retried by botocore.',
+    ('operation', 'table'))
+dynamodb_throttles = metrics.counter(
+    'terptracker_dynamodb_throttles_total',
+    'DynamoDB attempts rejected with a throttling error.',
+    ('operation', 'table'))
+dynamodb_errors = metrics.counter(
+    'terptracker_dynamodb_errors_total',
+    'DynamoDB API calls that failed, by error code.',
+    ('operation', 'table', 'code'))
+dynamodb_consumed_capacity = metrics.counter(
+    'terptracker_dynamodb_consumed_capacity_units_total',
+    'Read and write capacity units consumed, as reported through ReturnConsumedCapacity.',
+    ('operation', 'table'))
+
+
+def record_request(timing: RequestTiming, method: str, route: str, status: int):
+    """
+    Records a finished request's latency and phase breakdown.
+    """
+    total_seconds = time.perf_counter() - timing.started_at
+    http_request_duration.observe(total_seconds, method=method, route=route, status=status)
+    for phase, seconds in timing.phases(total_seconds).items():
+        http_request_phase_duration.observe(seconds, route=route, phase=phase)
+    metrics.publish()
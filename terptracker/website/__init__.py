@@ -1,20 +1,22 @@
-import boto3
-import os
-from flask import Flask
-from flask_sqlalchemy import SQLAlchemy
+import time
+
+_IMPORT_STARTED_AT = time.perf_counter()
+
+from flask import Flask, session
 from flask_login import LoginManager, current_user
-from flask_session import Session
+from terptracker.constants.AppConstants import AppConstants
 from terptracker.dynamodb.TerpTrackerDb import TerpTrackerDb
-from terptracker.dynamodb.dynamodb_helpers import (table_exists, DynamoDbConstants, get_dynamodb_resource,
-                                                  get_dynamodb_client, get_dynamodb_table)
+from terptracker.dynamodb.dynamodb_helpers import DynamoDbConstants
+from terptracker.dynamodb.schema_manifest import verify_schema_manifest
+from .startup import StartupTimer, LazySchemaCheck
 
 # db = SQLAlchemy()
 # DB_NAME = "database.db"
-db_resource = get_dynamodb_resource(db_mode=DynamoDbConstants.DB_MODE)
-db_client = get_dynamodb_client(db_mode=DynamoDbConstants.DB_MODE)
+IMPORT_DURATION_MS = round((time.perf_counter() - _IMPORT_STARTED_AT) * 1000, 2)
 
 
 def create_app():
+    timer = StartupTimer()
     app = Flask(__name__)
     app.config['SECRET_KEY'] = 'terptracker_msml'
 
@@ -23,48 +25,77 @@ def create_app():
     from .views import views
     from .auth import auth
     from .summary import summary
+    from .export import export
 
     app.register_blueprint(views, url_prefix='/')
     app.register_blueprint(auth, url_prefix='/')
     app.register_blueprint(summary, url_prefix='/')
+    app.register_blueprint(export, url_prefix='/')
+    timer.mark('blueprints')
 
-    from .models import User
+    from .models import User, user_cache, remember_user_snapshot, USER_SNAPSHOT_SESSION_KEY
 
     # with app.app_context():
     #     db.create_all()
     # create_database(app=app, db=db)
     DB_MODE = DynamoDbConstants.DB_MODE
-    bsky_dynamodb = TerpTrackerDb(db_mode=DB_MODE)
-    print(f'Initializing TerpTracker Database w/ {DB_MODE=}')
+    schema_mode = AppConstants.STARTUP_SCHEMA_MODE
+    print(f'Initializing TerpTracker Database w/ {DB_MODE=} {schema_mode=}')
 
-    login_table_exists = table_exists(client=db_client, table_name=DynamoDbConstants.TERPTRACKER_LOGIN_TABLE_NAME)
-    if login_table_exists is False:
-        bsky_dynamodb.create_login_table()
+    if schema_mode == 'MANIFEST':
+        verify_schema_manifest(path=AppConstants.SCHEMA_MANIFEST_PATH, db_mode=DB_MODE)
+    elif schema_mode == 'LAZY':
+        app.before_request(LazySchemaCheck(db_mode=DB_MODE))
+    else:
+        TerpTrackerDb(db_mode=DB_MODE).create_all_tables()
+    timer.mark('schema')
 
     login_manager = LoginManager()
     login_manager.login_view = 'auth.login'
     login_manager.init_app(app)
 
-    login_table = get_dynamodb_table(dynamodb_resource=db_resource,
-                                     table_name=DynamoDbConstants.TERPTRACKER_LOGIN_TABLE_NAME)
+    from .auth import login_table
 
     @login_manager.user_loader
     def load_user(user_id):
-        response = login_table.get_item(Key={'user_id': user_id})
-        item = response.get('Item')
-        if item:
-            return User(user_id=item['user_id'], email=item['email'],first_name=item['firstName'], password_hash=item['password'])
-        return None
-
-    user_expenses_table_exists = table_exists(client=bsky_dynamodb.client, table_name=DynamoDbConstants.TERPTRACKER_USER_EXPENSES_TABLE_NAME)
-    if user_expenses_table_exists is False:
-        bsky_dynamodb.create_user_expenses_table()
+        if AppConstants.USER_SESSION_SNAPSHOT:
+            user = User.from_session_snapshot(session.get(USER_SNAPSHOT_SESSION_KEY), user_id)
+            if user:
+                return user
+
+        user = user_cache.get(user_id)
+        if user is None:
+            response = login_table.get_item(Key={'user_id': user_id})
+            item = response.get('Item')
+            if not item:
+                return None
+            user = User.from_item(item)
+            user_cache.set(user_id, user)
+
+        remember_user_snapshot(user)
+        return user
 
     @app.context_processor
     def inject_user():
         from flask_login import current_user
         return dict(user=current_user)
 
+    timer.mark('login_manager')
+
+    from terptracker.dynamodb.throttling import TableThrottled, retry_after_headers
+
+    @app.errorhandler(TableThrottled)
+    def table_throttled(e):
+        # Shed by the LOGIN throttle (e.g. while loading the user); the client should come back shortly
+        print(f'⚠️{e}')
+        return 'TerpTracker is busy right now, please try again in a moment.', 503, retry_after_headers(e)
+
+    if AppConstants.METRICS_ENABLED:
+        from .instrumentation import instrument_app
+        instrument_app(app)
+
+    app.config['STARTUP_TIMINGS'] = dict(timer.report(), importMs=IMPORT_DURATION_MS)
+    timer.print_report(title=f'TerpTracker app created (package import {IMPORT_DURATION_MS}ms)')
     return app
 
 
@@ -1,16 +1,89 @@
 from flask import Blueprint, render_template, request, flash, redirect, url_for, session
-from .models import User
-from werkzeug.security import generate_password_hash, check_password_hash
+from .models import User, user_cache, remember_user_snapshot, forget_user
+from .password_hashing import password_hasher, HashingPoolFull
 from flask_login import login_user, login_required, logout_user, current_user
 import uuid
 from boto3.dynamodb.conditions import Key
-from terptracker.dynamodb.dynamodb_helpers import get_dynamodb_table, get_dynamodb_resource
+from botocore.exceptions import ClientError
+from terptracker.dynamodb.throttling import TableThrottled, create_throttled_table, retry_after_headers
+from terptracker.dynamodb.login_accounts import (email_key, email_taken_from_error, new_account_transaction,
+                                                 password_update_transaction, user_item_from_email_lookup)
 from terptracker.constants.DynamoDbConstants import DynamoDbConstants
 
 auth = Blueprint('auth', __name__)
-db_resource = get_dynamodb_resource(db_mode=DynamoDbConstants.DB_MODE)
-login_table = get_dynamodb_table(dynamodb_resource=db_resource,
-                                 table_name=DynamoDbConstants.TERPTRACKER_LOGIN_TABLE_NAME)
+# LOGIN is provisioned (2 RCU/2 WCU, 1/1 on username-index), so its calls go through the client-side throttle
+login_table = create_throttled_table(db_mode=DynamoDbConstants.DB_MODE,
+                                     table_name=DynamoDbConstants.TERPTRACKER_LOGIN_TABLE_NAME)
+
+SIGN_IN_BUSY_MESSAGE = 'We are handling a lot of sign-ins right now, please try again in a moment.'
+
+
+def rehash_password(user_data: dict, password: str):
+    """
+    Re-hashes a user's password with the currently configured cost parameters after a successful login. Both of the
+    account's LOGIN items are updated in one transaction, conditional on the stored hash being unchanged, and any
+    failure (including an account without an email item yet) leaves the old (still valid) hash in place.
+
+    Returns:
+        str: The hash now stored for the user.
+    """
+    try:
+        new_hash = password_hasher.hash_password(password)
+        login_table.transact_write_items(TransactItems=password_update_transaction(user_item=user_data,
+                                                                                   new_hash=new_hash))
+        return new_hash
+    except (HashingPoolFull, ClientError, TableThrottled) as e:
+        print(f"⚠️ Skipped password rehash for user_id={user_data['user_id']}: {e}")
+        return user_data['password']
+
+
+def find_login_item(email: str):
+    """
+    Looks up the account of an email with a strongly consistent GetItem of its LOGIN email item. Accounts without
+    one yet are looked up on username-index while LOGIN_EMAIL_INDEX_FALLBACK is on.
+
+    Returns:
+        dict | None: The account's user item fields (user_id, email, firstName, password), or None.
+    """
+    if not email:
+        return None
+    item = login_table.get_item(Key={'user_id': email_key(email)}, ConsistentRead=True).get('Item')
+    if item:
+        return user_item_from_email_lookup(item)
+    if DynamoDbConstants.LOGIN_EMAIL_INDEX_FALLBACK:
+        items = login_table.query(IndexName='username-index',
+                                  KeyConditionExpression=Key('email').eq(email)).get('Items', [])
+        return items[0] if items else None
+    return None
+
+
+def sign_in_busy(template: str, error: TableThrottled):
+    """
+    Answers a sign-in or sign-up the LOGIN table cannot take right now with the form again and 503.
+    """
+    print(f'⚠️{error}')
+    flash(SIGN_IN_BUSY_MESSAGE, category='error')
+    return render_template(template), 503, retry_after_headers(error)
+
+
+def sign_up_error(email: str, first_name: str, password1: str, password2: str, email_taken: bool):
+    """
+    Validates the sign-up form.
+
+    Returns:
+        str | None: The message to flash for the first problem found, or None if the form is valid.
+    """
+    if email_taken:
+        return 'Email already exists'
+    elif len(email) < 4:
+        return 'Email must be greater than 3 characters.'
+    elif len(first_name) < 2:
+        return 'First name must be greater than 1 character.'
+    elif password1 != password2:
+        return 'Passwords don\'t match.'
+    elif len(password1) < 7:
+        return 'Password must be at least 7 characters.'
+    return None
 
 
 @auth.route('/login', methods=['GET', 'POST'])
@@ -19,20 +92,28 @@ def login():
         email = request.form.get('email')
         password = request.form.get('password')
 
-        # Query the user table to see whether the entered credentials match a valid account
+        # Look up the account to see whether the entered credentials match a valid account
         # user = User.query.filter_by(email=email).first()
 
-        response = login_table.query(
-            IndexName='username-index',
-            KeyConditionExpression=Key('email').eq(email)
-        )
-        items = response.get('Items', [])
+        try:
+            user_data = find_login_item(email)
+        except TableThrottled as e:
+            return sign_in_busy(template='login.html', error=e)
+
+        if user_data:
+            try:
+                password_valid = password_hasher.verify_password(user_data['password'], password)
+            except HashingPoolFull:
+                flash(SIGN_IN_BUSY_MESSAGE, category='error')
+                return render_template('login.html'), 429
 
-        if items:
-            user_data = items[0]
-            if check_password_hash(user_data['password'], password):
-                user = User(user_data['user_id'], user_data['email'], user_data['firstName'], user_data['password'])
+            if password_valid:
+                if password_hasher.needs_rehash(user_data['password']):
+                    user_data = dict(user_data, password=rehash_password(user_data=user_data, password=password))
+                user = User.from_item(user_data)
                 login_user(user, remember=True)
+                user_cache.set(user.id, user)
+                remember_user_snapshot(user)
                 return redirect(url_for('views.home'))
             else:
                 flash('Incorrect password, try again.', category='error')
@@ -44,6 +125,7 @@ def login():
 @auth.route('/logout')
 @login_required
 def logout():
+    forget_user(current_user.id)
     logout_user()
     flash("You’ve been logged out.", "success")
     return redirect(url_for('auth.login'))
@@ -57,37 +139,46 @@ def sign_up():
         password1 = request.form.get('password1')
         password2 = request.form.get('password2')
 
-        # Query the login table to see whether the entered credentials match a valid account
-        response = login_table.query(
-            IndexName='username-index',
-            KeyConditionExpression=Key('email').eq(email)
-        )
-        user = response.get('Items', [])
-
-        if user:
-            flash('Email already exists', category='error')
-        elif len(email) < 4:
-            flash('Email must be greater than 3 characters.', category='error')
-        elif len(first_name) < 2:
-            flash('First name must be greater than 1 character.', category='error')
-        elif password1 != password2:
-            flash('Passwords don\'t match.', category='error')
-        elif len(password1) < 7:
-            flash('Password must be at least 7 characters.', category='error')
+        # Look up the email so a taken one is reported with the other form errors; the transaction below is what
+        # actually enforces uniqueness
+        try:
+            user = find_login_item(email)
+        except TableThrottled as e:
+            return sign_in_busy(template='sign_up.html', error=e)
+
+        error = sign_up_error(email=email, first_name=first_name, password1=password1, password2=password2,
+                              email_taken=user is not None)
+        if error:
+            flash(error, category='error')
         else:
             user_id = str(uuid.uuid4())
-            password_hash = generate_password_hash(password1, method='pbkdf2:sha256:600000')
+            try:
+                password_hash = password_hasher.hash_password(password1)
+            except HashingPoolFull:
+                flash(SIGN_IN_BUSY_MESSAGE, category='error')
+                return render_template('sign_up.html'), 429
 
             new_user = User(user_id=user_id, email=email, first_name=first_name, password_hash=password_hash)
 
-            # Store user in DynamoDB
-            login_table.put_item(Item={
-                'user_id': user_id,
-                'email': email,
-                'firstName': first_name,
-                'password': password_hash
-            })
+            # Store the user and its email item in DynamoDB, atomically and only if the email is still free
+            try:
+                login_table.transact_write_items(TransactItems=new_account_transaction(user_item={
+                    'user_id': user_id,
+                    'email': email,
+                    'firstName': first_name,
+                    'password': password_hash
+                }))
+            except TableThrottled as e:
+                return sign_in_busy(template='sign_up.html', error=e)
+            except ClientError as e:
+                if not email_taken_from_error(e):
+                    raise
+                flash(sign_up_error(email=email, first_name=first_name, password1=password1, password2=password2,
+                                    email_taken=True), category='error')
+                return render_template('sign_up.html')
+            forget_user(user_id)
             login_user(new_user, remember=True)
+            remember_user_snapshot(new_user)
             flash('Account created!', category='success')
             return redirect(url_for('views.home'))
 
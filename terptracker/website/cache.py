@@ -0,0 +1,408 @@
+import itertools
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from terptracker.constants.AppConstants import AppConstants
+
+
+class LRUTTLCache:
+    """
+    A thread-safe, bounded in-process cache with least-recently-used eviction and a per-entry time-to-live.
+
+    Hit, miss, eviction and expiration counters are kept so cache effectiveness can be reported.
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        """
+        Args:
+            max_size (int): The maximum number of entries kept; the least recently used entry is evicted beyond it.
+            ttl_seconds (float): The default lifetime of an entry.
+        """
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        """
+        Returns the cached value for `key`, or None if it is missing or expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl_seconds: float = None):
+        """
+        Stores `value` under `key`, evicting the least recently used entries if the cache is full.
+
+        Args:
+            key: The cache key.
+            value: The value to cache.
+            ttl_seconds (float, optional): Overrides the default lifetime for this entry.
+        """
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        """
+        Removes `key` from the cache if present.
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """
+        Returns:
+            dict: The current size and the hit, miss, eviction and expiration counters, plus the hit ratio.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxSize': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'hitRatio': self.hits / lookups if lookups else 0.0,
+            }
+
+
+class SqliteCacheBackend:
+    """
+    A shared cache tier in a local SQLite file, standing in for a networked cache (e.g. Redis) so every worker
+    process on the host sees the same entries and invalidations. Each thread (and forked process) opens its own
+    connection; the database runs in WAL mode so readers do not block the writer. Values are pickled, so the file
+    must only be writable by the app.
+
+    Entries are tagged with the version of their scope (see `MonthResponseCache`); `bump_version` invalidates every
+    entry of a scope at once.
+    """
+
+    # Expired rows are purged on one `set` in this many
+    PURGE_EVERY = 256
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._sets = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.errors = 0
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute('CREATE TABLE IF NOT EXISTS entries '
+                               '(key TEXT PRIMARY KEY, version INTEGER, expires_at REAL, value BLOB)')
+            connection.execute('CREATE TABLE IF NOT EXISTS versions (scope TEXT PRIMARY KEY, version INTEGER)')
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def _count(self, counter: str, amount: int = 1):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+
+    def version(self, scope: str):
+        """
+        Returns:
+            int: The scope's current version (0 until it is first bumped), or None if the database is unavailable.
+        """
+        try:
+            row = self._connection().execute('SELECT version FROM versions WHERE scope = ?', (scope,)).fetchone()
+        except sqlite3.Error as e:
+            self._count('errors')
+            print(f'⚠️Shared cache unavailable: {e}')
+            return None
+        return row[0] if row else 0
+
+    def bump_version(self, scope: str):
+        try:
+            self._connection().execute('INSERT INTO versions (scope, version) VALUES (?, 1) '
+                                       'ON CONFLICT(scope) DO UPDATE SET version = version + 1', (scope,))
+        except sqlite3.Error as e:
+            self._count('errors')
+            print(f'🚨Shared cache invalidation failed for {scope}: {e}')
+
+    def get(self, key: str, version: int):
+        """
+        Returns the value stored under `key` if it was stored at `version` and has not expired, else None.
+        """
+        try:
+            row = self._connection().execute('SELECT version, expires_at, value FROM entries WHERE key = ?',
+                                             (key,)).fetchone()
+        except sqlite3.Error as e:
+            self._count('errors')
+            print(f'⚠️Shared cache unavailable: {e}')
+            return None
+        if row is None or row[0] != version or row[1] <= time.time():
+            self._count('misses')
+            return None
+        self._count('hits')
+        return pickle.loads(row[2])
+
+    def set(self, key: str, value, version: int, ttl_seconds: float):
+        try:
+            connection = self._connection()
+            connection.execute('INSERT OR REPLACE INTO entries (key, version, expires_at, value) VALUES (?, ?, ?, ?)',
+                               (key, version, time.time() + ttl_seconds,
+                                pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)))
+            with self._lock:
+                self._sets += 1
+                purge = self._sets % self.PURGE_EVERY == 0
+            if purge:
+                purged = connection.execute('DELETE FROM entries WHERE expires_at <= ?', (time.time(),)).rowcount
+                self._count('evictions', purged)
+        except (sqlite3.Error, pickle.PicklingError) as e:
+            self._count('errors')
+            print(f'⚠️Could not write {key} to the shared cache: {e}')
+
+    def stats(self):
+        try:
+            size = self._connection().execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+        except sqlite3.Error:
+            size = None
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'path': self.path,
+                'size': size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'errors': self.errors,
+                'hitRatio': self.hits / lookups if lookups else 0.0,
+            }
+
+
+class MonthResponseCache:
+    """
+    Caches per-month view data keyed by (userEmail, YYYY-MM, view): an in-process LRUTTLCache in front of an
+    optional shared backend (see SqliteCacheBackend).
+
+    Every (user, month) has a version; entries are stored with the version read *before* their data was loaded and
+    are only served while it is still current. A write calls `invalidate_month`, which bumps the version, so it
+    also discards data that was being loaded concurrently. With a shared backend the version lives there and
+    invalidations reach every worker process; without one the cache is only coherent within a single process.
+
+    Months that have fully ended rarely change, so their entries get the long `closed_month_ttl`.
+    """
+
+    # The views cached per month, dropped from the local tier on invalidation
+    VIEWS = ('summary', 'api_summary')
+
+    def __init__(self, local: LRUTTLCache, shared: SqliteCacheBackend = None, open_month_ttl: float = 60,
+                 closed_month_ttl: float = 86400, max_rows: int = 2000):
+        """
+        Args:
+            local (LRUTTLCache): The in-process tier.
+            shared (SqliteCacheBackend, optional): The shared tier.
+            open_month_ttl (float): Lifetime of entries for the current (or a future) month.
+            closed_month_ttl (float): Lifetime of entries for months that have ended.
+            max_rows (int): Row lists longer than this are streamed but not cached.
+        """
+        self.local = local
+        self.shared = shared
+        self.open_month_ttl = open_month_ttl
+        self.closed_month_ttl = closed_month_ttl
+        self.max_rows = max_rows
+        # Local versions only matter without a shared tier. Losing one (eviction) is safe: the version reads as 0
+        # again, which no entry stored after the month's last invalidation carries.
+        self._versions = LRUTTLCache(max_size=local.max_size * 4, ttl_seconds=closed_month_ttl)
+        self._version_counter = itertools.count(1)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.invalidations = 0
+
+    def ttl_for(self, year_month: str, now: datetime = None):
+        """
+        Returns:
+            float: The lifetime of entries for `year_month`; long once the month has ended.
+        """
+        now = now or datetime.now(timezone.utc)
+        return self.closed_month_ttl if year_month < now.strftime('%Y-%m') else self.open_month_ttl
+
+    def _count(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def version(self, user_email: str, year_month: str):
+        """
+        Returns:
+            int | None: The (user, month) version to store loaded data under; None if it cannot be determined (the
+                data should then not be cached).
+        """
+        scope = f'{user_email}|{year_month}'
+        if self.shared is not None:
+            return self.shared.version(scope)
+        return self._versions.get(scope) or 0
+
+    def lookup(self, user_email: str, year_month: str, view: str):
+        """
+        Returns:
+            tuple: (value or None, version). Pass the version to `set` once the value has been loaded.
+        """
+        version = self.version(user_email, year_month)
+        if version is None:
+            self._count('misses')
+            return None, None
+
+        key = (user_email, year_month, view)
+        entry = self.local.get(key)
+        if entry is not None:
+            if entry[0] == version:
+                self._count('hits')
+                return entry[1], version
+            self.local.invalidate(key)
+            self._count('stale')
+
+        if self.shared is not None:
+            value = self.shared.get('|'.join(key), version)
+            if value is not None:
+                self.local.set(key, (version, value), ttl_seconds=self.ttl_for(year_month))
+                self._count('hits')
+                return value, version
+
+        self._count('misses')
+        return None, version
+
+    def set(self, user_email: str, year_month: str, view: str, value, version: int):
+        """
+        Caches `value`, unless the month was invalidated after `version` was read.
+        """
+        if version is None or version != self.version(user_email, year_month):
+            return
+        key = (user_email, year_month, view)
+        ttl_seconds = self.ttl_for(year_month)
+        self.local.set(key, (version, value), ttl_seconds=ttl_seconds)
+        if self.shared is not None:
+            self.shared.set('|'.join(key), value, version=version, ttl_seconds=ttl_seconds)
+
+    def get_or_load(self, user_email: str, year_month: str, view: str, loader):
+        """
+        Returns the cached value, or calls `loader()` and caches its result.
+        """
+        value, version = self.lookup(user_email, year_month, view)
+        if value is None:
+            value = loader()
+            self.set(user_email, year_month, view, value, version)
+        return value
+
+    def stream_and_cache(self, user_email: str, year_month: str, view: str, rows, version: int, build_value):
+        """
+        Yields `rows` unchanged and, once they are exhausted, caches `build_value(rows_as_list)`. Nothing is cached
+        if the stream is abandoned (e.g. the client disconnects) or has more than `max_rows` rows.
+        """
+        collected = []
+        for row in rows:
+            if collected is not None:
+                collected.append(row)
+                if len(collected) > self.max_rows:
+                    collected = None
+            yield row
+        if collected is not None:
+            self.set(user_email, year_month, view, build_value(collected), version)
+
+    async def async_stream_and_cache(self, user_email: str, year_month: str, view: str, rows, version: int,
+                                     build_value):
+        """
+        Async counterpart of `stream_and_cache` for an async iterable of rows.
+        """
+        collected = []
+        async for row in rows:
+            if collected is not None:
+                collected.append(row)
+                if len(collected) > self.max_rows:
+                    collected = None
+            yield row
+        if collected is not None:
+            self.set(user_email, year_month, view, build_value(collected), version)
+
+    def invalidate_month(self, user_email: str, year_month: str):
+        """
+        Drops every cached view of one user's month; call it after writing to that month.
+        """
+        scope = f'{user_email}|{year_month}'
+        if self.shared is not None:
+            self.shared.bump_version(scope)
+        else:
+            self._versions.set(scope, next(self._version_counter))
+        for view in self.VIEWS:
+            self.local.invalidate((user_email, year_month, view))
+        self._count('invalidations')
+
+    def stats(self):
+        """
+        Returns:
+            dict: Hit/miss/stale/invalidation counters and hit ratio, plus each tier's own statistics (size,
+                evictions, expirations).
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            stats = {
+                'hits': self.hits,
+                'misses': self.misses,
+                'stale': self.stale,
+                'invalidations': self.invalidations,
+                'hitRatio': self.hits / lookups if lookups else 0.0,
+            }
+        stats['local'] = self.local.stats()
+        stats['shared'] = self.shared.stats() if self.shared is not None else None
+        return stats
+
+
+def create_month_response_cache():
+    """
+    Builds the response cache configured by AppConstants.
+    """
+    shared = None
+    if AppConstants.RESPONSE_CACHE_BACKEND == 'SQLITE':
+        shared = SqliteCacheBackend(path=AppConstants.RESPONSE_CACHE_PATH)
+    elif AppConstants.RESPONSE_CACHE_BACKEND != 'LOCAL':
+        raise ValueError(f'Unsupported RESPONSE_CACHE_BACKEND: {AppConstants.RESPONSE_CACHE_BACKEND}')
+    return MonthResponseCache(
+        local=LRUTTLCache(max_size=AppConstants.RESPONSE_CACHE_MAX_SIZE,
+                          ttl_seconds=AppConstants.RESPONSE_CACHE_OPEN_MONTH_TTL_SECONDS),
+        shared=shared,
+        open_month_ttl=AppConstants.RESPONSE_CACHE_OPEN_MONTH_TTL_SECONDS,
+        closed_month_ttl=AppConstants.RESPONSE_CACHE_CLOSED_MONTH_TTL_SECONDS,
+        max_rows=AppConstants.RESPONSE_CACHE_MAX_ROWS
+    )
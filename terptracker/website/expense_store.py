@@ -0,0 +1,35 @@
+from terptracker.constants.DynamoDbConstants import DynamoDbConstants
+from terptracker.dynamodb.write_behind import create_write_behind_queue, WriteBehindFull
+
+# None unless WRITE_BEHIND_ENABLED; the flusher thread and journal are started on first use in each worker. Shared by
+# the views, summary and export blueprints of both apps, so none of them imports another blueprint for it
+expense_write_queue = create_write_behind_queue(db_mode=DynamoDbConstants.DB_MODE)
+
+
+def queue_expense_write(user_expense_item: dict):
+    """
+    Hands a new expense to the write-behind queue.
+
+    Returns:
+        bool: False if write-behind is off or the queue stayed full; the caller must then write the item itself,
+            which slows submits down to what DynamoDB can absorb.
+    """
+    if expense_write_queue is None:
+        return False
+    try:
+        expense_write_queue.submit(user_expense_item)
+        return True
+    except WriteBehindFull as e:
+        print(f'⚠️{e}; writing synchronously')
+        return False
+
+
+def pending_expenses(user_email: str, year_month: str = None):
+    """
+    Returns:
+        list[dict]: The user's expenses still in the write-behind queue (optionally only one month's), in sort key
+            order, so read paths can show a user their own unflushed writes.
+    """
+    if expense_write_queue is None:
+        return []
+    return expense_write_queue.pending_items(user_email=user_email, year_month=year_month)
@@ -0,0 +1,163 @@
+import csv
+import io
+import json
+import zlib
+from datetime import datetime, timezone
+from flask import Blueprint, Response, request, abort
+from flask_login import login_required, current_user
+from boto3.dynamodb.conditions import Key
+from terptracker.constants.DynamoDbConstants import DynamoDbConstants
+from terptracker.dynamodb.dynamodb_helpers import LazyDynamoDbTable, paginate_query_pages
+from terptracker.dynamodb.expense_schema import Expense
+from terptracker.dynamodb.write_behind import with_pending_pages
+from terptracker.website.expense_store import pending_expenses
+
+export = Blueprint('export', __name__)
+
+user_expenses_table = LazyDynamoDbTable(db_mode=DynamoDbConstants.DB_MODE,
+                                        table_name=DynamoDbConstants.TERPTRACKER_USER_EXPENSES_TABLE_NAME)
+
+EXPORT_COLUMNS = ('date', 'timestamp', 'category', 'type', 'amount', 'note')
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def user_expenses_query_kwargs(user_email: str):
+    """
+    Builds the query arguments selecting a user's whole USER_EXPENSES partition, oldest first.
+    """
+    return dict(KeyConditionExpression=Key('userEmail').eq(user_email))
+
+
+def export_record(item: dict):
+    """
+    Converts a USER_EXPENSES item (v1 or v2) into a flat export row with plain (JSON and CSV safe) values.
+    """
+    expense = Expense.from_item(item)
+    return {
+        'date': expense.date_str,
+        'timestamp': f'{expense.epoch_seconds:.6f}',
+        'category': expense.expense_category or '',
+        'type': expense.expense_type or '',
+        'amount': str(expense.amount),
+        'note': expense.user_note or '',
+    }
+
+
+class ExportEncoder:
+    """
+    Incrementally encodes export rows as CSV or NDJSON, optionally gzip-compressing on the fly. Each call returns the
+    bytes ready to send, so a response can be streamed one query page at a time.
+    """
+
+    def __init__(self, export_format: str, compress: bool):
+        self.export_format = export_format
+        self._buffer = io.StringIO()
+        self._writer = csv.DictWriter(self._buffer, fieldnames=EXPORT_COLUMNS)
+        self._compressor = zlib.compressobj(wbits=31) if compress else None  # wbits=31 writes a gzip container
+
+    def _emit(self, data: bytes):
+        return self._compressor.compress(data) if self._compressor else data
+
+    def start(self):
+        """
+        Returns:
+            bytes: The CSV header row (nothing for NDJSON).
+        """
+        if self.export_format != 'csv':
+            return b''
+        self._writer.writeheader()
+        return self._emit(self._take_buffer())
+
+    def encode_page(self, items):
+        """
+        Returns:
+            bytes: The encoded rows for one page of USER_EXPENSES items.
+        """
+        if self.export_format == 'csv':
+            self._writer.writerows(export_record(item) for item in items)
+        else:
+            self._buffer.writelines(json.dumps(export_record(item)) + '\n' for item in items)
+        return self._emit(self._take_buffer())
+
+    def finish(self):
+        """
+        Returns:
+            bytes: Whatever the compressor still holds, including the gzip trailer.
+        """
+        return self._compressor.flush() if self._compressor else b''
+
+    def _take_buffer(self):
+        data = self._buffer.getvalue().encode('utf-8')
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return data
+
+
+def encode_export(pages, export_format: str, compress: bool):
+    """
+    Encodes query pages as an export stream, holding only one page at a time.
+
+    Args:
+        pages (Iterable[dict]): Query responses, e.g. from `paginate_query_pages`.
+        export_format (str): 'csv' or 'ndjson'.
+        compress (bool): Whether to gzip the stream.
+
+    Yields:
+        bytes: Non-empty chunks of the export.
+    """
+    encoder = ExportEncoder(export_format=export_format, compress=compress)
+    chunk = encoder.start()
+    if chunk:
+        yield chunk
+    for page in pages:
+        chunk = encoder.encode_page(page.get('Items', []))
+        if chunk:
+            yield chunk
+    chunk = encoder.finish()
+    if chunk:
+        yield chunk
+
+
+def export_headers(export_format: str, compress: bool):
+    """
+    Returns:
+        tuple: (mimetype, headers) for an export download.
+    """
+    filename = f"terptracker-expenses-{datetime.now(timezone.utc).strftime('%Y%m%d')}.{export_format}"
+    if compress:
+        filename += '.gz'
+    headers = {'Content-Disposition': f'attachment; filename="{filename}"', 'Cache-Control': 'no-store',
+               'X-Accel-Buffering': 'no'}
+    return ('application/gzip' if compress else EXPORT_FORMATS[export_format]), headers
+
+
+def parse_export_args(args):
+    """
+    Reads the `format` (csv | ndjson) and `gzip` query parameters, aborting with 400 on an unknown format.
+    """
+    export_format = (args.get('format') or 'csv').lower()
+    if export_format not in EXPORT_FORMATS:
+        abort(400, description=f"Format must be one of {', '.join(EXPORT_FORMATS)}")
+    compress = (args.get('gzip') or '').lower() in ('1', 'true', 'yes')
+    return export_format, compress
+
+
+@export.route('/export', methods=['GET'])
+@login_required
+def export_expenses():
+    """
+    Streams the current user's whole expense history as CSV or NDJSON (`?format=ndjson`), optionally gzip-compressed
+    (`?gzip=1`). The partition is paged through lazily and each page is encoded and sent as soon as it arrives, so
+    memory use does not grow with the number of expenses.
+    """
+    export_format, compress = parse_export_args(request.args)
+    pending = pending_expenses(user_email=current_user.email)
+    pages = with_pending_pages(
+        paginate_query_pages(user_expenses_table, **user_expenses_query_kwargs(user_email=current_user.email)),
+        pending)
+    mimetype, headers = export_headers(export_format=export_format, compress=compress)
+    return Response(encode_export(pages, export_format=export_format, compress=compress), mimetype=mimetype,
+                    headers=headers)
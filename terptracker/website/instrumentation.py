@@ -0,0 +1,86 @@
+import hmac
+import ipaddress
+from flask import Response, before_render_template, request, request_finished, request_started, template_rendered
+from terptracker.constants.AppConstants import AppConstants
+from terptracker.metrics import current_request_timing, metrics, record_request, render_prometheus, start_request_timing
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+METRICS_ALLOWED_NETWORKS = tuple(ipaddress.ip_network(network.strip(), strict=False)
+                                 for network in AppConstants.METRICS_ALLOWED_NETWORKS.split(',') if network.strip())
+
+
+def route_label(current_request):
+    """
+    Returns:
+        str: The matched URL rule (e.g. '/api/summary/<month_year>'), so paths with ids do not each get a series.
+    """
+    return current_request.url_rule.rule if current_request.url_rule is not None else 'unmatched'
+
+
+def prometheus_response(response_class=Response):
+    """
+    Returns:
+        Response: The metrics of every worker on the host in the Prometheus text format.
+    """
+    return response_class(render_prometheus(metrics.collect()), content_type=PROMETHEUS_CONTENT_TYPE)
+
+
+def metrics_scrape_allowed(remote_addr: str, authorization: str = None):
+    """
+    Decides whether a client may read /metrics (see METRICS_TOKEN and METRICS_ALLOWED_NETWORKS in AppConstants).
+
+    Args:
+        remote_addr (str): The client's address as the server saw it.
+        authorization (str, optional): The request's Authorization header.
+
+    Returns:
+        bool: True if the request carries the configured bearer token or, without a token configured, comes from an
+            allowed network.
+    """
+    if AppConstants.METRICS_TOKEN:
+        scheme, _, token = (authorization or '').partition(' ')
+        return scheme.lower() == 'bearer' and hmac.compare_digest(token.strip().encode(),
+                                                                  AppConstants.METRICS_TOKEN.encode())
+    try:
+        address = ipaddress.ip_address(remote_addr or '')
+    except ValueError:
+        return False
+    if address.version == 6 and address.ipv4_mapped is not None:
+        address = address.ipv4_mapped
+    return any(address in network for network in METRICS_ALLOWED_NETWORKS)
+
+
+def _on_request_started(sender, **extra):
+    start_request_timing()
+
+
+def _on_before_render_template(sender, **extra):
+    timing = current_request_timing()
+    if timing is not None:
+        timing.render_started()
+
+
+def _on_template_rendered(sender, **extra):
+    timing = current_request_timing()
+    if timing is not None:
+        timing.render_finished()
+
+
+def _on_request_finished(sender, response, **extra):
+    timing = current_request_timing()
+    if timing is None:
+        return
+    labels = (request.method, route_label(request), response.status_code)
+    # Streamed responses (summary tables) render while the body is sent, so the request is recorded once the server
+    # has closed the response rather than when the view returned
+    response.call_on_close(lambda: record_request(timing, *labels))
+
+
+def instrument_app(app):
+    """
+    Connects Flask's request and template signals to the request metrics (see terptracker/metrics.py).
+    """
+    request_started.connect(_on_request_started, app)
+    before_render_template.connect(_on_before_render_template, app)
+    template_rendered.connect(_on_template_rendered, app)
+    request_finished.connect(_on_request_finished, app)
@@ -1,4 +1,14 @@
+from flask import session
 from flask_login import UserMixin
+from terptracker.constants.AppConstants import AppConstants
+from .cache import LRUTTLCache, create_month_response_cache
+
+USER_SNAPSHOT_SESSION_KEY = '_user_snapshot'
+
+# Caches User objects by user_id so the Flask-Login user_loader does not read the LOGIN table on every request
+user_cache = LRUTTLCache(max_size=AppConstants.USER_CACHE_MAX_SIZE, ttl_seconds=AppConstants.USER_CACHE_TTL_SECONDS)
+# Caches summary view data per (userEmail, YYYY-MM, view); writes to a month invalidate it
+response_cache = create_month_response_cache()
 
 
 # class User(db.Model, UserMixin):
@@ -13,3 +23,49 @@ class User(UserMixin):
         self.email = email
         self.first_name = first_name
         self.password_hash = password_hash
+
+    @classmethod
+    def from_item(cls, item: dict):
+        """
+        Builds a User from a LOGIN table item.
+        """
+        return cls(user_id=item['user_id'], email=item['email'], first_name=item['firstName'],
+                   password_hash=item['password'])
+
+    def to_session_snapshot(self):
+        """
+        Returns the non-secret fields needed to rebuild this user from the (signed) session cookie. The password
+        hash is deliberately left out.
+        """
+        return {'user_id': self.id, 'email': self.email, 'first_name': self.first_name}
+
+    @classmethod
+    def from_session_snapshot(cls, snapshot, user_id):
+        """
+        Rebuilds a User from a session snapshot, or returns None if the snapshot is missing or belongs to another
+        user.
+        """
+        if not snapshot or snapshot.get('user_id') != user_id:
+            return None
+        return cls(user_id=snapshot['user_id'], email=snapshot['email'], first_name=snapshot['first_name'],
+                   password_hash=None)
+
+
+def remember_user_snapshot(user: User):
+    """
+    Stores a snapshot of the user in the session when session snapshots are enabled. The session is only written
+    when the snapshot changed, so an unchanged session cookie is not re-signed and re-sent.
+    """
+    if not AppConstants.USER_SESSION_SNAPSHOT:
+        return
+    snapshot = user.to_session_snapshot()
+    if session.get(USER_SNAPSHOT_SESSION_KEY) != snapshot:
+        session[USER_SNAPSHOT_SESSION_KEY] = snapshot
+
+
+def forget_user(user_id):
+    """
+    Drops every cached copy of a user: the in-process cache entry and the session snapshot.
+    """
+    user_cache.invalidate(user_id)
+    session.pop(USER_SNAPSHOT_SESSION_KEY, None)
@@ -0,0 +1,48 @@
+from itsdangerous import BadSignature, URLSafeSerializer
+
+# Separates page cursors from anything else signed with the app's secret key
+_CURSOR_SALT = 'terptracker-page-cursor'
+
+
+class InvalidCursor(Exception):
+    """
+    Raised when a page cursor was tampered with, is malformed or belongs to another user or listing; callers should
+    answer with 400.
+    """
+
+
+def encode_cursor(secret_key: str, scope: str, last_evaluated_key: dict, offset: int):
+    """
+    Encodes where the next page of a keyset-paginated listing starts as an opaque, signed, URL-safe token.
+
+    Args:
+        secret_key (str): The app's secret key.
+        scope (str): What the cursor may be used for, e.g. the user and month listed; checked by `decode_cursor`.
+        last_evaluated_key (dict): The DynamoDB `LastEvaluatedKey` to resume after.
+        offset (int): How many rows precede the next page, for "showing x-y of z".
+
+    Returns:
+        str: The cursor.
+    """
+    return URLSafeSerializer(secret_key, salt=_CURSOR_SALT).dumps({'s': scope, 'k': last_evaluated_key,
+                                                                    'n': offset})
+
+
+def decode_cursor(secret_key: str, scope: str, cursor: str):
+    """
+    Decodes a cursor created by `encode_cursor` for the same scope.
+
+    Returns:
+        tuple[dict, int]: The `ExclusiveStartKey` of the next page and the rows preceding it.
+
+    Raises:
+        InvalidCursor: If the cursor is not valid for `scope`.
+    """
+    try:
+        payload = URLSafeSerializer(secret_key, salt=_CURSOR_SALT).loads(cursor)
+    except BadSignature as e:
+        raise InvalidCursor('The cursor is not valid') from e
+    if not isinstance(payload, dict) or payload.get('s') != scope or not isinstance(payload.get('k'), dict):
+        raise InvalidCursor('The cursor belongs to another listing')
+    offset = payload.get('n')
+    return payload['k'], offset if isinstance(offset, int) and offset >= 0 else 0
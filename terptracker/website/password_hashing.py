@@ -0,0 +1,229 @@
+import asyncio
+import functools
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from werkzeug.security import generate_password_hash, check_password_hash
+from terptracker.constants.AppConstants import AppConstants
+
+
+class HashingPoolFull(Exception):
+    """
+    Raised when the password hashing pool cannot accept more work; callers should answer with 429.
+    """
+
+
+class PasswordHasher:
+    """
+    Runs PBKDF2 password hashing and verification in a dedicated process pool so the CPU-bound work neither pins a
+    request thread nor holds the worker's GIL.
+
+    At most `max_workers + queue_depth` calls may be running or queued at once; further calls fail fast with
+    `HashingPoolFull` instead of piling up behind the pool. Per-operation latency (including queue wait) is recorded.
+    """
+
+    def __init__(self, method: str, max_workers: int, queue_depth: int, timeout_seconds: float):
+        """
+        Args:
+            method (str): The werkzeug hash method new hashes are created with, e.g. 'pbkdf2:sha256:600000'.
+            max_workers (int): Hashing processes per worker; 0 hashes inline on the calling thread.
+            queue_depth (int): How many calls may wait for a free process.
+            timeout_seconds (float): How long a caller waits for its result before giving up.
+        """
+        self.method = method
+        self.max_workers = max_workers
+        self.queue_depth = queue_depth
+        self.timeout_seconds = timeout_seconds
+        self._slots = threading.BoundedSemaphore(max(1, max_workers) + queue_depth)
+        self._executor = None
+        self._executor_pid = None
+        self._hash_prefix = None
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def _get_executor(self):
+        # The pool belongs to the process that created it and is built on first use, so each gunicorn worker
+        # (forked after --preload or not) builds its own and the master never starts one. Workers are forked (spawn
+        # would re-run the app's __main__ module in every child); a fork-context pool forks all of its processes on
+        # the first submit, and they only run werkzeug's hashing, which takes none of the locks request threads hold.
+        with self._lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                start_method = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn'
+                mp_context = multiprocessing.get_context(start_method)
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=mp_context)
+                self._executor_pid = os.getpid()
+            return self._executor
+
+    def _reset_executor(self, broken_executor):
+        # Several callers can see the same pool break; only the first replaces it
+        with self._lock:
+            if self._executor is broken_executor:
+                self._executor = None
+        broken_executor.shutdown(wait=False, cancel_futures=True)
+
+    def _record(self, operation: str, started_at: float, outcome: str):
+        elapsed_ms = (time.perf_counter() - started_at) * 1000
+        with self._lock:
+            stats = self._stats.setdefault(operation, {'calls': 0, 'rejected': 0, 'timeouts': 0,
+                                                       'totalMs': 0.0, 'maxMs': 0.0})
+            if outcome == 'rejected':
+                stats['rejected'] += 1
+                return
+            if outcome == 'timeout':
+                stats['timeouts'] += 1
+            stats['calls'] += 1
+            stats['totalMs'] += elapsed_ms
+            stats['maxMs'] = max(stats['maxMs'], elapsed_ms)
+
+    def _acquire_slot(self, operation: str, started_at: float):
+        if not self._slots.acquire(blocking=False):
+            self._record(operation, started_at, 'rejected')
+            raise HashingPoolFull(f'Password {operation} queue is full')
+
+    def _release_slot(self, future=None):
+        self._slots.release()
+
+    def _submit(self, operation: str, started_at: float, fn, *args, **kwargs):
+        # The slot is released when the pool has actually finished (or dropped) the call, not when its caller gave
+        # up waiting, so timed-out calls still count against the pool until their process is free again
+        executor = self._get_executor()
+        try:
+            future = executor.submit(fn, *args, **kwargs)
+        except BrokenProcessPool as e:
+            self._release_slot()
+            raise self._pool_broke(operation, started_at, executor, e)
+        except BaseException:
+            self._release_slot()
+            raise
+        future.add_done_callback(self._release_slot)
+        return executor, future
+
+    def _pool_broke(self, operation: str, started_at: float, executor, error: BrokenProcessPool):
+        # A hashing process died (e.g. OOM-killed); shed this call and rebuild the pool for the next one
+        print(f'⚠️Password hashing pool broke ({error}); restarting it')
+        self._reset_executor(executor)
+        self._record(operation, started_at, 'rejected')
+        return HashingPoolFull(f'Password {operation} pool was restarted')
+
+    def _timed_out(self, operation: str, started_at: float):
+        self._record(operation, started_at, 'timeout')
+        return HashingPoolFull(f'Password {operation} timed out after {self.timeout_seconds}s')
+
+    def _run(self, operation: str, fn, *args, **kwargs):
+        started_at = time.perf_counter()
+        self._acquire_slot(operation, started_at)
+
+        if self.max_workers <= 0:
+            try:
+                result = fn(*args, **kwargs)
+            finally:
+                self._release_slot()
+        else:
+            executor, future = self._submit(operation, started_at, fn, *args, **kwargs)
+            try:
+                result = future.result(timeout=self.timeout_seconds)
+            except FutureTimeoutError:
+                # Drop the call if it is still queued; a running one keeps its slot until it finishes
+                future.cancel()
+                raise self._timed_out(operation, started_at)
+            except BrokenProcessPool as e:
+                raise self._pool_broke(operation, started_at, executor, e)
+
+        self._record(operation, started_at, 'ok')
+        return result
+
+    async def _run_async(self, operation: str, fn, *args, **kwargs):
+        # Same admission and accounting as `_run`, but the event loop awaits the pool's future instead of blocking
+        # on it; inline hashing (max_workers=0) moves to a thread so it cannot stall other coroutines.
+        started_at = time.perf_counter()
+        self._acquire_slot(operation, started_at)
+
+        if self.max_workers <= 0:
+            try:
+                future = asyncio.get_running_loop().run_in_executor(None, functools.partial(fn, *args, **kwargs))
+            except BaseException:
+                self._release_slot()
+                raise
+            future.add_done_callback(self._release_slot)
+            try:
+                # Shielded, so a timeout does not mark the future done while its thread is still hashing
+                result = await asyncio.wait_for(asyncio.shield(future), timeout=self.timeout_seconds)
+            except asyncio.TimeoutError:
+                raise self._timed_out(operation, started_at)
+        else:
+            executor, future = self._submit(operation, started_at, fn, *args, **kwargs)
+            try:
+                result = await asyncio.wait_for(asyncio.wrap_future(future), timeout=self.timeout_seconds)
+            except asyncio.TimeoutError:
+                raise self._timed_out(operation, started_at)
+            except BrokenProcessPool as e:
+                raise self._pool_broke(operation, started_at, executor, e)
+
+        self._record(operation, started_at, 'ok')
+        return result
+
+    def hash_password(self, password: str):
+        """
+        Returns:
+            str: A werkzeug password hash created with the configured method.
+
+        Raises:
+            HashingPoolFull: If the pool is saturated or the call timed out.
+        """
+        return self._run('hash', generate_password_hash, password, method=self.method)
+
+    def verify_password(self, password_hash: str, password: str):
+        """
+        Returns:
+            bool: Whether `password` matches `password_hash`.
+
+        Raises:
+            HashingPoolFull: If the pool is saturated or the call timed out.
+        """
+        return self._run('verify', check_password_hash, password_hash, password)
+
+    async def async_hash_password(self, password: str):
+        """
+        Coroutine version of `hash_password` for the asyncio app.
+        """
+        return await self._run_async('hash', generate_password_hash, password, method=self.method)
+
+    async def async_verify_password(self, password_hash: str, password: str):
+        """
+        Coroutine version of `verify_password` for the asyncio app.
+        """
+        return await self._run_async('verify', check_password_hash, password_hash, password)
+
+    def _configured_hash_prefix(self):
+        # werkzeug expands shorthand methods ('pbkdf2', 'scrypt') with its default parameters, so the prefix stored
+        # in hashes is read off a freshly generated hash rather than taken from the setting
+        if self._hash_prefix is None:
+            self._hash_prefix = generate_password_hash('', method=self.method).split('$', 1)[0]
+        return self._hash_prefix
+
+    def needs_rehash(self, password_hash: str):
+        """
+        Returns:
+            bool: True if `password_hash` was created with different cost parameters than the configured method.
+        """
+        return password_hash.split('$', 1)[0] != self._configured_hash_prefix()
+
+    def stats(self):
+        """
+        Returns:
+            dict: Per-operation call, rejection and timeout counts with average and max latency in milliseconds.
+        """
+        with self._lock:
+            return {
+                operation: dict(stats, avgMs=stats['totalMs'] / stats['calls'] if stats['calls'] else 0.0)
+                for operation, stats in self._stats.items()
+            }
+
+
+password_hasher = PasswordHasher(method=AppConstants.PASSWORD_HASH_METHOD,
+                                 max_workers=AppConstants.PASSWORD_HASH_WORKERS,
+                                 queue_depth=AppConstants.PASSWORD_HASH_QUEUE_DEPTH,
+                                 timeout_seconds=AppConstants.PASSWORD_HASH_TIMEOUT_SECONDS)
@@ -0,0 +1,63 @@
+import threading
+import time
+from flask import abort
+from terptracker.dynamodb.TerpTrackerDb import TerpTrackerDb
+
+
+class StartupTimer:
+    """
+    Records how long each step of worker startup takes, so cold-start cost can be measured.
+    """
+
+    def __init__(self, started_at: float = None):
+        """
+        Args:
+            started_at (float, optional): A `time.perf_counter()` reading to measure from. Defaults to now.
+        """
+        self.started_at = time.perf_counter() if started_at is None else started_at
+        self._last_mark = self.started_at
+        self.steps = {}
+
+    def mark(self, step: str):
+        """
+        Records the time elapsed since the previous mark under `step`.
+        """
+        now = time.perf_counter()
+        self.steps[step] = round((now - self._last_mark) * 1000, 2)
+        self._last_mark = now
+
+    def report(self):
+        """
+        Returns:
+            dict: The per-step durations and the total, in milliseconds.
+        """
+        return {'steps': dict(self.steps), 'totalMs': round((self._last_mark - self.started_at) * 1000, 2)}
+
+    def print_report(self, title: str):
+        report = self.report()
+        steps = ', '.join(f'{step}={ms}ms' for step, ms in report['steps'].items())
+        print(f"⏱️ {title}: {report['totalMs']}ms ({steps})")
+
+
+class LazySchemaCheck:
+    """
+    Verifies that every TerpTracker table exists the first time a request needs it, instead of during startup.
+    The check runs once per worker process; until it succeeds, requests are answered with 503.
+    """
+
+    def __init__(self, db_mode: str):
+        self.db_mode = db_mode
+        self.verified = False
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        if self.verified:
+            return
+        with self._lock:
+            if self.verified:
+                return
+            missing_tables = TerpTrackerDb(db_mode=self.db_mode).get_missing_tables()
+            if missing_tables:
+                print(f'🚨Missing DynamoDB tables {missing_tables}; run `terptracker init-db`')
+                abort(503, description='The database schema has not been provisioned yet.')
+            self.verified = True
@@ -1,19 +1,39 @@
-from flask import Blueprint, render_template, request, flash, session, redirect, url_for
+from flask import Blueprint, render_template, request, jsonify, abort, current_app
 from flask_login import login_required, current_user
 from terptracker.dynamodb.TerpTrackerDb import TerpTrackerDb
+from terptracker.constants.AppConstants import AppConstants
 from terptracker.constants.DynamoDbConstants import DynamoDbConstants
 from terptracker.dynamodb.dynamodb_helpers import *
-from boto3.dynamodb.conditions import Key, Attr
+from terptracker.dynamodb.expense_schema import EXPENSE_RECORD_ATTRIBUTES
+from terptracker.dynamodb.rollup_helpers import (accumulate_monthly_rollups, get_or_build_monthly_rollup,
+                                                 new_rollup, rollup_daily_series, rollup_from_item, rollup_to_item)
+from terptracker.dynamodb.write_behind import merge_pending
+from terptracker.website.models import response_cache
+from terptracker.website.pagination import InvalidCursor, decode_cursor, encode_cursor
+from terptracker.website.expense_store import pending_expenses
+from terptracker.dynamodb.expense_analytics import (LOOKBACK_MONTHS, MAX_ROLLING_WINDOW, expense_trends,
+                                                    load_expense_columns, month_number, shift_month)
 from collections import Counter
+from datetime import date, datetime, timezone
+import calendar
 import random
+import re
+
+MONTH_YEAR_PATTERN = re.compile(r'^\d{4}-(0[1-9]|1[0-2])$')
+# Expense keys are epoch seconds, so ranges start on or after the epoch
+EARLIEST_SUMMARY_DATE = date(1970, 1, 1)
+# The item attributes a range summary aggregates; all of them are projected into the category index
+RANGE_SUMMARY_ATTRIBUTES = ('expenseTimestamp', 'expenseAmountCents', 'expenseAmount', 'expenseType',
+                            'expenseCategory')
 
 
 summary = Blueprint('summary', __name__)
 
 bsky_dynamodb = TerpTrackerDb(db_mode=DynamoDbConstants.DB_MODE)
-db_resource = get_dynamodb_resource(db_mode=DynamoDbConstants.DB_MODE)
-user_expenses_table = get_dynamodb_table(dynamodb_resource=db_resource,
-                                         table_name=DynamoDbConstants.TERPTRACKER_USER_EXPENSES_TABLE_NAME)
+user_expenses_table = LazyDynamoDbTable(db_mode=DynamoDbConstants.DB_MODE,
+                                        table_name=DynamoDbConstants.TERPTRACKER_USER_EXPENSES_TABLE_NAME)
+user_monthly_rollup_table = LazyDynamoDbTable(db_mode=DynamoDbConstants.DB_MODE,
+                                              table_name=DynamoDbConstants.TERPTRACKER_USER_MONTHLY_ROLLUP_TABLE_NAME)
 
 
 def get_category_counts(posts):
@@ -37,73 +57,448 @@ def generate_color_palette(n):
     return [random.choice(base_colors) for _ in range(n)]
 
 
+def month_expenses_plan(user_email: str, month_year: str):
+    """
+    Plans the read of every expense the user recorded in the given month. Month views are cached until the user's
+    next write, so the read is strongly consistent: an eventually consistent one could cache a month without the
+    write that just invalidated it.
+    """
+    return plan_expense_query(ExpenseQuery.for_months(user_email=user_email, start_month=month_year,
+                                                      end_month=month_year, consistent=True,
+                                                      attributes=EXPENSE_RECORD_ATTRIBUTES, label='month'))
+
+
+def month_expenses_cursor_scope(user_email: str, month_year: str):
+    return f'expenses|{user_email}|{month_year}'
+
+
+def parse_page_cursor(secret_key: str, cursor: str, user_email: str, month_year: str):
+    """
+    Decodes the `cursor` argument of a page of a month's expenses.
+
+    Returns:
+        tuple[dict | None, int]: The key the page starts after (None for the first page) and the rows before it.
+    """
+    if not cursor:
+        return None, 0
+    try:
+        return decode_cursor(secret_key=secret_key, scope=month_expenses_cursor_scope(user_email, month_year),
+                             cursor=cursor)
+    except InvalidCursor as e:
+        abort(400, description=str(e))
+
+
+def parse_page_size(args):
+    """
+    Reads the `limit` query argument of a page of a month's expenses, SUMMARY_PAGE_SIZE by default.
+    """
+    page_size = args.get('limit', AppConstants.SUMMARY_PAGE_SIZE, type=int)
+    if page_size is None or not 1 <= page_size <= AppConstants.SUMMARY_PAGE_MAX_SIZE:
+        abort(400, description=f'limit must be between 1 and {AppConstants.SUMMARY_PAGE_MAX_SIZE}')
+    return page_size
+
+
+def page_pending_items(pending_items: list, start_key: dict, last_evaluated_key: dict):
+    """
+    Returns:
+        list[dict]: The month's write-behind items that sort within a page of stored items: after the key the page
+            started after and up to the last key it read (or the end of the month on the last page).
+    """
+    low = start_key['expenseTimestamp'] if start_key else None
+    high = last_evaluated_key['expenseTimestamp'] if last_evaluated_key else None
+    return [item for item in pending_items
+            if (low is None or item['expenseTimestamp'] > low) and (high is None or item['expenseTimestamp'] <= high)]
+
+
+def trim_look_ahead(items: list, page_size: int):
+    """
+    Trims a page read with one row of look-ahead (`page_size + 1` rows) back to `page_size` rows. Whether there is a
+    next page is decided by that extra row alone, never by the month's (denormalized) item count, and no cursor to
+    an empty page is handed out.
+
+    Returns:
+        tuple[list[dict], dict | None]: The page's items and the key the next page starts after, None on the last
+            page. The month is always read from the base table, so its key is the next page's `ExclusiveStartKey`.
+    """
+    if len(items) <= page_size:
+        return items, None
+    items = items[:page_size]
+    return items, {'userEmail': items[-1]['userEmail'], 'expenseTimestamp': items[-1]['expenseTimestamp']}
+
+
+def month_expenses_page(secret_key: str, user_email: str, month_year: str, rows: list, last_evaluated_key: dict,
+                        offset: int):
+    """
+    Builds one page of a month's expenses from the rows read for it.
+
+    Args:
+        rows (list[dict]): The page's items, stored and pending, in sort key order.
+        last_evaluated_key (dict): The key the next page starts after, None on the last page (see `trim_look_ahead`).
+        offset (int): The rows before this page.
+
+    Returns:
+        dict: `expenses` (Expense records), `offset` and `nextCursor` (None on the last page).
+    """
+    next_cursor = None
+    if last_evaluated_key is not None:
+        next_cursor = encode_cursor(secret_key=secret_key, scope=month_expenses_cursor_scope(user_email, month_year),
+                                    last_evaluated_key=last_evaluated_key, offset=offset + len(rows))
+    return {'expenses': normalize_summary_records(rows), 'offset': offset, 'nextCursor': next_cursor}
+
+
+def load_month_expenses_page(user_email: str, month_year: str, page_size: int, start_key: dict, offset: int,
+                             pending_items: list):
+    """
+    Reads one page of a month's expenses (see `month_expenses_page`) with a single bounded query, merging in the
+    write-behind items that sort within it.
+    """
+    items, _ = run_query_plan_page(user_expenses_table, month_expenses_plan(user_email=user_email,
+                                                                            month_year=month_year),
+                                   page_size=page_size + 1, exclusive_start_key=start_key)
+    items, last_evaluated_key = trim_look_ahead(items, page_size)
+    rows = list(merge_pending(items, page_pending_items(pending_items, start_key, last_evaluated_key)))
+    return month_expenses_page(secret_key=current_app.secret_key, user_email=user_email, month_year=month_year,
+                               rows=rows, last_evaluated_key=last_evaluated_key, offset=offset)
+
+
+def summary_page_view(cursor: str):
+    # Each page of the summary table is cached as its own view of the month
+    return f'summary:{cursor}' if cursor else 'summary'
+
+
+def month_summary_payload(month_year: str, rollup: dict):
+    """
+    Builds the /api/summary JSON body for one month from its rollup (None meaning no expenses).
+    """
+    payload = {
+        'month': month_year,
+        'itemCount': 0,
+        'totalAmount': 0.0,
+        'categoryTotals': {},
+        'categoryCounts': {},
+        'typeTotals': {},
+        'typeCounts': {},
+        'daily': [],
+    }
+    if rollup:
+        payload.update({key: rollup[key] for key in ('itemCount', 'totalAmount', 'categoryTotals',
+                                                     'categoryCounts', 'typeTotals', 'typeCounts')})
+        payload['daily'] = rollup_daily_series(rollup)
+    return payload
+
+
+def parse_trend_args(args):
+    """
+    Reads the `start`, `end` and `window` query arguments of a trends request. The range defaults to the twelve
+    months ending with the current one.
+
+    Returns:
+        tuple[str, str, int]: The first month, last month and rolling window.
+    """
+    end_month = args.get('end') or datetime.now(timezone.utc).strftime('%Y-%m')
+    if not MONTH_YEAR_PATTERN.match(end_month):
+        abort(400, description='end must be formatted as YYYY-MM')
+    start_month = args.get('start') or shift_month(end_month, -11)
+    if not MONTH_YEAR_PATTERN.match(start_month):
+        abort(400, description='start must be formatted as YYYY-MM')
+    month_count = month_number(end_month) - month_number(start_month) + 1
+    if not 1 <= month_count <= AppConstants.TRENDS_MAX_MONTHS:
+        abort(400, description=f'The range must cover 1 to {AppConstants.TRENDS_MAX_MONTHS} months')
+    window = args.get('window', AppConstants.TRENDS_DEFAULT_WINDOW, type=int)
+    if window is None or not 1 <= window <= MAX_ROLLING_WINDOW:
+        abort(400, description=f'window must be between 1 and {MAX_ROLLING_WINDOW} months')
+    return start_month, end_month, window
+
+
+def parse_trend_filters(args):
+    """
+    Reads the optional `category` and `type` query arguments narrowing a trends request.
+
+    Returns:
+        tuple[str | None, str | None]: The category and expense type, None when not given.
+    """
+    return args.get('category') or None, args.get('type') or None
+
+
+def parse_range_dates(args):
+    """
+    Reads the `start` and `end` query arguments (YYYY-MM-DD, inclusive) of a date-range summary request.
+
+    Returns:
+        tuple[date, date]: The first and last day.
+    """
+    try:
+        start_date = date.fromisoformat(args.get('start', ''))
+        end_date = date.fromisoformat(args.get('end', ''))
+    except ValueError:
+        abort(400, description='start and end must be formatted as YYYY-MM-DD')
+    if start_date < EARLIEST_SUMMARY_DATE:
+        abort(400, description=f'start must be on or after {EARLIEST_SUMMARY_DATE.isoformat()}')
+    if not 1 <= (end_date - start_date).days + 1 <= AppConstants.RANGE_SUMMARY_MAX_DAYS:
+        abort(400, description=f'The range must cover 1 to {AppConstants.RANGE_SUMMARY_MAX_DAYS} days')
+    return start_date, end_date
+
+
+def quarter_dates(year: int, quarter: int):
+    """
+    Returns:
+        tuple[date, date]: The first and last day of a calendar quarter (1-4).
+    """
+    if not EARLIEST_SUMMARY_DATE.year <= year <= 9999:
+        abort(400, description=f'year must be between {EARLIEST_SUMMARY_DATE.year} and 9999')
+    if not 1 <= quarter <= 4:
+        abort(400, description='quarter must be between 1 and 4')
+    last_month = quarter * 3
+    return date(year, last_month - 2, 1), date(year, last_month, calendar.monthrange(year, last_month)[1])
+
+
+def year_dates(year: int):
+    """
+    Returns:
+        tuple[date, date]: The first and last day of a calendar year.
+    """
+    if not EARLIEST_SUMMARY_DATE.year <= year <= 9999:
+        abort(400, description=f'year must be between {EARLIEST_SUMMARY_DATE.year} and 9999')
+    return date(year, 1, 1), date(year, 12, 31)
+
+
+def range_expense_query(user_email: str, start_date: date, end_date: date, category: str = None,
+                        expense_type: str = None):
+    """
+    Builds the logical read behind a quarter, year or date-range summary. Range summaries are not cached, so the
+    read may be eventually consistent (half the read capacity).
+    """
+    return ExpenseQuery.for_dates(user_email=user_email, start_date=start_date, end_date=end_date,
+                                  category=category, expense_type=expense_type,
+                                  attributes=RANGE_SUMMARY_ATTRIBUTES, label='range')
+
+
+def range_pending_items(query: ExpenseQuery):
+    """
+    Returns:
+        list[dict]: The user's write-behind items that fall in the range read and pass its filters, in sort key order.
+    """
+    return [item for item in pending_expenses(user_email=query.user_email)
+            if query.in_range(item) and query.matches(item)]
+
+
+def range_summary_payload(start_date: date, end_date: date, rollups: dict, period: str = None):
+    """
+    Builds the JSON body of a quarter, year or date-range summary from the monthly rollups of its expenses: the
+    totals and counts of the whole range, one entry per month (empty months included) and a daily series.
+
+    Args:
+        rollups (dict[str, dict]): In-memory rollups by month, see `accumulate_monthly_rollups`.
+        period (str, optional): Names the range, e.g. '2025-Q1' or '2025'.
+    """
+    totals = new_rollup(user_email=None, year_month=None)
+    months, daily = [], []
+    month, end_month = start_date.strftime('%Y-%m'), end_date.strftime('%Y-%m')
+    while month <= end_month:
+        rollup = rollups.get(month)
+        if rollup is None:
+            months.append({'month': month, 'itemCount': 0, 'totalAmount': 0.0})
+        else:
+            # Totals are added up as Decimals and only converted to floats once
+            totals['totalAmount'] += rollup['totalAmount']
+            totals['itemCount'] += rollup['itemCount']
+            for group in ('categoryTotals', 'categoryCounts', 'typeTotals', 'typeCounts'):
+                for name, value in rollup[group].items():
+                    totals[group][name] += value
+            rollup = rollup_from_item(rollup_to_item(rollup))
+            months.append({'month': month, 'itemCount': rollup['itemCount'], 'totalAmount': rollup['totalAmount']})
+            daily.extend(rollup_daily_series(rollup))
+        month = shift_month(month, 1)
+
+    totals = rollup_from_item(rollup_to_item(totals))
+    payload = {'start': start_date.isoformat(), 'end': end_date.isoformat(), 'period': period}
+    payload.update({key: totals[key] for key in ('itemCount', 'totalAmount', 'categoryTotals', 'categoryCounts',
+                                                 'typeTotals', 'typeCounts')})
+    payload.update(months=months, daily=daily)
+    return payload
+
+
+def range_summary_response(start_date: date, end_date: date, period: str = None):
+    """
+    Answers a quarter, year or date-range summary request. The month sub-queries run concurrently on the range
+    query executor and their items are aggregated in one streaming pass, in sort key order.
+    """
+    category, expense_type = parse_trend_filters(request.args)
+    query = range_expense_query(user_email=current_user.email, start_date=start_date, end_date=end_date,
+                                category=category, expense_type=expense_type)
+    rollups = {}
+    for item in merge_pending(run_range_query(user_expenses_table, query), range_pending_items(query)):
+        accumulate_monthly_rollups(rollups, user_email=current_user.email, expense_item=item)
+
+    response = jsonify(range_summary_payload(start_date=start_date, end_date=end_date, rollups=rollups,
+                                             period=period))
+    response.add_etag()
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
+
+
 @summary.route('/summary', methods=['GET', 'POST'])
 @login_required
 def home():
-    if request.method == 'POST':
-        month_year = request.values.get('month')
-
-        year = month_year.split('-')[0]
-        month = month_year.split('-')[1]
-        day = 0
-
-        if month in ['01', '03', '05', '07', '08', '10', '12']:
-            day = 31
-        elif month == '02':
-            is_leap_year = isLeapYear(year)
-            if is_leap_year:
-                day = 29
-            else:
-                day = 28
-        else:
-            day = 30
-
-        start = get_first_timestamp_of_month(year=int(year), month=int(month))
-        end = get_last_timestamp_of_month(year=int(year), month=int(month), day=day)
+    month_year = request.values.get('month')
+    if request.method == 'POST' or month_year:
+        if not MONTH_YEAR_PATTERN.match(month_year or ''):
+            abort(400, description='Month must be formatted as YYYY-MM')
+        cursor = request.values.get('cursor')
+        start_key, offset = parse_page_cursor(secret_key=current_app.secret_key, cursor=cursor,
+                                              user_email=current_user.email, month_year=month_year)
 
-        response = user_expenses_table.query(
-            IndexName='UserTimestampIndex',
-            KeyConditionExpression=Key('userEmail').eq(current_user.email) & Key('expenseTimestamp').between(start, end)
-        )
+        def load_page():
+            # The totals come from the month's rollup (one GetItem), so rendering a page reads and loops over that
+            # page's rows only, however many expenses the month has
+            pending = pending_expenses(user_email=current_user.email, year_month=month_year)
+            rollup = get_or_build_monthly_rollup(
+                rollup_table=user_monthly_rollup_table,
+                user_expenses_table=user_expenses_table,
+                user_email=current_user.email,
+                year_month=month_year,
+                expense_query_plan=month_expenses_plan(user_email=current_user.email, month_year=month_year),
+                pending_items=pending
+            )
+            page = load_month_expenses_page(user_email=current_user.email, month_year=month_year,
+                                            page_size=AppConstants.SUMMARY_PAGE_SIZE, start_key=start_key,
+                                            offset=offset, pending_items=pending)
+            return dict(page, rollup=rollup)
 
-        norm_records = normalize_summary_records(response['Items'])
+        page = response_cache.get_or_load(user_email=current_user.email, year_month=month_year,
+                                          view=summary_page_view(cursor), loader=load_page)
         return render_template("summary_table.html",
                                selected_month=month_year,
-                               expenses=norm_records)
+                               rollup=page['rollup'],
+                               expenses=page['expenses'],
+                               offset=page['offset'],
+                               next_cursor=page['nextCursor'])
     else:
         return render_template('summary.html')
 
+
 @summary.route('/pie_chart', methods=['GET', 'POST'])
 @login_required
 def get_pie_chart():
-    if request.method == 'GET':
-        month_year = request.values.get('month')
-        print(f'{month_year=}')
-
-        year = month_year.split('-')[0]
-        month = month_year.split('-')[1]
-        day = 0
-
-        if month in ['01', '03', '05', '07', '08', '10', '12']:
-            day = 31
-        elif month == '02':
-            is_leap_year = isLeapYear(year)
-            if is_leap_year:
-                day = 29
-            else:
-                day = 28
-        else:
-            day = 30
+    month_year = request.values.get('month')
+    if not MONTH_YEAR_PATTERN.match(month_year or ''):
+        abort(400, description='Month must be formatted as YYYY-MM')
 
-        start = get_first_timestamp_of_month(year=int(year), month=int(month))
-        end = get_last_timestamp_of_month(year=int(year), month=int(month), day=day)
+    # The chart data is fetched client-side from /api/summary/<month>
+    return render_template("pie_chart.html",
+                           selected_month=month_year)
 
-        response = user_expenses_table.query(
-            IndexName='UserTimestampIndex',
-            KeyConditionExpression=Key('userEmail').eq(current_user.email) & Key('expenseTimestamp').between(start, end)
+
+@summary.route('/api/summary/<month_year>', methods=['GET'])
+@login_required
+def get_month_summary(month_year):
+    """
+    Returns the pre-aggregated totals for one month as JSON: category and type totals and counts, a daily series and
+    the item count. Responses carry an ETag so unchanged months are answered with 304 Not Modified.
+    """
+    if not MONTH_YEAR_PATTERN.match(month_year):
+        abort(400, description='Month must be formatted as YYYY-MM')
+
+    def load_payload():
+        rollup = get_or_build_monthly_rollup(
+            rollup_table=user_monthly_rollup_table,
+            user_expenses_table=user_expenses_table,
+            user_email=current_user.email,
+            year_month=month_year,
+            expense_query_plan=month_expenses_plan(user_email=current_user.email, month_year=month_year),
+            pending_items=pending_expenses(user_email=current_user.email, year_month=month_year)
         )
+        return month_summary_payload(month_year=month_year, rollup=rollup)
 
-        norm_records = normalize_summary_records(response['Items'])
-        return render_template("pie_chart.html",
-                               selected_month=month_year,
-                               expenses=norm_records)
+    payload = response_cache.get_or_load(user_email=current_user.email, year_month=month_year, view='api_summary',
+                                         loader=load_payload)
+    response = jsonify(payload)
+    response.add_etag()
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
+
+
+@summary.route('/api/summary/<month_year>/expenses', methods=['GET'])
+@login_required
+def get_month_expenses(month_year):
+    """
+    Returns one page of a month's expenses as JSON, oldest first: `expenses`, the `offset` of the first one and a
+    `nextCursor` to pass back as `cursor` for the next page, null on the last page. Query arguments: `cursor` and
+    `limit` (1 to SUMMARY_PAGE_MAX_SIZE rows, SUMMARY_PAGE_SIZE by default). The month's totals are served by
+    /api/summary/<month>.
+    """
+    if not MONTH_YEAR_PATTERN.match(month_year):
+        abort(400, description='Month must be formatted as YYYY-MM')
+    start_key, offset = parse_page_cursor(secret_key=current_app.secret_key, cursor=request.args.get('cursor'),
+                                          user_email=current_user.email, month_year=month_year)
+    page = load_month_expenses_page(user_email=current_user.email, month_year=month_year,
+                                    page_size=parse_page_size(request.args), start_key=start_key, offset=offset,
+                                    pending_items=pending_expenses(user_email=current_user.email,
+                                                                   year_month=month_year))
+
+    response = jsonify({'month': month_year, 'offset': page['offset'], 'nextCursor': page['nextCursor'],
+                        'expenses': [expense.to_dict() for expense in page['expenses']]})
+    response.add_etag()
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
+
+
+@summary.route('/summary/trends', methods=['GET'])
+@login_required
+def get_trends():
+    start_month, end_month, window = parse_trend_args(request.args)
+    # The chart data is fetched client-side from /api/summary/trends
+    return render_template('trends.html', start_month=start_month, end_month=end_month, window=window)
+
+
+@summary.route('/api/summary/trends', methods=['GET'])
+@login_required
+def get_expense_trends():
+    """
+    Returns multi-month trends as JSON: monthly totals with month-over-month and year-over-year changes, a rolling
+    average, per-category totals and shares, and spend projections. Query arguments: `start` and `end` (YYYY-MM,
+    up to TRENDS_MAX_MONTHS apart), `window` (rolling average months) and optionally `category` and `type`.
+    """
+    start_month, end_month, window = parse_trend_args(request.args)
+    category, expense_type = parse_trend_filters(request.args)
+    columns = load_expense_columns(user_expenses_table=user_expenses_table, user_email=current_user.email,
+                                   start_month=shift_month(start_month, -LOOKBACK_MONTHS), end_month=end_month,
+                                   category=category, expense_type=expense_type,
+                                   pending_items=pending_expenses(user_email=current_user.email))
+
+    response = jsonify(expense_trends(columns, start_month=start_month, end_month=end_month, window=window))
+    response.add_etag()
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
+
+
+@summary.route('/api/summary/range', methods=['GET'])
+@login_required
+def get_range_summary():
+    """
+    Returns the totals of an arbitrary date range as JSON: category and type totals and counts, monthly totals and
+    a daily series. Query arguments: `start` and `end` (YYYY-MM-DD, inclusive, up to RANGE_SUMMARY_MAX_DAYS days)
+    and optionally `category` and `type`.
+    """
+    start_date, end_date = parse_range_dates(request.args)
+    return range_summary_response(start_date=start_date, end_date=end_date)
+
+
+@summary.route('/api/summary/quarter/<int:year>/<int:quarter>', methods=['GET'])
+@login_required
+def get_quarter_summary(year, quarter):
+    """
+    Returns the totals of a calendar quarter as JSON, like `get_range_summary`.
+    """
+    start_date, end_date = quarter_dates(year=year, quarter=quarter)
+    return range_summary_response(start_date=start_date, end_date=end_date, period=f'{year:04d}-Q{quarter}')
+
+
+@summary.route('/api/summary/year/<int:year>', methods=['GET'])
+@login_required
+def get_year_summary(year):
+    """
+    Returns the totals of a calendar year as JSON, like `get_range_summary`.
+    """
+    start_date, end_date = year_dates(year=year)
+    return range_summary_response(start_date=start_date, end_date=end_date, period=f'{year:04d}')
@@ -1,20 +1,36 @@
-from flask import Blueprint, render_template, request, flash, jsonify, redirect, url_for, session
+from flask import Blueprint, render_template, request, flash, jsonify, redirect, url_for, session, abort
 from flask_login import login_required, current_user
 from terptracker.dynamodb.TerpTrackerDb import TerpTrackerDb
 from terptracker.dynamodb.dynamodb_helpers import *
+from terptracker.dynamodb.rollup_helpers import expense_year_month
+from terptracker.dynamodb.expense_import import import_expenses_csv, RowRejected
+from terptracker.dynamodb.expense_schema import new_expense_item, dollars_to_cents
+from terptracker.dynamodb.throttling import throttle_stats
+from terptracker.dynamodb.idempotency import (expense_idempotency_key, new_form_token, put_expense_idempotently,
+                                              put_expense_with_rollup, claim_idempotency_key,
+                                              release_idempotency_key)
+from terptracker.constants.AppConstants import AppConstants
 from terptracker.constants.DynamoDbConstants import DynamoDbConstants
 from datetime import datetime, date, timezone
-from .models import User
+from .models import User, user_cache, response_cache
+from .expense_store import expense_write_queue, queue_expense_write
+from .instrumentation import metrics_scrape_allowed, prometheus_response
 from boto3.dynamodb.conditions import Key
+from werkzeug.exceptions import RequestEntityTooLarge
 import requests
 import json
+import io
+import csv
 
 views = Blueprint('views', __name__)
 
 bsky_dynamodb = TerpTrackerDb(db_mode=DynamoDbConstants.DB_MODE)
-db_resource = get_dynamodb_resource(db_mode=DynamoDbConstants.DB_MODE)
-user_expenses_table = get_dynamodb_table(dynamodb_resource=db_resource,
-                                         table_name=DynamoDbConstants.TERPTRACKER_USER_EXPENSES_TABLE_NAME)
+user_expenses_table = LazyDynamoDbTable(db_mode=DynamoDbConstants.DB_MODE,
+                                        table_name=DynamoDbConstants.TERPTRACKER_USER_EXPENSES_TABLE_NAME)
+user_monthly_rollup_table = LazyDynamoDbTable(db_mode=DynamoDbConstants.DB_MODE,
+                                              table_name=DynamoDbConstants.TERPTRACKER_USER_MONTHLY_ROLLUP_TABLE_NAME)
+idempotency_table = LazyDynamoDbTable(db_mode=DynamoDbConstants.DB_MODE,
+                                      table_name=DynamoDbConstants.TERPTRACKER_EXPENSE_IDEMPOTENCY_TABLE_NAME)
 
 
 def timestamp_with_current_time(year: int, month: int, day: int):
@@ -29,34 +45,142 @@ def timestamp_with_current_time(year: int, month: int, day: int):
     return dt, dt.timestamp()
 
 
+def build_user_expense_item(user_email: str, form):
+    """
+    Builds a (v2) USER_EXPENSES item from the add-expense form.
+
+    Args:
+        user_email (str): The signed-in user's email address.
+        form (MultiDict): The submitted form fields.
+
+    Returns:
+        dict: The item to write.
+
+    Raises:
+        Exception: If the date or amount cannot be parsed; nothing should be written in that case.
+    """
+    expense_type = form.get('expense_type')
+    expense_category = form.get('expense_category')
+    expense_amount = form.get('expense_amount')
+    expense_date = form.get('expense_date')
+    user_note = form.get('expense_note')
+
+    year = int(expense_date.split('-')[0])
+    month = int(expense_date.split('-')[1])
+    day = int(expense_date.split('-')[2])
+    amount_cents = dollars_to_cents(expense_amount)  # Rejects non-numeric amounts before anything is written
+
+    dt, epoch = timestamp_with_current_time(year=year, month=month, day=day)
+    return new_expense_item(user_email=user_email, epoch_micros=round(epoch * 1_000_000), amount_cents=amount_cents,
+                            expense_type=expense_type, expense_category=expense_category, user_note=user_note)
+
+
+def record_expense(user_expense_item: dict, form_token: str = None):
+    """
+    Stores a new expense and its rollup delta unless the same submission (same form token, or same content within
+    IDEMPOTENCY_CONTENT_WINDOW_SECONDS) was already admitted.
+
+    Without write-behind, the idempotency claim, the expense and the rollup delta are written in one transaction.
+    With write-behind, the key is claimed with a conditional put and the expense is queued; if the queue is full,
+    the expense and its rollup delta are written in one transaction instead.
+
+    Returns:
+        dict | None: None if the expense was recorded, otherwise the idempotency record of the original submission.
+    """
+    idempotency_key = expense_idempotency_key(expense_item=user_expense_item, form_token=form_token)
+    if expense_write_queue is None:
+        return put_expense_idempotently(client=get_dynamodb_client(db_mode=DynamoDbConstants.DB_MODE),
+                                        expense_item=user_expense_item, idempotency_key=idempotency_key,
+                                        idempotency_table=idempotency_table)
+
+    original = claim_idempotency_key(idempotency_table=idempotency_table, expense_item=user_expense_item,
+                                     idempotency_key=idempotency_key)
+    if original is None and not queue_expense_write(user_expense_item):
+        try:
+            put_expense_with_rollup(client=get_dynamodb_client(db_mode=DynamoDbConstants.DB_MODE),
+                                    expense_item=user_expense_item)
+        except Exception:
+            release_idempotency_key(idempotency_table=idempotency_table, expense_item=user_expense_item,
+                                    idempotency_key=idempotency_key)
+            raise
+    return original
+
+
 @views.route('/', methods=['GET', 'POST'])
 @login_required
 def home():
     if request.method == 'POST':
         try:
-            expense_type = request.form.get('expense_type')
-            expense_category = request.form.get('expense_category')
-            expense_amount = request.form.get('expense_amount')
-            expense_date = request.form.get('expense_date')
-            user_note = request.form.get('expense_note')
-
-            year = int(expense_date.split('-')[0])
-            month = int(expense_date.split('-')[1])
-            day = int(expense_date.split('-')[2])
-
-            dt, epoch = timestamp_with_current_time(year=year, month=month, day=day)
-            user_expense_item = {'userEmail': current_user.email, 'expenseTimestamp': str(epoch),
-                                 'expenseType': expense_type, 'expenseCategory': expense_category,
-                                 'expenseAmount': expense_amount, 'userNote': user_note}
-
-            user_expenses_table.put_item(Item=user_expense_item)
-            flash(f'Successfully added your {expense_category} expense')
+            user_expense_item = build_user_expense_item(user_email=current_user.email, form=request.form)
+
+            original = record_expense(user_expense_item=user_expense_item,
+                                      form_token=request.form.get('idempotency_key'))
+            if original is None:
+                response_cache.invalidate_month(user_email=current_user.email,
+                                                year_month=expense_year_month(user_expense_item['expenseTimestamp']))
+                flash(f"Successfully added your {user_expense_item['expenseCategory']} expense")
+            else:
+                # A repeated submission (double-click, resubmit) gets the original result
+                flash(f"Successfully added your {original.get('expenseCategory')} expense")
 
         except Exception as e:
             print(e)
             flash('There was an error parsing your information', category='error')
 
-    return render_template("home.html")
+    return render_template("home.html", idempotency_key=new_form_token())
+
+
+IMPORT_TOO_LARGE_MESSAGE = (f'Files over {AppConstants.IMPORT_MAX_UPLOAD_BYTES / (1024 * 1024):g} MB are too large to '
+                            f'import here; import them with `terptracker import-expenses` instead')
+
+
+def import_upload_refusal(content_length: int):
+    """
+    Checks an import upload's size before its body is read.
+
+    Args:
+        content_length (int | None): The request's Content-Length; None when unknown (the caller bounds the body).
+
+    Returns:
+        str | None: The message refusing the upload, or None if it may be imported within the request.
+    """
+    if content_length is None or content_length <= AppConstants.IMPORT_MAX_UPLOAD_BYTES:
+        return None
+    return IMPORT_TOO_LARGE_MESSAGE
+
+
+@views.route('/import', methods=['GET', 'POST'])
+@login_required
+def import_expenses():
+    report = None
+    if request.method == 'POST':
+        refusal = import_upload_refusal(request.content_length)
+        if refusal:
+            flash(refusal, category='error')
+            return render_template('import_expenses.html', report=None), 413
+        # Bounds a body without a Content-Length, or longer than announced
+        request.max_content_length = AppConstants.IMPORT_MAX_UPLOAD_BYTES
+        try:
+            upload = request.files.get('expense_file')
+        except RequestEntityTooLarge:
+            flash(IMPORT_TOO_LARGE_MESSAGE, category='error')
+            return render_template('import_expenses.html', report=None), 413
+        if not upload or not upload.filename:
+            flash('Choose a CSV file to import', category='error')
+        else:
+            # Werkzeug spools large uploads to disk; the CSV is decoded and parsed incrementally from that stream
+            text_stream = io.TextIOWrapper(upload.stream, encoding='utf-8-sig', newline='')
+            try:
+                report = import_expenses_csv(text_stream=text_stream, user_email=current_user.email,
+                                             client=get_dynamodb_client(db_mode=DynamoDbConstants.DB_MODE),
+                                             rollup_table=user_monthly_rollup_table)
+                for year_month in report.months:
+                    response_cache.invalidate_month(user_email=current_user.email, year_month=year_month)
+                flash(f'Imported {report.rows_imported} of {report.rows_read} expenses')
+            except (RowRejected, UnicodeDecodeError, csv.Error) as e:
+                flash(f'Could not import {upload.filename}: {e}', category='error')
+
+    return render_template('import_expenses.html', report=report.to_dict() if report else None)
 
 
 @views.route('/task_status/<task_id>')
@@ -68,3 +192,27 @@ def task_status_page(task_id):
 @views.route('/health', methods=['GET'])
 def health():
     return "Healthy!", 200
+
+
+@views.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """
+    Serves request, template and DynamoDB metrics of every worker on the host for Prometheus to scrape.
+    """
+    if not AppConstants.METRICS_ENABLED:
+        abort(404)
+    if not metrics_scrape_allowed(remote_addr=request.remote_addr, authorization=request.headers.get('Authorization')):
+        abort(403)
+    return prometheus_response()
+
+
+@views.route('/api/cache/stats', methods=['GET'])
+@login_required
+def cache_stats():
+    """
+    Reports the response and user caches' hit ratios, sizes, evictions and expirations, the write-behind queue and
+    the client-side table throttles.
+    """
+    return jsonify({'responseCache': response_cache.stats(), 'userCache': user_cache.stats(),
+                    'writeBehind': expense_write_queue.stats() if expense_write_queue else None,
+                    'throttling': throttle_stats()})
@@ -0,0 +1,56 @@
+import os
+import tempfile
+import uuid
+
+import pytest
+
+# The app reads its configuration at import time, so point it at the in-process DynamoDB emulator before any test
+# module imports terptracker; the suite never needs Docker or AWS credentials
+os.environ['DB_MODE'] = 'MEMORY'
+os.environ['PASSWORD_HASH_WORKERS'] = '0'
+os.environ['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:1000'
+os.environ.setdefault('WRITE_BEHIND_JOURNAL_DIR', tempfile.mkdtemp(prefix='terptracker-journal-'))
+
+from terptracker.dynamodb.dynamodb_helpers import get_dynamodb_resource, list_table_names
+from terptracker.dynamodb.TerpTrackerDb import TerpTrackerDb
+from terptracker.dynamodb.throttling import _throttle_registry
+from terptracker.website import create_app
+
+
+@pytest.fixture
+def memory_db():
+    """
+    Empties the process's in-memory database and recreates every TerpTracker table. The resource itself is kept, so
+    tables the app modules already resolved stay bound to it.
+    """
+    resource = get_dynamodb_resource(db_mode='MEMORY')
+    # New tables start with fresh client-side rate limits, not the buckets earlier tests drained
+    _throttle_registry.clear()
+    for table_name in list_table_names(client=resource.meta.client):
+        resource.meta.client.delete_table(TableName=table_name)
+    TerpTrackerDb(db_mode='MEMORY').create_all_tables()
+    return resource
+
+
+@pytest.fixture(scope='session')
+def app():
+    app = create_app()
+    app.config['TESTING'] = True
+    return app
+
+
+@pytest.fixture
+def user_email():
+    # Unique per test, so nothing cached per user (responses, pending writes) leaks between tests
+    return f'user-{uuid.uuid4().hex[:8]}@example.com'
+
+
+@pytest.fixture
+def client(app, memory_db, user_email):
+    """
+    A test client signed in as `user_email`, a new account in an empty database.
+    """
+    client = app.test_client()
+    client.post('/sign-up', data={'email': user_email, 'firstName': 'Test', 'password1': 'password123',
+                                  'password2': 'password123'})
+    return client
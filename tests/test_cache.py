@@ -0,0 +1,181 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from terptracker.website import cache
+from terptracker.website.cache import LRUTTLCache, MonthResponseCache, SqliteCacheBackend
+
+USER_EMAIL = 'cache@example.com'
+NOW = datetime(2025, 3, 15, tzinfo=timezone.utc)
+
+
+class Clock:
+    """
+    Stands in for the cache module's `time`, so entries expire without sleeping.
+    """
+
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache, 'time', clock)
+    return clock
+
+
+@pytest.fixture
+def shared(tmp_path):
+    return SqliteCacheBackend(path=str(tmp_path / 'cache.sqlite'))
+
+
+def month_cache(shared=None, max_size: int = 16):
+    return MonthResponseCache(local=LRUTTLCache(max_size=max_size, ttl_seconds=60), shared=shared,
+                              open_month_ttl=60, closed_month_ttl=3600)
+
+
+def store(month_cache, year_month: str, value, view: str = 'summary'):
+    _, version = month_cache.lookup(USER_EMAIL, year_month, view)
+    month_cache.set(USER_EMAIL, year_month, view, value, version)
+
+
+def test_least_recently_used_entry_is_evicted():
+    lru = LRUTTLCache(max_size=2, ttl_seconds=60)
+    lru.set('a', 1)
+    lru.set('b', 2)
+    lru.get('a')
+
+    lru.set('c', 3)
+
+    assert (lru.get('a'), lru.get('b'), lru.get('c')) == (1, None, 3)
+    assert lru.stats()['evictions'] == 1
+
+
+def test_entries_expire_after_their_ttl(clock):
+    lru = LRUTTLCache(max_size=4, ttl_seconds=10)
+    lru.set('default', 1)
+    lru.set('longer', 2, ttl_seconds=30)
+
+    clock.now += 10
+
+    assert (lru.get('default'), lru.get('longer')) == (None, 2)
+    assert lru.stats() | {'hitRatio': None} == {'size': 1, 'maxSize': 4, 'hits': 1, 'misses': 1, 'evictions': 0,
+                                                'expirations': 1, 'hitRatio': None}
+
+
+def test_closed_months_get_the_longer_ttl():
+    responses = month_cache()
+
+    assert [responses.ttl_for(year_month, now=NOW) for year_month in ('2024-12', '2025-02', '2025-03', '2025-04')] == [
+        3600, 3600, 60, 60]
+
+
+def test_closed_month_entries_outlive_open_month_ones(clock):
+    responses = month_cache()
+    store(responses, '2025-02', 'closed')
+    # A month that has not ended yet
+    store(responses, '2999-01', 'open')
+
+    clock.now += 61
+
+    assert responses.lookup(USER_EMAIL, '2025-02', 'summary')[0] == 'closed'
+    assert responses.lookup(USER_EMAIL, '2999-01', 'summary')[0] is None
+
+
+def test_invalidate_month_drops_only_that_month():
+    responses = month_cache()
+    store(responses, '2025-02', 'summary', view='summary')
+    store(responses, '2025-02', 'api', view='api_summary')
+    store(responses, '2025-03', 'march')
+
+    responses.invalidate_month(USER_EMAIL, '2025-02')
+
+    assert responses.lookup(USER_EMAIL, '2025-02', 'summary')[0] is None
+    assert responses.lookup(USER_EMAIL, '2025-02', 'api_summary')[0] is None
+    assert responses.lookup(USER_EMAIL, '2025-03', 'summary')[0] == 'march'
+    assert responses.stats()['invalidations'] == 1
+
+
+def test_data_loaded_before_an_invalidation_is_not_cached():
+    responses = month_cache()
+    _, version = responses.lookup(USER_EMAIL, '2025-02', 'summary')
+    # A write lands while the stale data is being loaded
+    responses.invalidate_month(USER_EMAIL, '2025-02')
+
+    responses.set(USER_EMAIL, '2025-02', 'summary', 'stale', version)
+
+    assert responses.lookup(USER_EMAIL, '2025-02', 'summary')[0] is None
+
+
+def test_get_or_load_calls_the_loader_once():
+    responses = month_cache()
+    calls = []
+
+    def load():
+        calls.append(1)
+        return {'itemCount': 3}
+
+    values = [responses.get_or_load(USER_EMAIL, '2025-02', 'summary', load) for _ in range(3)]
+
+    assert values == [{'itemCount': 3}] * 3 and len(calls) == 1
+
+
+def test_oversized_streams_are_not_cached():
+    responses = MonthResponseCache(local=LRUTTLCache(max_size=4, ttl_seconds=60), max_rows=2)
+    _, version = responses.lookup(USER_EMAIL, '2025-02', 'export')
+
+    rows = responses.stream_and_cache(USER_EMAIL, '2025-02', 'export', iter([1, 2, 3]), version, list)
+
+    assert list(rows) == [1, 2, 3]
+    assert responses.lookup(USER_EMAIL, '2025-02', 'export')[0] is None
+
+
+def test_sqlite_tier_is_shared_between_workers(shared, tmp_path):
+    writer = month_cache(shared=shared)
+    # Another worker process: its own local tier and connection, the same file
+    reader = month_cache(shared=SqliteCacheBackend(path=str(tmp_path / 'cache.sqlite')))
+    store(writer, '2025-02', {'itemCount': 3})
+
+    assert reader.lookup(USER_EMAIL, '2025-02', 'summary')[0] == {'itemCount': 3}
+    assert reader.shared.stats()['hits'] == 1
+
+
+def test_sqlite_invalidation_reaches_every_worker(shared, tmp_path):
+    first = month_cache(shared=shared)
+    second = month_cache(shared=SqliteCacheBackend(path=str(tmp_path / 'cache.sqlite')))
+    store(first, '2025-02', 'old')
+    assert second.lookup(USER_EMAIL, '2025-02', 'summary')[0] == 'old'
+
+    first.invalidate_month(USER_EMAIL, '2025-02')
+
+    # The second worker's local copy carries the old version, so it is dropped as stale
+    assert second.lookup(USER_EMAIL, '2025-02', 'summary')[0] is None
+    assert second.stats()['stale'] == 1
+
+
+def test_sqlite_entries_expire_and_are_purged(shared, clock, monkeypatch):
+    monkeypatch.setattr(SqliteCacheBackend, 'PURGE_EVERY', 2)
+    shared.set('expired', 'value', version=0, ttl_seconds=10)
+    clock.now += 11
+
+    assert shared.get('expired', version=0) is None
+    shared.set('fresh', 'value', version=0, ttl_seconds=10)
+
+    assert shared.stats()['size'] == 1 and shared.stats()['evictions'] == 1
+    assert shared.get('fresh', version=0) == 'value'
+
+
+def test_unavailable_sqlite_tier_disables_caching(tmp_path):
+    responses = month_cache(shared=SqliteCacheBackend(path=str(tmp_path / 'missing' / 'cache.sqlite')))
+
+    store(responses, '2025-02', 'value')
+
+    assert responses.lookup(USER_EMAIL, '2025-02', 'summary') == (None, None)
+    assert responses.shared.stats()['errors'] >= 2
@@ -0,0 +1,250 @@
+from decimal import Decimal
+
+import pytest
+from boto3.dynamodb.conditions import Attr, Key
+from botocore.exceptions import ClientError
+
+from terptracker.dynamodb.embedded import EmbeddedDynamoDbResource, InMemoryBackend, SqliteBackend, serialize_item
+
+TABLE_NAME = 'Expenses'
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def resource(request, tmp_path):
+    if request.param == 'memory':
+        backend = InMemoryBackend()
+    else:
+        backend = SqliteBackend(path=str(tmp_path / 'embedded.sqlite3'))
+    return EmbeddedDynamoDbResource(backend=backend)
+
+
+@pytest.fixture
+def table(resource):
+    return resource.create_table(
+        TableName=TABLE_NAME,
+        KeySchema=[{'AttributeName': 'userEmail', 'KeyType': 'HASH'},
+                   {'AttributeName': 'expenseId', 'KeyType': 'RANGE'}],
+        AttributeDefinitions=[{'AttributeName': 'userEmail', 'AttributeType': 'S'},
+                              {'AttributeName': 'expenseId', 'AttributeType': 'S'},
+                              {'AttributeName': 'date', 'AttributeType': 'S'}],
+        BillingMode='PAY_PER_REQUEST',
+        GlobalSecondaryIndexes=[{'IndexName': 'DateIndex',
+                                 'KeySchema': [{'AttributeName': 'userEmail', 'KeyType': 'HASH'},
+                                               {'AttributeName': 'date', 'KeyType': 'RANGE'}],
+                                 'Projection': {'ProjectionType': 'ALL'}}])
+
+
+def error_code(excinfo):
+    return excinfo.value.response['Error']['Code']
+
+
+def expense(expense_id, date='2025-03-01', amount='10', **extra):
+    return dict({'userEmail': 'a@example.com', 'expenseId': expense_id, 'date': date,
+                 'amount': Decimal(amount)}, **extra)
+
+
+def test_put_and_get_round_trip(table):
+    table.put_item(Item=expense('e1', tags={'food'}, note='lunch'))
+
+    item = table.get_item(Key={'userEmail': 'a@example.com', 'expenseId': 'e1'})['Item']
+
+    assert item == expense('e1', tags={'food'}, note='lunch')
+    assert 'Item' not in table.get_item(Key={'userEmail': 'a@example.com', 'expenseId': 'missing'})
+
+
+def test_ints_are_normalized_and_floats_rejected(table):
+    table.put_item(Item=expense('e1', count=3))
+
+    assert table.get_item(Key={'userEmail': 'a@example.com', 'expenseId': 'e1'})['Item']['count'] == Decimal(3)
+    with pytest.raises(TypeError):
+        table.put_item(Item=expense('e2', ratio=0.5))
+
+
+def test_put_condition_expression(table):
+    table.put_item(Item=expense('e1'), ConditionExpression=Attr('expenseId').not_exists())
+
+    with pytest.raises(ClientError) as excinfo:
+        table.put_item(Item=expense('e1', amount='99'), ConditionExpression='attribute_not_exists(expenseId)')
+
+    assert error_code(excinfo) == 'ConditionalCheckFailedException'
+    assert table.get_item(Key={'userEmail': 'a@example.com', 'expenseId': 'e1'})['Item']['amount'] == Decimal(10)
+
+
+def test_put_and_delete_return_all_old(table):
+    assert 'Attributes' not in table.put_item(Item=expense('e1'), ReturnValues='ALL_OLD')
+
+    replaced = table.put_item(Item=expense('e1', amount='20'), ReturnValues='ALL_OLD')
+    deleted = table.delete_item(Key={'userEmail': 'a@example.com', 'expenseId': 'e1'}, ReturnValues='ALL_OLD')
+
+    assert replaced['Attributes']['amount'] == Decimal(10)
+    assert deleted['Attributes']['amount'] == Decimal(20)
+    assert 'Item' not in table.get_item(Key={'userEmail': 'a@example.com', 'expenseId': 'e1'})
+
+
+def test_update_expression_clauses(table):
+    table.put_item(Item=expense('e1', tags={'food', 'work'}, history=['created'], stale='x'))
+
+    response = table.update_item(
+        Key={'userEmail': 'a@example.com', 'expenseId': 'e1'},
+        UpdateExpression='SET #note = if_not_exists(#note, :note), history = list_append(history, :event) '
+                         'ADD amount :delta, visits :one REMOVE stale DELETE tags :removed',
+        ConditionExpression='size(history) = :length AND contains(tags, :tag) AND begins_with(#date, :year)',
+        ExpressionAttributeNames={'#note': 'note', '#date': 'date'},
+        ExpressionAttributeValues={':note': 'first', ':event': ['edited'], ':delta': Decimal(5), ':one': 1,
+                                   ':removed': {'work'}, ':length': 1, ':tag': 'work', ':year': '2025'},
+        ReturnValues='ALL_NEW')
+
+    assert response['Attributes'] == expense('e1', amount='15', tags={'food'}, history=['created', 'edited'],
+                                             note='first', visits=Decimal(1))
+
+
+def test_update_if_not_exists_keeps_existing_value(table):
+    table.put_item(Item=expense('e1', note='kept'))
+
+    table.update_item(Key={'userEmail': 'a@example.com', 'expenseId': 'e1'},
+                      UpdateExpression='SET note = if_not_exists(note, :note)',
+                      ExpressionAttributeValues={':note': 'replaced'})
+
+    assert table.get_item(Key={'userEmail': 'a@example.com', 'expenseId': 'e1'})['Item']['note'] == 'kept'
+
+
+def test_update_failed_condition_leaves_item_untouched(table):
+    table.put_item(Item=expense('e1'))
+
+    with pytest.raises(ClientError) as excinfo:
+        table.update_item(Key={'userEmail': 'a@example.com', 'expenseId': 'e1'},
+                          UpdateExpression='SET amount = :amount',
+                          ConditionExpression=Attr('amount').gt(Decimal(50)),
+                          ExpressionAttributeValues={':amount': Decimal(1)})
+
+    assert error_code(excinfo) == 'ConditionalCheckFailedException'
+    assert table.get_item(Key={'userEmail': 'a@example.com', 'expenseId': 'e1'})['Item']['amount'] == Decimal(10)
+
+
+def test_update_cannot_change_key_attributes(table):
+    table.put_item(Item=expense('e1'))
+
+    with pytest.raises(ClientError) as excinfo:
+        table.update_item(Key={'userEmail': 'a@example.com', 'expenseId': 'e1'},
+                          UpdateExpression='SET expenseId = :id', ExpressionAttributeValues={':id': 'e2'})
+
+    assert error_code(excinfo) == 'ValidationException'
+
+
+def test_transaction_cancellation_reasons(resource, table):
+    table.put_item(Item=expense('existing'))
+    client = resource.meta.client
+
+    with pytest.raises(ClientError) as excinfo:
+        client.transact_write_items(TransactItems=[
+            {'Put': {'TableName': TABLE_NAME, 'Item': serialize_item(expense('new'))}},
+            {'Put': {'TableName': TABLE_NAME, 'Item': serialize_item(expense('existing', amount='99')),
+                     'ConditionExpression': 'attribute_not_exists(expenseId)',
+                     'ReturnValuesOnConditionCheckFailure': 'ALL_OLD'}},
+        ])
+
+    assert error_code(excinfo) == 'TransactionCanceledException'
+    reasons = excinfo.value.response['CancellationReasons']
+    assert reasons[0] == {'Code': 'None'}
+    assert reasons[1]['Code'] == 'ConditionalCheckFailed'
+    assert reasons[1]['Item']['amount'] == {'N': '10'}
+    # Nothing is written unless every condition passes
+    assert 'Item' not in table.get_item(Key={'userEmail': 'a@example.com', 'expenseId': 'new'})
+
+
+def test_transaction_applies_every_action(resource, table):
+    table.put_item(Item=expense('old'))
+    table.put_item(Item=expense('counter', amount='1'))
+
+    resource.meta.client.transact_write_items(TransactItems=[
+        {'Put': {'TableName': TABLE_NAME, 'Item': serialize_item(expense('new'))}},
+        {'Delete': {'TableName': TABLE_NAME, 'Key': serialize_item({'userEmail': 'a@example.com',
+                                                                    'expenseId': 'old'})}},
+        {'Update': {'TableName': TABLE_NAME,
+                    'Key': serialize_item({'userEmail': 'a@example.com', 'expenseId': 'counter'}),
+                    'UpdateExpression': 'ADD amount :one',
+                    'ExpressionAttributeValues': serialize_item({':one': Decimal(1)})}},
+    ])
+
+    ids = {item['expenseId']: item['amount'] for item in table.scan()['Items']}
+    assert ids == {'new': Decimal(10), 'counter': Decimal(2)}
+
+
+def test_transaction_rejects_more_than_100_actions(resource, table):
+    actions = [{'Put': {'TableName': TABLE_NAME, 'Item': serialize_item(expense(f'e{i}'))}} for i in range(101)]
+
+    with pytest.raises(ClientError) as excinfo:
+        resource.meta.client.transact_write_items(TransactItems=actions)
+
+    assert error_code(excinfo) == 'ValidationException'
+
+
+def test_query_pages_with_limit_and_exclusive_start_key(table):
+    for day in range(1, 8):
+        table.put_item(Item=expense(f'e{day}', date=f'2025-03-{day:02d}'))
+    table.put_item(Item=expense('other', date='2025-04-01'))
+
+    seen = []
+    kwargs = {'KeyConditionExpression': Key('userEmail').eq('a@example.com')
+              & Key('date').between('2025-03-01', '2025-03-31'), 'IndexName': 'DateIndex', 'Limit': 3}
+    while True:
+        page = table.query(**kwargs)
+        seen.append([item['date'][-2:] for item in page['Items']])
+        if 'LastEvaluatedKey' not in page:
+            break
+        kwargs['ExclusiveStartKey'] = page['LastEvaluatedKey']
+
+    assert seen == [['01', '02', '03'], ['04', '05', '06'], ['07']]
+
+
+def test_query_descending_with_filter_and_count(table):
+    for day in range(1, 5):
+        table.put_item(Item=expense(f'e{day}', date=f'2025-03-{day:02d}', amount=str(day)))
+
+    newest = table.query(KeyConditionExpression=Key('userEmail').eq('a@example.com'), IndexName='DateIndex',
+                         ScanIndexForward=False, FilterExpression=Attr('amount').gte(Decimal(2)))
+    counted = table.query(KeyConditionExpression=Key('userEmail').eq('a@example.com')
+                          & Key('expenseId').begins_with('e'), Select='COUNT')
+
+    assert [item['expenseId'] for item in newest['Items']] == ['e4', 'e3', 'e2']
+    assert newest['ScannedCount'] == 4
+    assert counted['Count'] == 4 and 'Items' not in counted
+
+
+def test_query_consistent_read_on_index_is_rejected(table):
+    with pytest.raises(ClientError) as excinfo:
+        table.query(KeyConditionExpression=Key('userEmail').eq('a@example.com'), IndexName='DateIndex',
+                    ConsistentRead=True)
+
+    assert error_code(excinfo) == 'ValidationException'
+
+
+def test_query_page_stops_at_one_megabyte(table):
+    padding = 'x' * 200 * 1024
+    for number in range(8):
+        table.put_item(Item=expense(f'e{number}', padding=padding))
+
+    page = table.query(KeyConditionExpression=Key('userEmail').eq('a@example.com'))
+
+    assert 0 < page['Count'] < 8
+    assert 'LastEvaluatedKey' in page
+
+
+def test_parallel_scan_segments_partition_the_table(table):
+    for number in range(20):
+        table.put_item(Item=dict(expense('e1'), userEmail=f'user{number}@example.com'))
+
+    segments = [{item['userEmail'] for item in table.scan(Segment=segment, TotalSegments=3)['Items']}
+                for segment in range(3)]
+
+    assert sum(len(emails) for emails in segments) == 20
+    assert set.union(*segments) == {f'user{number}@example.com' for number in range(20)}
+
+
+def test_batch_writer_puts_and_deletes(table):
+    with table.batch_writer() as batch:
+        for number in range(30):
+            batch.put_item(Item=expense(f'e{number}'))
+        batch.delete_item(Key={'userEmail': 'a@example.com', 'expenseId': 'e0'})
+
+    assert table.query(KeyConditionExpression=Key('userEmail').eq('a@example.com'), Select='COUNT')['Count'] == 29
@@ -0,0 +1,262 @@
+import io
+from decimal import Decimal
+
+import pytest
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+
+from terptracker.constants.AppConstants import AppConstants
+from terptracker.constants.DynamoDbConstants import DynamoDbConstants
+from terptracker.dynamodb import expense_import
+from terptracker.dynamodb.dynamodb_helpers import get_dynamodb_client
+from terptracker.dynamodb.expense_import import (ExpenseImporter, RowRejected, import_expenses_csv,
+                                                 parse_expense_amount, parse_expense_date, resolve_columns,
+                                                 row_to_expense_item)
+from terptracker.dynamodb.rollup_helpers import get_monthly_rollup
+
+USER_EMAIL = 'import@example.com'
+BANK_EXPORT = '\n'.join([
+    'Transaction Date,Description,Category,Amount',
+    '02/03/2025,Coffee Shop,Food,-4.50',
+    '02/14/2025,Florist,Gifts,"($1,204.00)"',
+    '2025-03-01,Bookstore,,12',
+    'someday,Broken,Food,1.00',
+    '02/20/2025,Refund,Food,abc',
+    '02/21/2025,Nothing,Food,0',
+])
+
+
+class FlakyClient:
+    """
+    Wraps a client, answering the first calls of each write operation with the given responses or errors.
+    """
+
+    def __init__(self, client, batch_write_results=(), transact_errors=()):
+        self.client = client
+        self.batch_write_results = list(batch_write_results)
+        self.transact_errors = list(transact_errors)
+        self.transact_calls = 0
+
+    def batch_write_item(self, RequestItems):
+        if self.batch_write_results:
+            return self.batch_write_results.pop(0)(RequestItems)
+        return self.client.batch_write_item(RequestItems=RequestItems)
+
+    def transact_write_items(self, TransactItems):
+        self.transact_calls += 1
+        if self.transact_errors:
+            raise self.transact_errors.pop(0)
+        return self.client.transact_write_items(TransactItems=TransactItems)
+
+
+def unprocessed(request_items):
+    # Nothing was written; every request comes back for a retry
+    return {'UnprocessedItems': request_items}
+
+
+def client_error(code: str, operation: str = 'TransactWriteItems', reasons=None):
+    response = {'Error': {'Code': code, 'Message': code}}
+    if reasons is not None:
+        response['CancellationReasons'] = reasons
+    return ClientError(response, operation)
+
+
+def import_csv(text: str, rollup_table=None, client=None, **importer_kwargs):
+    return import_expenses_csv(text_stream=io.StringIO(text), user_email=USER_EMAIL,
+                               client=client or get_dynamodb_client(db_mode='MEMORY'), rollup_table=rollup_table,
+                               backoff_base_seconds=0, **importer_kwargs)
+
+
+def importer(client, **kwargs):
+    return ExpenseImporter(client=client, backoff_base_seconds=0, **kwargs)
+
+
+def user_items(expenses_table):
+    return expenses_table.query(KeyConditionExpression=Key('userEmail').eq(USER_EMAIL))['Items']
+
+
+def rows(count: int, day: int = 3):
+    return [{'Date': f'2025-02-{day:02d}', 'Amount': f'{number + 1}.00'} for number in range(count)]
+
+
+def items(count: int):
+    columns = {'date': 'Date', 'amount': 'Amount'}
+    return [row_to_expense_item(row=row, columns=columns, user_email=USER_EMAIL, row_number=number + 2)
+            for number, row in enumerate(rows(count))]
+
+
+@pytest.fixture
+def expenses_table(memory_db):
+    return memory_db.Table(DynamoDbConstants.TERPTRACKER_USER_EXPENSES_TABLE_NAME)
+
+
+@pytest.fixture
+def rollup_table(memory_db):
+    return memory_db.Table(DynamoDbConstants.TERPTRACKER_USER_MONTHLY_ROLLUP_TABLE_NAME)
+
+
+def test_columns_are_resolved_through_their_aliases():
+    columns = resolve_columns([' Posted Date ', 'PAYEE', 'Debit', 'Payment Type', 'Unused'])
+
+    assert columns == {'date': ' Posted Date ', 'amount': 'Debit', 'type': 'Payment Type', 'note': 'PAYEE'}
+
+
+def test_header_without_an_amount_column_is_rejected():
+    with pytest.raises(RowRejected, match='amount'):
+        resolve_columns(['Date', 'Description'])
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('2025-02-03', '2025-02-03'), ('02/03/2025', '2025-02-03'), ('02/03/25', '2025-02-03'),
+    ('2025/02/03', '2025-02-03'),
+])
+def test_date_formats(value, expected):
+    assert parse_expense_date(value).isoformat() == expected
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('12.5', Decimal('12.50')), ('$1,204.00', Decimal('1204.00')), ('-12.50', Decimal('12.50')),
+    ('(12.50)', Decimal('12.50')), ('1,000', Decimal('1000.00')),
+])
+def test_amount_formats(value, expected):
+    assert parse_expense_amount(value) == expected
+
+
+@pytest.mark.parametrize('value', ['', 'abc', '0', '0.004', 'NaN', 'Infinity', None])
+def test_invalid_amounts_are_rejected(value):
+    with pytest.raises(RowRejected):
+        parse_expense_amount(value)
+
+
+def test_same_row_gets_the_same_key_and_different_rows_do_not():
+    columns = {'date': 'Date', 'amount': 'Amount', 'note': 'Note'}
+    row = {'Date': '2025-02-03', 'Amount': '4.50', 'Note': 'Coffee'}
+
+    first = row_to_expense_item(row=row, columns=columns, user_email=USER_EMAIL, row_number=2)
+    again = row_to_expense_item(row=dict(row), columns=columns, user_email=USER_EMAIL, row_number=2)
+    next_row = row_to_expense_item(row=row, columns=columns, user_email=USER_EMAIL, row_number=3)
+    edited = row_to_expense_item(row={**row, 'Note': 'Tea'}, columns=columns, user_email=USER_EMAIL, row_number=2)
+
+    assert first == again
+    assert len({first['expenseTimestamp'], next_row['expenseTimestamp'], edited['expenseTimestamp']}) == 3
+    assert (first['expenseAmountCents'], first['expenseType'], first['expenseCategory']) == (450, 'other', 'other')
+
+
+def test_report_counts_imported_and_rejected_rows(expenses_table, rollup_table):
+    report = import_csv(BANK_EXPORT, rollup_table=rollup_table)
+
+    assert report.to_dict() | {'elapsedSeconds': None, 'rowsPerSecond': None} == {
+        'rowsRead': 6, 'rowsImported': 3, 'rowsSkipped': 0, 'rowsRejected': 3, 'rowsFailed': 0,
+        'batchesWritten': 1, 'writeRetries': 0, 'monthsUpdated': 2, 'elapsedSeconds': None, 'rowsPerSecond': None,
+        'rejected': [{'row': 5, 'reason': 'unrecognized date "someday"'},
+                     {'row': 6, 'reason': 'invalid amount "abc"'},
+                     {'row': 7, 'reason': 'invalid amount "0"'}],
+    }
+    assert report.months == ['2025-02', '2025-03']
+    stored = sorted((item['expenseCategory'], item['userNote'], int(item['expenseAmountCents']))
+                    for item in user_items(expenses_table))
+    assert stored == [('food', 'Coffee Shop', 450), ('gifts', 'Florist', 120400), ('other', 'Bookstore', 1200)]
+
+
+def test_reimporting_a_file_skips_its_rows_and_counts_them_once(expenses_table, rollup_table):
+    import_csv(BANK_EXPORT, rollup_table=rollup_table)
+
+    again = import_csv(BANK_EXPORT + '\n03/02/2025,New Row,Food,1.00', rollup_table=rollup_table)
+
+    assert (again.rows_imported, again.rows_skipped, again.rows_failed) == (1, 3, 0)
+    assert len(user_items(expenses_table)) == 4
+    february = get_monthly_rollup(rollup_table, USER_EMAIL, '2025-02')
+    march = get_monthly_rollup(rollup_table, USER_EMAIL, '2025-03')
+    assert (february['itemCount'], february['totalAmount']) == (2, Decimal('1208.5'))
+    assert (march['itemCount'], march['totalAmount']) == (2, Decimal('13'))
+
+
+def test_import_without_a_rollup_table_leaves_rollups_alone(expenses_table, rollup_table):
+    report = import_csv(BANK_EXPORT)
+
+    assert (report.rows_imported, report.months_updated) == (3, 0)
+    assert get_monthly_rollup(rollup_table, USER_EMAIL, '2025-02') is None
+
+
+def test_large_import_is_split_into_batches_across_writers(expenses_table, rollup_table):
+    lines = ['Date,Amount'] + [f'2025-0{1 + number % 3}-{1 + number % 28:02d},1.00' for number in range(130)]
+
+    report = import_csv('\n'.join(lines), rollup_table=rollup_table, writer_threads=3)
+
+    assert (report.rows_imported, report.batches_written, report.months_updated) == (130, 6, 3)
+    assert sum(get_monthly_rollup(rollup_table, USER_EMAIL, f'2025-0{month}')['itemCount']
+               for month in (1, 2, 3)) == 130
+
+
+def test_unprocessed_items_are_retried(expenses_table):
+    client = FlakyClient(get_dynamodb_client(db_mode='MEMORY'), batch_write_results=[unprocessed, unprocessed])
+    batch = items(3)
+
+    written, retries = importer(client).write_batch(batch)
+
+    assert (written, retries) == (batch, 2)
+    assert len(user_items(expenses_table)) == 3
+
+
+def test_rows_still_unprocessed_after_the_last_attempt_count_as_failed(expenses_table):
+    client = FlakyClient(get_dynamodb_client(db_mode='MEMORY'), batch_write_results=[unprocessed] * 3)
+
+    written, retries = importer(client, max_attempts=3).write_batch(items(2))
+
+    assert (written, retries) == ([], 3)
+    assert user_items(expenses_table) == []
+
+
+def test_retries_back_off_exponentially_up_to_the_cap(expenses_table, monkeypatch):
+    delays = []
+    monkeypatch.setattr(expense_import.random, 'uniform', lambda low, high: high)
+    monkeypatch.setattr(expense_import.time, 'sleep', delays.append)
+    client = FlakyClient(get_dynamodb_client(db_mode='MEMORY'), batch_write_results=[unprocessed] * 4)
+
+    ExpenseImporter(client=client, backoff_base_seconds=0.1, backoff_max_seconds=0.3).write_batch(items(1))
+
+    assert delays == pytest.approx([0.1, 0.2, 0.3, 0.3])
+
+
+def test_throttled_and_conflicting_transactions_are_retried(expenses_table, rollup_table):
+    conflict = client_error('TransactionCanceledException',
+                            reasons=[{'Code': 'None'}, {'Code': 'TransactionConflict'}])
+    client = FlakyClient(get_dynamodb_client(db_mode='MEMORY'),
+                         transact_errors=[client_error('ThrottlingException'), conflict])
+    batch = items(2)
+
+    written, skipped, retries = importer(client, rollup_table=rollup_table).write_import_batch(batch)
+
+    assert (written, skipped, retries, client.transact_calls) == (batch, [], 2, 3)
+    assert get_monthly_rollup(rollup_table, USER_EMAIL, '2025-02')['itemCount'] == 2
+
+
+def test_non_retryable_transaction_errors_are_raised(expenses_table):
+    client = FlakyClient(get_dynamodb_client(db_mode='MEMORY'),
+                         transact_errors=[client_error('ValidationException')])
+
+    with pytest.raises(ClientError):
+        importer(client).write_import_batch(items(1))
+
+
+def test_failed_batches_are_reported_without_their_rollup_delta(expenses_table, rollup_table):
+    client = FlakyClient(get_dynamodb_client(db_mode='MEMORY'),
+                         transact_errors=[client_error('ThrottlingException')] * 2)
+
+    report = import_csv('Date,Amount\n2025-02-03,1.00\n2025-02-04,2.00', rollup_table=rollup_table, client=client,
+                        max_attempts=2)
+
+    assert (report.rows_imported, report.rows_failed, report.write_retries, report.months) == (0, 2, 2, [])
+    assert user_items(expenses_table) == []
+    assert get_monthly_rollup(rollup_table, USER_EMAIL, '2025-02') is None
+
+
+def test_oversized_upload_is_refused(client, monkeypatch):
+    monkeypatch.setattr(AppConstants, 'IMPORT_MAX_UPLOAD_BYTES', 100)
+    upload = ('Date,Amount\n' + '2025-02-03,1.00\n' * 20).encode()
+
+    response = client.post('/import', data={'expense_file': (io.BytesIO(upload), 'export.csv')},
+                           content_type='multipart/form-data')
+
+    assert response.status_code == 413
+    assert 'terptracker import-expenses' in response.get_data(as_text=True)
@@ -0,0 +1,91 @@
+import json
+
+import pytest
+from boto3.dynamodb.conditions import Key
+
+from terptracker.constants.DynamoDbConstants import DynamoDbConstants
+from terptracker.dynamodb.expense_migration import ExpenseSchemaMigration
+from terptracker.dynamodb.expense_schema import EXPENSE_SCHEMA_VERSION
+
+USER_EMAIL = 'migrate@example.com'
+LEGACY_COUNT = 6
+
+
+@pytest.fixture
+def expenses_table(memory_db):
+    table = memory_db.Table(DynamoDbConstants.TERPTRACKER_USER_EXPENSES_TABLE_NAME)
+    for number in range(LEGACY_COUNT):
+        table.put_item(Item={'userEmail': USER_EMAIL, 'expenseTimestamp': f'17400000{number:02d}.250000',
+                             'expenseAmount': f'{number}.50', 'expenseType': 'Expense',
+                             'expenseCategory': 'Food', 'userNote': f'v1 #{number}'})
+    return table
+
+
+def migration(state_path, **kwargs):
+    return ExpenseSchemaMigration(db_mode='MEMORY', segments=1, write_rate=0, state_path=str(state_path),
+                                  page_size=1, **kwargs)
+
+
+def user_items(table):
+    return table.query(KeyConditionExpression=Key('userEmail').eq(USER_EMAIL))['Items']
+
+
+def test_migration_upgrades_legacy_items(expenses_table, tmp_path):
+    totals = migration(tmp_path / 'state.json').run()
+
+    items = user_items(expenses_table)
+    assert totals['migrated'] == LEGACY_COUNT and totals['conflicts'] == 0
+    assert len(items) == LEGACY_COUNT
+    assert all(item['schemaVersion'] == EXPENSE_SCHEMA_VERSION and 'expenseAmount' not in item for item in items)
+    assert sorted(int(item['expenseAmountCents']) for item in items) == [number * 100 + 50
+                                                                         for number in range(LEGACY_COUNT)]
+    assert {item['userCategory'] for item in items} == {f'{USER_EMAIL}#Food'}
+
+
+def test_interrupted_migration_resumes_from_saved_progress(expenses_table, tmp_path, monkeypatch):
+    state_path = tmp_path / 'state.json'
+    interrupted = migration(state_path)
+    migrate_item = interrupted.migrate_item
+    calls = []
+
+    def crash_on_third_item(client, table, item):
+        calls.append(item['expenseTimestamp'])
+        if len(calls) == 3:
+            raise RuntimeError('interrupted')
+        return migrate_item(client, table, item)
+
+    monkeypatch.setattr(interrupted, 'migrate_item', crash_on_third_item)
+    with pytest.raises(RuntimeError, match='interrupted'):
+        interrupted.run()
+
+    saved = json.loads(state_path.read_text())['segments']['0']
+    assert saved['migrated'] == 2 and not saved['done'] and saved['lastEvaluatedKey']
+
+    totals = migration(state_path).run()
+
+    items = user_items(expenses_table)
+    assert totals['migrated'] == LEGACY_COUNT and totals['conflicts'] == 0
+    assert len(items) == LEGACY_COUNT
+    assert all(item['schemaVersion'] == EXPENSE_SCHEMA_VERSION for item in items)
+
+
+def test_rerunning_a_finished_migration_is_a_no_op(expenses_table, tmp_path):
+    state_path = tmp_path / 'state.json'
+    first = migration(state_path).run()
+    migrated = {item['expenseTimestamp'] for item in user_items(expenses_table)}
+
+    resumed = migration(state_path).run()
+    restarted = migration(tmp_path / 'fresh.json').run()
+
+    # Every segment is already done, so the resumed run scans nothing more
+    assert (resumed['scanned'], resumed['migrated']) == (first['scanned'], first['migrated'])
+    assert restarted['migrated'] == 0
+    assert {item['expenseTimestamp'] for item in user_items(expenses_table)} == migrated
+
+
+def test_resume_with_different_segment_count_is_rejected(expenses_table, tmp_path):
+    state_path = tmp_path / 'state.json'
+    migration(state_path).run()
+
+    with pytest.raises(RuntimeError, match='segments'):
+        ExpenseSchemaMigration(db_mode='MEMORY', segments=2, write_rate=0, state_path=str(state_path)).run()
@@ -0,0 +1,80 @@
+from datetime import date
+
+import pytest
+from boto3.dynamodb.conditions import Key
+
+from terptracker.constants.DynamoDbConstants import DynamoDbConstants
+from terptracker.dynamodb.dynamodb_helpers import ExpenseQuery, get_month_timestamp_range, split_expense_query
+from terptracker.dynamodb.expense_schema import make_expense_sort_key
+
+USER_EMAIL = 'range@example.com'
+# 2025-01-01T00:00:00Z and 2025-02-01T00:00:00Z
+NEW_YEAR_SECONDS = 1_735_689_600
+FEBRUARY_SECONDS = 1_738_368_000
+
+
+def boundary_keys():
+    """
+    Sort keys just before, at and just after two month boundaries, in both the v2 and the legacy v1 layout.
+    """
+    keys = []
+    for seconds in (NEW_YEAR_SECONDS, FEBRUARY_SECONDS):
+        micros = seconds * 1_000_000
+        keys += [make_expense_sort_key(micros - 1, suffix='00000000'), make_expense_sort_key(micros, suffix='00000000'),
+                 make_expense_sort_key(micros + 1, suffix='00000000'), f'{seconds}.0', f'{seconds - 1}.999999']
+    return keys
+
+
+def test_single_month_read_is_not_split():
+    query = ExpenseQuery.for_dates(user_email=USER_EMAIL, start_date=date(2025, 2, 10), end_date=date(2025, 2, 20))
+
+    sub_queries = split_expense_query(query)
+
+    assert [(sub.start, sub.end) for sub in sub_queries] == [(query.start, query.end)]
+
+
+def test_read_across_a_year_is_split_per_month_keeping_the_original_bounds():
+    query = ExpenseQuery.for_dates(user_email=USER_EMAIL, start_date=date(2024, 12, 15), end_date=date(2025, 2, 3),
+                                   category='Food', consistent=True)
+
+    sub_queries = split_expense_query(query)
+
+    january = get_month_timestamp_range('2025-01')
+    assert [(sub.start, sub.end) for sub in sub_queries] == [
+        (query.start, get_month_timestamp_range('2024-12')[1]),
+        january,
+        (get_month_timestamp_range('2025-02')[0], query.end),
+    ]
+    assert all(sub.category == 'Food' and sub.consistent and sub.user_email == USER_EMAIL for sub in sub_queries)
+
+
+def test_month_reads_split_into_whole_months():
+    query = ExpenseQuery.for_months(user_email=USER_EMAIL, start_month='2024-02', end_month='2024-03')
+
+    assert [(sub.start, sub.end) for sub in split_expense_query(query)] == [get_month_timestamp_range('2024-02'),
+                                                                           get_month_timestamp_range('2024-03')]
+
+
+@pytest.mark.parametrize('sort_key', boundary_keys())
+def test_every_key_falls_in_exactly_one_month(sort_key):
+    query = ExpenseQuery.for_dates(user_email=USER_EMAIL, start_date=date(2024, 12, 1), end_date=date(2025, 2, 28))
+    item = {'expenseTimestamp': sort_key}
+
+    assert query.in_range(item)
+    assert sum(sub.in_range(item) for sub in split_expense_query(query)) == 1
+
+
+def test_sub_reads_return_the_same_items_as_the_whole_read(memory_db):
+    table = memory_db.Table(DynamoDbConstants.TERPTRACKER_USER_EXPENSES_TABLE_NAME)
+    for sort_key in boundary_keys():
+        table.put_item(Item={'userEmail': USER_EMAIL, 'expenseTimestamp': sort_key})
+    query = ExpenseQuery.for_dates(user_email=USER_EMAIL, start_date=date(2024, 12, 31), end_date=date(2025, 2, 1))
+
+    def read(sub_query):
+        condition = Key('userEmail').eq(USER_EMAIL) & Key('expenseTimestamp').between(sub_query.start, sub_query.end)
+        return [item['expenseTimestamp'] for item in table.query(KeyConditionExpression=condition)['Items']]
+
+    split_keys = [key for sub_query in split_expense_query(query) for key in read(sub_query)]
+
+    assert len(split_keys) == len(boundary_keys())
+    assert split_keys == read(query)
@@ -0,0 +1,67 @@
+import re
+
+import pytest
+
+from terptracker.dynamodb import idempotency
+from terptracker.dynamodb.expense_schema import new_expense_item
+from terptracker.dynamodb.idempotency import expense_idempotency_key, new_form_token
+
+EXPENSE_FORM = {'expense_type': 'Expense', 'expense_category': 'Food', 'expense_amount': '12.50',
+                'expense_date': '2025-02-10', 'expense_note': 'lunch'}
+
+
+def form_token(client):
+    return re.search(r'name="idempotency_key" value="(\w+)"', client.get('/').get_data(as_text=True)).group(1)
+
+
+def month_expenses(client):
+    return client.get('/api/summary/2025-02/expenses').get_json()['expenses']
+
+
+def test_resubmitting_a_form_token_adds_one_expense(client):
+    token = form_token(client)
+
+    responses = [client.post('/', data=dict(EXPENSE_FORM, idempotency_key=token)) for _ in range(3)]
+
+    assert all('Successfully added your Food expense' in response.get_data(as_text=True) for response in responses)
+    assert len(month_expenses(client)) == 1
+    assert client.get('/api/summary/2025-02').get_json()['itemCount'] == 1
+
+
+def test_a_new_form_token_adds_another_expense(client):
+    client.post('/', data=dict(EXPENSE_FORM, idempotency_key=form_token(client)))
+    client.post('/', data=dict(EXPENSE_FORM, idempotency_key=form_token(client)))
+
+    assert len(month_expenses(client)) == 2
+    assert client.get('/api/summary/2025-02').get_json()['itemCount'] == 2
+
+
+def test_identical_submissions_without_a_token_are_collapsed(client, monkeypatch):
+    # Keep all three submissions inside one content-hash window
+    monkeypatch.setattr(idempotency.time, 'time', lambda: 1_739_145_600.0)
+    client.post('/', data=EXPENSE_FORM)
+    client.post('/', data=EXPENSE_FORM)
+    client.post('/', data=dict(EXPENSE_FORM, expense_amount='13.00'))
+
+    assert sorted(expense['amount'] for expense in month_expenses(client)) == ['12.5', '13']
+
+
+@pytest.mark.parametrize('token', [None, '', 'short', 'not a token!' * 2])
+def test_malformed_tokens_fall_back_to_the_content_hash(token):
+    item = new_expense_item(user_email='a@example.com', epoch_micros=1_739_145_600_000_000, amount_cents=1250,
+                            expense_type='Expense', expense_category='Food', user_note='lunch')
+
+    key = expense_idempotency_key(item, form_token=token, window_seconds=60, now=0)
+
+    assert key.startswith('content:')
+    assert key == expense_idempotency_key(item, window_seconds=60, now=59)
+
+
+def test_content_hash_changes_with_the_time_window():
+    item = new_expense_item(user_email='a@example.com', epoch_micros=1_739_145_600_000_000, amount_cents=1250,
+                            expense_type='Expense', expense_category='Food', user_note='lunch')
+    token = new_form_token()
+
+    assert expense_idempotency_key(item, form_token=token) == f'form:{token}'
+    assert expense_idempotency_key(item, window_seconds=60, now=0) != expense_idempotency_key(item, window_seconds=60,
+                                                                                              now=60)
@@ -0,0 +1,45 @@
+from flask import session
+
+from terptracker.constants.AppConstants import AppConstants
+from terptracker.website.models import USER_SNAPSHOT_SESSION_KEY, User, remember_user_snapshot
+
+USER = User(user_id='user-1', email='login@example.com', first_name='Test', password_hash='hash')
+
+
+def session_cookie_set(response):
+    return any(header.startswith('session=') for header in response.headers.getlist('Set-Cookie'))
+
+
+def test_unchanged_snapshot_leaves_the_session_unmodified(app, monkeypatch):
+    monkeypatch.setattr(AppConstants, 'USER_SESSION_SNAPSHOT', True)
+    with app.test_request_context():
+        session[USER_SNAPSHOT_SESSION_KEY] = USER.to_session_snapshot()
+        session.modified = False
+
+        remember_user_snapshot(USER)
+
+        assert not session.modified
+
+
+def test_changed_snapshot_is_stored(app, monkeypatch):
+    monkeypatch.setattr(AppConstants, 'USER_SESSION_SNAPSHOT', True)
+    renamed = User(user_id='user-1', email='login@example.com', first_name='Renamed', password_hash='hash')
+    with app.test_request_context():
+        session[USER_SNAPSHOT_SESSION_KEY] = USER.to_session_snapshot()
+        session.modified = False
+
+        remember_user_snapshot(renamed)
+
+        assert session.modified and session[USER_SNAPSHOT_SESSION_KEY]['first_name'] == 'Renamed'
+
+
+def test_snapshot_is_written_once_and_not_on_every_request(client, monkeypatch):
+    monkeypatch.setattr(AppConstants, 'USER_SESSION_SNAPSHOT', True)
+    with client.session_transaction() as session:
+        session.pop(USER_SNAPSHOT_SESSION_KEY, None)
+
+    first = client.get('/import')
+    later = [client.get('/import') for _ in range(2)]
+
+    assert first.status_code == 200 and session_cookie_set(first)
+    assert not any(session_cookie_set(response) for response in later)
@@ -0,0 +1,100 @@
+import re
+
+import pytest
+from itsdangerous import URLSafeSerializer
+
+from terptracker.constants.AppConstants import AppConstants
+from terptracker.constants.DynamoDbConstants import DynamoDbConstants
+from terptracker.website.pagination import _CURSOR_SALT, InvalidCursor, decode_cursor, encode_cursor
+
+SECRET_KEY = 'test-secret'
+SCOPE = 'user@example.com|2025-02'
+LAST_KEY = {'userEmail': 'user@example.com', 'expenseTimestamp': '1739145600.000000#00000000'}
+
+
+def tampered(cursor: str):
+    # Flip one character of the payload, leaving the signature as it was
+    index = len(cursor) // 3
+    return cursor[:index] + ('A' if cursor[index] != 'A' else 'B') + cursor[index + 1:]
+
+
+def add_expense(client, day: int, amount: str):
+    client.post('/', data={'expense_type': 'Expense', 'expense_category': 'Food', 'expense_amount': amount,
+                           'expense_date': f'2025-02-{day:02d}', 'expense_note': ''})
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor(secret_key=SECRET_KEY, scope=SCOPE, last_evaluated_key=LAST_KEY, offset=50)
+
+    assert decode_cursor(secret_key=SECRET_KEY, scope=SCOPE, cursor=cursor) == (LAST_KEY, 50)
+
+
+@pytest.mark.parametrize('secret_key, scope, mangle', [
+    (SECRET_KEY, SCOPE, tampered),
+    ('another-secret', SCOPE, None),
+    (SECRET_KEY, 'other@example.com|2025-02', None),
+    (SECRET_KEY, 'user@example.com|2025-03', None),
+    (SECRET_KEY, SCOPE, lambda cursor: 'not-a-cursor'),
+])
+def test_invalid_cursors_are_rejected(secret_key, scope, mangle):
+    cursor = encode_cursor(secret_key=SECRET_KEY, scope=SCOPE, last_evaluated_key=LAST_KEY, offset=50)
+
+    with pytest.raises(InvalidCursor):
+        decode_cursor(secret_key=secret_key, scope=scope, cursor=mangle(cursor) if mangle else cursor)
+
+
+def test_signed_cursor_without_a_key_is_rejected():
+    cursor = URLSafeSerializer(SECRET_KEY, salt=_CURSOR_SALT).dumps({'s': SCOPE, 'k': 'expenseTimestamp', 'n': 1})
+
+    with pytest.raises(InvalidCursor):
+        decode_cursor(secret_key=SECRET_KEY, scope=SCOPE, cursor=cursor)
+
+
+def test_bad_offset_resets_to_zero():
+    cursor = URLSafeSerializer(SECRET_KEY, salt=_CURSOR_SALT).dumps({'s': SCOPE, 'k': LAST_KEY, 'n': -5})
+
+    assert decode_cursor(secret_key=SECRET_KEY, scope=SCOPE, cursor=cursor) == (LAST_KEY, 0)
+
+
+def test_month_expenses_are_paged_with_cursors(client):
+    for day, amount in ((3, '1.00'), (9, '2.00'), (17, '3.00')):
+        add_expense(client, day=day, amount=amount)
+
+    pages = []
+    url = '/api/summary/2025-02/expenses?limit=2'
+    while url:
+        page = client.get(url).get_json()
+        pages.append((page['offset'], [expense['amount'] for expense in page['expenses']]))
+        url = f"/api/summary/2025-02/expenses?limit=2&cursor={page['nextCursor']}" if page['nextCursor'] else None
+
+    assert pages == [(0, ['1', '2']), (2, ['3'])]
+
+
+def test_full_last_page_has_no_next_cursor(client):
+    for day in (3, 9):
+        add_expense(client, day=day, amount='1.00')
+
+    page = client.get('/api/summary/2025-02/expenses?limit=2').get_json()
+
+    assert len(page['expenses']) == 2 and page['nextCursor'] is None
+
+
+def test_summary_pages_do_not_stop_at_the_rollup_item_count(client, memory_db, user_email, monkeypatch):
+    monkeypatch.setattr(AppConstants, 'SUMMARY_PAGE_SIZE', 2)
+    for day in range(1, 6):
+        add_expense(client, day=day, amount='1.00')
+    # A rollup that undercounts the month must not hide the rows past its count
+    memory_db.Table(DynamoDbConstants.TERPTRACKER_USER_MONTHLY_ROLLUP_TABLE_NAME).update_item(
+        Key={'userEmail': user_email, 'yearMonth': '2025-02'},
+        UpdateExpression='SET itemCount = :count, rollupVersion = :version',
+        ExpressionAttributeValues={':count': 1, ':version': 2})
+
+    rows = 0
+    url = '/summary?month=2025-02'
+    while url:
+        html = client.get(url).get_data(as_text=True)
+        rows += html.count('<td class="text-end">$')
+        cursor = re.search(r'cursor=([\w.-]+)', html)
+        url = f'/summary?month=2025-02&cursor={cursor.group(1)}' if cursor else None
+
+    assert rows == 5
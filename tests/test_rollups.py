@@ -0,0 +1,98 @@
+import pytest
+
+from terptracker.constants.DynamoDbConstants import DynamoDbConstants
+from terptracker.dynamodb.dynamodb_helpers import ExpenseQuery, get_dynamodb_client, plan_expense_query
+from terptracker.dynamodb.expense_schema import new_expense_item
+from terptracker.dynamodb.idempotency import put_expense_with_rollup
+from terptracker.dynamodb.rollup_helpers import (ROLLUP_SCHEMA_VERSION, ROLLUP_VERSION_ATTRIBUTE, build_rollup,
+                                                 get_monthly_rollup, get_or_build_monthly_rollup,
+                                                 record_expense_in_rollup, store_rebuilt_rollup)
+
+USER_EMAIL = 'rollups@example.com'
+# 2025-02-10T00:00:00Z
+FEBRUARY_MICROS = 1_739_145_600_000_000
+
+
+def expense(offset_seconds: int, amount_cents: int):
+    return new_expense_item(user_email=USER_EMAIL, epoch_micros=FEBRUARY_MICROS + offset_seconds * 1_000_000,
+                            amount_cents=amount_cents, expense_type='Expense', expense_category='Food',
+                            user_note='')
+
+
+@pytest.fixture
+def expenses_table(memory_db):
+    return memory_db.Table(DynamoDbConstants.TERPTRACKER_USER_EXPENSES_TABLE_NAME)
+
+
+@pytest.fixture
+def rollup_table(memory_db):
+    return memory_db.Table(DynamoDbConstants.TERPTRACKER_USER_MONTHLY_ROLLUP_TABLE_NAME)
+
+
+def read_february(rollup_table, expenses_table):
+    plan = plan_expense_query(ExpenseQuery.for_months(user_email=USER_EMAIL, start_month='2025-02',
+                                                      end_month='2025-02', consistent=True))
+    return get_or_build_monthly_rollup(rollup_table=rollup_table, user_expenses_table=expenses_table,
+                                       user_email=USER_EMAIL, year_month='2025-02', expense_query_plan=plan)
+
+
+def test_month_with_expenses_stored_before_its_rollup_is_rebuilt(expenses_table, rollup_table):
+    for offset in range(3):
+        expenses_table.put_item(Item=expense(offset, 1000))
+    # The first write after rollups existed creates the month's rollup holding only itself
+    put_expense_with_rollup(client=get_dynamodb_client(db_mode='MEMORY'), expense_item=expense(10, 500))
+
+    rollup = read_february(rollup_table, expenses_table)
+
+    assert (rollup['itemCount'], rollup['totalAmount']) == (4, 35.0)
+    stored = get_monthly_rollup(rollup_table, USER_EMAIL, '2025-02')
+    assert (stored['itemCount'], stored[ROLLUP_VERSION_ATTRIBUTE]) == (4, ROLLUP_SCHEMA_VERSION)
+
+
+def test_expenses_added_after_a_rebuild_are_counted_once(expenses_table, rollup_table):
+    expenses_table.put_item(Item=expense(0, 1000))
+    read_february(rollup_table, expenses_table)
+
+    put_expense_with_rollup(client=get_dynamodb_client(db_mode='MEMORY'), expense_item=expense(1, 250))
+
+    stored = get_monthly_rollup(rollup_table, USER_EMAIL, '2025-02')
+    assert (stored['itemCount'], stored['totalAmount']) == (2, 12.5)
+    assert read_february(rollup_table, expenses_table) == stored
+
+
+def test_missing_rollup_is_stored_once_rebuilt(expenses_table, rollup_table):
+    expenses_table.put_item(Item=expense(0, 1000))
+    expenses_table.put_item(Item=expense(86_400, 200))
+
+    rollup = read_february(rollup_table, expenses_table)
+
+    assert rollup == get_monthly_rollup(rollup_table, USER_EMAIL, '2025-02')
+    assert rollup['dayCounts'] == {'10': 1, '11': 1}
+
+
+def test_empty_month_stores_nothing(expenses_table, rollup_table):
+    assert read_february(rollup_table, expenses_table) is None
+    assert get_monthly_rollup(rollup_table, USER_EMAIL, '2025-02') is None
+
+
+def test_rebuild_is_not_stored_over_a_concurrent_write(rollup_table):
+    stale = None
+    built = build_rollup(user_email=USER_EMAIL, year_month='2025-02', expense_items=[expense(0, 1000)])
+    # Another request created the rollup between this read and the rebuild being stored
+    record_expense_in_rollup(rollup_table, expense(5, 700))
+
+    store_rebuilt_rollup(rollup_table=rollup_table, rollup=stale, built=built)
+
+    stored = get_monthly_rollup(rollup_table, USER_EMAIL, '2025-02')
+    assert (stored['itemCount'], stored['totalAmount'], stored[ROLLUP_VERSION_ATTRIBUTE]) == (1, 7.0, 0)
+
+
+def test_rebuild_counting_fewer_expenses_than_the_rollup_is_not_stored(rollup_table):
+    record_expense_in_rollup(rollup_table, expense(0, 1000))
+    record_expense_in_rollup(rollup_table, expense(1, 1000))
+    stored = get_monthly_rollup(rollup_table, USER_EMAIL, '2025-02')
+    lagging = build_rollup(user_email=USER_EMAIL, year_month='2025-02', expense_items=[expense(0, 1000)])
+
+    store_rebuilt_rollup(rollup_table=rollup_table, rollup=stored, built=lagging)
+
+    assert get_monthly_rollup(rollup_table, USER_EMAIL, '2025-02')['totalAmount'] == 20.0
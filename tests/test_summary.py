@@ -0,0 +1,17 @@
+import pytest
+
+
+def test_pie_chart_renders_a_valid_month(client):
+    response = client.get('/pie_chart?month=2025-02')
+
+    assert response.status_code == 200
+    assert 'Month: 2025-02' in response.get_data(as_text=True)
+
+
+def test_pie_chart_accepts_a_posted_month(client):
+    assert client.post('/pie_chart', data={'month': '2025-02'}).status_code == 200
+
+
+@pytest.mark.parametrize('query', ['', '?month=', '?month=2025-13', '?month=2025-2', '?month=<script>'])
+def test_pie_chart_rejects_a_missing_or_malformed_month(client, query):
+    assert client.get(f'/pie_chart{query}').status_code == 400
@@ -0,0 +1,246 @@
+import pytest
+from botocore.exceptions import ClientError
+
+from terptracker.dynamodb import throttling
+from terptracker.dynamodb.throttling import (CircuitBreaker, TableThrottle, TableThrottled, ThrottledTable,
+                                             consumed_capacity_units, retry_after_headers)
+
+TABLE = 'USER_EXPENSES'
+INDEX = 'UserCategoryIndex'
+READ = ('read', TABLE)
+
+
+class Clock:
+    """
+    Stands in for time.monotonic so breaker periods pass without sleeping.
+    """
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def throttling_error(code: str = 'ProvisionedThroughputExceededException'):
+    return ClientError({'Error': {'Code': code, 'Message': code}}, 'GetItem')
+
+
+def read_response(units: float):
+    return {'ConsumedCapacity': {'TableName': TABLE, 'CapacityUnits': units, 'Table': {'CapacityUnits': units}}}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(throttling.time, 'monotonic', clock)
+    return clock
+
+
+@pytest.fixture
+def breaker(clock):
+    return CircuitBreaker(name=TABLE, failure_threshold=3, reset_seconds=10)
+
+
+@pytest.fixture
+def throttle():
+    throttle = TableThrottle(table_name=TABLE, capacity_share=1, burst_seconds=1, max_attempts=3,
+                             backoff_base_seconds=0.1, backoff_max_seconds=0.3, failure_threshold=2)
+    throttle.apply_description({'ProvisionedThroughput': {'ReadCapacityUnits': 100, 'WriteCapacityUnits': 10}})
+    return throttle
+
+
+def open_breaker(breaker):
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+
+
+def test_breaker_opens_after_the_failure_threshold(breaker, clock):
+    breaker.record_failure()
+    breaker.record_failure()
+    assert (breaker.state, breaker.retry_after()) == (CircuitBreaker.CLOSED, None)
+
+    breaker.record_failure()
+    clock.now += 4
+
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.retry_after() == pytest.approx(6)
+
+
+def test_success_resets_the_failure_count(breaker):
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_one_probe_per_period_once_the_breaker_is_half_open(breaker, clock):
+    open_breaker(breaker)
+    clock.now += 10
+
+    assert breaker.retry_after() is None
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.retry_after() == pytest.approx(10)
+
+
+def test_successful_probe_closes_the_breaker(breaker, clock):
+    open_breaker(breaker)
+    clock.now += 10
+    breaker.retry_after()
+
+    breaker.record_success()
+
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.retry_after() is None
+
+
+def test_failed_probe_reopens_the_breaker_for_another_period(breaker, clock):
+    open_breaker(breaker)
+    clock.now += 10
+    breaker.retry_after()
+    clock.now += 2
+
+    breaker.record_failure()
+
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.retry_after() == pytest.approx(10)
+
+
+def test_neutral_probe_lets_the_next_call_probe(breaker, clock):
+    open_breaker(breaker)
+    clock.now += 10
+    breaker.retry_after()
+
+    breaker.record_neutral()
+
+    assert breaker.retry_after() is None
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+
+def test_neutral_calls_neither_reset_nor_add_to_the_failure_count(breaker):
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_neutral()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    breaker.record_failure()
+
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_buckets_are_sized_from_the_provisioned_capacity(throttle):
+    assert throttle.bucket(READ).rate == 100
+    assert throttle.bucket(('write', TABLE)).rate == 10
+
+
+def test_on_demand_tables_get_unlimited_buckets():
+    throttle = TableThrottle(table_name=TABLE)
+    throttle.apply_description({'BillingModeSummary': {'BillingMode': 'PAY_PER_REQUEST'},
+                                'ProvisionedThroughput': {'ReadCapacityUnits': 0, 'WriteCapacityUnits': 0}})
+
+    assert throttle.bucket(READ).rate == 0
+
+
+def test_throttled_calls_halve_the_rate_down_to_its_floor(throttle):
+    rates = []
+    for _ in range(5):
+        throttle.throttled(READ, attempt=1, error=throttling_error())
+        rates.append(throttle.bucket(READ).rate)
+
+    assert rates == [50, 25, 12.5, 10, 10]
+    assert throttle.counters['throttled'] == 5 and throttle.counters['retries'] == 5
+
+
+def test_successful_calls_win_the_rate_back(throttle):
+    for _ in range(2):
+        throttle.throttled(READ, attempt=1, error=throttling_error())
+
+    rates = []
+    for _ in range(16):
+        throttle.settle('get_item', READ, tokens=1, response=read_response(1))
+        rates.append(throttle.bucket(READ).rate)
+
+    assert rates[:3] == [30, 35, 40]
+    assert rates[-2:] == [100, 100]
+
+
+def test_retry_delays_are_capped_and_the_last_attempt_gives_up(throttle, monkeypatch):
+    monkeypatch.setattr(throttling.random, 'uniform', lambda low, high: high)
+
+    delays = [throttle.throttled(READ, attempt=attempt, error=throttling_error()) for attempt in (1, 2)]
+    with pytest.raises(TableThrottled) as raised:
+        throttle.throttled(READ, attempt=3, error=throttling_error())
+
+    assert delays == pytest.approx([0.1, 0.2])
+    assert raised.value.retry_after == 0.3
+    assert retry_after_headers(raised.value) == {'Retry-After': '1'}
+    assert throttle.counters['exhausted'] == 1
+
+
+def test_exhausted_calls_open_the_breaker_and_shed_later_calls(throttle):
+    for _ in range(2):
+        with pytest.raises(TableThrottled):
+            throttle.throttled(READ, attempt=3, error=throttling_error())
+
+    with pytest.raises(TableThrottled, match='circuit open'):
+        throttle.begin('get_item', {})
+    assert throttle.counters['shed'] == 1
+
+
+def test_settle_follows_the_reported_cost(throttle):
+    key, tokens = throttle.begin('query', {})
+    assert tokens == 1.0
+
+    throttle.settle('query', key, tokens=1, response=read_response(20))
+    first_estimate = throttle.begin('query', {})[1]
+    throttle.settle('query', key, tokens=1, response=read_response(10))
+
+    # The first report replaces the default; later ones move the estimate a fifth of the way
+    assert (first_estimate, throttle.begin('query', {})[1]) == (20, 18)
+    assert throttle.counters['consumedReadUnits'] == 30
+
+
+def test_capacity_is_split_by_table_and_index():
+    response = {'ConsumedCapacity': {'TableName': TABLE, 'CapacityUnits': 7.5, 'Table': {'CapacityUnits': 2.5},
+                                     'GlobalSecondaryIndexes': {INDEX: {'CapacityUnits': 5}}}}
+
+    assert consumed_capacity_units(response, table_name=TABLE, target=INDEX) == {TABLE: 2.5, INDEX: 5.0}
+
+
+def test_transaction_capacity_is_taken_from_the_table_entry():
+    response = {'ConsumedCapacity': [
+        {'TableName': 'USER_MONTHLY_ROLLUP', 'CapacityUnits': 2, 'Table': {'CapacityUnits': 2}},
+        {'TableName': TABLE, 'CapacityUnits': 4, 'Table': {'CapacityUnits': 4}},
+    ]}
+
+    assert consumed_capacity_units(response, table_name=TABLE, target=TABLE) == {TABLE: 4.0}
+    assert consumed_capacity_units(response, table_name='EXPENSE_IDEMPOTENCY', target='EXPENSE_IDEMPOTENCY') == {}
+
+
+def test_capacity_without_a_breakdown_is_charged_to_the_target():
+    assert consumed_capacity_units({'ConsumedCapacity': {'TableName': TABLE, 'CapacityUnits': 3}},
+                                   table_name=TABLE, target=INDEX) == {INDEX: 3.0}
+    assert consumed_capacity_units({}, table_name=TABLE, target=TABLE) == {}
+
+
+def test_throttled_table_retries_throttled_calls(throttle, monkeypatch):
+    outcomes = [throttling_error('ThrottlingException'), read_response(1)]
+
+    class Table:
+        def get_item(self, **kwargs):
+            outcome = outcomes.pop(0)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+
+    table = ThrottledTable(db_mode='MEMORY', table_name=TABLE)
+    table._table = Table()
+    monkeypatch.setattr(throttling, 'get_table_throttle', lambda db_mode, table_name: throttle)
+    monkeypatch.setattr(throttle, 'claim_refresh', lambda: False)
+    monkeypatch.setattr(throttling.time, 'sleep', lambda seconds: None)
+
+    assert table.get_item(Key={'userEmail': 'a'}) == read_response(1)
+    assert (throttle.counters['calls'], throttle.counters['retries']) == (1, 1)
+    assert throttle.bucket(READ).rate == 55
@@ -0,0 +1,135 @@
+import json
+from decimal import Decimal
+
+import pytest
+from botocore.exceptions import ClientError
+
+from terptracker.constants.DynamoDbConstants import DynamoDbConstants
+from terptracker.dynamodb import write_behind
+from terptracker.dynamodb.dynamodb_helpers import get_dynamodb_client
+from terptracker.dynamodb.expense_schema import new_expense_item
+from terptracker.dynamodb.idempotency import apply_rollup_delta_once
+from terptracker.dynamodb.rollup_helpers import accumulate_monthly_rollups, get_monthly_rollup
+from terptracker.dynamodb.write_behind import DEAD_LETTER_FILENAME, WriteBehindQueue, read_journal
+
+USER_EMAIL = 'journal@example.com'
+# 2025-02-14 UTC
+FEBRUARY_MICROS = 1_739_500_000_000_000
+
+
+def expense(offset_seconds: int, amount_cents: int, category: str = 'Food'):
+    return new_expense_item(user_email=USER_EMAIL, epoch_micros=FEBRUARY_MICROS + offset_seconds * 1_000_000,
+                            amount_cents=amount_cents, expense_type='Expense', expense_category=category,
+                            user_note='')
+
+
+def write_journal(path, records):
+    with open(path, 'w', encoding='utf-8') as journal:
+        for record in records:
+            journal.write(json.dumps(record) + '\n')
+
+
+@pytest.fixture
+def journal_dir(tmp_path):
+    return tmp_path / 'journal'
+
+
+@pytest.fixture
+def queue(memory_db, journal_dir):
+    queue = WriteBehindQueue(db_mode='MEMORY', journal_dir=str(journal_dir), max_pending=100, linger_seconds=0.01,
+                             enqueue_timeout_seconds=1, fsync=False, backoff_base_seconds=0.01,
+                             backoff_max_seconds=0.05)
+    yield queue
+    queue.stop()
+
+
+@pytest.fixture
+def rollup_table(memory_db):
+    return memory_db.Table(DynamoDbConstants.TERPTRACKER_USER_MONTHLY_ROLLUP_TABLE_NAME)
+
+
+@pytest.fixture
+def expenses_table(memory_db):
+    return memory_db.Table(DynamoDbConstants.TERPTRACKER_USER_EXPENSES_TABLE_NAME)
+
+
+def test_read_journal_separates_unwritten_and_written_items(tmp_path):
+    first, second, third, fourth = expense(0, 100), expense(1, 200), expense(2, 300), expense(3, 400)
+    path = tmp_path / 'write-behind-1-deadbeef.jsonl'
+    write_journal(path, [{'put': first}, {'put': second}, {'put': third}, {'put': fourth},
+                         {'batch': 'b1', 'keys': [[USER_EMAIL, second['expenseTimestamp']],
+                                                  [USER_EMAIL, third['expenseTimestamp']]]},
+                         {'done': [[USER_EMAIL, third['expenseTimestamp']]]},
+                         {'dead': [[USER_EMAIL, fourth['expenseTimestamp']]]}])
+    with open(path, 'a', encoding='utf-8') as journal:
+        journal.write('{"put": {"userEmail": "torn')
+
+    unwritten, written_batches = read_journal(str(path))
+
+    assert unwritten == [first]
+    assert written_batches == {'b1': [second]}
+
+
+def test_replay_does_not_count_an_applied_rollup_delta_twice(queue, journal_dir, expenses_table, rollup_table):
+    unwritten, stored = expense(0, 100), expense(1, 200)
+    # The previous worker stored `stored` and applied its batch's delta, then died before journaling it done
+    expenses_table.put_item(Item=stored)
+    rollup = accumulate_monthly_rollups({}, USER_EMAIL, stored)['2025-02']
+    apply_rollup_delta_once(client=get_dynamodb_client(db_mode='MEMORY'), rollup=rollup, delta_id='b1:2025-02')
+    journal_dir.mkdir()
+    orphan = journal_dir / 'write-behind-1-deadbeef.jsonl'
+    write_journal(orphan, [{'put': unwritten}, {'put': stored},
+                           {'batch': 'b1', 'keys': [[USER_EMAIL, stored['expenseTimestamp']]]}])
+
+    queue.start()
+
+    assert queue.flush(timeout=5)
+    assert queue.stats()['recovered'] == 2
+    assert not orphan.exists()
+    month = get_monthly_rollup(rollup_table, USER_EMAIL, '2025-02')
+    assert (month['totalAmount'], month['itemCount']) == (Decimal('3'), 2)
+
+
+def test_rollup_failures_keep_items_pending_until_applied(queue, rollup_table, monkeypatch):
+    failures = [2]
+
+    def flaky_apply(**kwargs):
+        if failures[0]:
+            failures[0] -= 1
+            raise ClientError({'Error': {'Code': 'InternalServerError', 'Message': 'try again'}},
+                              'TransactWriteItems')
+        return apply_rollup_delta_once(**kwargs)
+
+    monkeypatch.setattr(write_behind, 'apply_rollup_delta_once', flaky_apply)
+    queue.submit(expense(0, 300))
+
+    assert queue.flush(timeout=5)
+    assert queue.stats()['failedRollups'] == 2
+    month = get_monthly_rollup(rollup_table, USER_EMAIL, '2025-02')
+    assert (month['totalAmount'], month['itemCount']) == (Decimal('3'), 1)
+
+
+def test_rejected_items_are_dead_lettered(queue, journal_dir, expenses_table, rollup_table, monkeypatch):
+    queue.start()
+    write_batch = queue._importer.write_batch
+
+    def reject_poison(items):
+        if any(item['expenseCategory'] == 'Poison' for item in items):
+            raise ClientError({'Error': {'Code': 'ValidationException', 'Message': 'invalid item'}}, 'BatchWriteItem')
+        return write_batch(items)
+
+    monkeypatch.setattr(queue._importer, 'write_batch', reject_poison)
+    poison, good = expense(0, 400, category='Poison'), expense(1, 500)
+    with queue._condition:
+        queue._enqueue(poison)
+        queue._enqueue(good)
+        queue._condition.notify_all()
+
+    assert queue.flush(timeout=5)
+    assert queue.stats()['deadLettered'] == 1
+    dead_letters = [json.loads(line) for line in (journal_dir / DEAD_LETTER_FILENAME).read_text().splitlines()]
+    assert [record['item']['expenseTimestamp'] for record in dead_letters] == [poison['expenseTimestamp']]
+    assert 'Item' in expenses_table.get_item(Key={'userEmail': USER_EMAIL,
+                                                  'expenseTimestamp': good['expenseTimestamp']})
+    month = get_monthly_rollup(rollup_table, USER_EMAIL, '2025-02')
+    assert (month['totalAmount'], month['itemCount']) == (Decimal('5'), 1)